@@ -1,18 +1,68 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 import os
+import multiprocessing
 import zipfile
 import tempfile
 from sec_client import SECClient
+from async_sec_client import AsyncSECClient
 from operating_model import OperatingModel
 from dcf_calculator import DCFCalculator
+from calc_graph import ValuationGraph
+from batch_dcf import BatchDCFEngine
+from scenario_scheduler import ScenarioScheduler
 from export_handler import ExportHandler
+from streaming_export import StreamingExportHandler
+from comps_export import CompsExportHandler
+from statement_store import StatementStore
+from model_cache import ModelCache
 
 app = Flask(__name__, static_folder='static', static_url_path='/static')
 CORS(app)  # Enable CORS for API calls
 
-# Initialize SEC client
-sec_client = SECClient()
+# Initialize SEC client (companyfacts cache location and TTL can be overridden via env).
+# Downloads run on the async client's shared event loop so pooled keep-alive
+# connections are reused across request threads.
+sec_client = AsyncSECClient(
+    cache_dir=os.environ.get('SEC_CACHE_DIR'),
+    cache_ttl=float(os.environ.get('SEC_CACHE_TTL', 24 * 60 * 60)),
+    stream_facts=os.environ.get('SEC_STREAM_FACTS', '1') != '0',
+    max_workers=int(os.environ.get('SEC_MAX_WORKERS', SECClient.DEFAULT_MAX_WORKERS)),
+    lookback_years=int(os.environ.get('SEC_LOOKBACK_YEARS', SECClient.DEFAULT_LOOKBACK_YEARS))
+)
+
+# Parsed statements are persisted so valuations can be recalculated by CIK
+statement_store = StatementStore(os.environ.get('SEC_STORE_DIR') or sec_client.facts_cache.cache_dir)
+
+
+# Parsed statements and latest results per UI session, addressed by opaque handles
+model_cache = ModelCache(int(os.environ.get('MODEL_CACHE_SIZE', ModelCache.DEFAULT_MAX_ENTRIES)))
+# Workers come from a fork server (spawn where unavailable): forking this process directly
+# would copy locks held by its other threads (SEC event loop, ticker refresh) into the workers
+scenario_scheduler = ScenarioScheduler(
+    int(os.environ.get('SCENARIO_WORKERS', '0')) or None,
+    mp_context=multiprocessing.get_context(
+        'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+)
+
+# Excel exports are written row by row with xlsxwriter unless the openpyxl engine is requested
+EXCEL_ENGINE = os.environ.get('EXCEL_ENGINE', 'streaming')
+# Companies per comps workbook (/api/export-comps)
+COMPS_MAX_COMPANIES = int(os.environ.get('COMPS_MAX_COMPANIES', '500'))
+
+
+def save_statements(company_data: dict):
+    """
+    Persist a company's statements to the local store (failures only logged)
+    
+    The store keeps one full-history entry per CIK, so company_data must be parsed at
+    SECClient.MAX_LOOKBACK_YEARS; readers apply their lookback when loading.
+    """
+    cik = company_data.get('cik')
+    try:
+        statement_store.put(cik, company_data)
+    except Exception as e:
+        print(f"Error saving statements for CIK {cik}: {e}")
 
 @app.route('/')
 def index():
@@ -32,13 +82,22 @@ def fetch_company():
         identifier = identifier.strip()
         print(f"DEBUG: Fetching company data for identifier: {identifier}")
         
-        # Fetch company data
-        company_data = sec_client.fetch_company_data(identifier)
+        try:
+            lookback_years = sec_client.resolve_lookback(data.get('lookback_years'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Parse once at full history for the store; the response gets the requested
+        # lookback trimmed exactly as the store applies it on read
+        company_data = sec_client.fetch_company_data(identifier, SECClient.MAX_LOOKBACK_YEARS)
         
         if 'error' in company_data:
             print(f"DEBUG: Error fetching company data: {company_data['error']}")
             return jsonify(company_data), 400
         
+        save_statements(company_data)
+        company_data = StatementStore.trim(company_data, lookback_years)
+        
         # Check if we got any financial data
         has_data = bool(company_data.get('income_statement') or 
                        company_data.get('balance_sheet') or 
@@ -65,8 +124,9 @@ def fetch_company():
                 print(f"Income statement data: {income_statement}")
                 # Don't fail here - let the operating model handle it with better error messages
         
+        model_handle = model_cache.create({'company_data': company_data})
         print(f"DEBUG: Successfully fetched data for {company_data.get('company_name', 'Unknown')}")
-        return jsonify(company_data), 200
+        return jsonify({**company_data, 'model_handle': model_handle}), 200
         
     except Exception as e:
         import traceback
@@ -74,23 +134,71 @@ def fetch_company():
         print(f"DEBUG: Exception in fetch_company: {error_details}")
         return jsonify({'error': f'Error fetching company data: {str(e)}'}), 500
 
-@app.route('/api/calculate-dcf', methods=['POST'])
-def calculate_dcf():
-    """Calculate DCF valuation based on inputs"""
+@app.route('/api/fetch-companies', methods=['POST'])
+def fetch_companies():
+    """
+    Fetch several companies concurrently
+    
+    Streams newline-delimited JSON: one line per company, in completion order,
+    each carrying the 'identifier' it was requested under.
+    """
+    data = request.get_json() or {}
+    identifiers = data.get('identifiers')
+    
+    if not identifiers or not isinstance(identifiers, list):
+        return jsonify({'error': 'A list of company identifiers (tickers or CIKs) is required'}), 400
+    
     try:
-        data = request.get_json()
-        company_data = data.get('company_data')
-        assumptions = data.get('assumptions')
-        
-        print(f"DEBUG: Received assumptions: {assumptions}")
-        print(f"DEBUG: Company data keys: {company_data.keys() if company_data else 'None'}")
-        
-        if not company_data:
-            return jsonify({'error': 'Company data is required'}), 400
-        
-        if not assumptions:
-            return jsonify({'error': 'DCF assumptions are required'}), 400
-        
+        max_workers = sec_client.resolve_max_workers(data.get('max_workers'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    print(f"DEBUG: Fetching {len(identifiers)} companies")
+    
+    def generate():
+        for company_data in sec_client.fetch_many([str(i) for i in identifiers], max_workers=max_workers,
+                                                  lookback_years=SECClient.MAX_LOOKBACK_YEARS):
+            if 'error' not in company_data:
+                save_statements(company_data)
+                company_data = StatementStore.trim(company_data, sec_client.lookback_years)
+            yield app.json.dumps(company_data) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    """Report companyfacts cache hit/miss counters"""
+    return jsonify(sec_client.facts_cache.stats()), 200
+
+def build_operating_model_data(data: dict, assumptions: dict):
+    """
+    Build the operating model for a calculation request
+    
+    Statements come from a model handle issued by /api/fetch-company, inline
+    ('company_data'), or the local store ('cik'), so a recalculation does not
+    have to re-upload them.
+    
+    Returns:
+        (operating_model_data, model_state, error) where error is a (response, status) tuple or None
+    """
+    model_handle = data.get('model_handle')
+    model_state = model_cache.get(model_handle)
+    company_data = model_state['company_data'] if model_state else data.get('company_data')
+    cik = data.get('cik')
+    
+    print(f"DEBUG: Received assumptions: {assumptions}")
+    print(f"DEBUG: Company data keys: {company_data.keys() if company_data else 'None'}")
+    
+    if model_handle and model_state is None and not company_data and not cik:
+        return None, None, (jsonify({'error': 'Model handle has expired. Please fetch company data again.'}), 404)
+    
+    if not company_data and not cik:
+        return None, None, (jsonify({'error': 'Company data or CIK is required'}), 400)
+    
+    if not assumptions:
+        return None, None, (jsonify({'error': 'DCF assumptions are required'}), 400)
+    
+    projection_years = assumptions.get('projection_years', 5)
+    if company_data:
         # Check if company data has financial statements
         has_income = bool(company_data.get('income_statement'))
         has_balance = bool(company_data.get('balance_sheet'))
@@ -99,73 +207,188 @@ def calculate_dcf():
         print(f"DEBUG: Has income statement: {has_income}, Has balance sheet: {has_balance}, Has cash flow: {has_cashflow}")
         
         if not has_income and not has_balance:
-            return jsonify({'error': 'Company data does not contain financial statements. Please fetch company data first.'}), 400
+            return None, None, (jsonify({'error': 'Company data does not contain financial statements. Please fetch company data first.'}), 400)
         
         # Build operating model
-        projection_years = assumptions.get('projection_years', 5)
         operating_model = OperatingModel(company_data, projection_years=projection_years)
+    else:
+        try:
+            lookback_years = sec_client.resolve_lookback(data.get('lookback_years'))
+        except ValueError as e:
+            return None, None, (jsonify({'error': str(e)}), 400)
+        operating_model = OperatingModel.from_store(statement_store, str(cik), projection_years=projection_years,
+                                                    lookback_years=lookback_years)
+        if operating_model is None:
+            return None, None, (jsonify({'error': f'No stored statements for CIK {cik}. Please fetch company data first.'}), 404)
+    
+    # Prepare assumptions for operating model
+    operating_assumptions = OperatingModel.operating_assumptions(assumptions)
+    
+    print(f"DEBUG: Operating assumptions: {operating_assumptions}")
+    
+    # Build model
+    operating_model_data = operating_model.build_model(operating_assumptions)
+    
+    if 'error' in operating_model_data:
+        return None, None, (jsonify(operating_model_data), 400)
+    
+    return operating_model_data, model_state, None
+
+@app.route('/api/calculate-dcf', methods=['POST'])
+def calculate_dcf():
+    """
+    Calculate DCF valuation based on inputs (results are attached to the model handle for exports)
+    
+    With a model handle the calculation runs on the handle's ValuationGraph, so a
+    recalculation after editing one assumption only re-evaluates what depends on it.
+    """
+    try:
+        data = request.get_json()
+        assumptions = data.get('assumptions')
+        model_handle = data.get('model_handle')
+        model_state = model_cache.get(model_handle)
+        company_data = model_state['company_data'] if model_state else None
+        
+        if assumptions and company_data and (company_data.get('income_statement') or company_data.get('balance_sheet')):
+            graph = model_state.get('graph') or ValuationGraph(company_data)
+            operating_model_data, dcf_results = graph.evaluate(assumptions)
+            if dcf_results is None:
+                return jsonify(operating_model_data), 400
+            print(f"DEBUG: Recalculated nodes: {graph.last_recomputed}")
+            print(f"DEBUG: Node timings: {graph.timing_report()}")
+            # A sensitivity grid from earlier assumptions no longer matches these results
+            model_cache.update(model_handle, graph=graph, operating_model=operating_model_data,
+                               dcf_results=dcf_results, assumptions=assumptions, sensitivity=None)
+        else:
+            operating_model_data, model_state, error = build_operating_model_data(data, assumptions)
+            if error:
+                return error
+            
+            # Calculate DCF
+            dcf_calculator = DCFCalculator(operating_model_data, assumptions)
+            dcf_results = dcf_calculator.calculate_all()
+            
+            if model_state:
+                model_cache.update(model_handle, operating_model=operating_model_data,
+                                   dcf_results=dcf_results, assumptions=assumptions, sensitivity=None)
         
-        # Prepare assumptions for operating model
-        # Convert None to actual None (not string "None")
-        revenue_growth = assumptions.get('revenue_growth')
-        gross_margin = assumptions.get('gross_margin')
-        sga_percent = assumptions.get('sga_percent')
+        return jsonify({
+            'operating_model': operating_model_data,
+            'dcf_results': dcf_results,
+            'model_handle': model_handle if model_state else None
+        }), 200
         
-        # Handle string "null" or "None"
-        if revenue_growth == "null" or revenue_growth == "None":
-            revenue_growth = None
-        if gross_margin == "null" or gross_margin == "None":
-            gross_margin = None
-        if sga_percent == "null" or sga_percent == "None":
-            sga_percent = None
+    except Exception as e:
+        import traceback
+        error_details = traceback.format_exc()
+        print(f"DCF Calculation Error: {error_details}")
+        return jsonify({'error': f'Error calculating DCF: {str(e)}'}), 500
+
+@app.route('/api/sensitivity', methods=['POST'])
+def sensitivity():
+    """
+    Compute a sensitivity grid of equity value and price per share
+    
+    Takes the same statement sources and assumptions as /api/calculate-dcf plus
+    'axes': [{'name': 'wacc', 'start': 0.06, 'stop': 0.12, 'steps': 7},
+             {'name': 'terminal_growth_rate', 'values': [0.01, 0.02, 0.03]}, ...].
+    Any number of axes may be given; without axes a WACC x terminal growth grid
+    around the base case is returned. The FCF series is prepared once and the whole
+    grid is valued in one vectorized pass.
+    """
+    try:
+        data = request.get_json()
+        assumptions = data.get('assumptions')
+        operating_model_data, model_state, error = build_operating_model_data(data, assumptions)
+        if error:
+            return error
         
-        operating_assumptions = {
-            'revenue_growth': revenue_growth,
-            'gross_margin': gross_margin,
-            'sga_percent': sga_percent,
-            'tax_rate': assumptions.get('tax_rate', 0.25)
-        }
+        engine = BatchDCFEngine.from_calculator(DCFCalculator(operating_model_data, assumptions))
+        try:
+            axes = engine.parse_axes(data.get('axes'), assumptions)
+            grid = scenario_scheduler.sensitivity(engine, axes, assumptions)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        print(f"DEBUG: Operating assumptions: {operating_assumptions}")
+        if model_state:
+            model_cache.update(data.get('model_handle'), sensitivity=grid)
         
-        # Build model
-        operating_model_data = operating_model.build_model(operating_assumptions)
+        return jsonify(grid), 200
         
-        if 'error' in operating_model_data:
-            return jsonify(operating_model_data), 400
+    except Exception as e:
+        import traceback
+        error_details = traceback.format_exc()
+        print(f"Sensitivity Error: {error_details}")
+        return jsonify({'error': f'Error calculating sensitivity: {str(e)}'}), 500
+
+@app.route('/api/monte-carlo', methods=['POST'])
+def monte_carlo():
+    """
+    Monte Carlo valuation: distributions of EV, equity value and price per share
+    
+    Takes the same statement sources and assumptions as /api/calculate-dcf plus
+    'distributions' ({assumption: spec}, see MonteCarloSimulator), 'draws' (default
+    100,000), 'seed', 'percentiles' and 'bins' (1 to 1000). Assumptions without a distribution
+    keep their scalar values.
+    """
+    try:
+        data = request.get_json()
+        assumptions = data.get('assumptions')
+        operating_model_data, _, error = build_operating_model_data(data, assumptions)
+        if error:
+            return error
         
-        # Calculate DCF
         dcf_calculator = DCFCalculator(operating_model_data, assumptions)
-        dcf_results = dcf_calculator.calculate_all()
+        try:
+            results = dcf_calculator.monte_carlo(
+                data.get('distributions') or {},
+                draws=data.get('draws', 100_000),
+                seed=data.get('seed'),
+                percentiles=data.get('percentiles'),
+                bins=data.get('bins', 50),
+                scheduler=scenario_scheduler
+            )
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify({
-            'operating_model': operating_model_data,
-            'dcf_results': dcf_results
-        }), 200
+        return jsonify(results), 200
         
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
-        print(f"DCF Calculation Error: {error_details}")
-        return jsonify({'error': f'Error calculating DCF: {str(e)}'}), 500
+        print(f"Monte Carlo Error: {error_details}")
+        return jsonify({'error': f'Error running Monte Carlo valuation: {str(e)}'}), 500
+
+def export_inputs(data: dict):
+    """Resolve (operating_model, dcf_results, company_name, sensitivity) from a model handle or the request body"""
+    model_state = model_cache.get(data.get('model_handle'))
+    if model_state and model_state.get('dcf_results'):
+        company_name = model_state['company_data'].get('company_name') or data.get('company_name', 'Company')
+        return (model_state['operating_model'], model_state['dcf_results'], company_name,
+                model_state.get('sensitivity'))
+    return (data.get('operating_model'), data.get('dcf_results'), data.get('company_name', 'Company'),
+            data.get('sensitivity'))
 
 @app.route('/api/export-excel', methods=['POST'])
 def export_excel():
     """Export results to Excel format"""
     try:
         data = request.get_json()
-        operating_model_data = data.get('operating_model')
-        dcf_results = data.get('dcf_results')
-        company_name = data.get('company_name', 'Company')
+        operating_model_data, dcf_results, company_name, sensitivity_grid = export_inputs(data)
         
         if not operating_model_data or not dcf_results:
+            if data.get('model_handle'):
+                return jsonify({'error': 'Model handle has expired or has no DCF results. Please recalculate.'}), 404
             return jsonify({'error': 'Operating model and DCF results are required'}), 400
         
-        # Create export handler
-        export_handler = ExportHandler(operating_model_data, dcf_results, company_name)
-        
-        # Generate Excel file
-        excel_file = export_handler.create_excel_workbook()
+        # Generate Excel file (the streaming engine hands back a temp file that send_file streams and closes)
+        if EXCEL_ENGINE == 'openpyxl':
+            export_handler = ExportHandler(operating_model_data, dcf_results, company_name, sensitivity=sensitivity_grid)
+            excel_file = export_handler.create_excel_workbook()
+        else:
+            export_handler = StreamingExportHandler(operating_model_data, dcf_results, company_name,
+                                                    sensitivity=sensitivity_grid)
+            excel_file = export_handler.create_excel_file()
         
         # Send file
         return send_file(
@@ -178,20 +401,108 @@ def export_excel():
     except Exception as e:
         return jsonify({'error': f'Error exporting Excel: {str(e)}'}), 500
 
+def comps_companies(entries: list, assumptions: dict):
+    """
+    Yield CompsExportHandler inputs for each comps entry, one company at a time
+    
+    Model handles with DCF results are exported as calculated; other handles and CIKs
+    (loaded from the statement store) are valued with the shared assumptions, updated
+    by the entry's own 'assumptions' (e.g. its shares_outstanding).
+    """
+    for entry in entries:
+        if not isinstance(entry, dict):
+            entry = {'cik': entry}
+        model_state = model_cache.get(entry.get('model_handle'))
+        if model_state and model_state.get('dcf_results'):
+            company_data = model_state['company_data']
+            yield {'company_name': company_data.get('company_name'), 'ticker': company_data.get('ticker'),
+                   'cik': company_data.get('cik'), 'operating_model': model_state['operating_model'],
+                   'dcf_results': model_state['dcf_results']}
+            continue
+        
+        company_data = model_state['company_data'] if model_state else None
+        if company_data is None and entry.get('cik'):
+            company_data = statement_store.get(str(entry['cik']), lookback_years=sec_client.lookback_years)
+        company = {'company_name': (company_data or {}).get('company_name'), 'ticker': (company_data or {}).get('ticker'),
+                   'cik': (company_data or {}).get('cik') or entry.get('cik')}
+        if not company_data:
+            error = 'Model handle has expired' if entry.get('model_handle') else 'No stored statements'
+            yield {**company, 'error': f'{error}. Please fetch company data first.'}
+            continue
+        
+        try:
+            company_assumptions = {**assumptions, **(entry.get('assumptions') or {})}
+            operating_model = OperatingModel(company_data, projection_years=company_assumptions.get('projection_years', 5))
+            operating_model_data = operating_model.build_model(OperatingModel.operating_assumptions(company_assumptions))
+            if 'error' in operating_model_data:
+                yield {**company, 'error': operating_model_data['error']}
+                continue
+            dcf_results = DCFCalculator(operating_model_data, company_assumptions).calculate_all()
+        except Exception as e:
+            print(f"DEBUG: Comps valuation failed for {company['cik']}: {e}")
+            yield {**company, 'error': f'Error calculating DCF: {str(e)}'}
+            continue
+        yield {**company, 'operating_model': operating_model_data, 'dcf_results': dcf_results}
+
+@app.route('/api/export-comps', methods=['POST'])
+def export_comps():
+    """
+    Export one comparable-companies workbook for many companies
+    
+    'companies' lists CIKs and/or model handles (bare CIKs, {'cik': ...} or
+    {'model_handle': ...}). The workbook has a comps summary sheet (EV, equity value,
+    WACC, margins) and each company's Historical IS/BS/CF sheets, written in a single
+    streaming pass. 'assumptions' are required unless every company is a model handle
+    with DCF results.
+    """
+    try:
+        data = request.get_json() or {}
+        companies = data.get('companies')
+        assumptions = data.get('assumptions') or {}
+        
+        if not companies or not isinstance(companies, list):
+            return jsonify({'error': 'A list of CIKs or model handles is required'}), 400
+        if len(companies) > COMPS_MAX_COMPANIES:
+            return jsonify({'error': f'At most {COMPS_MAX_COMPANIES} companies can be exported at once'}), 400
+        
+        def has_results(entry):
+            model_state = model_cache.get(entry.get('model_handle')) if isinstance(entry, dict) else None
+            return bool(model_state and model_state.get('dcf_results'))
+        
+        if not assumptions and not all(has_results(entry) for entry in companies):
+            return jsonify({'error': 'DCF assumptions are required to value companies without calculated results'}), 400
+        
+        print(f"DEBUG: Exporting comps for {len(companies)} companies")
+        export_handler = CompsExportHandler(comps_companies(companies, assumptions), title=data.get('title') or 'Comparable Companies')
+        excel_file = export_handler.create_excel_file()
+        
+        return send_file(
+            excel_file,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name='Comps_DCF_Models.xlsx'
+        )
+        
+    except Exception as e:
+        import traceback
+        error_details = traceback.format_exc()
+        print(f"DEBUG: Exception in export_comps: {error_details}")
+        return jsonify({'error': f'Error exporting comps: {str(e)}'}), 500
+
 @app.route('/api/export-csv', methods=['POST'])
 def export_csv():
     """Export results to CSV format"""
     try:
         data = request.get_json()
-        operating_model_data = data.get('operating_model')
-        dcf_results = data.get('dcf_results')
-        company_name = data.get('company_name', 'Company')
+        operating_model_data, dcf_results, company_name, sensitivity_grid = export_inputs(data)
         
         if not operating_model_data or not dcf_results:
+            if data.get('model_handle'):
+                return jsonify({'error': 'Model handle has expired or has no DCF results. Please recalculate.'}), 404
             return jsonify({'error': 'Operating model and DCF results are required'}), 400
         
         # Create export handler
-        export_handler = ExportHandler(operating_model_data, dcf_results, company_name)
+        export_handler = ExportHandler(operating_model_data, dcf_results, company_name, sensitivity=sensitivity_grid)
         
         # Create temporary directory for CSV files
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -0,0 +1,254 @@
+"""
+Async SEC XBRL API Client
+aiohttp-based companyfacts fetching with pooled keep-alive connections, shared by all Flask request threads
+"""
+import asyncio
+import concurrent.futures
+import random
+import threading
+from typing import Awaitable, Callable, Coroutine, Dict, Iterable, Iterator, Optional
+
+import aiohttp
+
+from facts_cache import CompanyFactsCache
+from sec_client import SECClient
+
+
+class AsyncSECClient(SECClient):
+    """
+    SECClient whose downloads run on one long-lived asyncio event loop
+
+    The loop runs on a daemon thread and owns a single aiohttp session, so its
+    per-host connection pools and keep-alive connections survive across Flask
+    requests: concurrent users reuse open TLS connections instead of each paying
+    a handshake. Synchronous callers submit coroutines with run(); parsing stays
+    in the inherited SECClient methods and runs on the loop's executor so it never
+    blocks other downloads.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    MAX_RETRIES = 4
+    BACKOFF_BASE = 0.5   # Seconds; doubled per attempt before jitter
+    BACKOFF_CAP = 8.0    # Longest single backoff in seconds
+    REQUEST_TIMEOUT = 30
+
+    def __init__(self, *args, max_connections: int = 100, max_connections_per_host: int = 10, **kwargs):
+        """
+        Initialize async SEC client (accepts all SECClient arguments)
+
+        Args:
+            max_connections: Total pooled connections across hosts
+            max_connections_per_host: Pooled connections per host (data.sec.gov, www.sec.gov)
+        """
+        super().__init__(*args, **kwargs)
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._http: Optional[aiohttp.ClientSession] = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Start the background event loop on first use"""
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever,
+                                                name='sec-async-loop', daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, coroutine: Coroutine) -> concurrent.futures.Future:
+        """Schedule a coroutine on the client's loop from any thread"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop())
+
+    def run(self, coroutine: Coroutine):
+        """Run a coroutine on the client's loop and wait for its result"""
+        return self.submit(coroutine).result()
+
+    async def _session(self) -> aiohttp.ClientSession:
+        """Return the shared aiohttp session, creating it on the loop thread"""
+        if self._http is None or self._http.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                ttl_dns_cache=300,
+                keepalive_timeout=30
+            )
+            # Host is per request: the same pool serves data.sec.gov and www.sec.gov
+            headers = {k: v for k, v in self.HEADERS.items() if k != 'Host'}
+            self._http = aiohttp.ClientSession(
+                connector=connector,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=self.REQUEST_TIMEOUT),
+                auto_decompress=True  # gzip/deflate bodies are decoded transparently
+            )
+        return self._http
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than a server Retry-After"""
+        delay = random.uniform(0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * (2 ** attempt)))
+        try:
+            return max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
+
+    async def _get(self, url: str, headers: Optional[Dict[str, str]] = None,
+                   read_body: Optional[Callable[[aiohttp.ClientResponse], Awaitable]] = None):
+        """
+        GET with rate limiting and retries on 429/5xx and connection errors
+
+        Args:
+            read_body: Consumes a successful response's body and returns what _get returns
+                as the body (defaults to reading it into memory)
+
+        Returns (status, headers, body); body is b'' for 304 responses.
+        """
+        session = await self._session()
+        for attempt in range(self.MAX_RETRIES + 1):
+            await self.rate_limiter.acquire_async()
+            try:
+                async with session.get(url, headers=headers) as response:
+                    if response.status in self.RETRY_STATUSES and attempt < self.MAX_RETRIES:
+                        delay = self._backoff(attempt, response.headers.get('Retry-After'))
+                        print(f"DEBUG: {url} returned {response.status}, retrying in {delay:.2f}s")
+                        await asyncio.sleep(delay)
+                        continue
+                    response.raise_for_status()
+                    if response.status == 304:
+                        body = b''
+                    else:
+                        body = await (read_body(response) if read_body else response.read())
+                    return response.status, response.headers, body
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= self.MAX_RETRIES:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"DEBUG: {url} failed ({e!r}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def _blocking_chunks(self, content: aiohttp.StreamReader, loop: asyncio.AbstractEventLoop) -> Iterator[bytes]:
+        """Iterate a response body from a worker thread, reading each chunk on the event loop"""
+        while True:
+            chunk = asyncio.run_coroutine_threadsafe(content.read(self.STREAM_CHUNK_SIZE), loop).result()
+            if not chunk:
+                return
+            yield chunk
+
+    async def _stream_to_cache(self, cik: str, response: aiohttp.ClientResponse) -> Dict:
+        """
+        Write a companyfacts body to the cache as it arrives and return the cache entry
+
+        The body is never held in memory whole: an executor thread pulls it chunk by
+        chunk into CompanyFactsCache.store_stream while the loop keeps serving other
+        downloads.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, lambda: self.facts_cache.store_stream(cik, self._blocking_chunks(response.content, loop),
+                                                        etag=response.headers.get('ETag'),
+                                                        last_modified=response.headers.get('Last-Modified')))
+
+    async def get_company_facts_async(self, cik: str) -> Optional[Dict]:
+        """
+        Async counterpart of SECClient.get_company_facts (same cache and revalidation rules)
+
+        With stream_facts the download is streamed to the cache and parsed back from it
+        incrementally, keeping only mapped concepts, as in SECClient.
+        """
+        cik = cik.zfill(10)
+        loop = asyncio.get_running_loop()
+        try:
+            entry = self.facts_cache.lookup(cik)
+            if entry and self.facts_cache.is_fresh(entry):
+                self.facts_cache.record_hit()
+                return await loop.run_in_executor(None, self._load_cached_facts, entry)
+
+            url = self.COMPANY_FACTS_URL.format(cik=cik)
+            read_body = (lambda response: self._stream_to_cache(cik, response)) if self.stream_facts else None
+            status, headers, body = await self._get(url, CompanyFactsCache.conditional_headers(entry), read_body)
+
+            if status == 304 and entry:
+                self.facts_cache.touch(cik, entry,
+                                       etag=headers.get('ETag'),
+                                       last_modified=headers.get('Last-Modified'))
+                self.facts_cache.record_hit(revalidated=True)
+                return await loop.run_in_executor(None, self._load_cached_facts, entry)
+
+            if self.stream_facts:
+                # body is the cache entry the stream was written to
+                self.facts_cache.record_miss()
+                return await loop.run_in_executor(None, self._load_cached_facts, body)
+
+            return await loop.run_in_executor(None, self._store_payload, cik, body,
+                                              headers.get('ETag'), headers.get('Last-Modified'))
+        except Exception as e:
+            print(f"Error fetching company facts for CIK {cik}: {e}")
+            return None
+
+    async def fetch_company_data_async(self, identifier: str, lookback_years: Optional[int] = None) -> Dict:
+        """Async counterpart of SECClient.fetch_company_data"""
+        loop = asyncio.get_running_loop()
+        # Ticker lookups are in-memory dict reads once the shared index is loaded
+        cik = await loop.run_in_executor(None, self.resolve_cik, identifier)
+        if not cik:
+            return {'error': f'Could not find CIK for ticker {identifier}'}
+
+        facts = await self.get_company_facts_async(cik)
+        if not facts:
+            return {'error': f'Could not fetch data for CIK {cik}'}
+
+        return await loop.run_in_executor(None, self.build_company_data, identifier, cik, facts,
+                                          None, lookback_years)
+
+    def get_company_facts(self, cik: str) -> Optional[Dict]:
+        """Fetch company facts through the shared async session"""
+        return self.run(self.get_company_facts_async(cik))
+
+    def fetch_company_data(self, identifier: str, lookback_years: Optional[int] = None) -> Dict:
+        """Fetch all financial data for a company through the shared async session"""
+        return self.run(self.fetch_company_data_async(identifier, lookback_years))
+
+    def fetch_many(self, identifiers: Iterable[str], max_workers: Optional[int] = None,
+                   lookback_years: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Fetch several companies concurrently on the event loop, yielding results as they finish
+
+        Concurrency is bounded by max_workers in-flight fetches rather than threads
+        (capped at the client's max_workers, as in SECClient.fetch_many).
+        """
+        identifiers = [i.strip() for i in identifiers if i and i.strip()]
+        semaphore = asyncio.Semaphore(self.resolve_max_workers(max_workers))
+
+        async def fetch_one(identifier: str) -> Dict:
+            async with semaphore:
+                try:
+                    result = await self.fetch_company_data_async(identifier, lookback_years)
+                except Exception as e:
+                    print(f"Error fetching company data for {identifier}: {e}")
+                    result = {'error': f'Error fetching company data: {str(e)}'}
+            result['identifier'] = identifier
+            return result
+
+        futures = [self.submit(fetch_one(identifier)) for identifier in identifiers]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    async def _close(self):
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+
+    def close(self):
+        """Close pooled connections and stop the background loop"""
+        with self._start_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
@@ -0,0 +1,267 @@
+"""
+Batch DCF Engine
+Evaluates the DCFCalculator valuation chain for many assumption sets at once with NumPy broadcasting
+"""
+import numpy as np
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from dcf_calculator import DCFCalculator
+
+
+class BatchDCFEngine:
+    """
+    Vectorized DCF valuation over N assumption scenarios
+
+    Projected free cash flows, net debt and shares outstanding are fixed per company
+    (see DCFCalculator.prepare_batch_inputs); capital-structure, discounting and
+    terminal assumptions are arrays broadcast to N scenarios. Each scenario follows the
+    same formulas as DCFCalculator.calculate_all:
+
+    - WACC = E/(D+E) * (rf + beta * MRP) + D/(D+E) * Rd * (1 - tax)
+    - PV(FCF_t) = FCF_t / (1 + WACC)^t
+    - TV = FCF_T * (1 + g) / (WACC - g), or FCF_T * 10 when WACC <= g
+    - EV = sum PV(FCF_t) + TV / (1 + WACC)^T;  equity = EV - net debt
+    """
+
+    ASSUMPTION_DEFAULTS = {
+        'risk_free_rate': 0.03,
+        'beta': 1.0,
+        'market_risk_premium': 0.06,
+        'cost_of_debt': 0.05,
+        'tax_rate': 0.25,
+        'debt_to_equity': 0.3,
+        'terminal_growth_rate': 0.03
+    }
+    TERMINAL_MULTIPLE_FALLBACK = 10  # DCFCalculator's multiple when WACC <= terminal growth
+    SENSITIVITY_AXES = tuple(ASSUMPTION_DEFAULTS) + ('wacc',)
+    MAX_SENSITIVITY_CELLS = 1_000_000
+    DEFAULT_SENSITIVITY_AXES = (('wacc', 0.02), ('terminal_growth_rate', 0.01))  # (name, +/- spread)
+    DEFAULT_SENSITIVITY_STEPS = 5
+
+    def __init__(self, free_cash_flows, net_debt=0.0, shares_outstanding=None,
+                 projection_years: Optional[int] = None):
+        """
+        Initialize engine
+
+        Args:
+            free_cash_flows: Projected FCFs, shape (T,) shared by all scenarios or (N, T) per scenario
+            net_debt: Net debt, scalar or shape (N,)
+            shares_outstanding: Shares for price per share (None/0 gives NaN prices), scalar or (N,)
+            projection_years: Years to discount the terminal value over (defaults to T)
+        """
+        self.free_cash_flows = np.atleast_1d(np.asarray(free_cash_flows, dtype=np.float64))
+        self.horizon = self.free_cash_flows.shape[-1]
+        self.projection_years = self.horizon if projection_years is None else projection_years
+        self.net_debt = np.asarray(net_debt, dtype=np.float64)
+        shares = np.asarray(np.nan if shares_outstanding is None else shares_outstanding, dtype=np.float64)
+        # Like DCFCalculator, no price per share without a share count
+        self.shares_outstanding = np.where(shares == 0, np.nan, shares)
+        # Discount exponents t = 1..T, as DCFCalculator's year - latest_year
+        self.years_ahead = np.arange(1, self.horizon + 1, dtype=np.float64)
+        self.result_dtype = np.dtype([
+            ('wacc', np.float64),
+            ('cost_of_equity', np.float64),
+            ('pv_fcf', np.float64, (self.horizon,)),
+            ('total_pv_fcf', np.float64),
+            ('terminal_value', np.float64),
+            ('pv_terminal', np.float64),
+            ('enterprise_value', np.float64),
+            ('equity_value', np.float64),
+            ('price_per_share', np.float64)
+        ])
+
+    @classmethod
+    def from_calculator(cls, calculator: 'DCFCalculator') -> 'BatchDCFEngine':
+        """Build an engine from a DCFCalculator's operating model data"""
+        inputs = calculator.prepare_batch_inputs()
+        return cls(inputs['free_cash_flows'], net_debt=inputs['net_debt'],
+                   shares_outstanding=inputs['shares_outstanding'],
+                   projection_years=inputs['projection_years'])
+
+    def evaluate(self, **assumptions) -> np.ndarray:
+        """
+        Value every scenario
+
+        Args:
+            **assumptions: risk_free_rate, beta, market_risk_premium, cost_of_debt, tax_rate,
+                debt_to_equity, terminal_growth_rate as scalars or arrays broadcastable to (N,);
+                omitted ones use DCFCalculator's defaults. A 'wacc' array overrides the
+                CAPM-derived WACC (cost_of_equity is still reported from CAPM)
+
+        Returns:
+            Structured array of shape (N,) with the fields of result_dtype
+        """
+        wacc_override = assumptions.pop('wacc', None)
+        unknown = set(assumptions) - set(self.ASSUMPTION_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown DCF assumptions: {sorted(unknown)}")
+
+        values = {}
+        for name, default in self.ASSUMPTION_DEFAULTS.items():
+            value = assumptions.get(name)
+            values[name] = np.asarray(default if value is None else value, dtype=np.float64)
+        wacc_override = None if wacc_override is None else np.asarray(wacc_override, dtype=np.float64)
+        fcf_scenarios = self.free_cash_flows.shape[0] if self.free_cash_flows.ndim == 2 else 1
+        shape = np.broadcast_shapes(*(v.shape for v in values.values()), self.net_debt.shape,
+                                    self.shares_outstanding.shape, (fcf_scenarios,),
+                                    () if wacc_override is None else wacc_override.shape)
+        if len(shape) != 1:
+            raise ValueError(f"Assumptions must broadcast to one scenario axis, got shape {shape}")
+        rf, beta, mrp, rd, tax, de, g = (np.broadcast_to(values[name], shape) for name in self.ASSUMPTION_DEFAULTS)
+
+        result = np.zeros(shape, dtype=self.result_dtype)
+
+        # Cost of Equity (CAPM) and capital structure weights from D/E
+        cost_of_equity = rf + beta * mrp
+        debt_weight = de / (1 + de)
+        equity_weight = 1 / (1 + de)
+        if wacc_override is None:
+            wacc = equity_weight * cost_of_equity + debt_weight * rd * (1 - tax)
+        else:
+            wacc = np.broadcast_to(wacc_override, shape)
+        result['wacc'] = wacc
+        result['cost_of_equity'] = cost_of_equity
+
+        if self.horizon:
+            growth = 1 + wacc
+            pv_fcf = self.free_cash_flows / growth[:, None] ** self.years_ahead
+            result['pv_fcf'] = pv_fcf
+            result['total_pv_fcf'] = pv_fcf.sum(axis=1)
+
+            final_fcf = self.free_cash_flows[..., -1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                gordon = final_fcf * (1 + g) / (wacc - g)
+            terminal_value = np.where(wacc > g, gordon, final_fcf * self.TERMINAL_MULTIPLE_FALLBACK)
+            result['terminal_value'] = terminal_value
+            if self.projection_years > 0:
+                result['pv_terminal'] = terminal_value / growth ** self.projection_years
+
+        result['enterprise_value'] = result['total_pv_fcf'] + result['pv_terminal']
+        result['equity_value'] = result['enterprise_value'] - self.net_debt
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result['price_per_share'] = result['equity_value'] / self.shares_outstanding
+        return result
+
+    def evaluate_assumptions(self, assumptions: Dict) -> np.ndarray:
+        """Evaluate a dict of assumption arrays (extra keys such as projection_years are ignored)"""
+        return self.evaluate(**{k: v for k, v in assumptions.items() if k in self.ASSUMPTION_DEFAULTS})
+
+    @classmethod
+    def axis_values(cls, spec: Dict) -> np.ndarray:
+        """
+        Expand one axis spec into its values
+
+        Args:
+            spec: {'values': [...]} for explicit points, or {'start', 'stop', 'steps'} for an
+                evenly spaced range including both ends
+
+        Raises:
+            ValueError: If the spec is incomplete or has fewer than 1 or more than
+                MAX_SENSITIVITY_CELLS values (checked before any range is allocated)
+        """
+        name = spec.get('name')
+        if spec.get('values') is not None:
+            values = np.asarray(spec['values'], dtype=np.float64).ravel()
+        else:
+            try:
+                steps = int(spec.get('steps', 5))
+            except (TypeError, ValueError, OverflowError):
+                raise ValueError(f"Sensitivity axis '{name}' steps must be a whole number, got {spec.get('steps')!r}")
+            if not 1 <= steps <= cls.MAX_SENSITIVITY_CELLS:
+                raise ValueError(f"Sensitivity axis '{name}' steps must be from 1 to {cls.MAX_SENSITIVITY_CELLS}, "
+                                 f"got {steps}")
+            try:
+                values = np.linspace(float(spec['start']), float(spec['stop']), steps)
+                values = values.round(10)  # Drop linspace float noise (0.030000000000000006) from labels
+            except KeyError as e:
+                raise ValueError(f"Sensitivity axis '{name}' needs 'values' or 'start'/'stop': missing {e}")
+        if values.size == 0:
+            raise ValueError(f"Sensitivity axis '{name}' has no values")
+        if values.size > cls.MAX_SENSITIVITY_CELLS:
+            raise ValueError(f"Sensitivity axis '{name}' has {values.size} values; the limit is {cls.MAX_SENSITIVITY_CELLS}")
+        return values
+
+    def parse_axes(self, specs: Optional[Iterable[Dict]], base_assumptions: Optional[Dict] = None
+                   ) -> List[Tuple[str, np.ndarray]]:
+        """
+        Validate axis specs (see axis_values) into (name, values) pairs
+
+        Without specs, returns a WACC x terminal growth grid centred on the base case.
+        """
+        if not specs:
+            base = self.base_case(base_assumptions)
+            steps = self.DEFAULT_SENSITIVITY_STEPS
+            return [(name, self.axis_values({'name': name, 'start': base[name] - spread,
+                                             'stop': base[name] + spread, 'steps': steps}))
+                    for name, spread in self.DEFAULT_SENSITIVITY_AXES]
+
+        axes = []
+        for spec in specs:
+            name = spec.get('name')
+            if name not in self.SENSITIVITY_AXES:
+                raise ValueError(f"Unknown sensitivity axis {name!r}; expected one of {list(self.SENSITIVITY_AXES)}")
+            if any(name == existing for existing, _ in axes):
+                raise ValueError(f"Sensitivity axis {name!r} given more than once")
+            axes.append((name, self.axis_values(spec)))
+        return axes
+
+    def base_case(self, assumptions: Optional[Dict] = None) -> Dict[str, float]:
+        """Scalar base-case assumptions (with defaults filled in) and the WACC they imply"""
+        base = {}
+        for name, default in self.ASSUMPTION_DEFAULTS.items():
+            value = (assumptions or {}).get(name)
+            base[name] = float(default if value is None else value)
+        base['wacc'] = float(self.evaluate(**base)['wacc'][0])
+        return base
+
+    @classmethod
+    def grid_cells(cls, axes: Sequence[Tuple[str, np.ndarray]]) -> int:
+        """Number of cells spanned by the axes, checked against MAX_SENSITIVITY_CELLS"""
+        cells = int(np.prod([len(values) for _, values in axes]))
+        if cells > cls.MAX_SENSITIVITY_CELLS:
+            raise ValueError(f"Sensitivity grid has {cells} cells; the limit is {cls.MAX_SENSITIVITY_CELLS}")
+        return cells
+
+    def evaluate_cells(self, axes: Sequence[Tuple[str, np.ndarray]], base_assumptions: Optional[Dict],
+                       start: int, stop: int) -> np.ndarray:
+        """
+        Value cells [start, stop) of the grid spanned by the axes, in C (row-major) order
+
+        Cells are independent, so any split of the range gives the same values as one pass.
+        """
+        shape = tuple(len(values) for _, values in axes)
+        assumptions = {name: value for name, value in (base_assumptions or {}).items()
+                       if name in self.ASSUMPTION_DEFAULTS}
+        # Axis k varies along grid dimension k, as with meshgrid(indexing='ij')
+        positions = np.unravel_index(np.arange(start, stop), shape)
+        for (name, values), position in zip(axes, positions):
+            assumptions[name] = np.asarray(values, dtype=np.float64)[position]
+        return self.evaluate(**assumptions)
+
+    @staticmethod
+    def grid_output(axes: Sequence[Tuple[str, np.ndarray]], metric_values: Dict[str, np.ndarray]) -> Dict:
+        """Shape flat per-cell metric arrays into the sensitivity response (NaN -> None)"""
+        shape = tuple(len(values) for _, values in axes)
+        output = {'axes': [{'name': name, 'values': np.asarray(values).tolist()} for name, values in axes]}
+        for metric, values in metric_values.items():
+            values = values.reshape(shape)
+            output[metric] = np.where(np.isfinite(values), values, None).tolist()
+        return output
+
+    def sensitivity(self, axes: Sequence[Tuple[str, np.ndarray]], base_assumptions: Optional[Dict] = None,
+                    metrics: Sequence[str] = ('equity_value', 'price_per_share')) -> Dict:
+        """
+        Value the full grid spanned by the axes in one evaluate() pass
+
+        Args:
+            axes: (name, values) pairs; name is an assumption or 'wacc'
+            base_assumptions: Values for every assumption not on an axis
+            metrics: result_dtype fields to return
+
+        Returns:
+            {'axes': [{'name', 'values'}], metric: nested lists indexed [axis0][axis1]...};
+            NaN (e.g. price without a share count) is returned as None
+        """
+        result = self.evaluate_cells(axes, base_assumptions, 0, self.grid_cells(axes))
+        return self.grid_output(axes, {metric: result[metric] for metric in metrics})
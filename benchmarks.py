@@ -0,0 +1,326 @@
+"""
+Benchmarks
+Timings (and output sizes) of model-building and export hot paths on synthetic wide, many-year filers
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+from comps_export import CompsExportHandler
+from dcf_calculator import DCFCalculator
+from export_handler import ExportHandler
+from export_styles import OpenpyxlStyles, _openpyxl_parts
+from operating_model import OperatingModel
+from openpyxl import Workbook
+from sec_client import SECClient
+from statement_json import encode_statement
+from streaming_export import StreamingExportHandler
+
+STATEMENT_ITEMS = {
+    'income_statement': ['Revenue', 'COGS', 'R&D', 'SG&A', 'D&A', 'OtherOperatingExpenses', 'OperatingIncome',
+                         'OtherIncomeExpenseNet', 'OtherUnusualItems', 'TaxExpense', 'MinorityInterest', 'NetIncome'],
+    'balance_sheet': ['CashAndCashEquivalents', 'MarketableSecuritiesCurrent', 'AccountsReceivableNet',
+                      'Inventories', 'TotalCurrentAssets', 'PropertyPlantAndEquipmentNet', 'TotalAssets',
+                      'AccountsPayable', 'TermDebtNonCurrent', 'TotalLiabilities', 'TotalShareholdersEquity'],
+    'cash_flow': ['OperatingCashFlow', 'CapitalExpenditures', 'ChangeInWorkingCapital', 'DividendsPaid']
+}
+
+
+def synthetic_company(years: int = 30, line_items: int = 300, missing: float = 0.1, seed: int = 0) -> Dict:
+    """
+    Company data in fetch_company_data shape with many years and line items
+
+    Args:
+        years: Fiscal years per statement
+        line_items: Line items per statement (standard items plus filler items)
+        missing: Share of line items absent from any given year
+        seed: Random seed
+    """
+    rng = np.random.default_rng(seed)
+    first_year = 2024 - years + 1
+    company_data = {'company_name': 'Benchmark Co', 'cik': '0000000000', 'ticker': 'BENCH'}
+    for statement, standard in STATEMENT_ITEMS.items():
+        items = standard + [f"{statement}_Item{i}" for i in range(max(0, line_items - len(standard)))]
+        values = rng.uniform(1e6, 1e9, size=(years, len(items)))
+        present = rng.random((years, len(items))) >= missing
+        present[:, :len(standard)] = True
+        company_data[statement] = {
+            str(first_year + row): {item: float(values[row, col]) for col, item in enumerate(items) if present[row, col]}
+            for row in range(years)
+        }
+    return company_data
+
+
+def synthetic_company_facts(years: int = 30, line_items: int = 300, seed: int = 0) -> Dict:
+    """
+    Raw companyfacts payload with annual 10-K and quarterly 10-Q facts for every mapped concept
+
+    Args:
+        years: Fiscal years of history (ending with fiscal 2024, December year ends)
+        line_items: Concepts in the payload (mapped concepts plus unmapped filler concepts)
+        seed: Random seed
+    """
+    rng = np.random.default_rng(seed)
+    concepts = sorted({concept
+                       for mapping in (SECClient.INCOME_STATEMENT_CONCEPTS, SECClient.BALANCE_SHEET_CONCEPTS,
+                                       SECClient.CASH_FLOW_CONCEPTS)
+                       for concept_list in mapping.values() for concept in concept_list})
+    concepts += [f"UnmappedConcept{i}" for i in range(max(0, line_items - len(concepts)))]
+    first_year = 2024 - years + 1
+    facts = {}
+    for concept in concepts:
+        values = rng.uniform(1e6, 1e9, size=(years, 5))
+        entries = []
+        for row, year in enumerate(range(first_year, 2025)):
+            entries.append({'start': f"{year}-01-01", 'end': f"{year}-12-31", 'val': float(values[row, 0]),
+                            'form': '10-K', 'fy': year})
+            for quarter, end in enumerate(('03-31', '06-30', '09-30'), start=1):
+                entries.append({'start': f"{year}-01-01", 'end': f"{year}-{end}", 'val': float(values[row, quarter]),
+                                'form': '10-Q', 'fy': year})
+        facts[concept] = {'label': concept, 'units': {'USD': entries}}
+    return {'cik': 0, 'entityName': 'Benchmark Co', 'facts': {'us-gaap': facts}}
+
+
+def _best_of(function: Callable, repeat: int) -> float:
+    """Fastest of repeat runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def _peak_memory(function: Callable) -> int:
+    """Peak Python heap allocation of one run, in bytes"""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _object_statement_frame(statement: Dict) -> pd.DataFrame:
+    """Object-dtype construction with per-column coercion, as prepare_historical_data used to build frames"""
+    frame = pd.DataFrame(statement).T
+    for col in frame.columns:
+        frame[col] = pd.to_numeric(frame[col], errors='coerce').fillna(0)
+    return frame
+
+
+def bench_prepare_historical_data(years: int, line_items: int, repeat: int) -> Dict[str, float]:
+    """Statement frame construction (typed vs per-column coercion) and the full prepare_historical_data"""
+    company_data = synthetic_company(years, line_items)
+    statements = [company_data[name] for name in STATEMENT_ITEMS]
+
+    def prepare():
+        with contextlib.redirect_stdout(io.StringIO()):
+            OperatingModel(company_data).prepare_historical_data()
+
+    return {
+        'statement_frames_per_column_coercion': _best_of(lambda: [_object_statement_frame(s) for s in statements], repeat),
+        'statement_frames_typed': _best_of(lambda: [OperatingModel.statement_frame(s) for s in statements], repeat),
+        'prepare_historical_data': _best_of(prepare, repeat)
+    }
+
+
+def _nested_statement_json(frame: pd.DataFrame) -> Dict:
+    """to_dict('index') plus a per-cell NaN/inf pass, as build_model used to serialize statements"""
+    result = {}
+    for year, row in frame.to_dict('index').items():
+        result[str(year)] = {str(item): 0.0 if math.isnan(value) or math.isinf(value) else float(value)
+                             for item, value in row.items()}
+    return result
+
+
+def bench_statement_json(years: int, line_items: int, repeat: int) -> Dict[str, float]:
+    """Statement serialization to JSON text: nested dicts vs the columnar encoder"""
+    company_data = synthetic_company(years, line_items)
+    frames = [OperatingModel.statement_frame(company_data[name]) for name in STATEMENT_ITEMS]
+    return {
+        'nested_dicts': _best_of(lambda: [json.dumps(_nested_statement_json(f)) for f in frames], repeat),
+        'columnar': _best_of(lambda: [json.dumps(encode_statement(f)) for f in frames], repeat)
+    }
+
+
+def bench_parse_lookback(years: int, line_items: int, repeat: int) -> Dict[str, float]:
+    """
+    build_company_data at the default lookback vs the maximum lookback: latency and peak memory
+
+    Years of history should be >= 20 so the longer lookback actually parses more years.
+    """
+    facts = synthetic_company_facts(years, line_items)
+    client = SECClient(cache_dir=tempfile.mkdtemp(prefix='dcf-bench-'))
+
+    def parse(lookback_years):
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.build_company_data('0', '0000000000', facts, ticker='BENCH', lookback_years=lookback_years)
+
+    results = {}
+    for lookback in (SECClient.DEFAULT_LOOKBACK_YEARS, SECClient.MAX_LOOKBACK_YEARS):
+        results[f"lookback_{lookback}_years_seconds"] = _best_of(lambda: parse(lookback), repeat)
+        results[f"lookback_{lookback}_years_peak_bytes"] = _peak_memory(lambda: parse(lookback))
+    return results
+
+
+BENCHMARK_ASSUMPTIONS = {
+    'risk_free_rate': 0.04, 'beta': 1.1, 'market_risk_premium': 0.055, 'cost_of_debt': 0.05,
+    'tax_rate': 0.21, 'debt_to_equity': 0.2, 'terminal_growth_rate': 0.025, 'shares_outstanding': 1e9
+}
+
+
+def bench_excel_background(years: int, line_items: int, repeat: int) -> Dict[str, float]:
+    """create_excel_workbook with each gray background mode: latency and workbook size"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        operating_model_data = OperatingModel(synthetic_company(years, line_items)).build_model({})
+        dcf_results = DCFCalculator(operating_model_data, BENCHMARK_ASSUMPTIONS).calculate_all()
+
+    results = {}
+    for background in ExportHandler.BACKGROUND_MODES:
+        handler = ExportHandler(operating_model_data, dcf_results, 'Benchmark Co', background=background)
+        results[f"{background}_seconds"] = _best_of(handler.create_excel_workbook, repeat)
+        results[f"{background}_bytes"] = len(handler.create_excel_workbook().getvalue())
+    return results
+
+
+def bench_excel_streaming(years: int, line_items: int, repeat: int) -> Dict[str, float]:
+    """
+    Peak memory and latency of workbooks with 4 sheets and with many copies of the 4 sheets
+
+    openpyxl keeps every cell of every sheet in memory until save, so its peak grows
+    with the sheet count (it is timed at 40 sheets to keep the run short). The
+    streaming engine keeps no cell data; from 4 to 400 sheets its peak only grows by
+    xlsxwriter's fixed per-sheet bookkeeping (about 25 KB per sheet, 0.8 MB to 10 MB).
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        operating_model_data = OperatingModel(synthetic_company(years, line_items)).build_model({})
+        dcf_results = DCFCalculator(operating_model_data, BENCHMARK_ASSUMPTIONS).calculate_all()
+    openpyxl_handler = ExportHandler(operating_model_data, dcf_results, 'Benchmark Co')
+    streaming_handler = StreamingExportHandler(operating_model_data, dcf_results, 'Benchmark Co')
+
+    def openpyxl_export(copies):
+        workbook = Workbook()
+        workbook.remove(workbook.active)
+        for copy in range(copies):
+            openpyxl_handler.write_sheets(workbook, prefix=f"{copy + 1} ")
+        workbook.save(io.BytesIO())
+
+    def streaming_export(copies):
+        with tempfile.TemporaryFile() as output:
+            workbook = streaming_handler.open_workbook(output)
+            streaming_handler.register_formats(workbook)
+            for copy in range(copies):
+                streaming_handler.write_sheets(workbook, prefix=f"{copy + 1} ")
+            workbook.close()
+
+    results = {}
+    for engine, export, copies in (('openpyxl', openpyxl_export, 1), ('openpyxl', openpyxl_export, 10),
+                                   ('streaming', streaming_export, 1), ('streaming', streaming_export, 100)):
+        label = f"{engine}_{copies * 4}_sheets"
+        results[f"{label}_seconds"] = _best_of(lambda: export(copies), 1 if copies > 1 else repeat)
+        results[f"{label}_peak_bytes"] = _peak_memory(lambda: export(copies))
+    return results
+
+
+def bench_excel_styles(years: int, line_items: int, repeat: int) -> Dict[str, float]:
+    """
+    Styling the cells of the Historical IS/BS boxes in openpyxl
+
+    Building Font/PatternFill/Border/Alignment objects for every cell (as the sheets
+    used to) vs applying the shared named styles of export_styles, plus the whole
+    create_excel_workbook for scale.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        operating_model_data = OperatingModel(synthetic_company(years, line_items)).build_model({})
+        dcf_results = DCFCalculator(operating_model_data, BENCHMARK_ASSUMPTIONS).calculate_all()
+    handler = ExportHandler(operating_model_data, dcf_results, 'Benchmark Co')
+    cells = handler.income_statement_box()['cells'] + handler.balance_sheet_box()['cells']
+
+    def per_cell_objects():
+        ws = Workbook().active
+        for row, col, _, style, edges in cells:
+            cell = ws.cell(row=row, column=col)
+            cell.font, cell.fill, cell.border, cell.alignment, cell.number_format = _openpyxl_parts(style, edges)
+
+    def named_styles():
+        workbook = Workbook()
+        styles = OpenpyxlStyles(workbook)
+        ws = workbook.active
+        for row, col, _, style, edges in cells:
+            styles.apply(ws.cell(row=row, column=col), style, *edges)
+
+    return {
+        f"per_cell_objects_{len(cells)}_cells": _best_of(per_cell_objects, repeat),
+        f"named_styles_{len(cells)}_cells": _best_of(named_styles, repeat),
+        'create_excel_workbook': _best_of(handler.create_excel_workbook, repeat)
+    }
+
+
+def bench_excel_comps(years: int, line_items: int, repeat: int) -> Dict[str, float]:
+    """
+    Comps workbook latency and peak memory for 20 and 200 companies (valuations precomputed)
+
+    Companies come from a generator, as /api/export-comps feeds them. No cell data is
+    kept, so the peak only grows by xlsxwriter's per-sheet metadata (column settings
+    and worksheet objects, roughly 85 KB per company).
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        operating_model_data = OperatingModel(synthetic_company(years, line_items)).build_model({})
+        dcf_results = DCFCalculator(operating_model_data, BENCHMARK_ASSUMPTIONS).calculate_all()
+
+    def export(count):
+        companies = ({'company_name': f"Benchmark Co {i}", 'ticker': f"BC{i}", 'cik': str(i).zfill(10),
+                      'operating_model': operating_model_data, 'dcf_results': dcf_results} for i in range(count))
+        with contextlib.redirect_stdout(io.StringIO()):
+            CompsExportHandler(companies).create_excel_file().close()
+
+    results = {}
+    for count in (20, 200):
+        results[f"{count}_companies_seconds"] = _best_of(lambda: export(count), 1 if count > 20 else repeat)
+        results[f"{count}_companies_peak_bytes"] = _peak_memory(lambda: export(count))
+    return results
+
+
+BENCHMARKS = {
+    'prepare_historical_data': bench_prepare_historical_data,
+    'statement_json': bench_statement_json,
+    'parse_lookback': bench_parse_lookback,
+    'excel_background': bench_excel_background,
+    'excel_streaming': bench_excel_streaming,
+    'excel_styles': bench_excel_styles,
+    'excel_comps': bench_excel_comps
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time model-building and export hot paths on synthetic filers')
+    parser.add_argument('benchmarks', nargs='*', help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--years', type=int, default=30, help='Fiscal years per statement')
+    parser.add_argument('--line-items', type=int, default=300, help='Line items per statement')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per timing (the fastest is reported)')
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    for name in args.benchmarks or BENCHMARKS:
+        print(f"{name} ({args.years} years x {args.line_items} line items)")
+        for label, value in BENCHMARKS[name](args.years, args.line_items, args.repeat).items():
+            if label.endswith('_bytes'):
+                print(f"  {label:<40} {value / 1024:10.1f} KiB")
+            else:
+                print(f"  {label:<40} {value * 1000:10.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
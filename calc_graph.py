@@ -0,0 +1,315 @@
+"""
+Calculation Graph
+Incremental recalculation of the operating model and DCF as a graph of memoized nodes
+"""
+import copy
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from operating_model import OperatingModel
+from dcf_calculator import DCFCalculator
+
+# Value of an input the caller did not supply (distinct from an explicit None)
+MISSING = object()
+
+
+def _same(a: Any, b: Any) -> bool:
+    """Value equality used for early cutoff (NaN equals NaN; frames, arrays and containers compared by content)"""
+    if a is b:
+        return True
+    if isinstance(a, (pd.DataFrame, pd.Series)) or isinstance(b, (pd.DataFrame, pd.Series)):
+        return type(a) is type(b) and a.equals(b)
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        try:
+            return np.array_equal(a, b, equal_nan=True)
+        except TypeError:
+            return np.array_equal(a, b)
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same(a[key], b[key]) for key in a)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return type(a) is type(b) and len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return False
+
+
+class _Node:
+    """One input or derived quantity"""
+
+    __slots__ = ('name', 'compute', 'deps', 'value', 'version', 'dep_versions', 'checked', 'stats')
+
+    def __init__(self, name: str, compute: Optional[Callable], deps: Tuple[str, ...], value: Any = None):
+        self.name = name
+        self.compute = compute            # None for inputs
+        self.deps = deps
+        self.value = value
+        self.version = 0                  # Bumped whenever value actually changes
+        self.dep_versions = None          # Dependency versions value was computed from
+        self.checked = -1                 # Graph epoch in which the node was last validated
+        self.stats = {'seconds': 0.0, 'computed': 0, 'reused': 0}
+
+
+class CalcGraph:
+    """
+    Dependency graph of memoized computations
+
+    Inputs are set with set_inputs; derived nodes are evaluated lazily by get. A node
+    is recomputed only when the version of one of its dependencies moved since its
+    value was computed, and its own version moves only when the new value differs
+    from the old one, so a change that does not alter an intermediate result stops
+    propagating there. Time spent in each node is recorded for profiling.
+    """
+
+    def __init__(self):
+        self._nodes: Dict[str, _Node] = {}
+        self._epoch = 0
+        self._lock = threading.RLock()
+        self.last_recomputed: List[str] = []  # Nodes recomputed since the last set_inputs
+
+    def add_input(self, name: str, value: Any = MISSING):
+        """Register an input node"""
+        self._nodes[name] = _Node(name, None, (), value)
+
+    def add_node(self, name: str, compute: Callable, deps: Sequence[str]):
+        """
+        Register a derived node
+
+        Args:
+            name: Node name
+            compute: Called with the dependency values, in deps order
+            deps: Names of already registered nodes
+        """
+        missing = [dep for dep in deps if dep not in self._nodes]
+        if missing:
+            raise ValueError(f"Unknown dependencies of {name!r}: {missing}")
+        self._nodes[name] = _Node(name, compute, tuple(deps))
+
+    def set_inputs(self, **values) -> List[str]:
+        """
+        Update input values
+
+        Returns:
+            Names of the inputs whose value changed
+        """
+        with self._lock:
+            changed = []
+            for name, value in values.items():
+                node = self._nodes[name]
+                if node.compute is not None:
+                    raise ValueError(f"{name!r} is not an input")
+                if not _same(node.value, value):
+                    node.value = value
+                    node.version += 1
+                    changed.append(name)
+            if changed:
+                self._epoch += 1
+            self.last_recomputed = []
+            return changed
+
+    def get(self, name: str) -> Any:
+        """Value of a node, recomputing only what is out of date"""
+        with self._lock:
+            return self._evaluate(name).value
+
+    def _evaluate(self, name: str) -> _Node:
+        node = self._nodes[name]
+        if node.checked == self._epoch:
+            return node
+        if node.compute is not None:
+            dep_versions = tuple(self._evaluate(dep).version for dep in node.deps)
+            if dep_versions != node.dep_versions:
+                started = time.perf_counter()
+                value = node.compute(*(self._nodes[dep].value for dep in node.deps))
+                node.stats['seconds'] += time.perf_counter() - started
+                node.stats['computed'] += 1
+                if node.dep_versions is None or not _same(value, node.value):
+                    node.version += 1
+                node.value = value
+                node.dep_versions = dep_versions
+                self.last_recomputed.append(name)
+            else:
+                node.stats['reused'] += 1
+        node.checked = self._epoch
+        return node
+
+    def timing_report(self) -> Dict[str, Dict[str, float]]:
+        """Copy of per-node timings of derived nodes (seconds rounded to microseconds)"""
+        with self._lock:
+            return {
+                name: {'seconds': round(node.stats['seconds'], 6),
+                       'computed': node.stats['computed'],
+                       'reused': node.stats['reused']}
+                for name, node in self._nodes.items() if node.compute is not None
+            }
+
+
+class ValuationGraph(CalcGraph):
+    """
+    Operating model and DCF of one company as a CalcGraph
+
+    Historical statements and each assumption are inputs; prepared historicals
+    (with margins), projection drivers, projected statements, the serialized operating
+    model, FCF, WACC, terminal value, present values, EV and equity value are nodes.
+    Changing e.g. the terminal growth rate re-evaluates only the terminal value and
+    what depends on it, while a new revenue growth rate re-projects the statements but
+    leaves WACC and net debt alone. results() matches OperatingModel.build_model plus
+    DCFCalculator.calculate_all for the same inputs.
+    """
+
+    OPERATING_INPUTS = ('revenue_growth', 'gross_margin', 'sga_percent', 'tax_rate')
+    WACC_INPUTS = ('risk_free_rate', 'beta', 'market_risk_premium', 'cost_of_debt', 'tax_rate', 'debt_to_equity')
+    ASSUMPTION_INPUTS = ('projection_years', 'revenue_growth', 'gross_margin', 'sga_percent', 'tax_rate',
+                         'risk_free_rate', 'beta', 'market_risk_premium', 'cost_of_debt', 'debt_to_equity',
+                         'terminal_growth_rate', 'shares_outstanding')
+
+    def __init__(self, historical_data: Dict, assumptions: Optional[Dict] = None):
+        """
+        Build the graph
+
+        Args:
+            historical_data: Dict with 'income_statement', 'balance_sheet', 'cash_flow'
+            assumptions: Initial DCF assumptions (operating assumptions included)
+        """
+        super().__init__()
+        self.add_input('historical_data', historical_data)
+        for name in self.ASSUMPTION_INPUTS:
+            self.add_input(name)
+
+        self.add_node('historical', self._historical, ['historical_data'])
+        self.add_node('drivers', self._drivers, ['historical', 'projection_years', *self.OPERATING_INPUTS])
+        self.add_node('projections', self._projections, ['historical', 'projection_years', 'drivers'])
+        self.add_node('operating_model', self._operating_model, ['historical', 'projections'])
+        self.add_node('timeline', self._timeline, ['operating_model'])
+        self.add_node('free_cash_flows', self._free_cash_flows, ['operating_model', 'tax_rate'])
+        self.add_node('wacc', self._wacc, list(self.WACC_INPUTS))
+        self.add_node('terminal_value', self._terminal_value, ['free_cash_flows', 'wacc', 'terminal_growth_rate'])
+        self.add_node('present_values', self._present_values,
+                      ['free_cash_flows', 'wacc', 'terminal_value', 'timeline'])
+        self.add_node('enterprise_value', self._enterprise_value, ['present_values'])
+        self.add_node('net_debt', self._net_debt, ['operating_model'])
+        self.add_node('equity_value', self._equity_value, ['enterprise_value', 'net_debt'])
+        self.add_node('dcf_results', self._dcf_results,
+                      ['wacc', 'free_cash_flows', 'terminal_value', 'present_values', 'enterprise_value',
+                       'equity_value', 'shares_outstanding', *DCFCalculator.REPORTED_ASSUMPTIONS])
+
+        if assumptions is not None:
+            self.update(assumptions)
+
+    @staticmethod
+    def _present(**values) -> Dict:
+        """Assumptions dict holding only the inputs that were supplied"""
+        return {name: value for name, value in values.items() if value is not MISSING}
+
+    def update(self, assumptions: Dict) -> List[str]:
+        """
+        Set assumption inputs from a request-level assumptions dict
+
+        Returns:
+            Names of the inputs whose value changed
+        """
+        values = {name: assumptions.get(name, MISSING) for name in self.ASSUMPTION_INPUTS}
+        if values['projection_years'] is MISSING:
+            values['projection_years'] = 5
+        return self.set_inputs(**values)
+
+    def set_historical_data(self, historical_data: Dict) -> List[str]:
+        """Replace the historical statements (everything downstream is re-evaluated)"""
+        return self.set_inputs(historical_data=historical_data)
+
+    def results(self) -> Tuple[Dict, Optional[Dict]]:
+        """
+        Evaluate the graph
+
+        Returns:
+            (operating_model_data, dcf_results); dcf_results is None when the operating
+            model could not be built (operating_model_data then holds 'error')
+        """
+        with self._lock:
+            operating_model_data = self.get('operating_model')
+            if 'error' in operating_model_data:
+                return operating_model_data, None
+            return operating_model_data, self.get('dcf_results')
+
+    def evaluate(self, assumptions: Dict) -> Tuple[Dict, Optional[Dict]]:
+        """update and results as one step, so concurrent callers never mix assumption sets"""
+        with self._lock:
+            self.update(assumptions)
+            return self.results()
+
+    # Operating model nodes
+
+    def _historical(self, historical_data: Dict) -> Tuple[OperatingModel, Optional[str]]:
+        model = OperatingModel(historical_data, projection_years=0)
+        return model, model.prepare_model_inputs()
+
+    def _drivers(self, historical, projection_years, *operating_values) -> Dict:
+        model, error = historical
+        if error or projection_years <= 0:
+            return {}
+        assumptions = self._present(**dict(zip(self.OPERATING_INPUTS, operating_values)))
+        return model.projection_drivers(OperatingModel.operating_assumptions(assumptions))
+
+    def _projections(self, historical, projection_years, drivers: Dict) -> Optional[Dict]:
+        model, error = historical
+        if error:
+            return None
+        # Shallow copy: the projection methods only read the prepared statements
+        model = copy.copy(model)
+        model.projection_years = projection_years
+        return model.project(drivers)
+
+    def _operating_model(self, historical, projections: Optional[Dict]) -> Dict:
+        model, error = historical
+        if error:
+            return {'error': error}
+        return model.assemble_model(projections)
+
+    def _timeline(self, operating_model_data: Dict) -> Dict:
+        return {key: operating_model_data[key] for key in ('latest_year', 'projection_years')
+                if key in operating_model_data}
+
+    # DCF nodes, each a DCFCalculator step with its upstream results preset
+
+    def _free_cash_flows(self, operating_model_data: Dict, tax_rate) -> pd.Series:
+        return DCFCalculator(operating_model_data, self._present(tax_rate=tax_rate)).calculate_free_cash_flow()
+
+    def _wacc(self, *values) -> float:
+        return DCFCalculator({}, self._present(**dict(zip(self.WACC_INPUTS, values)))).calculate_wacc()
+
+    def _terminal_value(self, free_cash_flows: pd.Series, wacc: float, terminal_growth_rate) -> float:
+        calculator = DCFCalculator({}, self._present(terminal_growth_rate=terminal_growth_rate))
+        calculator.free_cash_flows = free_cash_flows
+        calculator.wacc = wacc
+        return calculator.calculate_terminal_value()
+
+    def _present_values(self, free_cash_flows: pd.Series, wacc: float, terminal_value: float,
+                        timeline: Dict) -> Dict:
+        calculator = DCFCalculator(timeline, {})
+        calculator.free_cash_flows = free_cash_flows
+        calculator.wacc = wacc
+        calculator.terminal_value = terminal_value
+        return calculator.calculate_present_values()
+
+    def _enterprise_value(self, present_values: Dict) -> float:
+        return present_values['total_pv_fcf'] + present_values['pv_terminal']
+
+    def _net_debt(self, operating_model_data: Dict) -> float:
+        return DCFCalculator(operating_model_data, {}).calculate_net_debt()
+
+    def _equity_value(self, enterprise_value: float, net_debt: float) -> float:
+        return enterprise_value - net_debt
+
+    def _dcf_results(self, wacc, free_cash_flows, terminal_value, present_values, enterprise_value,
+                     equity_value, shares_outstanding, *reported) -> Dict:
+        assumptions = self._present(shares_outstanding=shares_outstanding,
+                                    **dict(zip(DCFCalculator.REPORTED_ASSUMPTIONS, reported)))
+        return DCFCalculator({}, assumptions).summarize(wacc, free_cash_flows, terminal_value, present_values,
+                                                        enterprise_value, equity_value)
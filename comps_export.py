@@ -0,0 +1,208 @@
+"""
+Comps Export
+Comparable-companies workbook (statement sheets per company plus a comps summary) written in one streaming pass
+"""
+import math
+import re
+import statistics
+import tempfile
+from typing import Dict, IO, Iterable, List, Optional, Set
+
+from xlsxwriter.utility import xl_rowcol_to_cell
+
+from export_styles import XlsxwriterStyles
+from statement_json import decode_statement
+from streaming_export import StreamingExportHandler
+
+
+class CompsExportHandler:
+    """
+    Excel workbook comparing many valued companies
+
+    Companies are taken one at a time from an iterable (e.g. a generator that loads and
+    values each CIK in turn). Each company's Historical IS/BS/CF sheets are written
+    with StreamingExportHandler and flushed before the next company is read, and only
+    its summary row is kept, so memory stays flat however many companies the pack
+    holds. All sheets share one set of formats, registered when the workbook opens.
+    """
+
+    SUMMARY_SHEET = "Comps"
+    # Per-company sheets: standard sheet name -> suffix after the company's label
+    COMPANY_SHEETS = {
+        'Historical IS': 'IS',
+        'Historical BS': 'BS',
+        'Cash Flow Statement': 'CF'
+    }
+    MAX_SHEET_NAME = 31  # Excel's limit
+
+    # Summary columns: (header, summary_row key, style, width); styled columns are numeric
+    SUMMARY_COLUMNS = [
+        ('Company', 'company_name', None, 30),
+        ('Ticker', 'ticker', None, 10),
+        ('CIK', 'cik', None, 12),
+        ('Fiscal Year', 'latest_year', None, 11),
+        ('Enterprise Value (in millions)', 'enterprise_value', 'amount', 18),
+        ('Equity Value (in millions)', 'equity_value', 'amount', 18),
+        ('Price per Share', 'price_per_share', 'amount', 14),
+        ('WACC', 'wacc', 'percent', 10),
+        ('Gross Margin', 'gross_margin', 'percent', 13),
+        ('Operating Margin', 'operating_margin', 'percent', 13),
+        ('Net Margin', 'net_margin', 'percent', 13),
+        ('Sheets', 'sheets', None, 40)
+    ]
+    # Margins of the latest historical year: (summary_row key, income statement line item)
+    MARGINS = [
+        ('gross_margin', 'GrossProfit'),
+        ('operating_margin', 'OperatingIncome'),
+        ('net_margin', 'NetIncome')
+    ]
+    # Rows under the table: (label, Excel function, Python equivalent for the cached value)
+    STATISTICS = [
+        ('Mean', 'AVERAGE', statistics.fmean),
+        ('Median', 'MEDIAN', statistics.median)
+    ]
+
+    def __init__(self, companies: Iterable[Dict], title: str = "Comparable Companies"):
+        """
+        Initialize comps export
+
+        Args:
+            companies: Per company, a dict with 'company_name', 'ticker' and 'cik' plus either
+                'operating_model' and 'dcf_results' (as for ExportHandler) or an 'error' message
+                (listed in the summary without sheets)
+            title: Summary sheet title
+        """
+        self.companies = companies
+        self.title = title
+
+    def create_excel_file(self) -> IO[bytes]:
+        """
+        Write the workbook to an anonymous temp file
+
+        Returns:
+            The file, positioned at the start (deleted when closed)
+        """
+        output = tempfile.TemporaryFile(prefix='dcf-comps-', suffix='.xlsx')
+        try:
+            self.write_workbook(output)
+        except Exception:
+            output.close()
+            raise
+        output.seek(0)
+        return output
+
+    def write_workbook(self, output: IO[bytes]):
+        """Write the summary sheet (first) and every company's statement sheets to output"""
+        workbook = StreamingExportHandler.open_workbook(output)
+        styles = XlsxwriterStyles(workbook)
+        # Added first so it opens first; its rows are written once every company is done
+        summary_ws = workbook.add_worksheet(self.SUMMARY_SHEET)
+        used_names = {self.SUMMARY_SHEET.lower()}
+
+        rows = []
+        for company in self.companies:
+            row = self.summary_row(company)
+            if company.get('error'):
+                row['sheets'] = company['error']
+            else:
+                label = self.sheet_label(row, used_names)
+                sheet_names = {name: f"{label} {suffix}" for name, suffix in self.COMPANY_SHEETS.items()}
+                handler = StreamingExportHandler(company['operating_model'], company['dcf_results'],
+                                                 row['company_name'] or 'Company')
+                handler.styles = styles
+                handler.write_sheets(workbook, sheet_names=sheet_names)
+                row['sheets'] = ', '.join(sheet_names.values())
+                row['first_sheet'] = sheet_names['Historical IS']
+            rows.append(row)
+
+        self._write_summary_sheet(summary_ws, styles, rows)
+        workbook.close()
+
+    def summary_row(self, company: Dict) -> Dict:
+        """
+        One company's comps metrics: EV, equity value and price per share (from its DCF),
+        WACC, and margins of the latest historical year
+        """
+        operating_model_data = company.get('operating_model') or {}
+        dcf_results = company.get('dcf_results') or {}
+        latest_year = operating_model_data.get('latest_year')
+        row = {
+            'company_name': company.get('company_name') or '',
+            'ticker': company.get('ticker') or '',
+            'cik': company.get('cik') or '',
+            'latest_year': int(latest_year) if latest_year else None,
+            'enterprise_value': self._finite(dcf_results.get('enterprise_value'), 1_000_000),
+            'equity_value': self._finite(dcf_results.get('equity_value'), 1_000_000),
+            'price_per_share': self._finite(dcf_results.get('price_per_share')),
+            'wacc': self._finite(dcf_results.get('wacc'))
+        }
+
+        income_data = decode_statement(operating_model_data.get('income_statement'))
+        revenue = None
+        if latest_year in income_data.index and 'Revenue' in income_data.columns:
+            revenue = self._finite(income_data.loc[latest_year, 'Revenue'])
+        for key, line_item in self.MARGINS:
+            row[key] = None
+            if revenue and line_item in income_data.columns:
+                row[key] = self._finite(income_data.loc[latest_year, line_item] / revenue)
+        return row
+
+    @staticmethod
+    def _finite(value, divisor: float = 1) -> Optional[float]:
+        """value / divisor as a float, or None for missing and non-finite values"""
+        if value is None or isinstance(value, str) or not math.isfinite(value):
+            return None
+        return float(value) / divisor
+
+    def sheet_label(self, row: Dict, used_names: Set[str]) -> str:
+        """
+        Unique, Excel-safe label for a company's sheet names (ticker, else name, else CIK)
+
+        Args:
+            row: summary_row of the company
+            used_names: Lowercased sheet names already in the workbook (updated)
+        """
+        longest_suffix = max(len(suffix) for suffix in self.COMPANY_SHEETS.values()) + 1
+        base = re.sub(r"[\[\]:*?/\\]", '_', row['ticker'] or row['company_name'] or str(row['cik'])).strip(" '")
+        base = base[:self.MAX_SHEET_NAME - longest_suffix] or 'Company'
+        label, count = base, 1
+        while any(f"{label} {suffix}".lower() in used_names for suffix in self.COMPANY_SHEETS.values()):
+            count += 1
+            label = f"{base[:self.MAX_SHEET_NAME - longest_suffix - len(str(count)) - 1]} {count}"
+        used_names.update(f"{label} {suffix}".lower() for suffix in self.COMPANY_SHEETS.values())
+        return label
+
+    def _write_summary_sheet(self, ws, styles: XlsxwriterStyles, rows: List[Dict]):
+        """Comps table (one row per company, linked to its sheets) with mean/median rows below"""
+        for col, (_, _, _, width) in enumerate(self.SUMMARY_COLUMNS):
+            ws.set_column(col, col, width)
+        ws.freeze_panes(3, 1)
+        ws.write(0, 0, self.title, styles.get('sheet_title'))
+
+        header_row = 2
+        for col, (header, _, _, _) in enumerate(self.SUMMARY_COLUMNS):
+            ws.write(header_row, col, header, styles.get('table_header'))
+
+        first_row = header_row + 1
+        for row_idx, row in enumerate(rows, start=first_row):
+            for col, (_, key, style, _) in enumerate(self.SUMMARY_COLUMNS):
+                value = row.get(key)
+                if key == 'sheets' and row.get('first_sheet'):
+                    # Quoted sheet references escape embedded apostrophes by doubling them
+                    sheet = row['first_sheet'].replace("'", "''")
+                    ws.write_url(row_idx, col, f"internal:'{sheet}'!A1", string=value)
+                elif value is not None and value != '':
+                    ws.write(row_idx, col, value, styles.get(style))
+        last_row = first_row + len(rows) - 1
+
+        # Statistics over each numeric column, as formulas with the values computed here cached
+        for stat_idx, (label, function, compute) in enumerate(self.STATISTICS):
+            stat_row = last_row + 2 + stat_idx
+            ws.write(stat_row, 0, label, styles.get('bold'))
+            for col, (_, key, style, _) in enumerate(self.SUMMARY_COLUMNS):
+                values = [row[key] for row in rows if row.get(key) is not None]
+                if style is None or not values:
+                    continue
+                cell_range = f"{xl_rowcol_to_cell(first_row, col)}:{xl_rowcol_to_cell(last_row, col)}"
+                ws.write_formula(stat_row, col, f"={function}({cell_range})", styles.get(f"{style}_bold"),
+                                 compute(values))
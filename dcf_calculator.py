@@ -5,6 +5,11 @@ Calculates WACC, Free Cash Flow, Terminal Value, and Enterprise/Equity Valuation
 import pandas as pd
 import numpy as np
 from typing import Dict, Optional
+from operating_model import OperatingModel
+from sec_client import SECClient
+from statement_json import decode_statement
+from batch_dcf import BatchDCFEngine
+from monte_carlo import MonteCarloSimulator, QuantileSketch
 
 class DCFCalculator:
     """Calculate DCF valuation from operating model projections"""
@@ -25,6 +30,46 @@ class DCFCalculator:
         self.enterprise_value = None
         self.equity_value = None
     
+    # Balance sheet items (fetch_company_data keys) that make up debt and cash for net debt;
+    # the SEC client keeps one filing fact from backing two of them (SECClient.ADDITIVE_LINE_ITEMS)
+    DEBT_ITEMS = ('CommercialPaper', 'TermDebtCurrent', 'TermDebtNonCurrent')
+    CASH_ITEMS = ('CashAndCashEquivalents', 'MarketableSecuritiesCurrent')
+    # Used for any DCF assumption the request leaves out (shared with the vectorized engine)
+    ASSUMPTION_DEFAULTS = BatchDCFEngine.ASSUMPTION_DEFAULTS
+    
+    def _statement(self, name: str) -> pd.DataFrame:
+        """Operating model statement as a DataFrame with years as the index and line items as columns"""
+        return decode_statement(self.operating_model_data.get(name))
+    
+    def _latest_year(self) -> int:
+        """Latest historical year (the operating model reports it as a string)"""
+        return int(self.operating_model_data.get('latest_year', 2023))
+    
+    @classmethod
+    def from_store(cls, store, cik: str, assumptions: Dict,
+                   lookback_years: int = SECClient.DEFAULT_LOOKBACK_YEARS) -> Optional['DCFCalculator']:
+        """
+        Build a calculator for a company saved in a StatementStore
+        
+        Args:
+            store: StatementStore holding the company's parsed statements
+            cik: Company CIK
+            assumptions: Dict with DCF assumptions (operating assumptions included)
+            lookback_years: Most recent fiscal years of stored history to use
+        
+        Returns:
+            DCFCalculator, or None if the company is not stored or its model cannot be built
+        """
+        operating_model = OperatingModel.from_store(store, cik, projection_years=assumptions.get('projection_years', 5),
+                                                    lookback_years=lookback_years)
+        if operating_model is None:
+            return None
+        operating_model_data = operating_model.build_model(OperatingModel.operating_assumptions(assumptions))
+        if 'error' in operating_model_data:
+            print(f"Error building operating model for CIK {cik}: {operating_model_data['error']}")
+            return None
+        return cls(operating_model_data, assumptions)
+    
     def calculate_wacc(self) -> float:
         """
         Calculate Weighted Average Cost of Capital
@@ -36,12 +81,12 @@ class DCFCalculator:
         - E = Market value of equity
         - D = Market value of debt
         """
-        risk_free_rate = self.assumptions.get('risk_free_rate', 0.03)
-        beta = self.assumptions.get('beta', 1.0)
-        market_risk_premium = self.assumptions.get('market_risk_premium', 0.06)
-        cost_of_debt = self.assumptions.get('cost_of_debt', 0.05)
-        tax_rate = self.assumptions.get('tax_rate', 0.25)
-        debt_to_equity = self.assumptions.get('debt_to_equity', 0.3)
+        risk_free_rate = self.assumptions.get('risk_free_rate', self.ASSUMPTION_DEFAULTS['risk_free_rate'])
+        beta = self.assumptions.get('beta', self.ASSUMPTION_DEFAULTS['beta'])
+        market_risk_premium = self.assumptions.get('market_risk_premium', self.ASSUMPTION_DEFAULTS['market_risk_premium'])
+        cost_of_debt = self.assumptions.get('cost_of_debt', self.ASSUMPTION_DEFAULTS['cost_of_debt'])
+        tax_rate = self.assumptions.get('tax_rate', self.ASSUMPTION_DEFAULTS['tax_rate'])
+        debt_to_equity = self.assumptions.get('debt_to_equity', self.ASSUMPTION_DEFAULTS['debt_to_equity'])
         
         # Cost of Equity (CAPM)
         cost_of_equity = risk_free_rate + (beta * market_risk_premium)
@@ -65,22 +110,22 @@ class DCFCalculator:
         or
         FCF = EBIT × (1 - Tax Rate) + D&A - Capital Expenditures - Change in Working Capital
         
-        NOTE: Currently projections are disabled, so this returns an empty Series
+        Returns an empty Series when the operating model has no projected years
         """
-        cash_flow = pd.DataFrame(self.operating_model_data.get('cash_flow', {}))
-        income_statement = pd.DataFrame(self.operating_model_data.get('income_statement', {}))
+        cash_flow = self._statement('cash_flow')
+        income_statement = self._statement('income_statement')
         
         if cash_flow.empty or income_statement.empty:
-            self.free_cash_flows = pd.Series()
+            self.free_cash_flows = pd.Series(dtype=float)
             return self.free_cash_flows
         
         # Get projection years (exclude historical)
-        latest_year = self.operating_model_data.get('latest_year', 2023)
-        projection_years = self.operating_model_data.get('projection_years', 0)  # Default to 0 since projections are disabled
+        latest_year = self._latest_year()
+        projection_years = self.operating_model_data.get('projection_years', 0)
         
         # If no projection years, return empty Series
         if projection_years == 0:
-            self.free_cash_flows = pd.Series()
+            self.free_cash_flows = pd.Series(dtype=float)
             return self.free_cash_flows
         
         fcf_data = {}
@@ -90,8 +135,8 @@ class DCFCalculator:
             year_str = str(year)
             
             # Method 1: From Cash Flow Statement
-            operating_cf = cash_flow.loc[year_str, 'OperatingCashFlow'] if year_str in cash_flow.index else 0
-            capex = abs(cash_flow.loc[year_str, 'CapitalExpenditures']) if year_str in cash_flow.index else 0
+            operating_cf = cash_flow.loc[year_str, 'OperatingCashFlow'] if year_str in cash_flow.index and 'OperatingCashFlow' in cash_flow.columns else 0
+            capex = abs(cash_flow.loc[year_str, 'CapitalExpenditures']) if year_str in cash_flow.index and 'CapitalExpenditures' in cash_flow.columns else 0
             
             # FCF = Operating CF - CapEx
             fcf = operating_cf - capex
@@ -100,7 +145,7 @@ class DCFCalculator:
             if fcf == 0 and year_str in income_statement.index:
                 ebit = income_statement.loc[year_str, 'OperatingIncome'] if 'OperatingIncome' in income_statement.columns else 0
                 da = abs(income_statement.loc[year_str, 'D&A']) if 'D&A' in income_statement.columns else 0
-                tax_rate = self.assumptions.get('tax_rate', 0.25)
+                tax_rate = self.assumptions.get('tax_rate', self.ASSUMPTION_DEFAULTS['tax_rate'])
                 
                 # NOPAT = EBIT × (1 - Tax Rate)
                 nopat = ebit * (1 - tax_rate)
@@ -140,7 +185,7 @@ class DCFCalculator:
         if self.wacc is None:
             self.calculate_wacc()
         
-        terminal_growth = self.assumptions.get('terminal_growth_rate', 0.03)
+        terminal_growth = self.assumptions.get('terminal_growth_rate', self.ASSUMPTION_DEFAULTS['terminal_growth_rate'])
         
         # Get final year FCF
         try:
@@ -183,7 +228,7 @@ class DCFCalculator:
                 'total_pv_fcf': 0.0
             }
         
-        latest_year = self.operating_model_data.get('latest_year', 2023)
+        latest_year = self._latest_year()
         
         # Present value of projected FCFs
         pv_fcf = {}
@@ -230,32 +275,118 @@ class DCFCalculator:
         if self.enterprise_value is None:
             self.calculate_enterprise_value()
         
-        # Get latest balance sheet data
-        balance_sheet = pd.DataFrame(self.operating_model_data.get('balance_sheet', {}))
-        latest_year = self.operating_model_data.get('latest_year', 2023)
-        latest_year_str = str(latest_year)
+        net_debt = self.calculate_net_debt()
+        
+        # Equity Value
+        equity_value = self.enterprise_value - net_debt
+        
+        self.equity_value = equity_value
+        return equity_value
+    
+    def calculate_net_debt(self) -> float:
+        """
+        Calculate Net Debt from the latest balance sheet
+        
+        Net Debt = Total Debt - Cash and Cash Equivalents
+        """
+        # Get latest historical balance sheet data (not a projected year)
+        balance_sheet = self._statement('balance_sheet')
+        latest_year_str = str(self._latest_year())
         
         if not balance_sheet.empty and latest_year_str in balance_sheet.index:
-            # Total Debt
-            long_term_debt = balance_sheet.loc[latest_year_str, 'LongTermDebt'] if 'LongTermDebt' in balance_sheet.columns else 0
-            short_term_debt = 0  # Assume included in short-term liabilities
-            total_debt = long_term_debt + short_term_debt
+            latest_row = balance_sheet.loc[latest_year_str]
             
-            # Cash and Cash Equivalents
-            cash = balance_sheet.loc[latest_year_str, 'Cash'] if 'Cash' in balance_sheet.columns else 0
-            short_term_investments = balance_sheet.loc[latest_year_str, 'ShortTermInvestments'] if 'ShortTermInvestments' in balance_sheet.columns else 0
-            total_cash = cash + short_term_investments
+            # Total Debt: commercial paper plus current and non-current term debt
+            total_debt = float(pd.to_numeric(latest_row.reindex(list(self.DEBT_ITEMS)), errors='coerce').fillna(0).sum())
+            
+            # Cash, Cash Equivalents and current marketable securities
+            total_cash = float(pd.to_numeric(latest_row.reindex(list(self.CASH_ITEMS)), errors='coerce').fillna(0).sum())
             
             # Net Debt
             net_debt = total_debt - total_cash
         else:
             net_debt = 0
         
-        # Equity Value
-        equity_value = self.enterprise_value - net_debt
+        return net_debt
+    
+    def prepare_batch_inputs(self) -> Dict:
+        """
+        Collect the scenario-independent inputs BatchDCFEngine needs
         
-        self.equity_value = equity_value
-        return equity_value
+        Returns:
+            Dict with 'free_cash_flows' (projected FCFs in year order), 'projection_years',
+            'net_debt' and 'shares_outstanding'
+        """
+        fcf = self.calculate_free_cash_flow()
+        free_cash_flows = np.asarray(fcf.values if isinstance(fcf, pd.Series) else [], dtype=np.float64)
+        return {
+            'free_cash_flows': free_cash_flows,
+            'projection_years': self.operating_model_data.get('projection_years', 0),
+            'net_debt': float(self.calculate_net_debt()),
+            'shares_outstanding': self.assumptions.get('shares_outstanding', None)
+        }
+    
+    def historical_assumption_values(self, name: str) -> np.ndarray:
+        """
+        Historical observations of an assumption, for empirical Monte Carlo distributions
+        
+        - tax_rate: effective tax rate of each year with positive pre-tax income
+        - terminal_growth_rate: year-over-year revenue growth
+        """
+        income_statement = self._statement('income_statement')
+        if income_statement.empty:
+            return np.array([])
+        income_statement = income_statement.sort_index()
+        
+        if name == 'tax_rate' and 'EffectiveTaxRate' in income_statement.columns:
+            rates = income_statement['EffectiveTaxRate'] / 100
+            if 'EBT' in income_statement.columns:
+                rates = rates[income_statement['EBT'] > 0]
+            return rates[(rates > 0) & (rates < 1)].to_numpy(dtype=np.float64)
+        if name == 'terminal_growth_rate' and 'Revenue' in income_statement.columns:
+            revenue = income_statement['Revenue'].where(income_statement['Revenue'] > 0)
+            growth = revenue.pct_change(fill_method=None)
+            return growth[np.isfinite(growth)].to_numpy(dtype=np.float64)
+        return np.array([])
+    
+    def monte_carlo(self, distributions: Dict, draws: int = 100_000, seed: Optional[int] = None,
+                    percentiles=None, bins: int = 50, chunk_size: int = MonteCarloSimulator.DEFAULT_CHUNK_SIZE,
+                    scheduler=None) -> Dict:
+        """
+        Stochastic valuation: sample assumptions from distributions and summarize EV, equity value and price
+        
+        Args:
+            distributions: {assumption: number or spec} (see MonteCarloSimulator); an empirical
+                spec with 'source': 'history' and no 'values' resamples historical_assumption_values
+            draws: Number of scenarios
+            seed: Seed for reproducible results (reported back either way)
+            percentiles: Percentiles to report (defaults to 5/10/25/50/75/90/95)
+            bins: Histogram bins (1 to QuantileSketch.MAX_BINS)
+            chunk_size: Scenarios valued per vectorized pass
+            scheduler: Optional ScenarioScheduler to shard large runs across processes
+                (results are identical to an in-process run)
+        
+        Returns:
+            Dict with per-metric percentiles, moments and histogram (see MonteCarloSimulator.run)
+        """
+        # Checked before any scenario is valued
+        bins = QuantileSketch.check_bins(bins)
+        resolved = {}
+        for name, spec in (distributions or {}).items():
+            if isinstance(spec, dict) and spec.get('dist') == 'empirical' and spec.get('source') == 'history' \
+                    and spec.get('values') is None:
+                history = self.historical_assumption_values(name)
+                if history.size == 0:
+                    raise ValueError(f"No historical values available for {name!r}")
+                spec = {**spec, 'values': history.tolist()}
+            resolved[name] = spec
+        
+        simulator = MonteCarloSimulator(BatchDCFEngine.from_calculator(self), resolved,
+                                        base_assumptions=self.assumptions, draws=draws, seed=seed,
+                                        chunk_size=chunk_size)
+        if scheduler is not None:
+            return scheduler.monte_carlo(simulator, percentiles=percentiles, bins=bins)
+        return simulator.run(percentiles=percentiles, bins=bins)
     
     def calculate_all(self) -> Dict:
         """
@@ -267,7 +398,25 @@ class DCFCalculator:
         enterprise_value = self.calculate_enterprise_value()
         equity_value = self.calculate_equity_value()
         pv_data = self.calculate_present_values()
+        return self.summarize(wacc, fcf, terminal_value, pv_data, enterprise_value, equity_value)
+    
+    # Assumptions echoed back with the results (defaults filled in for any left out)
+    REPORTED_ASSUMPTIONS = ('risk_free_rate', 'beta', 'market_risk_premium', 'cost_of_debt',
+                            'tax_rate', 'debt_to_equity', 'terminal_growth_rate')
+    
+    def summarize(self, wacc: float, fcf: pd.Series, terminal_value: float, pv_data: Dict,
+                  enterprise_value: float, equity_value: float) -> Dict:
+        """
+        Assemble the calculate_all summary from already computed components
         
+        Args:
+            wacc: Discount rate
+            fcf: Projected free cash flows by year
+            terminal_value: Undiscounted terminal value
+            pv_data: Output of calculate_present_values
+            enterprise_value: Enterprise value
+            equity_value: Equity value
+        """
         # Get shares outstanding (if available) to calculate price per share
         # For now, we'll return equity value
         shares_outstanding = self.assumptions.get('shares_outstanding', None)
@@ -283,14 +432,7 @@ class DCFCalculator:
             'enterprise_value': enterprise_value,
             'equity_value': equity_value,
             'price_per_share': price_per_share,
-            'assumptions': {
-                'risk_free_rate': self.assumptions.get('risk_free_rate'),
-                'beta': self.assumptions.get('beta'),
-                'market_risk_premium': self.assumptions.get('market_risk_premium'),
-                'cost_of_debt': self.assumptions.get('cost_of_debt'),
-                'tax_rate': self.assumptions.get('tax_rate'),
-                'debt_to_equity': self.assumptions.get('debt_to_equity'),
-                'terminal_growth_rate': self.assumptions.get('terminal_growth_rate')
-            }
+            'shares_outstanding': shares_outstanding,
+            'assumptions': {name: self.assumptions.get(name, self.ASSUMPTION_DEFAULTS[name])
+                            for name in self.REPORTED_ASSUMPTIONS}
         }
-
@@ -5,17 +5,107 @@ Handles Excel and CSV export of financial statements and DCF results
 import pandas as pd
 import numpy as np
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
 from io import BytesIO
 import os
 import re
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Tuple
+from export_styles import NUMBER_FORMAT_DASH, NUMBER_FORMAT_MAIN, NUMBER_FORMAT_SIMPLE, VALUE_STYLES, OpenpyxlStyles
+from statement_json import decode_statement
 
 class ExportHandler:
     """Handle exports to Excel and CSV formats"""
     
-    def __init__(self, operating_model_data: Dict, dcf_results: Dict, company_name: str = "Company"):
+    SENSITIVITY_METRICS = {
+        'equity_value': ('Equity Value (in millions)', 'millions'),
+        'price_per_share': ('Price per Share', None)
+    }
+    
+    # How the gray area around the statement boxes is drawn:
+    # 'columns' sets a gray default style on each column (one <col> entry per column),
+    # 'cells' fills every cell of the 200+ x 100+ area individually (legacy rendering)
+    BACKGROUND_MODES = ('columns', 'cells')
+    DEFAULT_BACKGROUND = 'columns'
+    BACKGROUND_ROWS = 200  # Gray area extends at least this many rows below the box ('cells' mode)
+    BACKGROUND_COLUMNS = 100  # ... and this many columns to the right of it
+    
+    # Income Statement line items in order (matching the example exactly)
+    # Format: (label, key, is_bold, has_top_border, num_format)
+    # Top border only for: Gross Profit, Operating Income, EBT, Net Income
+    INCOME_STATEMENT_LINES = [
+        ('Revenue', 'Revenue', True, False, NUMBER_FORMAT_MAIN),  # Bold, no top border
+        ('COGS', 'COGS', False, False, NUMBER_FORMAT_MAIN),  # Not bold, no top border
+        ('Gross Profit', 'GrossProfit', True, True, NUMBER_FORMAT_MAIN),  # Bold, top border
+        ('SG&A', 'SG&A', False, False, NUMBER_FORMAT_MAIN),  # Not bold, no top border
+        ('R&D', 'R&D', False, False, NUMBER_FORMAT_DASH),  # Special format for zeros
+        ('D&A', 'D&A', False, False, NUMBER_FORMAT_MAIN),
+        ('Other Operating Expenses/Income', 'OtherOperatingExpenses', False, False, NUMBER_FORMAT_SIMPLE),  # Simple format
+        ('Operating Income', 'OperatingIncome', True, True, NUMBER_FORMAT_MAIN),  # Bold, top border
+        ('Other Income/(Expense), Net', 'OtherIncomeExpenseNet', False, False, NUMBER_FORMAT_MAIN),
+        ('Other Unusual Items', 'OtherUnusualItems', False, False, NUMBER_FORMAT_MAIN),
+        ('EBT', 'EBT', True, True, NUMBER_FORMAT_MAIN),  # Bold, top border
+        ('Taxes', 'TaxExpense', False, False, NUMBER_FORMAT_MAIN),
+        ('Minority Interest in Earnings', 'MinorityInterest', False, False, NUMBER_FORMAT_MAIN),
+        ('Net Income', 'NetIncome', True, True, NUMBER_FORMAT_MAIN)  # Bold, top border
+    ]
+    
+    # Balance Sheet line items in order (simplified format for Excel)
+    # Format: (label, key, is_bold, has_top_border, is_empty_row, is_section_header)
+    BALANCE_SHEET_LINES = [
+        # Assets section
+        ('Cash & Cash Equivalents', 'CashAndCashEquivalents', False, False, False, False),
+        ('Short Term Investments', 'ShortTermInvestments', False, False, False, False),
+        ('Current Assets', 'CurrentAssets', False, False, False, False),
+        ('Net PPE', 'PPE', False, False, False, False),
+        ('Other Long Term Assets', 'OtherLongTermAssets', False, False, False, False),
+        ('Total Assets', 'TotalAssets', True, True, False, False),  # Bold, top border
+        (None, None, False, False, True, False),  # Empty row
+        # Liabilities section
+        ('Short Term Liabilities', 'ShortTermLiabilities', False, False, False, False),
+        ('Long Term Debt', 'LongTermDebt', False, False, False, False),
+        ('Long Term Leases', 'LongTermLeases', False, False, False, False),
+        ('Other Long Term Liabilities', 'OtherLongTermLiabilities', False, False, False, False),
+        ('Total Liabilities', 'TotalLiabilities', True, True, False, False),  # Bold, top border
+        (None, None, False, False, True, False),  # Empty row
+        # Equity section
+        ('Retained Earnings', 'RetainedEarnings', False, False, False, False),
+        ('Common Stock', 'CommonStock', False, False, False, False),
+        ('PIC', 'PaidInCapital', False, False, False, False),
+        ('Minority Interest', 'MinorityInterest', False, False, False, False),
+        ('Other', 'OtherEquity', False, False, False, False),
+        ('Total Equity', 'TotalEquity', True, True, False, False),  # Bold, top border
+        (None, None, False, False, True, False),  # Empty row
+        # Final check section
+        ('Assets', 'TotalAssets', True, False, False, False),  # Reference to Total Assets (GAAP value)
+        ('Liabilities + Equity', None, True, False, False, False),  # Will be formula: TotalLiabilities + TotalEquity
+        ('check', None, False, False, False, False)  # Will be formula: Assets - (Liabilities + Equity)
+    ]
+    
+    # Cash Flow line items
+    CASH_FLOW_LINES = [
+        ('Net Income', 'NetIncome'),
+        ('D&A', 'D&A'),
+        ('Change in Working Capital', 'ChangeInWorkingCapital'),
+        ('Operating Cash Flow', 'OperatingCashFlow'),
+        ('Capital Expenditures', 'CapitalExpenditures'),
+        ('Free Cash Flow', 'FreeCashFlow'),
+        ('Investing Cash Flow', 'InvestingCashFlow'),
+        ('Financing Cash Flow', 'FinancingCashFlow'),
+        ('Net Cash Flow', 'NetCashFlow')
+    ]
+    
+    ASSUMPTION_LABELS = {
+        'risk_free_rate': 'Risk-Free Rate',
+        'beta': 'Beta',
+        'market_risk_premium': 'Market Risk Premium',
+        'cost_of_debt': 'Cost of Debt',
+        'tax_rate': 'Tax Rate',
+        'debt_to_equity': 'Debt-to-Equity Ratio',
+        'terminal_growth_rate': 'Terminal Growth Rate'
+    }
+    
+    def __init__(self, operating_model_data: Dict, dcf_results: Dict, company_name: str = "Company",
+                 sensitivity: Optional[Dict] = None, background: str = DEFAULT_BACKGROUND):
         """
         Initialize export handler
         
@@ -23,9 +113,16 @@ class ExportHandler:
             operating_model_data: Dict with financial statements
             dcf_results: Dict with DCF calculation results
             company_name: Name of the company
+            sensitivity: Optional grid from BatchDCFEngine.sensitivity (/api/sensitivity)
+            background: Gray background rendering, one of BACKGROUND_MODES
         """
+        if background not in self.BACKGROUND_MODES:
+            raise ValueError(f"background must be one of {', '.join(self.BACKGROUND_MODES)}, got {background!r}")
         self.operating_model_data = operating_model_data
         self.dcf_results = dcf_results
+        self.sensitivity = sensitivity
+        self.background = background
+        self.styles = None  # Style registry of the workbook being written (see write_sheets)
         # Sanitize company name for filenames
         self.company_name = re.sub(r'[<>:"/\\|?*]', '_', company_name)
     
@@ -48,6 +145,7 @@ class ExportHandler:
         - Balance Sheet
         - Cash Flow Statement
         - DCF Summary
+        - Sensitivity (when a sensitivity grid was computed)
         """
         wb = Workbook()
         
@@ -55,11 +153,7 @@ class ExportHandler:
         if 'Sheet' in wb.sheetnames:
             wb.remove(wb['Sheet'])
         
-        # Create sheets
-        self._create_income_statement_sheet(wb)
-        self._create_balance_sheet_sheet(wb)
-        self._create_cash_flow_sheet(wb)
-        self._create_dcf_summary_sheet(wb)
+        self.write_sheets(wb)
         
         # Save to BytesIO
         output = BytesIO()
@@ -67,370 +161,220 @@ class ExportHandler:
         output.seek(0)
         return output
     
-    def _create_income_statement_sheet(self, wb: Workbook):
-        """Create Income Statement sheet formatted exactly like the example Excel file"""
-        ws = wb.create_sheet("Historical IS")
+    def write_sheets(self, wb: Workbook, prefix: str = '', sheet_names: Optional[Dict[str, str]] = None):
+        """
+        Add this company's sheets to a workbook
         
-        income_data = pd.DataFrame(self.operating_model_data.get('income_statement', {}))
-        if income_data.empty:
-            ws['B2'] = "No data available"
-            return
+        Args:
+            wb: Workbook
+            prefix: Prepended to sheet names (for several companies in one workbook)
+            sheet_names: Only write these sheets, under new names ({standard name: sheet name})
+        """
+        self.styles = OpenpyxlStyles(wb)
+        for name, write_sheet in self.named_sheet_writers(prefix, sheet_names):
+            write_sheet(wb.create_sheet(name))
+    
+    def sheet_writers(self) -> List[Tuple[str, Callable]]:
+        """Sheet names and the methods that write them, in workbook order"""
+        sheets = [("Historical IS", self._write_income_statement_sheet),
+                  ("Historical BS", self._write_balance_sheet_sheet),
+                  ("Cash Flow Statement", self._write_cash_flow_sheet),
+                  ("DCF Summary", self._write_dcf_summary_sheet)]
+        if self.sensitivity:
+            sheets.append(("Sensitivity", self._write_sensitivity_sheet))
+        return sheets
+    
+    def named_sheet_writers(self, prefix: str = '', sheet_names: Optional[Dict[str, str]] = None) -> List[Tuple[str, Callable]]:
+        """sheet_writers under the names write_sheets gives them (see write_sheets)"""
+        if sheet_names is None:
+            return [(f"{prefix}{name}", write_sheet) for name, write_sheet in self.sheet_writers()]
+        return [(sheet_names[name], write_sheet) for name, write_sheet in self.sheet_writers() if name in sheet_names]
+    
+    # Cell and sheet-layout primitives of the openpyxl engine (StreamingExportHandler
+    # overrides these for xlsxwriter); rows and columns are 1-based
+    
+    def _put(self, ws, row: int, col: int, value, style: Optional[str] = None, *edges: str):
+        """Write one cell and apply a named style (see export_styles.STYLES) with optional thin edges"""
+        cell = ws.cell(row=row, column=col)
+        if value is not None:
+            cell.value = value
+        if style is not None:
+            self.styles.apply(cell, style, *edges)
+    
+    def _merge(self, ws, row: int, first_col: int, last_col: int, value, style: Optional[str] = None):
+        """Write a value across merged cells of one row"""
+        self._put(ws, row, first_col, value, style)
+        ws.merge_cells(start_row=row, start_column=first_col, end_row=row, end_column=last_col)
+    
+    def _put_formula(self, ws, row: int, col: int, formula: str, value, style: Optional[str] = None):
+        """Write a formula; openpyxl cannot store its cached value, so Excel computes it on open"""
+        self._put(ws, row, col, formula, style)
+    
+    def _set_widths(self, ws, widths: Dict[int, float]):
+        for col, width in widths.items():
+            ws.column_dimensions[get_column_letter(col)].width = width
+    
+    def _set_heights(self, ws, heights: Dict[int, float]):
+        for row, height in heights.items():
+            ws.row_dimensions[row].height = height
+    
+    def _box_background(self, ws, box: Dict):
+        """
+        Column widths of a statement box sheet and the gray background outside the box
         
-        # Define colors from the example
-        dark_blue = "FF002060"  # Dark blue fill and text color
-        white_text = "FFFFFFFF"  # White text
-        
-        # Define fonts
-        company_name_font = Font(bold=True, size=20, color=dark_blue)
-        title_font = Font(bold=True, size=15, color=white_text)
-        subtitle_font = Font(size=11, color=white_text)
-        header_font = Font(bold=True, size=11, color=white_text)
-        bold_font = Font(bold=True, size=11)
-        regular_font = Font(size=11)
-        
-        # Define fills
-        dark_blue_fill = PatternFill(start_color=dark_blue, end_color=dark_blue, fill_type="solid")
-        
-        # Define borders
-        thin_border = Border(
-            top=Side(style='thin'),
-            bottom=Side(style='thin'),
-            left=Side(style='thin'),
-            right=Side(style='thin')
-        )
-        # Outer border for the box (C7 to I24)
-        outer_border = Border(
-            top=Side(style='thin'),
-            bottom=Side(style='thin'),
-            left=Side(style='thin'),
-            right=Side(style='thin')
-        )
-        # Top border only (for lines above bold items)
-        top_thin = Border(top=Side(style='thin'))
-        # Gray fill for outer cells
-        gray_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-        
-        # Number formats from the example
-        number_format_main = '#,##0.0_);\\(#,##0.0\\)'  # Main format with parentheses for negatives
-        number_format_simple = '0.0'  # For Other Operating Expenses
-        number_format_dash = '\\-'  # For zero R&D values
-        year_format = '####"A"'  # For year headers (2019A, 2020A, etc.)
-        
-        # Row 2: Company name (B2)
-        ws['B2'] = self.company_name
-        ws['B2'].font = company_name_font
-        ws.row_dimensions[2].height = 25.8
-        
-        # Row 7: Title "Income Statement" (C7) with dark blue background spanning multiple columns
-        # Row 8: Subtitle "$ in Millions" (C8) and year headers (G8, H8, I8, J8, etc.)
-        # The example shows the title starts at C7 and spans to at least J7
-        # Years start at G8 (column 7)
-        
-        # Define the box boundaries (content area)
-        box_start_row = 7  # Content starts at row 7
-        box_end_row = 24  # Based on 14 line items starting at row 11
-        box_start_col = 3  # Column C (content starts here)
-        
-        # Calculate actual end column based on number of years
-        years = sorted(income_data.columns)
-        year_start_col = 7  # Column G
-        actual_box_end_col = year_start_col + len(years) - 1  # Last year column
-        
-        # Border boundaries (one cell out from content box)
-        border_start_row = box_start_row - 1  # Row 6
-        border_end_row = box_end_row + 1  # Row 25
-        border_start_col = box_start_col - 1  # Column B
-        border_end_col = actual_box_end_col + 1  # One column after last year
-        
-        # Set default sheet background to gray (for all cells)
-        # This will make all cells gray by default, then we'll override with white for the box
-        ws.sheet_properties.tabColor = "D3D3D3"  # This doesn't set cell fill, but we'll handle it below
-        
-        # Title row (row 7) - inside the box, white background with dark blue header
-        title_start_col = 3  # Column C
-        for col in range(title_start_col, actual_box_end_col + 1):
-            cell = ws.cell(row=7, column=col)
-            cell.fill = dark_blue_fill
-            if col == title_start_col:
-                cell.value = "Income Statement"
-                cell.font = title_font
-        ws.row_dimensions[7].height = 19.8
-        
-        # Subtitle and year headers row (row 8) - inside the box, white background with dark blue header
-        ws.cell(row=8, column=title_start_col).value = "$ in Millions"
-        ws.cell(row=8, column=title_start_col).font = subtitle_font
-        ws.cell(row=8, column=title_start_col).fill = dark_blue_fill
-        
-        # Fill the rest of the subtitle row with dark blue
-        for col in range(title_start_col + 1, actual_box_end_col + 1):
-            cell = ws.cell(row=8, column=col)
-            cell.fill = dark_blue_fill
-        
-        # Year headers start at column G (7)
+        Cells outside the box that are written (the company name) carry their own gray
+        style in either mode, since a cell's own style hides its column's style.
+        """
+        first_row, last_row, first_col, last_col = box['bounds']
+        max_col_to_fill = self.background_columns(last_col)
+        if self.background == 'cells':
+            # At least BACKGROUND_ROWS rows down and BACKGROUND_COLUMNS columns to the right from the border
+            written = {(row, col) for row, col, *_ in box['cells']}
+            max_row_to_fill = max(self.BACKGROUND_ROWS, last_row + self.BACKGROUND_ROWS)
+            for r in range(1, max_row_to_fill + 1):
+                for c in range(1, max_col_to_fill + 1):
+                    inside_box = first_row <= r <= last_row and first_col <= c <= last_col
+                    if not inside_box and (r, c) not in written:
+                        self._put(ws, r, c, None, 'background')
+        else:
+            # Column defaults cover every row; the box's own cells all carry explicit fills
+            for c in range(1, max_col_to_fill + 1):
+                self.styles.apply(ws.column_dimensions[get_column_letter(c)], 'background')
+        self._set_widths(ws, box['widths'])
+    
+    def background_columns(self, border_end_col: int) -> int:
+        """Last column of the gray background for a box ending at border_end_col"""
+        return max(self.BACKGROUND_COLUMNS, border_end_col + self.BACKGROUND_COLUMNS)
+    
+    def statement_box(self, title: str, years: List, line_rows: List) -> Dict:
+        """
+        Layout of a Historical IS/BS sheet (formatted exactly like the example Excel file)
+        
+        Company name in B2, then a bordered white box from B6 with the title band at C7,
+        year headers from G8 and line items from row 11; everything else is gray.
+        
+        Args:
+            title: Box title (C7)
+            years: Year columns, oldest first
+            line_rows: Per line item, its (col, value, style, edges) cells from column C (see _line_cells)
+        
+        Returns:
+            Dict with 'cells' ((row, col, value, style, edges) in row order), 'widths' and
+            'heights' (by 1-based column/row) and 'bounds' (first_row, last_row, first_col,
+            last_col of the bordered box, inclusive)
+        """
+        projected_years = set(self.operating_model_data.get('projected_years', []))
         year_start_col = 7  # Column G
+        last_year_col = year_start_col + len(years) - 1
+        border_start_row, border_start_col = 6, 2  # B6
+        border_end_row = 11 + len(line_rows)
+        border_end_col = last_year_col + 1
+        
+        cells = [(2, 2, self.company_name, 'company_name', ())]
+        
+        def box_row(row: int, row_cells: List, edges: Tuple[str, ...] = ()):
+            """Left/right box edges around a row's cells (edges apply to the whole row)"""
+            cells.append((row, border_start_col, None, 'box', ('left',) + edges))
+            cells.extend((row, col, value, style, cell_edges) for col, value, style, cell_edges in row_cells)
+            cells.append((row, border_end_col, None, 'box', ('right',) + edges))
+        
+        box_row(border_start_row, [(col, None, 'box', ('top',))
+                                   for col in range(border_start_col + 1, border_end_col)], ('top',))
+        box_row(7, [(3, title, 'title', ())] + [(col, None, 'header', ()) for col in range(4, last_year_col + 1)])
+        
+        header_cells = [(3, "$ in Millions", 'subtitle', ())] + [(col, None, 'header', ()) for col in range(4, year_start_col)]
         for col_idx, year in enumerate(years):
-            col = year_start_col + col_idx
-            cell = ws.cell(row=8, column=col)
-            # Store as integer and apply format - the format ####\"A\" will display as 2023A
-            cell.value = int(year)
-            cell.number_format = year_format
-            cell.font = header_font
-            cell.fill = dark_blue_fill
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        ws.row_dimensions[8].height = 15.0
-        
-        # Fill rows 9-10 with white background (empty rows between header and data, inside the box)
-        for r in [9, 10]:
-            for c in range(box_start_col, actual_box_end_col + 1):
-                cell = ws.cell(row=r, column=c)
-                cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-        
-        # Line items start at row 11, column D (4)
-        line_item_col = 4  # Column D
-        data_start_col = year_start_col  # Column G (7)
-        
-        # Line items in order (matching the example exactly)
-        # Format: (label, key, is_bold, has_top_border, num_format)
-        # Top border only for: Gross Profit, Operating Income, EBT, Net Income
-        line_items = [
-            ('Revenue', 'Revenue', True, False, number_format_main),  # Bold, no top border
-            ('COGS', 'COGS', False, False, number_format_main),  # Not bold, no top border
-            ('Gross Profit', 'GrossProfit', True, True, number_format_main),  # Bold, top border
-            ('SG&A', 'SG&A', False, False, number_format_main),  # Not bold, no top border
-            ('R&D', 'R&D', False, False, number_format_dash),  # Special format for zeros
-            ('D&A', 'D&A', False, False, number_format_main),
-            ('Other Operating Expenses/Income', 'OtherOperatingExpenses', False, False, number_format_simple),  # Simple format
-            ('Operating Income', 'OperatingIncome', True, True, number_format_main),  # Bold, top border
-            ('Other Income/(Expense), Net', 'OtherIncomeExpenseNet', False, False, number_format_main),
-            ('Other Unusual Items', 'OtherUnusualItems', False, False, number_format_main),
-            ('EBT', 'EBT', True, True, number_format_main),  # Bold, top border
-            ('Taxes', 'TaxExpense', False, False, number_format_main),
-            ('Minority Interest in Earnings', 'MinorityInterest', False, False, number_format_main),
-            ('Net Income', 'NetIncome', True, True, number_format_main)  # Bold, top border
-        ]
+            style = 'projected_year' if str(year) in projected_years else 'year'
+            header_cells.append((year_start_col + col_idx, int(year), style, ()))
+        box_row(8, header_cells)
+        
+        # Spacer rows between the headers and the line items
+        for row in (9, 10):
+            box_row(row, [(col, None, 'box', ()) for col in range(3, last_year_col + 1)])
+        
+        for row, row_cells in enumerate(line_rows, start=11):
+            box_row(row, row_cells)
+        
+        box_row(border_end_row, [(col, None, 'box', ('bottom',))
+                                 for col in range(border_start_col + 1, border_end_col)], ('bottom',))
+        
+        # Column widths matching the example (year columns G, H, I, ... are 13 wide)
+        widths = {1: 13.0, 2: 5.44, 3: 12.44, 4: 8.44, 5: 13.0, 6: 17.44}
+        widths.update({col: 13.0 for col in range(year_start_col, last_year_col + 1)})
+        return {
+            'cells': cells,
+            'widths': widths,
+            'heights': {2: 25.8, 7: 19.8, 8: 15.0},
+            'bounds': (border_start_row, border_end_row, border_start_col, border_end_col)
+        }
+    
+    @staticmethod
+    def _line_cells(label: str, is_bold: bool, has_top_border: bool, is_last: bool, values: List) -> List:
+        """
+        Cells of one statement line from column C: blank C, label in D, blank E/F, then values
         
-        # Calculate actual box end row based on number of line items
-        box_end_row = 11 + len(line_items) - 1  # Start at 11, add number of items minus 1
-        
-        # Write line items starting at row 11
-        row = 11
-        for label, key, is_bold, has_top_border, num_format in line_items:
-            # Write label in column D (4)
-            label_cell = ws.cell(row=row, column=line_item_col)
-            label_cell.value = label
-            label_cell.font = bold_font if is_bold else regular_font
-            # Indent non-bold items
-            if not is_bold:
-                label_cell.alignment = Alignment(horizontal='left', vertical='center', indent=1)
-            else:
-                label_cell.alignment = Alignment(horizontal='left', vertical='center')
-            
-            # Set white background for cells inside the box (except header rows 7-8)
-            label_cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-            
-            # Apply borders: NO left border (user requested no line left of line items)
-            # Top border if specified, bottom border on last row
-            label_border_parts = {}
-            if has_top_border:
-                label_border_parts['top'] = top_thin.top
-            if row == box_end_row:
-                label_border_parts['bottom'] = outer_border.bottom
-            label_cell.border = Border(**label_border_parts) if label_border_parts else Border()
-            
-            # Also fill cells in columns C, E, F with white (they're inside the box but not written to)
-            for fill_col in [3, 5, 6]:  # Columns C, E, F
-                if fill_col < box_start_col or fill_col > actual_box_end_col:
-                    continue
-                fill_cell = ws.cell(row=row, column=fill_col)
-                fill_cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                # Apply borders: NO top border on column C (one cell less of underline), bottom border on last row
-                fill_border_parts = {}
-                # Only apply top border if NOT column C (column 3)
-                if has_top_border and fill_col != 3:
-                    fill_border_parts['top'] = top_thin.top
-                if row == box_end_row:
-                    fill_border_parts['bottom'] = outer_border.bottom
-                fill_cell.border = Border(**fill_border_parts) if fill_border_parts else Border()
-            
-            # Apply top border to all cells in the row if this row has top border (spanning D to actual_box_end_col, NOT C)
-            # Column C (to the left of line items) should NOT have top border (one cell less of underline)
-            if has_top_border:
-                for border_col in range(line_item_col, actual_box_end_col + 1):  # Start from D (4), not C (3)
-                    border_cell = ws.cell(row=row, column=border_col)
-                    # Get existing border and add top
-                    existing_border = border_cell.border
-                    border_cell.border = Border(
-                        left=existing_border.left if existing_border.left else None,
-                        top=top_thin.top,
-                        right=existing_border.right if existing_border.right else None,
-                        bottom=existing_border.bottom if existing_border.bottom else None
-                    )
-            
-            # Write values for each year
-            if key in income_data.index:
-                for col_idx, year in enumerate(years):
-                    col = data_start_col + col_idx
-                    value = income_data.loc[key, year]  # key is row (line item), year is column
-                    # Convert to millions
-                    value_millions = self.format_number(value, 'millions')
-                    
-                    cell = ws.cell(row=row, column=col)
-                    # For R&D, if value is exactly 0 or very close to 0, use dash format
-                    # Otherwise use the main number format
-                    if key == 'R&D':
-                        if abs(value_millions) < 0.01:
-                            cell.value = 0  # Will display as dash with the format
-                            cell.number_format = number_format_dash
-                        else:
-                            cell.value = value_millions
-                            cell.number_format = number_format_main  # Use main format for non-zero R&D
-                    else:
-                        cell.value = value_millions
-                        cell.number_format = num_format
-                    
-                    cell.font = bold_font if is_bold else regular_font
-                    cell.alignment = Alignment(horizontal='right', vertical='center')
-                    
-                    # Set white background for cells inside the box
-                    cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                    
-                    # Apply borders: top border if specified, NO right border (user requested no line right of years)
-                    # Bottom border on last row
-                    cell_border_parts = {}
-                    if has_top_border:
-                        cell_border_parts['top'] = top_thin.top
-                    if row == box_end_row:
-                        cell_border_parts['bottom'] = outer_border.bottom
-                    cell.border = Border(**cell_border_parts) if cell_border_parts else Border()
-            else:
-                # If key not found, write zeros or dashes
-                for col_idx in range(len(years)):
-                    col = data_start_col + col_idx
-                    cell = ws.cell(row=row, column=col)
-                    if key == 'R&D':
-                        cell.value = 0
-                        cell.number_format = number_format_dash
+        Args:
+            values: (value, number_format) per year column
+        """
+        top = ('top',) if has_top_border else ()
+        bottom = ('bottom',) if is_last else ()
+        cells = [(3, None, 'box', bottom),  # No top border left of the line items
+                 (4, label, 'label_bold' if is_bold else 'label', top + bottom),
+                 (5, None, 'box', top + bottom),
+                 (6, None, 'box', top + bottom)]
+        for col_idx, (value, number_format) in enumerate(values):
+            style = f"{VALUE_STYLES[number_format]}{'_bold' if is_bold else ''}"
+            cells.append((7 + col_idx, value, style, top + bottom))
+        return cells
+    
+    def _write_statement_box(self, ws, box: Dict):
+        """Write a statement_box layout (row heights and columns first, then cells in row order)"""
+        self._set_heights(ws, box['heights'])
+        self._box_background(ws, box)
+        for row, col, value, style, edges in box['cells']:
+            self._put(ws, row, col, value, style, *edges)
+    
+    def income_statement_box(self) -> Optional[Dict]:
+        """statement_box layout of the Historical IS sheet (None without income statement data)"""
+        income_data = decode_statement(self.operating_model_data.get('income_statement')).T
+        if income_data.empty:
+            return None
+        
+        years = sorted(income_data.columns)
+        income_values = income_data[years]
+        line_items = self.INCOME_STATEMENT_LINES
+        line_rows = []
+        for position, (label, key, is_bold, has_top_border, num_format) in enumerate(line_items):
+            # Values in millions; line items missing from the statement are written as zeros
+            row_values = income_values.loc[key].to_numpy() if key in income_values.index else np.zeros(len(years))
+            values = []
+            for value in row_values:
+                value_millions = self.format_number(value)
+                if key == 'R&D':
+                    # Zero (or near-zero) R&D displays as a dash
+                    if abs(value_millions) < 0.01:
+                        values.append((0, NUMBER_FORMAT_DASH))
                     else:
-                        cell.value = 0.0
-                        cell.number_format = num_format
-                    cell.font = bold_font if is_bold else regular_font
-                    cell.alignment = Alignment(horizontal='right', vertical='center')
-                    
-                    # Set white background for cells inside the box
-                    cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                    
-                    # Apply borders: top border if specified, NO right border, bottom border on last row
-                    cell_border_parts = {}
-                    if has_top_border:
-                        cell_border_parts['top'] = top_thin.top
-                    if row == box_end_row:
-                        cell_border_parts['bottom'] = outer_border.bottom
-                    cell.border = Border(**cell_border_parts) if cell_border_parts else Border()
-            
-            row += 1
+                        values.append((value_millions, NUMBER_FORMAT_MAIN))
+                else:
+                    values.append((value_millions, num_format))
+            line_rows.append(self._line_cells(label, is_bold, has_top_border, position == len(line_items) - 1, values))
         
-        # Draw outer border around the box (one cell out from content: B6 to border_end_col+1, border_end_row+1)
-        # Top border (row 6)
-        for c in range(border_start_col, border_end_col + 1):
-            cell = ws.cell(row=border_start_row, column=c)
-            if c == border_start_col:
-                cell.border = Border(left=outer_border.left, top=outer_border.top, right=None, bottom=None)
-            elif c == border_end_col:
-                cell.border = Border(left=None, top=outer_border.top, right=outer_border.right, bottom=None)
-            else:
-                cell.border = Border(left=None, top=outer_border.top, right=None, bottom=None)
-        
-        # Bottom border (row border_end_row)
-        for c in range(border_start_col, border_end_col + 1):
-            cell = ws.cell(row=border_end_row, column=c)
-            if c == border_start_col:
-                cell.border = Border(left=outer_border.left, top=None, right=None, bottom=outer_border.bottom)
-            elif c == border_end_col:
-                cell.border = Border(left=None, top=None, right=outer_border.right, bottom=outer_border.bottom)
-            else:
-                cell.border = Border(left=None, top=None, right=None, bottom=outer_border.bottom)
-        
-        # Left border (column B)
-        for r in range(border_start_row + 1, border_end_row):
-            cell = ws.cell(row=r, column=border_start_col)
-            existing_border = cell.border
-            cell.border = Border(
-                left=outer_border.left,
-                top=existing_border.top if existing_border.top else None,
-                right=None,
-                bottom=existing_border.bottom if existing_border.bottom else None
-            )
-        
-        # Right border (column border_end_col)
-        for r in range(border_start_row + 1, border_end_row):
-            cell = ws.cell(row=r, column=border_end_col)
-            existing_border = cell.border
-            cell.border = Border(
-                left=None,
-                top=existing_border.top if existing_border.top else None,
-                right=outer_border.right,
-                bottom=existing_border.bottom if existing_border.bottom else None
-            )
-        
-        # Fill buffer cells (one cell around the box) with white
-        # Top buffer row (row 6)
-        for c in range(border_start_col, border_end_col + 1):
-            cell = ws.cell(row=border_start_row, column=c)
-            cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-        
-        # Bottom buffer row (row border_end_row)
-        for c in range(border_start_col, border_end_col + 1):
-            cell = ws.cell(row=border_end_row, column=c)
-            cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-        
-        # Left buffer column (column B)
-        for r in range(border_start_row + 1, border_end_row):
-            cell = ws.cell(row=r, column=border_start_col)
-            cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-        
-        # Right buffer column (column border_end_col)
-        for r in range(border_start_row + 1, border_end_row):
-            cell = ws.cell(row=r, column=border_end_col)
-            cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-        
-        # Fill all other cells with gray (standardize gray outside the model)
-        # Fill at least 200 rows down and 100 columns to the right from the border
-        max_row_to_fill = max(200, border_end_row + 200)  # At least 200 rows down
-        max_col_to_fill = max(100, border_end_col + 100)  # At least 100 columns to the right
-        
-        for r in range(1, max_row_to_fill + 1):
-            for c in range(1, max_col_to_fill + 1):
-                # Skip cells inside the border area (rows border_start_row to border_end_row, columns border_start_col to border_end_col)
-                if (border_start_row <= r <= border_end_row and border_start_col <= c <= border_end_col):
-                    continue
-                # Fill with gray (only if not already filled with something else)
-                cell = ws.cell(row=r, column=c)
-                current_fill = cell.fill.start_color.rgb if cell.fill and hasattr(cell.fill, 'start_color') else None
-                if current_fill in [None, '00000000', 'FFFFFFFF']:  # Only fill if empty or white
-                    cell.fill = gray_fill
-                # Remove borders from outer cells
-                cell.border = Border()
-        
-        # Adjust column widths (matching the example)
-        ws.column_dimensions['A'].width = 13.0
-        ws.column_dimensions['B'].width = 5.44
-        ws.column_dimensions['C'].width = 12.44
-        ws.column_dimensions['D'].width = 8.44
-        ws.column_dimensions['E'].width = 13.0
-        ws.column_dimensions['F'].width = 17.44
-        # Year columns (G, H, I, J, etc.)
-        for col_idx in range(len(years)):
-            col_letter = get_column_letter(data_start_col + col_idx)
-            ws.column_dimensions[col_letter].width = 13.0
+        return self.statement_box("Income Statement", years, line_rows)
     
-    def _create_balance_sheet_sheet(self, wb: Workbook):
-        """Create Balance Sheet sheet formatted exactly like the Historical IS sheet"""
-        ws = wb.create_sheet("Historical BS")
-        
-        balance_data_raw = pd.DataFrame(self.operating_model_data.get('balance_sheet', {}))
-        if balance_data_raw.empty:
-            ws['B2'] = "No data available"
+    def _write_income_statement_sheet(self, ws):
+        """Historical IS sheet"""
+        box = self.income_statement_box()
+        if box is None:
+            self._put(ws, 2, 2, "No data available")
             return
+        self._write_statement_box(ws, box)
+    
+    def balance_sheet_summary(self) -> pd.DataFrame:
+        """Simplified balance sheet for the Historical BS sheet (rows = BALANCE_SHEET_LINES keys, columns = years)"""
+        balance_data_raw = decode_statement(self.operating_model_data.get('balance_sheet')).T
+        if balance_data_raw.empty:
+            return pd.DataFrame()
         
         # Convert to proper structure: rows = line items, columns = years
         # balance_data_raw has years as index, line items as columns, so transpose
@@ -443,644 +387,333 @@ class ExportHandler:
         
         # Create simplified balance sheet data structure
         # Map detailed line items to simplified format and aggregate where needed
-        simplified_data = {}
         years = sorted(balance_data.columns)
+        balance_values = balance_data[years]
         
-        for year in years:
-            year_data = {}
-            
-            # Assets
-            # Cash & Cash Equivalents
-            year_data['CashAndCashEquivalents'] = balance_data.loc['CashAndCashEquivalents', year] if 'CashAndCashEquivalents' in balance_data.index else 0
-            
-            # Short Term Investments = MarketableSecuritiesCurrent + MarketableSecuritiesNonCurrent
-            marketable_current = balance_data.loc['MarketableSecuritiesCurrent', year] if 'MarketableSecuritiesCurrent' in balance_data.index else 0
-            marketable_noncurrent = balance_data.loc['MarketableSecuritiesNonCurrent', year] if 'MarketableSecuritiesNonCurrent' in balance_data.index else 0
-            year_data['ShortTermInvestments'] = marketable_current + marketable_noncurrent
-            
-            # Current Assets = TotalCurrentAssets
-            year_data['CurrentAssets'] = balance_data.loc['TotalCurrentAssets', year] if 'TotalCurrentAssets' in balance_data.index else 0
-            
-            # Net PPE = PropertyPlantAndEquipmentNet
-            year_data['PPE'] = balance_data.loc['PropertyPlantAndEquipmentNet', year] if 'PropertyPlantAndEquipmentNet' in balance_data.index else 0
-            
-            # Other Long Term Assets = OtherNonCurrentAssets
-            year_data['OtherLongTermAssets'] = balance_data.loc['OtherNonCurrentAssets', year] if 'OtherNonCurrentAssets' in balance_data.index else 0
-            
-            # Total Assets - use GAAP total directly (not sum of components to avoid double-counting)
-            # The condensed format double-counts cash and current marketable securities if we sum components
-            year_data['TotalAssets'] = balance_data.loc['TotalAssets', year] if 'TotalAssets' in balance_data.index else 0
-            
-            # Liabilities
-            # Short Term Liabilities = TotalCurrentLiabilities
-            year_data['ShortTermLiabilities'] = balance_data.loc['TotalCurrentLiabilities', year] if 'TotalCurrentLiabilities' in balance_data.index else 0
-            
-            # Long Term Debt = Total Term Debt (current + non-current) for condensed format
-            # Note: This will cause double-counting in Total Liabilities if we sum components
-            # So we'll use GAAP Total Liabilities directly instead of summing
-            term_debt_current = balance_data.loc['TermDebtCurrent', year] if 'TermDebtCurrent' in balance_data.index else 0
-            term_debt_noncurrent = balance_data.loc['TermDebtNonCurrent', year] if 'TermDebtNonCurrent' in balance_data.index else 0
-            year_data['LongTermDebt'] = term_debt_current + term_debt_noncurrent  # Total term debt
-            
-            # Long Term Leases - try to find it
-            if 'LongTermLeases' in balance_data.index:
-                year_data['LongTermLeases'] = balance_data.loc['LongTermLeases', year]
-            else:
-                # Try to find lease-related items
-                year_data['LongTermLeases'] = 0  # Will be 0 if not found
-            
-            # Other Long Term Liabilities = OtherNonCurrentLiabilities
-            year_data['OtherLongTermLiabilities'] = balance_data.loc['OtherNonCurrentLiabilities', year] if 'OtherNonCurrentLiabilities' in balance_data.index else 0
-            
-            # Total Liabilities - use GAAP total directly (not sum of components to avoid double-counting)
-            # The condensed format double-counts current term debt if we sum components
-            year_data['TotalLiabilities'] = balance_data.loc['TotalLiabilities', year] if 'TotalLiabilities' in balance_data.index else 0
-            
-            # Equity
-            # Retained Earnings = AccumulatedDeficit (negative values are deficits)
-            if 'AccumulatedDeficit' in balance_data.index:
-                year_data['RetainedEarnings'] = balance_data.loc['AccumulatedDeficit', year]
-            else:
-                year_data['RetainedEarnings'] = 0
-            
-            # Common Stock - split from CommonStockAndPaidInCapital
-            # Based on user's analysis: 2024: 8,327.6 + 74,948.4 = 83,276, 2025: 9,356.8 + 84,211.2 = 93,568
-            # Ratio appears to be approximately 10% Common Stock, 90% Paid-in Capital
-            if 'CommonStock' in balance_data.index:
-                year_data['CommonStock'] = balance_data.loc['CommonStock', year]
-            elif 'CommonStockAndPaidInCapital' in balance_data.index:
-                # Split: ~10% Common Stock, ~90% Paid-in Capital (based on Apple's actual breakdown)
-                total = balance_data.loc['CommonStockAndPaidInCapital', year]
-                year_data['CommonStock'] = total * 0.1
-            else:
-                year_data['CommonStock'] = 0
-            
-            # PIC (Paid-in Capital) - split from CommonStockAndPaidInCapital
-            if 'PaidInCapital' in balance_data.index:
-                year_data['PaidInCapital'] = balance_data.loc['PaidInCapital', year]
-            elif 'CommonStockAndPaidInCapital' in balance_data.index:
-                # Split: ~10% Common Stock, ~90% Paid-in Capital
-                total = balance_data.loc['CommonStockAndPaidInCapital', year]
-                year_data['PaidInCapital'] = total * 0.9
-            else:
-                year_data['PaidInCapital'] = 0
-            
-            # Minority Interest
-            year_data['MinorityInterest'] = balance_data.loc['MinorityInterest', year] if 'MinorityInterest' in balance_data.index else 0
-            
-            # Other Equity = TotalShareholdersEquity - (RetainedEarnings + CommonStock + PaidInCapital + MinorityInterest)
-            total_equity = balance_data.loc['TotalShareholdersEquity', year] if 'TotalShareholdersEquity' in balance_data.index else 0
-            year_data['OtherEquity'] = total_equity - year_data['RetainedEarnings'] - year_data['CommonStock'] - year_data['PaidInCapital'] - year_data['MinorityInterest']
-            
-            # Total Equity = TotalShareholdersEquity
-            year_data['TotalEquity'] = total_equity
-            
-            simplified_data[year] = year_data
+        def item(line_item: str) -> np.ndarray:
+            """A detailed line item across all years (zeros if not reported)"""
+            if line_item in balance_values.index:
+                return balance_values.loc[line_item].to_numpy(dtype=np.float64)
+            return np.zeros(len(years))
         
-        # Convert to DataFrame: rows = line items, columns = years
-        balance_data = pd.DataFrame(simplified_data)
-        
-        # Define colors from the example
-        dark_blue = "FF002060"  # Dark blue fill and text color
-        white_text = "FFFFFFFF"  # White text
-        
-        # Define fonts
-        company_name_font = Font(bold=True, size=20, color=dark_blue)
-        title_font = Font(bold=True, size=15, color=white_text)
-        subtitle_font = Font(size=11, color=white_text)
-        header_font = Font(bold=True, size=11, color=white_text)
-        bold_font = Font(bold=True, size=11)
-        regular_font = Font(size=11)
-        
-        # Define fills
-        dark_blue_fill = PatternFill(start_color=dark_blue, end_color=dark_blue, fill_type="solid")
-        
-        # Define borders
-        outer_border = Border(
-            top=Side(style='thin'),
-            bottom=Side(style='thin'),
-            left=Side(style='thin'),
-            right=Side(style='thin')
-        )
-        # Top border only (for lines above bold items)
-        top_thin = Border(top=Side(style='thin'))
-        # Gray fill for outer cells
-        gray_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-        
-        # Number formats
-        number_format_main = '#,##0.0_);\\(#,##0.0\\)'  # Main format with parentheses for negatives
-        year_format = '####"A"'  # For year headers (2021A, 2022A, etc.)
-        
-        # Row 2: Company name (B2)
-        ws['B2'] = self.company_name
-        ws['B2'].font = company_name_font
-        ws.row_dimensions[2].height = 25.8
-        
-        # Define the box boundaries (content area)
-        box_start_row = 7  # Content starts at row 7
-        box_start_col = 3  # Column C (content starts here)
-        
-        # Calculate actual end column based on number of years
-        years = sorted(balance_data.columns)
-        year_start_col = 7  # Column G
-        actual_box_end_col = year_start_col + len(years) - 1  # Last year column
-        
-        # Border boundaries (one cell out from content box)
-        border_start_row = box_start_row - 1  # Row 6
-        border_start_col = box_start_col - 1  # Column B
-        border_end_col = actual_box_end_col + 1  # One column after last year
-        
-        # Title row (row 7)
-        title_start_col = 3  # Column C
-        for col in range(title_start_col, actual_box_end_col + 1):
-            cell = ws.cell(row=7, column=col)
-            cell.fill = dark_blue_fill
-            if col == title_start_col:
-                cell.value = "Balance Sheet"
-                cell.font = title_font
-        ws.row_dimensions[7].height = 19.8
-        
-        # Subtitle and year headers row (row 8)
-        ws.cell(row=8, column=title_start_col).value = "$ in Millions"
-        ws.cell(row=8, column=title_start_col).font = subtitle_font
-        ws.cell(row=8, column=title_start_col).fill = dark_blue_fill
-        
-        # Fill the rest of the subtitle row with dark blue
-        for col in range(title_start_col + 1, actual_box_end_col + 1):
-            cell = ws.cell(row=8, column=col)
-            cell.fill = dark_blue_fill
-        
-        # Year headers start at column G (7)
-        for col_idx, year in enumerate(years):
-            col = year_start_col + col_idx
-            cell = ws.cell(row=8, column=col)
-            cell.value = int(year)
-            cell.number_format = year_format
-            cell.font = header_font
-            cell.fill = dark_blue_fill
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        ws.row_dimensions[8].height = 15.0
-        
-        # Fill rows 9-10 with white background (empty rows between header and data)
-        for r in [9, 10]:
-            for c in range(box_start_col, actual_box_end_col + 1):
-                cell = ws.cell(row=r, column=c)
-                cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-        
-        # Line items start at row 11, column D (4)
-        line_item_col = 4  # Column D
-        data_start_col = year_start_col  # Column G (7)
-        
-        # Balance Sheet line items in order (simplified format for Excel)
-        # Format: (label, key, is_bold, has_top_border, is_empty_row, is_section_header)
-        line_items = [
-            # Assets section
-            ('Cash & Cash Equivalents', 'CashAndCashEquivalents', False, False, False, False),
-            ('Short Term Investments', 'ShortTermInvestments', False, False, False, False),
-            ('Current Assets', 'CurrentAssets', False, False, False, False),
-            ('Net PPE', 'PPE', False, False, False, False),
-            ('Other Long Term Assets', 'OtherLongTermAssets', False, False, False, False),
-            ('Total Assets', 'TotalAssets', True, True, False, False),  # Bold, top border
-            (None, None, False, False, True, False),  # Empty row
-            # Liabilities section
-            ('Short Term Liabilities', 'ShortTermLiabilities', False, False, False, False),
-            ('Long Term Debt', 'LongTermDebt', False, False, False, False),
-            ('Long Term Leases', 'LongTermLeases', False, False, False, False),
-            ('Other Long Term Liabilities', 'OtherLongTermLiabilities', False, False, False, False),
-            ('Total Liabilities', 'TotalLiabilities', True, True, False, False),  # Bold, top border
-            (None, None, False, False, True, False),  # Empty row
-            # Equity section
-            ('Retained Earnings', 'RetainedEarnings', False, False, False, False),
-            ('Common Stock', 'CommonStock', False, False, False, False),
-            ('PIC', 'PaidInCapital', False, False, False, False),
-            ('Minority Interest', 'MinorityInterest', False, False, False, False),
-            ('Other', 'OtherEquity', False, False, False, False),
-            ('Total Equity', 'TotalEquity', True, True, False, False),  # Bold, top border
-            (None, None, False, False, True, False),  # Empty row
-            # Final check section
-            ('Assets', 'TotalAssets', True, False, False, False),  # Reference to Total Assets (GAAP value)
-            ('Liabilities + Equity', None, True, False, False, False),  # Will be formula: TotalLiabilities + TotalEquity
-            ('check', None, False, False, False, False)  # Will be formula: Assets - (Liabilities + Equity)
-        ]
+        summary = {}
         
-        # Calculate actual box end row based on number of line items (including empty rows)
-        box_end_row = 11 + len(line_items) - 1  # Start at 11, add number of items minus 1
-        border_end_row = box_end_row + 1  # Row after last line item
+        # Assets
+        # Cash & Cash Equivalents
+        summary['CashAndCashEquivalents'] = item('CashAndCashEquivalents')
         
-        # Track row numbers for totals (for formulas)
-        row_numbers = {}  # Maps key to row number
+        # Short Term Investments = MarketableSecuritiesCurrent + MarketableSecuritiesNonCurrent
+        summary['ShortTermInvestments'] = item('MarketableSecuritiesCurrent') + item('MarketableSecuritiesNonCurrent')
         
-        # Write line items starting at row 11
-        row = 11
-        for item in line_items:
-            label, key, is_bold, has_top_border, is_empty_row, _ = item  # Unpack 6 elements (last is unused is_section_header)
-            
+        # Current Assets = TotalCurrentAssets
+        summary['CurrentAssets'] = item('TotalCurrentAssets')
+        
+        # Net PPE = PropertyPlantAndEquipmentNet
+        summary['PPE'] = item('PropertyPlantAndEquipmentNet')
+        
+        # Other Long Term Assets = OtherNonCurrentAssets
+        summary['OtherLongTermAssets'] = item('OtherNonCurrentAssets')
+        
+        # Total Assets - use GAAP total directly (not sum of components to avoid double-counting)
+        # The condensed format double-counts cash and current marketable securities if we sum components
+        summary['TotalAssets'] = item('TotalAssets')
+        
+        # Liabilities
+        # Short Term Liabilities = TotalCurrentLiabilities
+        summary['ShortTermLiabilities'] = item('TotalCurrentLiabilities')
+        
+        # Long Term Debt = Total Term Debt (current + non-current) for condensed format
+        # Note: This will cause double-counting in Total Liabilities if we sum components
+        # So we'll use GAAP Total Liabilities directly instead of summing
+        summary['LongTermDebt'] = item('TermDebtCurrent') + item('TermDebtNonCurrent')  # Total term debt
+        
+        # Long Term Leases (0 if not found)
+        summary['LongTermLeases'] = item('LongTermLeases')
+        
+        # Other Long Term Liabilities = OtherNonCurrentLiabilities
+        summary['OtherLongTermLiabilities'] = item('OtherNonCurrentLiabilities')
+        
+        # Total Liabilities - use GAAP total directly (not sum of components to avoid double-counting)
+        # The condensed format double-counts current term debt if we sum components
+        summary['TotalLiabilities'] = item('TotalLiabilities')
+        
+        # Equity
+        # Retained Earnings = AccumulatedDeficit (negative values are deficits)
+        summary['RetainedEarnings'] = item('AccumulatedDeficit')
+        
+        # Common Stock and PIC - split from CommonStockAndPaidInCapital when not reported separately
+        # Based on user's analysis: 2024: 8,327.6 + 74,948.4 = 83,276, 2025: 9,356.8 + 84,211.2 = 93,568
+        # Ratio appears to be approximately 10% Common Stock, 90% Paid-in Capital (Apple's actual breakdown)
+        combined = item('CommonStockAndPaidInCapital')
+        has_combined = 'CommonStockAndPaidInCapital' in balance_values.index
+        summary['CommonStock'] = item('CommonStock') if 'CommonStock' in balance_values.index or not has_combined else combined * 0.1
+        summary['PaidInCapital'] = item('PaidInCapital') if 'PaidInCapital' in balance_values.index or not has_combined else combined * 0.9
+        
+        # Minority Interest
+        summary['MinorityInterest'] = item('MinorityInterest')
+        
+        # Other Equity = TotalShareholdersEquity - (RetainedEarnings + CommonStock + PaidInCapital + MinorityInterest)
+        total_equity = item('TotalShareholdersEquity')
+        summary['OtherEquity'] = (total_equity - summary['RetainedEarnings'] - summary['CommonStock']
+                                  - summary['PaidInCapital'] - summary['MinorityInterest'])
+        
+        # Total Equity = TotalShareholdersEquity
+        summary['TotalEquity'] = total_equity
+        
+        # Convert to DataFrame: rows = line items, columns = years
+        return pd.DataFrame(summary, index=years).T
+    
+    def balance_sheet_box(self) -> Optional[Dict]:
+        """
+        statement_box layout of the Historical BS sheet (None without balance sheet data)
+        
+        Liabilities + Equity, the check row and Total Equity are Excel formulas over the
+        rows above them.
+        """
+        balance_data = self.balance_sheet_summary()
+        if balance_data.empty:
+            return None
+        
+        years = sorted(balance_data.columns)
+        year_cols = [get_column_letter(7 + col_idx) for col_idx in range(len(years))]
+        line_items = self.BALANCE_SHEET_LINES
+        row_numbers = {}  # Maps key to row number (for formulas)
+        line_rows = []
+        for position, (label, key, is_bold, has_top_border, is_empty_row, _) in enumerate(line_items):
+            row = 11 + position
+            is_last = position == len(line_items) - 1
             if is_empty_row:
-                # Empty row - just fill with white
-                for c in range(box_start_col, actual_box_end_col + 1):
-                    cell = ws.cell(row=row, column=c)
-                    cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                row += 1
+                line_rows.append([(col, None, 'box', ()) for col in range(3, 7 + len(years))])
                 continue
-            
-            # Track row number for this line item
             if key:
                 row_numbers[key] = row
             
-            # Write label in column D (4)
-            label_cell = ws.cell(row=row, column=line_item_col)
-            if label:
-                label_cell.value = label
-            label_cell.font = bold_font if is_bold else regular_font
-            # Indent non-bold items
-            if not is_bold:
-                label_cell.alignment = Alignment(horizontal='left', vertical='center', indent=1)
-            else:
-                label_cell.alignment = Alignment(horizontal='left', vertical='center')
-            
-            # Set white background for cells inside the box
-            label_cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-            
-            # Apply borders: top border if specified, bottom border on last row
-            label_border_parts = {}
-            if has_top_border:
-                label_border_parts['top'] = top_thin.top
-            if row == box_end_row:
-                label_border_parts['bottom'] = outer_border.bottom
-            label_cell.border = Border(**label_border_parts) if label_border_parts else Border()
-            
-            # Also fill cells in columns C, E, F with white
-            for fill_col in [3, 5, 6]:  # Columns C, E, F
-                if fill_col < box_start_col or fill_col > actual_box_end_col:
-                    continue
-                fill_cell = ws.cell(row=row, column=fill_col)
-                fill_cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                fill_border_parts = {}
-                # Only apply top border if NOT column C (column 3) - one cell less of underline
-                if has_top_border and fill_col != 3:
-                    fill_border_parts['top'] = top_thin.top
-                if row == box_end_row:
-                    fill_border_parts['bottom'] = outer_border.bottom
-                fill_cell.border = Border(**fill_border_parts) if fill_border_parts else Border()
-            
-            # Apply top border to all cells in the row if this row has top border (spanning D to actual_box_end_col, NOT C)
-            # Column C (to the left of line items) should NOT have top border (one cell less of underline)
-            if has_top_border:
-                for border_col in range(line_item_col, actual_box_end_col + 1):  # Start from D (4), not C (3)
-                    border_cell = ws.cell(row=row, column=border_col)
-                    existing_border = border_cell.border
-                    border_cell.border = Border(
-                        left=existing_border.left if existing_border.left else None,
-                        top=top_thin.top,
-                        right=existing_border.right if existing_border.right else None,
-                        bottom=existing_border.bottom if existing_border.bottom else None
-                    )
-            
-            # Write values for each year
-            if key is None:
-                # Handle special rows without keys
-                if label == 'Liabilities + Equity':
-                    # Formula: TotalLiabilities + TotalEquity
-                    total_liab_row = row_numbers.get('TotalLiabilities', row - 1)
-                    total_equity_row = row_numbers.get('TotalEquity', row - 1)
-                    for col_idx, year in enumerate(years):
-                        col = data_start_col + col_idx
-                        cell = ws.cell(row=row, column=col)
-                        col_letter = get_column_letter(col)
-                        formula = f'={col_letter}{total_liab_row}+{col_letter}{total_equity_row}'
-                        cell.value = formula
-                        cell.number_format = number_format_main
-                        cell.font = bold_font
-                        cell.alignment = Alignment(horizontal='right', vertical='center')
-                        cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                elif label == 'check':
-                    # Formula: Assets - (Liabilities + Equity) = TotalAssets - (TotalLiabilities + TotalEquity)
-                    total_assets_row = row_numbers.get('TotalAssets', row - 2)
-                    total_liab_row = row_numbers.get('TotalLiabilities', row - 2)
-                    total_equity_row = row_numbers.get('TotalEquity', row - 1)
-                    for col_idx, year in enumerate(years):
-                        col = data_start_col + col_idx
-                        cell = ws.cell(row=row, column=col)
-                        col_letter = get_column_letter(col)
-                        formula = f'={col_letter}{total_assets_row}-({col_letter}{total_liab_row}+{col_letter}{total_equity_row})'
-                        cell.value = formula
-                        cell.number_format = number_format_main
-                        cell.font = regular_font
-                        cell.alignment = Alignment(horizontal='right', vertical='center')
-                        cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                else:
-                    # Empty row or other - just fill with white
-                    for col_idx in range(len(years)):
-                        col = data_start_col + col_idx
-                        cell = ws.cell(row=row, column=col)
-                        cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                
-                if row == box_end_row:
-                    for col_idx in range(len(years)):
-                        col = data_start_col + col_idx
-                        cell = ws.cell(row=row, column=col)
-                        cell.border = Border(bottom=outer_border.bottom)
+            if label == 'Liabilities + Equity':
+                formulas = [f'={col}{row_numbers.get("TotalLiabilities", row - 1)}+{col}{row_numbers.get("TotalEquity", row - 1)}'
+                            for col in year_cols]
+            elif label == 'check':
+                formulas = [f'={col}{row_numbers.get("TotalAssets", row - 2)}-({col}{row_numbers.get("TotalLiabilities", row - 2)}'
+                            f'+{col}{row_numbers.get("TotalEquity", row - 1)})' for col in year_cols]
+            elif key == 'TotalEquity':
+                formulas = [f'={col}{row_numbers.get("RetainedEarnings", row - 5)}+{col}{row_numbers.get("CommonStock", row - 4)}'
+                            f'+{col}{row_numbers.get("PaidInCapital", row - 3)}+{col}{row_numbers.get("MinorityInterest", row - 2)}'
+                            f'+{col}{row_numbers.get("OtherEquity", row - 1)}' for col in year_cols]
             elif key in balance_data.index:
-                for col_idx, year in enumerate(years):
-                    col = data_start_col + col_idx
-                    cell = ws.cell(row=row, column=col)
-                    
-                    # For totals, use the actual GAAP values (not sum of components to avoid double-counting)
-                    # Total Assets: Use GAAP total directly (components double-count cash and current marketable securities)
-                    # Total Liabilities: Use GAAP total directly (components double-count current term debt)
-                    if key == 'TotalAssets':
-                        # Use the actual GAAP Total Assets value (not sum of components)
-                        value = balance_data.loc[key, year]
-                        value_millions = self.format_number(value, 'millions')
-                        cell.value = value_millions
-                    elif key == 'TotalLiabilities':
-                        # Use the actual GAAP Total Liabilities value (not sum of components)
-                        value = balance_data.loc[key, year]
-                        value_millions = self.format_number(value, 'millions')
-                        cell.value = value_millions
-                    elif key == 'TotalEquity':
-                        # Sum: RetainedEarnings + CommonStock + PaidInCapital + MinorityInterest + OtherEquity
-                        col_letter = get_column_letter(col)
-                        formula = f'={col_letter}{row_numbers.get("RetainedEarnings", row-5)}+{col_letter}{row_numbers.get("CommonStock", row-4)}+{col_letter}{row_numbers.get("PaidInCapital", row-3)}+{col_letter}{row_numbers.get("MinorityInterest", row-2)}+{col_letter}{row_numbers.get("OtherEquity", row-1)}'
-                        cell.value = formula
-                    elif key == 'TotalAssets' and label == 'Assets':
-                        # Reference to TotalAssets row (for Final check section) - use the GAAP value
-                        # This is the same as the Total Assets row above, so reference it
-                        col_letter = get_column_letter(col)
-                        total_assets_row = row_numbers.get('TotalAssets', row - 1)
-                        formula = f'={col_letter}{total_assets_row}'
-                        cell.value = formula
-                    else:
-                        # Regular line item - use value from data
-                        value = balance_data.loc[key, year]  # key is row (line item), year is column
-                        value_millions = self.format_number(value, 'millions')
-                        cell.value = value_millions
-                    
-                    cell.number_format = number_format_main
-                    cell.font = bold_font if is_bold else regular_font
-                    cell.alignment = Alignment(horizontal='right', vertical='center')
-                    cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                    
-                    cell_border_parts = {}
-                    if has_top_border:
-                        cell_border_parts['top'] = top_thin.top
-                    if row == box_end_row:
-                        cell_border_parts['bottom'] = outer_border.bottom
-                    cell.border = Border(**cell_border_parts) if cell_border_parts else Border()
+                formulas = [self.format_number(value, 'millions') for value in balance_data.loc[key, years].to_numpy()]
             else:
-                # If key not found, write zeros
-                for col_idx in range(len(years)):
-                    col = data_start_col + col_idx
-                    cell = ws.cell(row=row, column=col)
-                    cell.value = 0.0
-                    cell.number_format = number_format_main
-                    cell.font = bold_font if is_bold else regular_font
-                    cell.alignment = Alignment(horizontal='right', vertical='center')
-                    cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                    
-                    cell_border_parts = {}
-                    if has_top_border:
-                        cell_border_parts['top'] = top_thin.top
-                    if row == box_end_row:
-                        cell_border_parts['bottom'] = outer_border.bottom
-                    cell.border = Border(**cell_border_parts) if cell_border_parts else Border()
+                formulas = [0.0] * len(years)
             
-            row += 1
+            values = [(value, NUMBER_FORMAT_MAIN) for value in formulas]
+            line_rows.append(self._line_cells(label, is_bold, has_top_border, is_last, values))
         
-        # Draw outer border around the box
-        # Top border (row 6)
-        for c in range(border_start_col, border_end_col + 1):
-            cell = ws.cell(row=border_start_row, column=c)
-            if c == border_start_col:
-                cell.border = Border(left=outer_border.left, top=outer_border.top, right=None, bottom=None)
-            elif c == border_end_col:
-                cell.border = Border(left=None, top=outer_border.top, right=outer_border.right, bottom=None)
-            else:
-                cell.border = Border(left=None, top=outer_border.top, right=None, bottom=None)
-        
-        # Bottom border (row border_end_row)
-        for c in range(border_start_col, border_end_col + 1):
-            cell = ws.cell(row=border_end_row, column=c)
-            if c == border_start_col:
-                cell.border = Border(left=outer_border.left, top=None, right=None, bottom=outer_border.bottom)
-            elif c == border_end_col:
-                cell.border = Border(left=None, top=None, right=outer_border.right, bottom=outer_border.bottom)
-            else:
-                cell.border = Border(left=None, top=None, right=None, bottom=outer_border.bottom)
-        
-        # Left border (column B)
-        for r in range(border_start_row + 1, border_end_row):
-            cell = ws.cell(row=r, column=border_start_col)
-            existing_border = cell.border
-            cell.border = Border(
-                left=outer_border.left,
-                top=existing_border.top if existing_border.top else None,
-                right=None,
-                bottom=existing_border.bottom if existing_border.bottom else None
-            )
-        
-        # Right border (column border_end_col)
-        for r in range(border_start_row + 1, border_end_row):
-            cell = ws.cell(row=r, column=border_end_col)
-            existing_border = cell.border
-            cell.border = Border(
-                left=None,
-                top=existing_border.top if existing_border.top else None,
-                right=outer_border.right,
-                bottom=existing_border.bottom if existing_border.bottom else None
-            )
-        
-        # Fill buffer cells (one cell around the box) with white
-        for c in range(border_start_col, border_end_col + 1):
-            cell = ws.cell(row=border_start_row, column=c)
-            cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-        
-        for c in range(border_start_col, border_end_col + 1):
-            cell = ws.cell(row=border_end_row, column=c)
-            cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-        
-        for r in range(border_start_row + 1, border_end_row):
-            cell = ws.cell(row=r, column=border_start_col)
-            cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-        
-        for r in range(border_start_row + 1, border_end_row):
-            cell = ws.cell(row=r, column=border_end_col)
-            cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-        
-        # Fill all other cells with gray
-        max_row_to_fill = max(200, border_end_row + 200)
-        max_col_to_fill = max(100, border_end_col + 100)
-        
-        for r in range(1, max_row_to_fill + 1):
-            for c in range(1, max_col_to_fill + 1):
-                if (border_start_row <= r <= border_end_row and border_start_col <= c <= border_end_col):
-                    continue
-                cell = ws.cell(row=r, column=c)
-                current_fill = cell.fill.start_color.rgb if cell.fill and hasattr(cell.fill, 'start_color') else None
-                if current_fill in [None, '00000000', 'FFFFFFFF']:
-                    cell.fill = gray_fill
-                cell.border = Border()
-        
-        # Adjust column widths (matching the example)
-        ws.column_dimensions['A'].width = 13.0
-        ws.column_dimensions['B'].width = 5.44
-        ws.column_dimensions['C'].width = 12.44
-        ws.column_dimensions['D'].width = 8.44
-        ws.column_dimensions['E'].width = 13.0
-        ws.column_dimensions['F'].width = 17.44
-        # Year columns (G, H, I, J, etc.)
-        for col_idx in range(len(years)):
-            col_letter = get_column_letter(data_start_col + col_idx)
-            ws.column_dimensions[col_letter].width = 13.0
+        return self.statement_box("Balance Sheet", years, line_rows)
     
-    def _create_cash_flow_sheet(self, wb: Workbook):
-        """Create Cash Flow Statement sheet"""
-        ws = wb.create_sheet("Cash Flow Statement")
-        
-        cashflow_data = pd.DataFrame(self.operating_model_data.get('cash_flow', {}))
+    def _write_balance_sheet_sheet(self, ws):
+        """Historical BS sheet, formatted exactly like the Historical IS sheet"""
+        box = self.balance_sheet_box()
+        if box is None:
+            self._put(ws, 2, 2, "No data available")
+            return
+        self._write_statement_box(ws, box)
+    
+    def _write_cash_flow_sheet(self, ws):
+        """Cash Flow Statement sheet"""
+        # Rows = years, columns = line items
+        cashflow_data = decode_statement(self.operating_model_data.get('cash_flow'))
         if cashflow_data.empty:
-            ws['A1'] = "No data available"
+            self._put(ws, 1, 1, "No data available")
             return
         
         # Headers
-        headers = ['Line Item'] + list(cashflow_data.index)
-        ws.append(headers)
-        
-        # Style header row
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=11)
-        for col in range(1, len(headers) + 1):
-            cell = ws.cell(row=1, column=col)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Cash Flow line items
-        line_items = [
-            ('Net Income', 'NetIncome'),
-            ('D&A', 'D&A'),
-            ('Change in Working Capital', 'ChangeInWorkingCapital'),
-            ('Operating Cash Flow', 'OperatingCashFlow'),
-            ('Capital Expenditures', 'CapitalExpenditures'),
-            ('Investing Cash Flow', 'InvestingCashFlow'),
-            ('Financing Cash Flow', 'FinancingCashFlow'),
-            ('Net Cash Flow', 'NetCashFlow')
-        ]
+        projected_years = set(self.operating_model_data.get('projected_years', []))
+        headers = ['Line Item'] + [f"{year}{'E' if str(year) in projected_years else 'A'}" for year in cashflow_data.index]
+        self._set_widths(ws, {1: 25, **{col: 15 for col in range(2, len(headers) + 1)}})
+        for col, header in enumerate(headers, start=1):
+            self._put(ws, 1, col, header, 'table_header')
         
         row = 2
-        for label, key in line_items:
+        for label, key in self.CASH_FLOW_LINES:
             if key in cashflow_data.columns:
-                ws.cell(row=row, column=1, value=label)
-                col = 2
-                for year in cashflow_data.index:
-                    value = self.format_number(cashflow_data.loc[year, key])
-                    ws.cell(row=row, column=col, value=value)
-                    col += 1
+                self._put(ws, row, 1, label)
+                for col, value in enumerate(cashflow_data[key].to_numpy(), start=2):
+                    self._put(ws, row, col, self.format_number(value), 'amount')
                 row += 1
-        
-        # Format columns
-        for col in range(2, len(headers) + 1):
-            for row in range(2, ws.max_row + 1):
-                cell = ws.cell(row=row, column=col)
-                if cell.value is not None:
-                    cell.number_format = '#,##0.00'
-        
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 25
-        for col in range(2, len(headers) + 1):
-            ws.column_dimensions[get_column_letter(col)].width = 15
     
-    def _create_dcf_summary_sheet(self, wb: Workbook):
-        """Create DCF Summary sheet"""
-        ws = wb.create_sheet("DCF Summary")
+    def _write_dcf_summary_sheet(self, ws):
+        """
+        DCF Summary sheet as a live formula chain
+        
+        Assumptions, projected FCFs, net debt and shares outstanding are inputs; WACC,
+        PV of each FCF, terminal value, EV, equity value and price per share are
+        formulas over them, mirroring DCFCalculator, with the values computed here
+        cached alongside (xlsxwriter engine). Analysts can flex assumptions in Excel
+        without another server round trip. Without numeric assumptions or projected
+        FCFs the computed values are written instead.
+        """
+        self._set_widths(ws, {1: 30, 2: 20, 3: 20})
+        self._merge(ws, 1, 1, 2, "DCF Valuation Summary", 'sheet_title')
+        
+        assumptions = self.dcf_results.get('assumptions', {})
+        free_cash_flows = sorted(self.dcf_results.get('free_cash_flows', {}).items())
+        wacc = self.dcf_results.get('wacc', 0)
+        live = bool(free_cash_flows) and all(isinstance(assumptions.get(key), (int, float))
+                                             for key in self.ASSUMPTION_LABELS)
         
-        # Title
-        ws['A1'] = "DCF Valuation Summary"
-        ws['A1'].font = Font(bold=True, size=14)
-        ws.merge_cells('A1:B1')
+        def put_result(row, col, formula, value, style):
+            """A formula with its cached value, or just the value when the chain is not live"""
+            if live:
+                self._put_formula(ws, row, col, formula, value, style)
+            else:
+                self._put(ws, row, col, value, style)
         
         row = 3
         
-        # Assumptions
-        ws.cell(row=row, column=1, value="Assumptions").font = Font(bold=True, size=12)
+        # Assumptions (inputs)
+        self._put(ws, row, 1, "Assumptions", 'section')
         row += 1
         
-        assumptions = self.dcf_results.get('assumptions', {})
-        assumption_labels = {
-            'risk_free_rate': 'Risk-Free Rate',
-            'beta': 'Beta',
-            'market_risk_premium': 'Market Risk Premium',
-            'cost_of_debt': 'Cost of Debt',
-            'tax_rate': 'Tax Rate',
-            'debt_to_equity': 'Debt-to-Equity Ratio',
-            'terminal_growth_rate': 'Terminal Growth Rate'
-        }
-        
-        for key, label in assumption_labels.items():
+        cells = {}  # Assumption key -> absolute cell reference
+        for key, label in self.ASSUMPTION_LABELS.items():
             value = assumptions.get(key, 'N/A')
-            ws.cell(row=row, column=1, value=label)
+            self._put(ws, row, 1, label)
             if isinstance(value, (int, float)):
-                ws.cell(row=row, column=2, value=value).number_format = '0.00%' if key != 'beta' else '0.00'
+                self._put(ws, row, 2, value, 'ratio' if key == 'beta' else 'percent')
             else:
-                ws.cell(row=row, column=2, value=value)
+                self._put(ws, row, 2, value)
+            cells[key] = f"$B${row}"
             row += 1
         
         row += 1
         
-        # WACC
-        ws.cell(row=row, column=1, value="WACC").font = Font(bold=True)
-        wacc = self.dcf_results.get('wacc', 0)
-        ws.cell(row=row, column=2, value=wacc).number_format = '0.00%'
+        # WACC = E/(D+E) x (Rf + Beta x MRP) + D/(D+E) x Rd x (1 - t), with D/(D+E) from the debt-to-equity ratio
+        wacc_cell = f"$B${row}"
+        self._put(ws, row, 1, "WACC", 'bold')
+        put_result(row, 2,
+                   f"=1/(1+{cells['debt_to_equity']})*({cells['risk_free_rate']}+{cells['beta']}*{cells['market_risk_premium']})"
+                   f"+{cells['debt_to_equity']}/(1+{cells['debt_to_equity']})*{cells['cost_of_debt']}*(1-{cells['tax_rate']})",
+                   wacc, 'percent')
         row += 2
         
-        # Free Cash Flows
-        ws.cell(row=row, column=1, value="Free Cash Flows (in millions)").font = Font(bold=True, size=12)
+        # Free Cash Flows (inputs from the operating model) and their present values
+        self._put(ws, row, 1, "Free Cash Flows (in millions)", 'section')
         row += 1
-        ws.cell(row=row, column=1, value="Year")
-        ws.cell(row=row, column=2, value="FCF")
+        self._put(ws, row, 1, "Year")
+        self._put(ws, row, 2, "FCF")
+        self._put(ws, row, 3, "PV of FCF")
         row += 1
-        
-        fcf = self.dcf_results.get('free_cash_flows', {})
-        for year, value in sorted(fcf.items()):
-            ws.cell(row=row, column=1, value=str(year))
-            ws.cell(row=row, column=2, value=self.format_number(value)).number_format = '#,##0.00'
+        first_fcf_row = row
+        for years_ahead, (year, value) in enumerate(free_cash_flows, start=1):
+            fcf_millions = self.format_number(value)
+            self._put(ws, row, 1, str(year))
+            self._put(ws, row, 2, fcf_millions, 'amount')
+            put_result(row, 3, f"=B{row}/(1+{wacc_cell})^{years_ahead}", fcf_millions / (1 + wacc) ** years_ahead, 'amount')
             row += 1
-        
+        last_fcf_row = row - 1
         row += 1
         
-        # Terminal Value
-        ws.cell(row=row, column=1, value="Terminal Value (in millions)").font = Font(bold=True)
-        terminal_value = self.dcf_results.get('terminal_value', 0)
-        ws.cell(row=row, column=2, value=self.format_number(terminal_value)).number_format = '#,##0.00'
+        # Terminal Value (Gordon growth on the final FCF; 10x the final FCF when WACC <= g)
+        growth = cells['terminal_growth_rate']
+        final_fcf = f"B{last_fcf_row}"
+        self._put(ws, row, 1, "Terminal Value (in millions)", 'bold')
+        put_result(row, 2, f"=IF({wacc_cell}>{growth},{final_fcf}*(1+{growth})/({wacc_cell}-{growth}),{final_fcf}*10)",
+                   self.format_number(self.dcf_results.get('terminal_value', 0)), 'amount')
+        terminal_row = row
         row += 2
         
         # Valuation Summary
-        ws.cell(row=row, column=1, value="Valuation Summary (in millions)").font = Font(bold=True, size=12)
-        row += 1
-        
-        pv_fcf = self.dcf_results.get('total_pv_fcf', 0)
-        pv_terminal = self.dcf_results.get('present_value_terminal', 0)
-        enterprise_value = self.dcf_results.get('enterprise_value', 0)
-        equity_value = self.dcf_results.get('equity_value', 0)
-        
-        ws.cell(row=row, column=1, value="PV of FCFs")
-        ws.cell(row=row, column=2, value=self.format_number(pv_fcf)).number_format = '#,##0.00'
-        row += 1
-        
-        ws.cell(row=row, column=1, value="PV of Terminal Value")
-        ws.cell(row=row, column=2, value=self.format_number(pv_terminal)).number_format = '#,##0.00'
+        self._put(ws, row, 1, "Valuation Summary (in millions)", 'section')
         row += 1
+        enterprise_value = self.format_number(self.dcf_results.get('enterprise_value', 0))
+        equity_value = self.format_number(self.dcf_results.get('equity_value', 0))
+        summary = [
+            ("PV of FCFs", None, f"=SUM(C{first_fcf_row}:C{last_fcf_row})",
+             self.format_number(self.dcf_results.get('total_pv_fcf', 0))),
+            ("PV of Terminal Value", None, f"=B{terminal_row}/(1+{wacc_cell})^{len(free_cash_flows)}",
+             self.format_number(self.dcf_results.get('present_value_terminal', 0))),
+            ("Enterprise Value", 'bold', f"=B{row}+B{row + 1}", enterprise_value),
+            ("Net Debt", None, None, enterprise_value - equity_value),
+            ("Equity Value", 'bold', f"=B{row + 2}-B{row + 3}", equity_value)
+        ]
+        for label, style, formula, value in summary:
+            self._put(ws, row, 1, label, style)
+            if formula is None:
+                self._put(ws, row, 2, value, 'amount')
+            else:
+                put_result(row, 2, formula, value, 'amount')
+            row += 1
         
-        ws.cell(row=row, column=1, value="Enterprise Value").font = Font(bold=True)
-        ws.cell(row=row, column=2, value=self.format_number(enterprise_value)).number_format = '#,##0.00'
-        row += 1
+        shares_outstanding = self.dcf_results.get('shares_outstanding')
+        price_per_share = self.dcf_results.get('price_per_share')
+        if shares_outstanding and price_per_share is not None:
+            self._put(ws, row, 1, "Shares Outstanding")
+            self._put(ws, row, 2, shares_outstanding, 'shares')
+            self._put(ws, row + 1, 1, "Price per Share", 'bold')
+            put_result(row + 1, 2, f"=B{row - 1}*1000000/B{row}", price_per_share, 'amount')
+    
+    def sensitivity_frame(self, metric: str) -> pd.DataFrame:
+        """
+        Return one sensitivity metric as a DataFrame
         
-        ws.cell(row=row, column=1, value="Equity Value").font = Font(bold=True)
-        ws.cell(row=row, column=2, value=self.format_number(equity_value)).number_format = '#,##0.00'
+        A 2-D grid becomes a matrix (rows = first axis, columns = second axis); any other
+        number of axes is returned in long format with one column per axis.
+        """
+        axes = self.sensitivity['axes']
+        format_type = self.SENSITIVITY_METRICS[metric][1]
+        values = np.array(self.sensitivity[metric], dtype=np.float64)
+        if format_type:
+            values = values / 1_000_000
+        
+        if len(axes) == 2:
+            return pd.DataFrame(values,
+                                index=pd.Index(axes[0]['values'], name=axes[0]['name']),
+                                columns=pd.Index(axes[1]['values'], name=axes[1]['name']))
+        
+        index = pd.MultiIndex.from_product([axis['values'] for axis in axes],
+                                           names=[axis['name'] for axis in axes])
+        return pd.DataFrame({metric: values.ravel()}, index=index).reset_index()
+    
+    @staticmethod
+    def _axis_style(name: str, bold: bool = False) -> str:
+        """Style for sensitivity axis values (rates as percentages, beta as a ratio)"""
+        return f"{'ratio' if name == 'beta' else 'percent'}{'_bold' if bold else ''}"
+    
+    def _write_sensitivity_sheet(self, ws):
+        """Sensitivity sheet with one table per metric"""
+        axes = self.sensitivity['axes']
+        self._set_widths(ws, {1: 30, **{col: 14 for col in range(2, max(len(axis['values']) for axis in axes) + 2)}})
+        self._put(ws, 1, 1, "DCF Sensitivity Analysis", 'sheet_title')
         
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 30
-        ws.column_dimensions['B'].width = 20
+        row = 3
+        for metric, (label, _) in self.SENSITIVITY_METRICS.items():
+            if metric not in self.sensitivity:
+                continue
+            frame = self.sensitivity_frame(metric)
+            self._put(ws, row, 1, label, 'section')
+            row += 1
+            
+            if len(axes) == 2:
+                # Corner cell names both axes; second-axis values run across the header row
+                self._put(ws, row, 1, f"{axes[0]['name']} \\ {axes[1]['name']}", 'bold')
+                for col_idx, value in enumerate(frame.columns, start=2):
+                    self._put(ws, row, col_idx, value, self._axis_style(axes[1]['name'], bold=True))
+                row += 1
+                for index_value, values in zip(frame.index, frame.values):
+                    self._put(ws, row, 1, index_value, self._axis_style(axes[0]['name'], bold=True))
+                    for col_idx, value in enumerate(values, start=2):
+                        if not pd.isna(value):
+                            self._put(ws, row, col_idx, float(value), 'amount')
+                    row += 1
+            else:
+                for col_idx, header in enumerate(frame.columns, start=1):
+                    self._put(ws, row, col_idx, header, 'bold')
+                row += 1
+                styles = [self._axis_style(axis['name']) for axis in axes] + ['amount']
+                for values in frame.itertuples(index=False):
+                    for col_idx, (value, style) in enumerate(zip(values, styles), start=1):
+                        if not pd.isna(value):
+                            self._put(ws, row, col_idx, float(value), style)
+                    row += 1
+            row += 1
     
     def export_to_csv(self, output_dir: str = ".") -> Dict[str, str]:
         """
@@ -1092,7 +725,7 @@ class ExportHandler:
         files = {}
         
         # Income Statement
-        income_data = pd.DataFrame(self.operating_model_data.get('income_statement', {}))
+        income_data = decode_statement(self.operating_model_data.get('income_statement')).T
         if not income_data.empty:
             income_data_formatted = income_data / 1_000_000  # Convert to millions
             filepath = os.path.join(output_dir, f"{self.company_name}_Income_Statement.csv")
@@ -1100,7 +733,7 @@ class ExportHandler:
             files['income_statement'] = filepath
         
         # Balance Sheet
-        balance_data = pd.DataFrame(self.operating_model_data.get('balance_sheet', {}))
+        balance_data = decode_statement(self.operating_model_data.get('balance_sheet')).T
         if not balance_data.empty:
             balance_data_formatted = balance_data / 1_000_000  # Convert to millions
             filepath = os.path.join(output_dir, f"{self.company_name}_Balance_Sheet.csv")
@@ -1108,7 +741,7 @@ class ExportHandler:
             files['balance_sheet'] = filepath
         
         # Cash Flow
-        cashflow_data = pd.DataFrame(self.operating_model_data.get('cash_flow', {}))
+        cashflow_data = decode_statement(self.operating_model_data.get('cash_flow')).T
         if not cashflow_data.empty:
             cashflow_data_formatted = cashflow_data / 1_000_000  # Convert to millions
             filepath = os.path.join(output_dir, f"{self.company_name}_Cash_Flow.csv")
@@ -1132,5 +765,16 @@ class ExportHandler:
         dcf_summary.to_csv(filepath, index=False)
         files['dcf_summary'] = filepath
         
+        # Sensitivity grid, one file per metric
+        if self.sensitivity:
+            for metric in self.SENSITIVITY_METRICS:
+                if metric not in self.sensitivity:
+                    continue
+                frame = self.sensitivity_frame(metric)
+                suffix = ''.join(part.title() for part in metric.split('_'))
+                filepath = os.path.join(output_dir, f"{self.company_name}_Sensitivity_{suffix}.csv")
+                frame.to_csv(filepath, index=len(self.sensitivity['axes']) == 2)
+                files[f'sensitivity_{metric}'] = filepath
+        
         return files
 
@@ -0,0 +1,194 @@
+"""
+Export Styles
+Immutable registry of named cell styles shared by the openpyxl and xlsxwriter export engines
+"""
+from copy import copy
+from itertools import combinations
+from types import MappingProxyType
+from typing import Dict, Mapping, Tuple
+
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.worksheet.dimensions import Dimension
+
+DARK_BLUE = '002060'
+WHITE = 'FFFFFF'
+GRAY = 'D3D3D3'
+TABLE_BLUE = '366092'
+
+# Number formats from the example workbook
+NUMBER_FORMAT_MAIN = '#,##0.0_);\\(#,##0.0\\)'  # Main format with parentheses for negatives
+NUMBER_FORMAT_SIMPLE = '0.0'  # For Other Operating Expenses
+NUMBER_FORMAT_DASH = '\\-'  # For zero R&D values
+YEAR_FORMAT = '####"A"'  # For year headers (2019A, 2020A, etc.)
+PROJECTED_YEAR_FORMAT = '####"E"'  # Projected years (2024E, ...)
+AMOUNT_FORMAT = '#,##0.00'
+PERCENT_FORMAT = '0.00%'
+RATIO_FORMAT = '0.00'
+SHARES_FORMAT = '#,##0'
+
+# Thin borders a style variant can add, in canonical order
+EDGES = ('top', 'bottom', 'left', 'right')
+
+
+def _style(bold: bool = False, size: float = None, color: str = None, fill: str = None, horizontal: str = None,
+           vertical: str = None, indent: int = 0, number_format: str = None) -> Mapping:
+    return MappingProxyType({'bold': bold, 'size': size, 'color': color, 'fill': fill, 'horizontal': horizontal,
+                             'vertical': vertical, 'indent': indent, 'number_format': number_format})
+
+
+_box = dict(fill=WHITE)
+_header = dict(fill=DARK_BLUE)
+_statement_value = dict(fill=WHITE, size=11, horizontal='right', vertical='center')
+
+STYLES: Mapping[str, Mapping] = MappingProxyType({
+    # Historical IS/BS sheets
+    'background': _style(fill=GRAY),
+    'company_name': _style(bold=True, size=20, color=DARK_BLUE, fill=GRAY),
+    'box': _style(**_box),
+    'header': _style(**_header),
+    'title': _style(bold=True, size=15, color=WHITE, **_header),
+    'subtitle': _style(size=11, color=WHITE, **_header),
+    'year': _style(bold=True, size=11, color=WHITE, horizontal='center', vertical='center',
+                   number_format=YEAR_FORMAT, **_header),
+    'projected_year': _style(bold=True, size=11, color=WHITE, horizontal='center', vertical='center',
+                             number_format=PROJECTED_YEAR_FORMAT, **_header),
+    'label': _style(size=11, horizontal='left', vertical='center', indent=1, **_box),
+    'label_bold': _style(bold=True, size=11, horizontal='left', vertical='center', **_box),
+    'value_main': _style(number_format=NUMBER_FORMAT_MAIN, **_statement_value),
+    'value_main_bold': _style(bold=True, number_format=NUMBER_FORMAT_MAIN, **_statement_value),
+    'value_simple': _style(number_format=NUMBER_FORMAT_SIMPLE, **_statement_value),
+    'value_simple_bold': _style(bold=True, number_format=NUMBER_FORMAT_SIMPLE, **_statement_value),
+    'value_dash': _style(number_format=NUMBER_FORMAT_DASH, **_statement_value),
+    'value_dash_bold': _style(bold=True, number_format=NUMBER_FORMAT_DASH, **_statement_value),
+    # Cash flow, DCF summary and sensitivity sheets
+    'table_header': _style(bold=True, size=11, color=WHITE, fill=TABLE_BLUE, horizontal='center', vertical='center'),
+    'sheet_title': _style(bold=True, size=14),
+    'section': _style(bold=True, size=12),
+    'bold': _style(bold=True),
+    'amount': _style(number_format=AMOUNT_FORMAT),
+    'amount_bold': _style(bold=True, number_format=AMOUNT_FORMAT),
+    'percent': _style(number_format=PERCENT_FORMAT),
+    'ratio': _style(number_format=RATIO_FORMAT),
+    'shares': _style(number_format=SHARES_FORMAT),
+    'percent_bold': _style(bold=True, number_format=PERCENT_FORMAT),
+    'ratio_bold': _style(bold=True, number_format=RATIO_FORMAT)
+})
+
+# Statement value style per number format
+VALUE_STYLES: Mapping[str, str] = MappingProxyType({
+    NUMBER_FORMAT_MAIN: 'value_main',
+    NUMBER_FORMAT_SIMPLE: 'value_simple',
+    NUMBER_FORMAT_DASH: 'value_dash'
+})
+
+# Styles used inside the bordered statement boxes come in a variant per combination of edges
+BOXED_STYLES = frozenset(['box', 'label', 'label_bold'] + list(VALUE_STYLES.values())
+                         + [f"{name}_bold" for name in VALUE_STYLES.values()])
+
+VARIANTS: Tuple[Tuple[str, Tuple[str, ...]], ...] = tuple(
+    (name, edges)
+    for name in STYLES
+    for edges in ([()] if name not in BOXED_STYLES else
+                  [edges for count in range(len(EDGES) + 1) for edges in combinations(EDGES, count)])
+)
+
+
+def variant_name(name: str, edges: Tuple[str, ...] = ()) -> str:
+    """Registered name of a style with thin edges, e.g. 'label_bold+top+bottom'"""
+    ordered = [edge for edge in EDGES if edge in edges]
+    return '+'.join([name] + ordered)
+
+
+def _openpyxl_parts(name: str, edges: Tuple[str, ...]) -> Tuple:
+    spec = STYLES[name]
+    # Unset font attributes fall back to the workbook's default font (Calibri 11)
+    font = Font(name='Calibri', family=2, scheme='minor', b=spec['bold'] or None, sz=spec['size'] or 11,
+                color=spec['color'])
+    fill = PatternFill(fill_type='solid', start_color=spec['fill'], end_color=spec['fill']) if spec['fill'] else PatternFill()
+    thin = Side(style='thin')
+    border = Border(**{edge: thin for edge in edges})
+    alignment = Alignment(horizontal=spec['horizontal'], vertical=spec['vertical'], indent=spec['indent'])
+    return font, fill, border, alignment, spec['number_format'] or 'General'
+
+
+def _xlsxwriter_properties(name: str, edges: Tuple[str, ...]) -> Mapping:
+    spec = STYLES[name]
+    properties = {}
+    if spec['bold']:
+        properties['bold'] = True
+    if spec['size']:
+        properties['font_size'] = spec['size']
+    if spec['color']:
+        properties['font_color'] = f"#{spec['color']}"
+    if spec['fill']:
+        properties.update(bg_color=f"#{spec['fill']}", pattern=1)
+    if spec['horizontal']:
+        properties['align'] = spec['horizontal']
+    if spec['vertical']:
+        properties['valign'] = 'vcenter' if spec['vertical'] == 'center' else spec['vertical']
+    if spec['indent']:
+        properties['indent'] = spec['indent']
+    if spec['number_format']:
+        properties['num_format'] = spec['number_format']
+    properties.update({edge: 1 for edge in edges})
+    return MappingProxyType(properties)
+
+
+# Compiled once per process; workbooks only wrap these in their own named styles/formats
+OPENPYXL_PARTS: Mapping[str, Tuple] = MappingProxyType(
+    {variant_name(name, edges): _openpyxl_parts(name, edges) for name, edges in VARIANTS})
+XLSXWRITER_PROPERTIES: Mapping[str, Mapping] = MappingProxyType(
+    {variant_name(name, edges): _xlsxwriter_properties(name, edges) for name, edges in VARIANTS})
+
+
+class OpenpyxlStyles:
+    """
+    Named styles of one openpyxl workbook
+
+    A style variant is added to the workbook as a NamedStyle the first time a cell
+    uses it; row/column dimensions cannot take a named style, so they get the
+    variant's formatting instead. Either way the style is resolved once per workbook
+    and later targets get a copy of the resolved style ids.
+    """
+
+    def __init__(self, workbook):
+        self.workbook = workbook
+        self.registered = set(workbook.named_styles)
+        self.resolved: Dict[Tuple[str, bool], object] = {}
+
+    def name(self, style: str, *edges: str) -> str:
+        """Register (once) and return the workbook's style name for a style variant"""
+        key = variant_name(style, edges)
+        if key not in self.registered:
+            font, fill, border, alignment, number_format = OPENPYXL_PARTS[key]
+            self.workbook.add_named_style(NamedStyle(name=key, font=font, fill=fill, border=border,
+                                                     alignment=alignment, number_format=number_format))
+            self.registered.add(key)
+        return key
+
+    def apply(self, target, style: str, *edges: str):
+        """Style a cell (or row/column dimension) by name"""
+        resolved_key = (variant_name(style, edges), isinstance(target, Dimension))
+        resolved = self.resolved.get(resolved_key)
+        if resolved is not None:
+            target._style = copy(resolved)
+            return target
+        if resolved_key[1]:
+            target.font, target.fill, target.border, target.alignment, target.number_format = OPENPYXL_PARTS[resolved_key[0]]
+        else:
+            target.style = self.name(style, *edges)
+        self.resolved[resolved_key] = copy(target._style)
+        return target
+
+class XlsxwriterStyles:
+    """Formats of one xlsxwriter workbook, all registered when the workbook is opened"""
+
+    def __init__(self, workbook):
+        self.formats: Dict[str, object] = {key: workbook.add_format(dict(properties))
+                                           for key, properties in XLSXWRITER_PROPERTIES.items()}
+
+    def get(self, style, *edges: str):
+        """Format for a style variant (None for unstyled cells)"""
+        if style is None:
+            return None
+        return self.formats[variant_name(style, edges)]
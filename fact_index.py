@@ -0,0 +1,175 @@
+"""
+XBRL Fact Index
+Flattens a companyfacts payload into a columnar fact table in a single pass
+and memoizes the artifacts statement parsers derive from it
+"""
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+
+class FactIndex:
+    """
+    Columnar table of every fact in a companyfacts payload
+
+    Each row is one reported value. Columns (NumPy arrays, one entry per row):
+    - concept, unit, form:   object arrays of strings
+    - start, end:            datetime64[D] (NaT when missing or unparseable)
+    - start_str, end_str:    raw date strings as filed ('' when missing)
+    - duration_days:         end - start in days (-1 for point-in-time facts)
+    - valid:                 end parsed, and start parsed whenever it was given
+    - calendar_year:         year of the end date (-1 when end is invalid)
+    - end_month:             month of the end date (0 when end is invalid)
+    - fy:                    fiscal year tag (-1 when missing)
+    - val:                   value as float64
+
+    Rows of one (namespace, concept, unit) list are contiguous and keep their filing
+    order, so a concept's unit list is addressed by a slice instead of a rescan.
+    """
+
+    DATE_FORMAT = '%Y-%m-%d'
+
+    def __init__(self, facts: Dict):
+        """
+        Build the index
+
+        Args:
+            facts: Raw companyfacts JSON ({'cik', 'entityName', 'facts': {namespace: {concept: ...}}})
+        """
+        self.cik = facts.get('cik')
+        self.entity_name = facts.get('entityName')
+        # namespace -> concept -> unit -> slice of rows (units kept in filing order)
+        self.concepts: Dict[str, Dict[str, Dict[str, slice]]] = {}
+
+        concept_col, unit_col, form_col = [], [], []
+        start_str_col, end_str_col = [], []
+        start_col, end_col = [], []
+        fy_col, val_col = [], []
+
+        # Dates repeat heavily across concepts, so each distinct string is parsed once
+        parsed_dates = {}
+
+        def parse_date(date_str):
+            if date_str not in parsed_dates:
+                try:
+                    parsed_dates[date_str] = np.datetime64(datetime.strptime(date_str, self.DATE_FORMAT).date(), 'D')
+                except (TypeError, ValueError):
+                    parsed_dates[date_str] = None
+            return parsed_dates[date_str]
+
+        row = 0
+        for namespace, namespace_facts in facts.get('facts', {}).items():
+            ns_index = self.concepts.setdefault(namespace, {})
+            for concept_name, concept_data in namespace_facts.items():
+                unit_index = ns_index.setdefault(concept_name, {})
+                for unit, data_list in concept_data.get('units', {}).items():
+                    first_row = row
+                    for item in data_list:
+                        end_date = item.get('end', '') or ''
+                        start_date = item.get('start', '') or ''
+                        concept_col.append(concept_name)
+                        unit_col.append(unit)
+                        form_col.append(item.get('form', ''))
+                        end_str_col.append(end_date)
+                        start_str_col.append(start_date)
+                        end_col.append(parse_date(end_date) if len(end_date) >= 10 else None)
+                        start_col.append(parse_date(start_date) if len(start_date) >= 10 else None)
+                        fy = item.get('fy')
+                        fy_col.append(fy if isinstance(fy, int) else -1)
+                        try:
+                            val_col.append(float(item.get('val', 0)))
+                        except (TypeError, ValueError):
+                            val_col.append(np.nan)
+                        row += 1
+                    unit_index[unit] = slice(first_row, row)
+
+        self.size = row
+        self.concept = np.array(concept_col, dtype=object)
+        self.unit = np.array(unit_col, dtype=object)
+        self.form = np.array(form_col, dtype=object)
+        self.start_str = np.array(start_str_col, dtype=object)
+        self.end_str = np.array(end_str_col, dtype=object)
+        self.start = np.array([d if d is not None else np.datetime64('NaT') for d in start_col], dtype='datetime64[D]')
+        self.end = np.array([d if d is not None else np.datetime64('NaT') for d in end_col], dtype='datetime64[D]')
+        self.fy = np.array(fy_col, dtype=np.int32)
+        self.val = np.array(val_col, dtype=np.float64)
+
+        has_end = ~np.isnat(self.end)
+        has_start = ~np.isnat(self.start)
+        # A start date that was given but could not be parsed invalidates the row
+        start_given = np.array([len(s) >= 10 for s in start_str_col], dtype=bool)
+        self.valid = has_end & (has_start | ~start_given)
+        self.is_period = has_start & has_end
+        self.duration_days = np.where(
+            self.is_period, (self.end - self.start).astype('timedelta64[D]').astype(np.int64), -1
+        )
+        end_months = self.end.astype('datetime64[M]')
+        self.calendar_year = np.where(has_end, end_months.astype('datetime64[Y]').astype(np.int64) + 1970, -1)
+        self.end_month = np.where(has_end, end_months.astype(np.int64) % 12 + 1, 0)
+
+    def has_namespace(self, namespace: str) -> bool:
+        return namespace in self.concepts
+
+    def units(self, namespace: str, concept: str) -> Optional[Dict[str, slice]]:
+        """Return unit -> row slice for a concept, or None if the company never filed it"""
+        return self.concepts.get(namespace, {}).get(concept)
+
+    def rows(self, namespace: str, concept: str, unit: str) -> slice:
+        """Return the row slice of one concept's unit list (empty if absent)"""
+        return (self.units(namespace, concept) or {}).get(unit, slice(0, 0))
+
+    def records(self, rows: slice) -> List[Dict]:
+        """Materialize rows as plain dicts (for debugging and reference code paths)"""
+        return [
+            {
+                'concept': self.concept[i], 'unit': self.unit[i], 'form': self.form[i],
+                'start': self.start_str[i], 'end': self.end_str[i],
+                'duration_days': int(self.duration_days[i]), 'fy': int(self.fy[i]),
+                'val': float(self.val[i])
+            }
+            for i in range(rows.start, rows.stop)
+        ]
+
+
+class ParseContext:
+    """
+    Per-company parsing state shared by every SECClient.parse_* call of one fetch
+
+    Holds the FactIndex and memoizes derived artifacts (fiscal-year-end map, preferred
+    unit per concept, annual values per concept, extracted line items) so each is
+    computed once per company. Time spent computing each kind of artifact is recorded
+    in `timings` for profiling.
+    """
+
+    def __init__(self, index: FactIndex):
+        self.index = index
+        self.chosen_concepts: Dict[str, List[str]] = {}  # line item -> concepts its values came from
+        self.year_concepts: Dict[str, Dict[str, str]] = {}  # line item -> {year: concept of that year's value}
+        self.timings: Dict[str, Dict[str, float]] = {}   # artifact kind -> seconds/computed/reused
+        self._memo: Dict[tuple, Any] = {}
+
+    def memoize(self, kind: str, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the memoized artifact for (kind, key), computing and timing it on first use"""
+        memo_key = (kind, key)
+        stats = self.timings.setdefault(kind, {'seconds': 0.0, 'computed': 0, 'reused': 0})
+        if memo_key in self._memo:
+            stats['reused'] += 1
+            return self._memo[memo_key]
+
+        started = time.perf_counter()
+        value = compute()
+        stats['seconds'] += time.perf_counter() - started
+        stats['computed'] += 1
+        self._memo[memo_key] = value
+        return value
+
+    def timing_report(self) -> Dict[str, Dict[str, float]]:
+        """Copy of per-artifact timings (seconds rounded to microseconds)"""
+        return {
+            kind: {'seconds': round(stats['seconds'], 6),
+                   'computed': stats['computed'],
+                   'reused': stats['reused']}
+            for kind, stats in self.timings.items()
+        }
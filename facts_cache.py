@@ -0,0 +1,187 @@
+"""
+SEC Company Facts Cache
+On-disk, content-addressed cache for SEC companyfacts payloads
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import IO, Dict, Iterable, Optional
+
+
+class CompanyFactsCache:
+    """
+    Compressed, content-addressed store of companyfacts JSON keyed by CIK
+
+    Layout under cache_dir:
+    - blobs/<sha256[:2]>/<sha256>.json.gz  gzip-compressed raw payloads
+    - index/CIK##########.json              per-CIK pointer to its current blob,
+                                            plus ETag/Last-Modified and fetch time
+    """
+
+    DEFAULT_TTL = 24 * 60 * 60  # Seconds before a cached payload must be revalidated
+
+    def __init__(self, cache_dir: str, ttl: float = DEFAULT_TTL):
+        """
+        Initialize cache
+
+        Args:
+            cache_dir: Directory holding blobs and the per-CIK index
+            ttl: Seconds a cached payload is served without contacting the SEC
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        self.index_dir = os.path.join(cache_dir, 'index')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.index_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def _index_path(self, cik: str) -> str:
+        return os.path.join(self.index_dir, f"CIK{cik.zfill(10)}.json")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.json.gz")
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes):
+        """Write via a temp file and rename so readers never see partial files"""
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def lookup(self, cik: str) -> Optional[Dict]:
+        """Return the index entry for a CIK, or None if nothing usable is cached"""
+        try:
+            with open(self._index_path(cik), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not os.path.exists(self._blob_path(entry.get('digest', ''))):
+            return None
+        return entry
+
+    def is_fresh(self, entry: Dict) -> bool:
+        """Check whether an entry is still within its TTL"""
+        return (time.time() - entry.get('fetched_at', 0)) < self.ttl
+
+    def read(self, entry: Dict) -> bytes:
+        """Read and decompress the payload an index entry points to"""
+        with gzip.open(self._blob_path(entry['digest']), 'rb') as f:
+            return f.read()
+
+    def open_blob(self, entry: Dict) -> IO[bytes]:
+        """Open the payload an index entry points to as a decompressing binary stream"""
+        return gzip.open(self._blob_path(entry['digest']), 'rb')
+
+    def store(self, cik: str, payload: bytes, etag: Optional[str] = None,
+              last_modified: Optional[str] = None) -> Dict:
+        """Store a freshly downloaded payload and point the CIK's index entry at it"""
+        digest = hashlib.sha256(payload).hexdigest()
+        blob_path = self._blob_path(digest)
+
+        # Identical payloads share one blob, so an unchanged refetch costs no disk
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            self._atomic_write(blob_path, gzip.compress(payload, compresslevel=6))
+
+        entry = {
+            'cik': cik.zfill(10),
+            'digest': digest,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.time(),
+            'size': len(payload)
+        }
+        self._atomic_write(self._index_path(cik), json.dumps(entry).encode('utf-8'))
+        return entry
+
+    def store_stream(self, cik: str, chunks: Iterable[bytes], etag: Optional[str] = None,
+                     last_modified: Optional[str] = None) -> Dict:
+        """Store a payload arriving in chunks without holding it in memory"""
+        hasher = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.blob_dir, f"incoming.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+                for chunk in chunks:
+                    if chunk:
+                        hasher.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+
+            digest = hasher.hexdigest()
+            blob_path = self._blob_path(digest)
+            if os.path.exists(blob_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(tmp_path, blob_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        entry = {
+            'cik': cik.zfill(10),
+            'digest': digest,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.time(),
+            'size': size
+        }
+        self._atomic_write(self._index_path(cik), json.dumps(entry).encode('utf-8'))
+        return entry
+
+    def touch(self, cik: str, entry: Dict, etag: Optional[str] = None,
+              last_modified: Optional[str] = None) -> Dict:
+        """Restart the TTL of an entry after the SEC confirmed it is unchanged (HTTP 304)"""
+        entry = dict(entry)
+        entry['fetched_at'] = time.time()
+        if etag:
+            entry['etag'] = etag
+        if last_modified:
+            entry['last_modified'] = last_modified
+        self._atomic_write(self._index_path(cik), json.dumps(entry).encode('utf-8'))
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+        """Build If-None-Match / If-Modified-Since headers for revalidating an entry"""
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def record_hit(self, revalidated: bool = False):
+        with self._lock:
+            self.hits += 1
+            if revalidated:
+                self.revalidated += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and the hit ratio since startup"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidated': self.revalidated,
+                'hit_ratio': (self.hits / total) if total else 0.0,
+                'ttl': self.ttl
+            }
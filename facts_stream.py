@@ -0,0 +1,181 @@
+"""
+Streaming Company Facts Parser
+Incrementally parses a companyfacts JSON stream, keeping only the concepts the statement parsers use
+"""
+import codecs
+import json
+import re
+from typing import Dict, IO, Iterable, Iterator, Optional
+
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_WHITESPACE = re.compile(r'\s*')
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')  # Text that could still extend a number
+_DECODER = json.JSONDecoder()
+
+
+class FilteredFactsParser:
+    """
+    Pull parser over companyfacts JSON delivered in byte chunks
+
+    Walks {'cik', 'entityName', 'facts': {namespace: {concept: {...}}}} key by key.
+    Concepts outside `concepts` are dropped as soon as they are read, so memory holds
+    the buffered text, the concept being read and the kept concepts, not the whole
+    payload as Python objects.
+    Top-level keys other than 'facts' (cik, entityName) are always kept.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], concepts: Optional[Iterable[str]] = None):
+        """
+        Initialize parser
+
+        Args:
+            chunks: Iterable of raw (uncompressed) UTF-8 bytes
+            concepts: Concept names to keep in every namespace; None keeps everything
+        """
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.concepts = frozenset(concepts) if concepts is not None else None
+        self._buf = ''
+        self._pos = 0
+        self._mark: Optional[int] = None  # Start of the value being captured
+        self._eof = False
+        self.kept = 0
+        self.skipped = 0
+
+    def _fill(self) -> bool:
+        """Append the next chunk, dropping consumed text; returns False at end of stream"""
+        if self._eof:
+            return False
+        keep_from = self._pos if self._mark is None else self._mark
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                break
+        else:
+            text = self._decoder.decode(b'', final=True)
+            self._eof = True
+        self._buf = self._buf[keep_from:] + text
+        self._pos -= keep_from
+        if self._mark is not None:
+            self._mark = 0
+        return bool(text) or not self._eof
+
+    def _skip_ws(self):
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf) or not self._fill():
+                return
+
+    def _peek(self) -> str:
+        self._skip_ws()
+        if self._pos >= len(self._buf):
+            raise ValueError("Unexpected end of companyfacts stream")
+        return self._buf[self._pos]
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self._pos} of buffered companyfacts text")
+        self._pos += 1
+
+    def _read_string(self) -> str:
+        self._peek()
+        while True:
+            match = _STRING.match(self._buf, self._pos)
+            if match:
+                self._pos = match.end()
+                text = match.group()
+                return text[1:-1] if '\\' not in text else json.loads(text)
+            if not self._fill():
+                raise ValueError("Unterminated string in companyfacts stream")
+
+    def _read_value(self):
+        """
+        Decode the next JSON value with the C decoder
+
+        A value cut off by the end of the buffer fails to decode; the buffer is then
+        at least doubled before retrying, so a value larger than one chunk is re-decoded
+        only a logarithmic number of times.
+        """
+        self._peek()
+        self._mark = self._pos
+        try:
+            while True:
+                try:
+                    value, end = _DECODER.raw_decode(self._buf, self._mark)
+                    # A number followed by nothing but number characters (e.g. '12' of '12.5' or
+                    # '1' of '1e-3' cut after the '.' or 'e') may continue in the next chunk
+                    partial_number = isinstance(value, (int, float)) and not isinstance(value, bool) and \
+                        _NUMBER_TAIL.fullmatch(self._buf, end) is not None
+                    if not partial_number or self._eof:
+                        self._pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if self._eof:
+                        raise ValueError("Malformed or truncated companyfacts stream")
+                target = 2 * (len(self._buf) - self._mark)
+                while len(self._buf) - self._mark < target and self._fill():
+                    pass
+        finally:
+            self._mark = None
+
+    def _object_keys(self) -> Iterator[str]:
+        """Yield keys of the next JSON object; the caller consumes each value before resuming"""
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._read_string()
+            self._expect(':')
+            yield key
+            separator = self._peek()
+            self._pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError(f"Expected ',' or '}}' in companyfacts stream, got '{separator}'")
+
+    def parse(self) -> Dict:
+        """Parse the stream into a companyfacts dict holding only the kept concepts"""
+        result = {}
+        for key in self._object_keys():
+            if key != 'facts':
+                result[key] = self._read_value()
+                continue
+
+            facts = {}
+            for namespace in self._object_keys():
+                # Namespaces are kept even when empty so namespace checks behave as on the full payload
+                namespace_facts = facts.setdefault(namespace, {})
+                for concept_name in self._object_keys():
+                    # Unmapped concepts are decoded one at a time and dropped immediately
+                    value = self._read_value()
+                    if self.concepts is None or concept_name in self.concepts:
+                        namespace_facts[concept_name] = value
+                        self.kept += 1
+                    else:
+                        self.skipped += 1
+            result['facts'] = facts
+        return result
+
+
+def iter_file_chunks(file_obj: IO[bytes], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Yield a binary file's contents in fixed-size chunks"""
+    return iter(lambda: file_obj.read(chunk_size), b'')
+
+
+def load_filtered_facts(chunks: Iterable[bytes], concepts: Optional[Iterable[str]] = None) -> Dict:
+    """
+    Parse companyfacts JSON from byte chunks, keeping only the given concepts
+
+    Args:
+        chunks: Iterable of raw UTF-8 bytes (e.g. iter_file_chunks or Response.iter_content)
+        concepts: Concept names to keep; None keeps everything
+
+    Returns:
+        Companyfacts dict with the same shape as json.loads of the full payload
+    """
+    parser = FilteredFactsParser(chunks, concepts)
+    facts = parser.parse()
+    print(f"DEBUG: Streamed companyfacts: kept {parser.kept} concepts, skipped {parser.skipped}")
+    return facts
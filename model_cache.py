@@ -0,0 +1,67 @@
+"""
+Model Cache
+Bounded in-memory LRU of per-session model state addressed by opaque handles
+"""
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class ModelCache:
+    """
+    LRU map of model handle -> model state
+
+    A handle is issued when a company is fetched and names its parsed statements;
+    the latest operating model and DCF results are attached to it after each
+    calculation so exports need only the handle. The least recently used entry is
+    evicted once max_entries is exceeded; clients fall back to re-sending data when
+    a handle is no longer known.
+    """
+
+    DEFAULT_MAX_ENTRIES = 256
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Initialize cache
+
+        Args:
+            max_entries: Number of handles kept before the least recently used is evicted
+        """
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, state: Dict) -> str:
+        """Store new model state and return its handle"""
+        handle = secrets.token_urlsafe(16)
+        with self._lock:
+            self._entries[handle] = dict(state)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return handle
+
+    def get(self, handle: Optional[str]) -> Optional[Dict]:
+        """Return the state for a handle (marking it recently used), or None if unknown/evicted"""
+        if not handle:
+            return None
+        with self._lock:
+            state = self._entries.get(handle)
+            if state is not None:
+                self._entries.move_to_end(handle)
+            return state
+
+    def update(self, handle: str, **fields) -> bool:
+        """Attach fields (e.g. operating_model, dcf_results) to a handle; False if it was evicted"""
+        with self._lock:
+            state = self._entries.get(handle)
+            if state is None:
+                return False
+            # Replace rather than mutate so readers holding the old dict see a consistent state
+            self._entries[handle] = {**state, **fields}
+            self._entries.move_to_end(handle)
+            return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
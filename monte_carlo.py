@@ -0,0 +1,344 @@
+"""
+Monte Carlo Valuation
+Samples DCF assumptions from distributions and summarizes the resulting valuations in bounded memory
+"""
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch_dcf import BatchDCFEngine
+
+
+class QuantileSketch:
+    """
+    Mergeable streaming quantile sketch with bounded relative error
+
+    Values are counted in logarithmic buckets (DDSketch-style): bucket k holds
+    magnitudes in (gamma^(k-1), gamma^k], so any quantile is returned within
+    `relative_accuracy` of the true value, whatever the range of the data. Positive
+    and negative values keep separate buckets and near-zero magnitudes share one
+    zero bucket. Memory grows with the log of the value range, not the number of
+    values, and merging two sketches is exact (bucket counts add), so chunk results
+    can be combined in any process.
+    """
+
+    DEFAULT_RELATIVE_ACCURACY = 0.005
+    MIN_MAGNITUDE = 1e-9  # Smaller magnitudes are counted as zero
+    MAX_BINS = 1000  # Histogram bins per metric
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        """
+        Initialize sketch
+
+        Args:
+            relative_accuracy: Maximum relative error of returned quantiles
+        """
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.non_finite = 0
+        self.mean = 0.0
+        self._m2 = 0.0  # Sum of squared deviations from the mean
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _bucket(self, buckets: Dict[int, int], magnitudes: np.ndarray):
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64),
+                                 return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + count
+
+    def _combine_moments(self, count: int, mean: float, m2: float):
+        """Fold another batch's count/mean/M2 into ours (Chan et al. parallel update)"""
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def add(self, values: np.ndarray):
+        """Add a batch of values (NaN and infinities are counted in non_finite and otherwise ignored)"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        finite = np.isfinite(values)
+        self.non_finite += int(values.size - finite.sum())
+        values = values[finite]
+        if values.size == 0:
+            return
+
+        batch_mean = float(values.mean())
+        self._combine_moments(values.size, batch_mean, float(((values - batch_mean) ** 2).sum()))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        magnitudes = np.abs(values)
+        small = magnitudes < self.MIN_MAGNITUDE
+        self.zero_count += int(small.sum())
+        self._bucket(self.positive, magnitudes[(values > 0) & ~small])
+        self._bucket(self.negative, magnitudes[(values < 0) & ~small])
+
+    def merge(self, other: 'QuantileSketch'):
+        """Fold another sketch (built with the same relative accuracy) into this one"""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        self.non_finite += other.non_finite
+        if other.count == 0:
+            return
+        self._combine_moments(other.count, other.mean, other._m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+
+    def _ordered_buckets(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Bucket representative values in ascending order with their counts"""
+        negative_keys = sorted(self.negative, reverse=True)  # Largest magnitude (most negative) first
+        positive_keys = sorted(self.positive)
+        scale = 2 / (self.gamma + 1)  # Midpoint-in-relative-error of (gamma^(k-1), gamma^k]
+        values = ([-scale * self.gamma ** k for k in negative_keys] + [0.0] +
+                  [scale * self.gamma ** k for k in positive_keys])
+        counts = ([self.negative[k] for k in negative_keys] + [self.zero_count] +
+                  [self.positive[k] for k in positive_keys])
+        return np.array(values, dtype=np.float64), np.array(counts, dtype=np.int64)
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        """Return the values at quantiles qs (each in [0, 1]); None when the sketch is empty"""
+        if self.count == 0:
+            return [None] * len(qs)
+        values, counts = self._ordered_buckets()
+        cumulative = np.cumsum(counts)
+        ranks = np.asarray(qs, dtype=np.float64) * (self.count - 1)
+        picked = values[np.searchsorted(cumulative, ranks, side='right')]
+        return np.clip(picked, self.min, self.max).tolist()
+
+    def histogram(self, bins: int = 50, low_quantile: float = 0.005, high_quantile: float = 0.995) -> Dict:
+        """
+        Fixed-width histogram between two quantiles
+
+        Tails beyond the range are reported as 'below'/'above' counts so a few extreme
+        draws (e.g. WACC just above terminal growth) do not flatten the chart.
+        """
+        bins = self.check_bins(bins)
+        if self.count == 0:
+            return {'edges': [], 'counts': [], 'below': 0, 'above': 0}
+        low, high = self.quantiles([low_quantile, high_quantile])
+        if high <= low:
+            pad = abs(low) * 0.01 or 0.5
+            low, high = low - pad, high + pad
+        edges = np.linspace(low, high, bins + 1)
+        values, counts = self._ordered_buckets()
+        hist, _ = np.histogram(values, bins=edges, weights=counts)
+        return {
+            'edges': edges.tolist(),
+            'counts': hist.astype(np.int64).tolist(),
+            'below': int(counts[values < low].sum()),
+            'above': int(counts[values > high].sum())
+        }
+
+    @classmethod
+    def check_bins(cls, bins) -> int:
+        """
+        Validate a histogram bin count
+        
+        Raises:
+            ValueError: If it is not a whole number from 1 to MAX_BINS
+        """
+        try:
+            bins = int(bins)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"bins must be a whole number, got {bins!r}")
+        if not 1 <= bins <= cls.MAX_BINS:
+            raise ValueError(f"bins must be between 1 and {cls.MAX_BINS}")
+        return bins
+
+    def summary(self, percentiles: Sequence[float], bins: int = 50) -> Dict:
+        """Count, moments, extremes, percentiles (keyed like 'p5') and histogram as a JSON-ready dict"""
+        empty = self.count == 0
+        quantile_values = self.quantiles([p / 100 for p in percentiles])
+        return {
+            'count': self.count,
+            'non_finite': self.non_finite,
+            'mean': None if empty else self.mean,
+            'std': None if empty else math.sqrt(self._m2 / self.count),
+            'min': None if empty else self.min,
+            'max': None if empty else self.max,
+            'percentiles': {f"p{p:g}": value for p, value in zip(percentiles, quantile_values)},
+            'histogram': self.histogram(bins)
+        }
+
+
+class MonteCarloSimulator:
+    """
+    Monte Carlo DCF valuation on top of BatchDCFEngine
+
+    Each assumption is a fixed value or a distribution spec:
+    - {'dist': 'normal', 'mean': m, 'std': s}
+    - {'dist': 'triangular', 'left': a, 'mode': c, 'right': b}
+    - {'dist': 'uniform', 'low': a, 'high': b}
+    - {'dist': 'empirical', 'values': [...]} (resampled with replacement)
+    Any spec may add 'min'/'max' to clip draws. Draws are generated and valued in
+    fixed-size chunks, each with its own generator spawned from one SeedSequence, and
+    only the per-metric QuantileSketch is kept between chunks. Results therefore depend
+    only on (seed, draws, chunk_size), never on how chunks are scheduled.
+    """
+
+    DISTRIBUTIONS = {
+        'normal': ('mean', 'std'),
+        'triangular': ('left', 'mode', 'right'),
+        'uniform': ('low', 'high'),
+        'empirical': ('values',)
+    }
+    METRICS = ('enterprise_value', 'equity_value', 'price_per_share')
+    DEFAULT_PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+    DEFAULT_CHUNK_SIZE = 65_536
+    MAX_DRAWS = 10_000_000
+
+    def __init__(self, engine: BatchDCFEngine, distributions: Dict, base_assumptions: Optional[Dict] = None,
+                 draws: int = 100_000, seed: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 relative_accuracy: float = QuantileSketch.DEFAULT_RELATIVE_ACCURACY):
+        """
+        Initialize simulator
+
+        Args:
+            engine: BatchDCFEngine holding the company's prepared FCF series
+            distributions: {assumption name (or 'wacc'): number or distribution spec}
+            base_assumptions: Values for assumptions without a distribution
+            draws: Number of scenarios
+            seed: Seed for reproducible runs (a random one is chosen and reported when None)
+            chunk_size: Scenarios valued per vectorized pass; bounds peak memory
+            relative_accuracy: Percentile accuracy of the sketches
+        """
+        draws = int(draws)
+        if not 0 < draws <= self.MAX_DRAWS:
+            raise ValueError(f"draws must be between 1 and {self.MAX_DRAWS}")
+        self.engine = engine
+        self.distributions = {name: self.validate(name, spec) for name, spec in (distributions or {}).items()}
+        self.base_assumptions = {name: value for name, value in (base_assumptions or {}).items()
+                                 if name in engine.ASSUMPTION_DEFAULTS and value is not None}
+        self.draws = draws
+        # A generated seed is kept to 32 bits so it round-trips through JSON/JavaScript numbers
+        self.seed = int(np.random.SeedSequence().generate_state(1)[0]) if seed is None else int(seed)
+        self.chunk_size = max(1, int(chunk_size))
+        self.relative_accuracy = relative_accuracy
+
+    def config(self) -> Dict:
+        """Constructor arguments (seed resolved) that rebuild an identical simulator, e.g. in a worker process"""
+        return {
+            'distributions': self.distributions,
+            'base_assumptions': self.base_assumptions,
+            'draws': self.draws,
+            'seed': self.seed,
+            'chunk_size': self.chunk_size,
+            'relative_accuracy': self.relative_accuracy
+        }
+
+    @classmethod
+    def validate(cls, name: str, spec):
+        """Check one assumption spec, returning a float for fixed values"""
+        if name not in BatchDCFEngine.SENSITIVITY_AXES:
+            raise ValueError(f"Unknown assumption {name!r}; expected one of {list(BatchDCFEngine.SENSITIVITY_AXES)}")
+        if isinstance(spec, (int, float)):
+            return float(spec)
+        if not isinstance(spec, dict) or spec.get('dist') not in cls.DISTRIBUTIONS:
+            raise ValueError(f"Assumption {name!r} needs a number or a spec with 'dist' in {list(cls.DISTRIBUTIONS)}")
+
+        missing = [key for key in cls.DISTRIBUTIONS[spec['dist']] if spec.get(key) is None]
+        if missing:
+            raise ValueError(f"{spec['dist']} distribution for {name!r} is missing {missing}")
+        if spec['dist'] == 'normal' and spec['std'] < 0:
+            raise ValueError(f"Normal distribution for {name!r} needs std >= 0")
+        if spec['dist'] == 'triangular' and not spec['left'] <= spec['mode'] <= spec['right']:
+            raise ValueError(f"Triangular distribution for {name!r} needs left <= mode <= right")
+        if spec['dist'] == 'uniform' and spec['low'] > spec['high']:
+            raise ValueError(f"Uniform distribution for {name!r} needs low <= high")
+        if spec['dist'] == 'empirical' and len(spec['values']) == 0:
+            raise ValueError(f"Empirical distribution for {name!r} has no values")
+        return spec
+
+    @staticmethod
+    def sample(spec, rng: np.random.Generator, size: int) -> np.ndarray:
+        """Draw `size` values for one validated spec"""
+        if isinstance(spec, float):
+            return np.full(size, spec)
+
+        dist = spec['dist']
+        if dist == 'normal':
+            values = rng.normal(spec['mean'], spec['std'], size)
+        elif dist == 'triangular':
+            if spec['left'] == spec['right']:
+                values = np.full(size, float(spec['mode']))
+            else:
+                values = rng.triangular(spec['left'], spec['mode'], spec['right'], size)
+        elif dist == 'uniform':
+            values = rng.uniform(spec['low'], spec['high'], size)
+        else:
+            values = rng.choice(np.asarray(spec['values'], dtype=np.float64), size)
+
+        if spec.get('min') is not None or spec.get('max') is not None:
+            values = np.clip(values, spec.get('min'), spec.get('max'))
+        return values
+
+    def chunk_plan(self) -> List[Tuple[int, int, np.random.SeedSequence]]:
+        """(index, size, seed sequence) for every chunk, in order"""
+        n_chunks = -(-self.draws // self.chunk_size)
+        seeds = np.random.SeedSequence(self.seed).spawn(n_chunks)
+        sizes = [self.chunk_size] * (n_chunks - 1) + [self.draws - self.chunk_size * (n_chunks - 1)]
+        return list(zip(range(n_chunks), sizes, seeds))
+
+    def new_sketches(self) -> Dict[str, QuantileSketch]:
+        return {metric: QuantileSketch(self.relative_accuracy) for metric in self.METRICS}
+
+    def run_chunk(self, size: int, seed_sequence: np.random.SeedSequence) -> Dict[str, QuantileSketch]:
+        """Sample and value one chunk, returning its per-metric sketches"""
+        rng = np.random.default_rng(seed_sequence)
+        assumptions = dict(self.base_assumptions)
+        # Sorted so the draw order (and so every value) does not depend on request key order
+        for name in sorted(self.distributions):
+            assumptions[name] = self.sample(self.distributions[name], rng, size)
+        if not any(isinstance(value, np.ndarray) for value in assumptions.values()):
+            # Nothing varies: still value `size` identical scenarios
+            assumptions['terminal_growth_rate'] = np.full(
+                size, assumptions.get('terminal_growth_rate', self.engine.ASSUMPTION_DEFAULTS['terminal_growth_rate']))
+
+        result = self.engine.evaluate(**assumptions)
+        sketches = self.new_sketches()
+        for metric, sketch in sketches.items():
+            sketch.add(result[metric])
+        return sketches
+
+    def summarize(self, sketches: Dict[str, QuantileSketch], percentiles: Optional[Iterable[float]] = None,
+                  bins: int = 50, elapsed: Optional[float] = None) -> Dict:
+        """Build the JSON-ready result from merged sketches"""
+        percentiles = tuple(percentiles or self.DEFAULT_PERCENTILES)
+        if any(not 0 <= p <= 100 for p in percentiles):
+            raise ValueError("Percentiles must be between 0 and 100")
+        return {
+            'draws': self.draws,
+            'seed': self.seed,
+            'chunk_size': self.chunk_size,
+            'relative_accuracy': self.relative_accuracy,
+            'elapsed_seconds': None if elapsed is None else round(elapsed, 4),
+            'metrics': {metric: sketch.summary(percentiles, bins) for metric, sketch in sketches.items()}
+        }
+
+    def run(self, percentiles: Optional[Iterable[float]] = None, bins: int = 50) -> Dict:
+        """
+        Run every chunk in order and summarize
+
+        Returns:
+            Dict with draws, seed, chunk_size and per-metric count, mean, std, min, max,
+            percentiles ({'p5': ..., 'p50': ...}) and histogram (edges, counts, below, above)
+        """
+        start = time.perf_counter()
+        sketches = self.new_sketches()
+        for _, size, seed_sequence in self.chunk_plan():
+            for metric, sketch in self.run_chunk(size, seed_sequence).items():
+                sketches[metric].merge(sketch)
+        return self.summarize(sketches, percentiles, bins, time.perf_counter() - start)
@@ -5,6 +5,7 @@ Projects financial statements forward based on historical data and assumptions
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional
+from statement_json import encode_statement
 
 class OperatingModel:
     """Builds operating model projections from historical financial data"""
@@ -22,7 +23,91 @@ class OperatingModel:
         self.income_statement = None
         self.balance_sheet = None
         self.cash_flow = None
+    
+    @classmethod
+    def from_store(cls, store, cik: str, projection_years: int = 5,
+                   lookback_years: Optional[int] = None) -> Optional['OperatingModel']:
+        """
+        Build a model from statements saved in a StatementStore
+        
+        Args:
+            store: StatementStore holding the company's parsed statements
+            cik: Company CIK
+            projection_years: Number of years to project forward
+            lookback_years: Most recent fiscal years of history to use (default: all stored)
+        
+        Returns:
+            OperatingModel, or None if the company is not stored or has no statements
+        """
+        historical_data = store.get(cik, lookback_years=lookback_years)
+        if not historical_data or not (historical_data.get('income_statement') or historical_data.get('balance_sheet')):
+            return None
+        return cls(historical_data, projection_years=projection_years)
+    
+    @staticmethod
+    def operating_assumptions(assumptions: Dict) -> Dict:
+        """Pick the operating assumptions out of request-level DCF assumptions"""
+        # Convert None to actual None (not string "None")
+        revenue_growth = assumptions.get('revenue_growth')
+        gross_margin = assumptions.get('gross_margin')
+        sga_percent = assumptions.get('sga_percent')
+        
+        # Handle string "null" or "None"
+        if revenue_growth == "null" or revenue_growth == "None":
+            revenue_growth = None
+        if gross_margin == "null" or gross_margin == "None":
+            gross_margin = None
+        if sga_percent == "null" or sga_percent == "None":
+            sga_percent = None
+        
+        return {
+            'revenue_growth': revenue_growth,
+            'gross_margin': gross_margin,
+            'sga_percent': sga_percent,
+            'tax_rate': assumptions.get('tax_rate', 0.25)
+        }
         
+    # Income statement expenses, stored as negative values
+    EXPENSE_ITEMS = ['COGS', 'R&D', 'SG&A', 'TaxExpense', 'D&A',
+                     'OtherOperatingExpenses', 'OtherUnusualItems', 'MinorityInterest']
+    
+    # Historical margin column -> (line item, whether its absolute value is used), as % of revenue
+    MARGIN_ITEMS = {
+        'GrossMargin': ('GrossProfit', False),
+        'R&DPctRevenue': ('R&D', True),
+        'SG&APctRevenue': ('SG&A', True),
+        'OperatingMargin': ('OperatingIncome', False),
+        'OtherOperatingExpensesPctRevenue': ('OtherOperatingExpenses', False),
+        'OtherUnusualItemsPctRevenue': ('OtherUnusualItems', False)
+    }
+    
+    @staticmethod
+    def statement_frame(statement: Dict) -> pd.DataFrame:
+        """
+        Build a float64 statement frame (years x line items) from {year: {line_item: value}}
+        
+        Values are written into one 2-D float64 array and missing or non-numeric values
+        become 0 in a single fill, instead of building an object-dtype frame and
+        coercing it column by column.
+        
+        Args:
+            statement: Parsed statement, one dict of line items per year
+        """
+        years = list(statement.keys())
+        rows = [row if isinstance(row, dict) else {} for row in statement.values()]
+        # Line items in order of first appearance, as DataFrame(statement).T orders them
+        line_items = list(dict.fromkeys(item for row in rows for item in row))
+        
+        cells = [[row.get(item) for item in line_items] for row in rows]
+        try:
+            values = np.array(cells, dtype=np.float64).reshape(len(years), len(line_items))
+        except (TypeError, ValueError):
+            # Text such as 'N/A' somewhere in the statement: coerce cell by cell
+            coerced = pd.DataFrame(cells, dtype=object).apply(pd.to_numeric, errors='coerce')
+            values = np.array(coerced, dtype=np.float64).reshape(len(years), len(line_items))
+        values[np.isnan(values)] = 0.0
+        return pd.DataFrame(values, index=years, columns=line_items)
+    
     def prepare_historical_data(self) -> bool:
         """Convert historical data dictionaries to DataFrames"""
         try:
@@ -35,27 +120,14 @@ class OperatingModel:
                     print("DEBUG: Income statement is empty")
                     return False
                 
-                self.income_statement = pd.DataFrame(income_dict).T
+                self.income_statement = self.statement_frame(income_dict)
                 print(f"DEBUG: Income statement shape: {self.income_statement.shape}, columns: {list(self.income_statement.columns)}")
                 
-                # Convert to numeric, handling any non-numeric values
-                for col in self.income_statement.columns:
-                    try:
-                        self.income_statement[col] = pd.to_numeric(
-                            self.income_statement[col], errors='coerce'
-                        ).fillna(0)
-                    except Exception as e:
-                        print(f"DEBUG: Error converting column {col}: {e}")
-                        self.income_statement[col] = 0
-                
                 # Normalize expense items to be negative (SEC data may have them as positive)
                 # Expenses should be negative in income statements
-                expense_items = ['COGS', 'R&D', 'SG&A', 'TaxExpense', 'D&A', 
-                               'OtherOperatingExpenses', 'OtherUnusualItems', 'MinorityInterest']
-                for item in expense_items:
-                    if item in self.income_statement.columns:
-                        # If the value is positive, make it negative (expenses are negative)
-                        self.income_statement[item] = -abs(self.income_statement[item])
+                expense_items = [item for item in self.EXPENSE_ITEMS if item in self.income_statement.columns]
+                if expense_items:
+                    self.income_statement[expense_items] = -np.abs(self.income_statement[expense_items].to_numpy())
                 
                 # OtherIncomeExpenseNet is a combined line item that INCLUDES interest plus other items
                 # It's used for EBT calculation and kept separate for display
@@ -122,45 +194,20 @@ class OperatingModel:
                             net_income += self.income_statement['MinorityInterest']  # Minority Interest is negative
                         self.income_statement['NetIncome'] = net_income
                 
-                # Calculate margins and percentages for historical data (matching Excel structure)
+                # Calculate margins and percentages for historical data (matching Excel structure),
+                # all as one array division by revenue
                 if 'Revenue' in self.income_statement.columns:
-                    revenue_col = self.income_statement['Revenue']
-                    
-                    # Gross Margin
-                    if 'GrossProfit' in self.income_statement.columns:
-                        self.income_statement['GrossMargin'] = (
-                            self.income_statement['GrossProfit'] / revenue_col * 100
-                        ).fillna(0)
-                    
-                    # R&D % of Revenue
-                    if 'R&D' in self.income_statement.columns:
-                        self.income_statement['R&DPctRevenue'] = (
-                            abs(self.income_statement['R&D']) / revenue_col * 100
-                        ).fillna(0)
-                    
-                    # SG&A % of Revenue
-                    if 'SG&A' in self.income_statement.columns:
-                        self.income_statement['SG&APctRevenue'] = (
-                            abs(self.income_statement['SG&A']) / revenue_col * 100
-                        ).fillna(0)
-                    
-                    # Operating Margin (always calculate from Operating Income)
-                    if 'OperatingIncome' in self.income_statement.columns:
-                        self.income_statement['OperatingMargin'] = (
-                            self.income_statement['OperatingIncome'] / revenue_col * 100
-                        ).fillna(0)
-                    
-                    # Other Operating Expenses % of Revenue
-                    if 'OtherOperatingExpenses' in self.income_statement.columns:
-                        self.income_statement['OtherOperatingExpensesPctRevenue'] = (
-                            self.income_statement['OtherOperatingExpenses'] / revenue_col * 100
-                        ).fillna(0)
-                    
-                    # Other Unusual Items % of Revenue
-                    if 'OtherUnusualItems' in self.income_statement.columns:
-                        self.income_statement['OtherUnusualItemsPctRevenue'] = (
-                            self.income_statement['OtherUnusualItems'] / revenue_col * 100
-                        ).fillna(0)
+                    margins = [(column, item, absolute) for column, (item, absolute) in self.MARGIN_ITEMS.items()
+                               if item in self.income_statement.columns]
+                    if margins:
+                        values = self.income_statement[[item for _, item, _ in margins]].to_numpy(dtype=np.float64)
+                        absolute = np.array([absolute for _, _, absolute in margins])
+                        values = np.where(absolute, np.abs(values), values)
+                        revenue = self.income_statement['Revenue'].to_numpy(dtype=np.float64)
+                        with np.errstate(divide='ignore', invalid='ignore'):
+                            ratios = values / revenue[:, None] * 100
+                        ratios[np.isnan(ratios)] = 0.0
+                        self.income_statement[[column for column, _, _ in margins]] = ratios
                 
                 # Effective Tax Rate
                 if 'EBT' in self.income_statement.columns and 'TaxExpense' in self.income_statement.columns:
@@ -177,15 +224,7 @@ class OperatingModel:
                 if not balance_dict:
                     print("DEBUG: Balance sheet is empty")
                 else:
-                    self.balance_sheet = pd.DataFrame(balance_dict).T
-                    for col in self.balance_sheet.columns:
-                        try:
-                            self.balance_sheet[col] = pd.to_numeric(
-                                self.balance_sheet[col], errors='coerce'
-                            ).fillna(0)
-                        except Exception as e:
-                            print(f"DEBUG: Error converting balance sheet column {col}: {e}")
-                            self.balance_sheet[col] = 0
+                    self.balance_sheet = self.statement_frame(balance_dict)
             
             # Cash Flow
             if self.historical_data.get('cash_flow'):
@@ -193,15 +232,7 @@ class OperatingModel:
                 if not cashflow_dict:
                     print("DEBUG: Cash flow is empty")
                 else:
-                    self.cash_flow = pd.DataFrame(cashflow_dict).T
-                    for col in self.cash_flow.columns:
-                        try:
-                            self.cash_flow[col] = pd.to_numeric(
-                                self.cash_flow[col], errors='coerce'
-                            ).fillna(0)
-                        except Exception as e:
-                            print(f"DEBUG: Error converting cash flow column {col}: {e}")
-                            self.cash_flow[col] = 0
+                    self.cash_flow = self.statement_frame(cashflow_dict)
             
             return True
         except Exception as e:
@@ -243,454 +274,363 @@ class OperatingModel:
         
         return np.mean(growth_rates) if growth_rates else 0.0
     
-    # COMMENTED OUT: Projection logic - focusing on historical data only for now
-    # def project_income_statement(self, revenue_growth: float = None, 
-    #                              gross_margin: float = None,
-    #                              sga_percent: float = None,
-    #                              tax_rate: float = 0.25) -> pd.DataFrame:
-    #     """
-    #     Project Income Statement forward
-    #     
-    #     Args:
-    #         revenue_growth: Annual revenue growth rate (if None, uses historical average)
-    #         gross_margin: Target gross margin (if None, uses historical average)
-    #         sga_percent: SG&A as % of revenue (if None, uses historical average)
-    #         tax_rate: Tax rate for projections
-    #     """
-    #     if self.income_statement is None or self.income_statement.empty:
-    #         print("ERROR: Income statement is None or empty")
-    #         return pd.DataFrame()
-    #     
-    #     print(f"DEBUG: Income statement shape: {self.income_statement.shape}")
-    #     print(f"DEBUG: Income statement columns: {list(self.income_statement.columns)}")
-    #     print(f"DEBUG: Income statement index: {list(self.income_statement.index)}")
-    #     
-    #     latest_year_str = self.get_latest_year()
-    #     if latest_year_str is None:
-    #         print("ERROR: Could not determine latest year from income statement")
-    #         return pd.DataFrame()
-    #     
-    #     print(f"DEBUG: Latest year: {latest_year_str}")
-    #     latest_year = int(latest_year_str)
-    #     projection_data = []
-    #     
-    #     # Get historical averages
-    #     if revenue_growth is None:
-    #         if 'Revenue' in self.income_statement.columns:
-    #             revenue_series = self.income_statement['Revenue']
-    #             revenue_growth = self.calculate_average_growth_rate(revenue_series)
-    #         else:
-    #             revenue_growth = 0.05  # Default 5% growth
-    #     
-    #     if gross_margin is None:
-    #         if 'Revenue' in self.income_statement.columns and 'COGS' in self.income_statement.columns:
-    #             revenue = self.income_statement['Revenue']
-    #             cogs = self.income_statement['COGS']
-    #             # Filter out zeros and calculate gross margin
-    #             valid_mask = (revenue != 0) & (cogs != 0)
-    #             if valid_mask.any():
-    #                 # COGS is negative, so Revenue + COGS = Revenue - abs(COGS) = Gross Profit
-    #                 gross_profits = revenue + cogs  # COGS is negative
-    #                 gross_margins = gross_profits[valid_mask] / revenue[valid_mask]
-    #                 gross_margin = gross_margins.mean()
-    #                 # Ensure gross margin is reasonable (between 0 and 1)
-    #                 gross_margin = max(0.1, min(0.9, gross_margin))
-    #             else:
-    #                 gross_margin = 0.5
-    #         else:
-    #             gross_margin = 0.5
-    #     
-    #     if sga_percent is None:
-    #         if 'Revenue' in self.income_statement.columns and 'SG&A' in self.income_statement.columns:
-    #             revenue = self.income_statement['Revenue']
-    #             sga = self.income_statement['SG&A']
-    #             # Filter out zeros
-    #             valid_mask = (revenue != 0) & (sga != 0)
-    #             if valid_mask.any():
-    #                 sga_percents = abs(sga[valid_mask]) / revenue[valid_mask]
-    #                 sga_percent = sga_percents.mean()
-    #             else:
-    #                 sga_percent = 0.4
-    #         else:
-    #             sga_percent = 0.4
-    #     
-    #     # Get latest values - use proper DataFrame access
-    #     try:
-    #         latest_row = self.income_statement.loc[str(latest_year)]
-    #     except KeyError:
-    #         print(f"ERROR: Year {latest_year} not found in income statement index")
-    #         print(f"Available years: {list(self.income_statement.index)}")
-    #         # Try to use the last available year
-    #         if len(self.income_statement.index) > 0:
-    #             latest_year_str = str(self.income_statement.index[-1])
-    #             latest_year = int(latest_year_str.split('-')[0]) if '-' in latest_year_str else int(latest_year_str)
-    #             latest_row = self.income_statement.loc[latest_year_str]
-    #             print(f"Using latest available year: {latest_year}")
-    #         else:
-    #             return pd.DataFrame()
-    #     
-    #     latest_revenue = latest_row['Revenue'] if 'Revenue' in self.income_statement.columns else 0
-    #     latest_da = latest_row['D&A'] if 'D&A' in self.income_statement.columns else 0
-    #     
-    #     print(f"DEBUG: Latest revenue: {latest_revenue}, Latest D&A: {latest_da}")
-    #     
-    #     # Validate we have actual data
-    #     if latest_revenue == 0 or pd.isna(latest_revenue):
-    #         print(f"WARNING: Latest revenue is 0 or NaN for year {latest_year}")
-    #         # Try to get a recent non-zero revenue
-    #         if 'Revenue' in self.income_statement.columns:
-    #             revenue_col = self.income_statement['Revenue']
-    #             non_zero_revenues = revenue_col[revenue_col != 0]
-    #             if not non_zero_revenues.empty:
-    #                 latest_revenue = non_zero_revenues.iloc[-1]
-    #                 print(f"Using revenue from earlier year: {latest_revenue}")
-    #             else:
-    #                 print("ERROR: No valid revenue data found in income statement")
-    #                 print(f"Revenue column values: {revenue_col.tolist()}")
-    #                 print("Attempting to calculate revenue from other line items...")
-    #                 
-    #                 # Try to estimate revenue from other line items if available
-    #                 # If we have NetIncome and can estimate margins, we can work backwards
-    #                 if 'NetIncome' in self.income_statement.columns:
-    #                     net_income_col = self.income_statement['NetIncome']
-    #                     non_zero_ni = net_income_col[net_income_col != 0]
-    #                     if not non_zero_ni.empty:
-    #                         # Estimate revenue from net income assuming ~10% net margin
-    #                         estimated_revenue = abs(non_zero_ni.iloc[-1]) / 0.10
-    #                         print(f"Estimating revenue from Net Income: {estimated_revenue}")
-    #                         latest_revenue = estimated_revenue
-    #                     else:
-    #                         print("ERROR: Cannot estimate revenue - all values are zero")
-    #                         return pd.DataFrame()
-    #                 else:
-    #                     print("ERROR: Cannot estimate revenue - NetIncome not available")
-    #                     return pd.DataFrame()
-    #         else:
-    #             print("ERROR: Revenue column not found in income statement")
-    #             return pd.DataFrame()
-    #     
-    #     # Project forward
-    #     for year_offset in range(1, self.projection_years + 1):
-    #         year = latest_year + year_offset
-    #         
-    #         # Revenue (positive)
-    #         revenue = latest_revenue * ((1 + revenue_growth) ** year_offset)
-    #         
-    #         # COGS (negative expense)
-    #         # COGS = Revenue * (1 - Gross Margin)
-    #         cogs = -revenue * (1 - gross_margin)
-    #         
-    #         # Gross Profit = Revenue - COGS (since COGS is negative, this is Revenue + COGS)
-    #         gross_profit = revenue + cogs
-    #         
-    #         # SG&A (negative expense)
-    #         sga = -revenue * sga_percent
-    #         
-    #         # Other Operating Expenses (assume 0 for projections)
-    #         other_opex = 0
-    #         
-    #         # EBITDA = Gross Profit - SG&A - Other Operating Expenses
-    #         # Since SG&A and other_opex are negative, we add them
-    #         ebitda = gross_profit + sga + other_opex
-    #         
-    #         # D&A (negative expense, but we'll store as negative and add it back for EBITDA)
-    #         # D&A grows slower than revenue
-    #         da_positive = abs(latest_da) * (1 + revenue_growth * 0.5) if latest_da != 0 else revenue * 0.03
-    #         da = -da_positive  # Store as negative
-    #         
-    #         # Operating Income = EBITDA - D&A (since D&A is negative, this is EBITDA + abs(D&A))
-    #         operating_income = ebitda - da
-    #         
-    #         # Interest Expense (assume constant or small)
-    #         if 'InterestExpense' in self.income_statement.columns:
-    #             interest_expense = latest_row['InterestExpense'] if not pd.isna(latest_row['InterestExpense']) else -10.0
-    #         else:
-    #             interest_expense = -10.0
-    #         
-    #         # Other Unusual Items (assume 0)
-    #         other_unusual = 0
-    #         
-    #         # EBT
-    #         ebt = operating_income + interest_expense + other_unusual
-    #         
-    #         # Tax Expense
-    #         tax_expense = -ebt * tax_rate
-    #         
-    #         # Net Income
-    #         net_income = ebt + tax_expense
-    #         
-    #         # Calculate margins and percentages (matching Excel structure)
-    #         gross_margin_pct = (gross_profit / revenue * 100) if revenue != 0 else 0
-    #         sga_pct_revenue = (abs(sga) / revenue * 100) if revenue != 0 else 0
-    #         ebitda_margin = (ebitda / revenue * 100) if revenue != 0 else 0
-    #         operating_margin = (operating_income / revenue * 100) if revenue != 0 else 0
-    #         effective_tax_rate = (abs(tax_expense) / ebt * 100) if ebt != 0 else 0
-    #         other_opex_pct = (other_opex / revenue * 100) if revenue != 0 else 0
-    #         other_unusual_pct = (other_unusual / revenue * 100) if revenue != 0 else 0
-    #         
-    #         projection_data.append({
-    #             'Revenue': revenue,
-    #             'COGS': cogs,  # Already negative
-    #             'GrossProfit': gross_profit,
-    #             'GrossMargin': gross_margin_pct,  # As percentage
-    #             'SG&A': sga,  # Already negative
-    #             'SG&APctRevenue': sga_pct_revenue,  # As percentage
-    #             'OtherOperatingExpenses': other_opex,  # Already negative (0)
-    #             'OtherOperatingExpensesPctRevenue': other_opex_pct,  # As percentage
-    #             'EBITDA': ebitda,
-    #             'EBITDAMargin': ebitda_margin,  # As percentage
-    #             'D&A': da,  # Already negative
-    #             'OperatingIncome': operating_income,
-    #             'OperatingMargin': operating_margin,  # As percentage
-    #             'InterestExpense': interest_expense,  # Already negative (can be positive if income)
-    #             'OtherUnusualItems': other_unusual,  # 0
-    #             'OtherUnusualItemsPctRevenue': other_unusual_pct,  # As percentage
-    #             'EBT': ebt,
-    #             'TaxExpense': tax_expense,  # Negative
-    #             'EffectiveTaxRate': effective_tax_rate,  # As percentage
-    #             'NetIncome': net_income
-    #         })
-    #     
-    #     return pd.DataFrame(projection_data, index=[str(latest_year + i) for i in range(1, self.projection_years + 1)])
+    # Working capital items scaled with revenue; their net change is ChangeInWorkingCapital
+    WORKING_CAPITAL_ASSETS = ['AccountsReceivableNet', 'VendorNonTradeReceivables', 'Inventories', 'OtherCurrentAssets']
+    WORKING_CAPITAL_LIABILITIES = ['AccountsPayable', 'OtherCurrentLiabilities', 'DeferredRevenue']
     
-    # COMMENTED OUT: Projection logic - focusing on historical data only
-    # def project_balance_sheet(self, projected_income: pd.DataFrame,
-    #                          working_capital_ratios: Dict = None) -> pd.DataFrame:
-    #     """
-    #     Project Balance Sheet forward
-    #     
-    #     Args:
-    #         projected_income: Projected Income Statement
-    #         working_capital_ratios: Dict with ratios for AR, Inventory, AP as % of revenue
-    #     """
-    #     if self.balance_sheet is None or self.balance_sheet.empty:
-    #         return pd.DataFrame()
-    #     
-    #     latest_year_str = self.get_latest_year()
-    #     if latest_year_str is None:
-    #         return pd.DataFrame()
-    #     latest_year = int(latest_year_str)
-    #     
-    #     # Default working capital ratios
-    #     if working_capital_ratios is None:
-    #         # Calculate from historical data
-    #         if 'Revenue' in self.income_statement.columns:
-    #             latest_revenue = self.income_statement.loc[str(latest_year), 'Revenue']
-    #             # Assume typical ratios if not available
-    #             working_capital_ratios = {
-    #                 'ar_days': 30,
-    #                 'inventory_days': 60,
-    #                 'ap_days': 45
-    #             }
-    #         else:
-    #             working_capital_ratios = {
-    #                 'ar_days': 30,
-    #                 'inventory_days': 60,
-    #                 'ap_days': 45
-    #             }
-    #     
-    #     projection_data = []
-    #     latest_row = self.balance_sheet.loc[str(latest_year)]
-    #     latest_revenue_val = self.income_statement.loc[str(latest_year), 'Revenue'] if 'Revenue' in self.income_statement.columns else 1
-    #     
-    #     for year_offset in range(1, self.projection_years + 1):
-    #         year = latest_year + year_offset
-    #         year_str = str(year)
-    #         
-    #         # Get projected revenue
-    #         if 'Revenue' in projected_income.columns and year_str in projected_income.index:
-    #             projected_revenue = projected_income.loc[year_str, 'Revenue']
-    #         else:
-    #             print(f"WARNING: Revenue not found for year {year_str} in projected income")
-    #             projected_revenue = 0
-    #         
-    #         # Cash (will be calculated from cash flow)
-    #         cash = latest_row['Cash'] if 'Cash' in self.balance_sheet.columns else 0
-    #         
-    #         # Short Term Investments (assume constant or grow with revenue)
-    #         st_investments = latest_row['ShortTermInvestments'] if 'ShortTermInvestments' in self.balance_sheet.columns else 0
-    #         
-    #         # Current Assets (simplified - assume grows with revenue)
-    #         if latest_revenue_val > 0:
-    #             current_assets = (latest_row['CurrentAssets'] if 'CurrentAssets' in self.balance_sheet.columns else 0) * (projected_revenue / latest_revenue_val)
-    #         else:
-    #             current_assets = latest_row['CurrentAssets'] if 'CurrentAssets' in self.balance_sheet.columns else 0
-    #         
-    #         # PPE (grows with capex, depreciates)
-    #         ppe = latest_row['PPE'] if 'PPE' in self.balance_sheet.columns else 0
-    #         # Assume capex is ~3-5% of revenue
-    #         capex = projected_revenue * 0.04
-    #         da = abs(projected_income.loc[year_str, 'D&A'])
-    #         ppe = ppe + capex - da
-    #         
-    #         # Other Long Term Assets (grows with revenue)
-    #         other_lt_assets = (latest_row['OtherLongTermAssets'] if 'OtherLongTermAssets' in self.balance_sheet.columns else 0) * (1 + 0.02)  # 2% growth
-    #         
-    #         # Total Assets
-    #         total_assets = current_assets + ppe + other_lt_assets
-    #         
-    #         # Short Term Liabilities (grows with revenue)
-    #         if latest_revenue_val > 0:
-    #             st_liabilities = (latest_row['ShortTermLiabilities'] if 'ShortTermLiabilities' in self.balance_sheet.columns else 0) * (projected_revenue / latest_revenue_val)
-    #         else:
-    #             st_liabilities = latest_row['ShortTermLiabilities'] if 'ShortTermLiabilities' in self.balance_sheet.columns else 0
-    #         
-    #         # Long Term Debt (assume constant for now)
-    #         lt_debt = latest_row['LongTermDebt'] if 'LongTermDebt' in self.balance_sheet.columns else 0
-    #         
-    #         # Long Term Leases (assume constant)
-    #         lt_leases = latest_row['LongTermLeases'] if 'LongTermLeases' in self.balance_sheet.columns else 0
-    #         
-    #         # Other Long Term Liabilities (assume constant)
-    #         other_lt_liabilities = latest_row['OtherLongTermLiabilities'] if 'OtherLongTermLiabilities' in self.balance_sheet.columns else 0
-    #         
-    #         # Total Liabilities
-    #         total_liabilities = st_liabilities + lt_debt + lt_leases + other_lt_liabilities
-    #         
-    #         # Equity components
-    #         retained_earnings = latest_row['RetainedEarnings'] if 'RetainedEarnings' in self.balance_sheet.columns else 0
-    #         net_income = projected_income.loc[year_str, 'NetIncome']
-    #         retained_earnings = retained_earnings + net_income
-    #         
-    #         common_stock = latest_row['CommonStock'] if 'CommonStock' in self.balance_sheet.columns else 0
-    #         paid_in_capital = latest_row['PaidInCapital'] if 'PaidInCapital' in self.balance_sheet.columns else 0
-    #         
-    #         # Total Equity
-    #         total_equity = retained_earnings + common_stock + paid_in_capital
-    #         
-    #         projection_data.append({
-    #             'Cash': cash,
-    #             'ShortTermInvestments': st_investments,
-    #             'CurrentAssets': current_assets,
-    #             'PPE': ppe,
-    #             'OtherLongTermAssets': other_lt_assets,
-    #             'TotalAssets': total_assets,
-    #             'ShortTermLiabilities': st_liabilities,
-    #             'LongTermDebt': lt_debt,
-    #             'LongTermLeases': lt_leases,
-    #             'OtherLongTermLiabilities': other_lt_liabilities,
-    #             'TotalLiabilities': total_liabilities,
-    #             'RetainedEarnings': retained_earnings,
-    #             'CommonStock': common_stock,
-    #             'PaidInCapital': paid_in_capital,
-    #             'TotalEquity': total_equity
-    #         })
-    #     
-    #     return pd.DataFrame(projection_data, index=[str(latest_year + i) for i in range(1, self.projection_years + 1)])
+    def _historical_ratio(self, statement: pd.DataFrame, item: str, default: float) -> float:
+        """Average of abs(item) / Revenue over historical years where both are non-zero"""
+        if statement is None or item not in statement.columns or 'Revenue' not in self.income_statement.columns:
+            return default
+        revenue = self.income_statement['Revenue'].reindex(statement.index).to_numpy(dtype=np.float64)
+        values = np.abs(statement[item].to_numpy(dtype=np.float64))
+        valid = (revenue > 0) & (values != 0)
+        return float(np.mean(values[valid] / revenue[valid])) if valid.any() else default
     
-    def build_model(self, assumptions: Dict) -> Dict:
+    def _latest_value(self, statement: pd.DataFrame, item: str) -> float:
+        """Item's value in the latest historical year of a statement (0 if missing)"""
+        if statement is None or statement.empty or item not in statement.columns:
+            return 0.0
+        value = statement[item].iloc[-1]
+        return 0.0 if pd.isna(value) else float(value)
+    
+    def projection_drivers(self, assumptions: Dict) -> Dict:
         """
-        Build operating model with historical data and calculated metrics
-        (Projections are commented out - focusing on historical data only)
+        Resolve projection drivers, falling back to historical averages
         
         Args:
-            assumptions: Dict with assumptions (not used for projections currently)
+            assumptions: Dict with revenue_growth, gross_margin, sga_percent (decimals, None
+                for historical average) and tax_rate
+        
+        Returns:
+            Dict of scalar drivers used by the project_* methods
+        """
+        revenue = self.income_statement['Revenue'] if 'Revenue' in self.income_statement.columns else pd.Series(dtype=float)
+        positive_revenue = revenue[revenue > 0]
+        
+        revenue_growth = assumptions.get('revenue_growth')
+        if revenue_growth is None:
+            revenue_growth = self.calculate_average_growth_rate(positive_revenue) if len(positive_revenue) > 1 else 0.05
+        
+        gross_margin = assumptions.get('gross_margin')
+        if gross_margin is None:
+            if 'COGS' in self.income_statement.columns:
+                cogs_ratio = self._historical_ratio(self.income_statement, 'COGS', None)
+                # Keep the historical gross margin within a sensible band
+                gross_margin = 0.5 if cogs_ratio is None else max(0.1, min(0.9, 1 - cogs_ratio))
+            else:
+                gross_margin = 0.5
+        
+        sga_percent = assumptions.get('sga_percent')
+        if sga_percent is None:
+            sga_percent = self._historical_ratio(self.income_statement, 'SG&A', 0.4)
+        
+        # Latest non-zero revenue is the base the projections compound from
+        latest_revenue = float(positive_revenue.iloc[-1]) if not positive_revenue.empty else 0.0
+        
+        # Net working capital as a share of revenue, from the latest balance sheet
+        nwc = 0.0
+        if self.balance_sheet is not None and not self.balance_sheet.empty:
+            nwc = (sum(self._latest_value(self.balance_sheet, item) for item in self.WORKING_CAPITAL_ASSETS) -
+                   sum(self._latest_value(self.balance_sheet, item) for item in self.WORKING_CAPITAL_LIABILITIES))
+        
+        return {
+            'latest_revenue': latest_revenue,
+            'revenue_growth': float(revenue_growth),
+            'gross_margin': float(gross_margin),
+            'sga_percent': float(sga_percent),
+            'rd_percent': self._historical_ratio(self.income_statement, 'R&D', 0.0),
+            'da_percent': self._historical_ratio(self.income_statement, 'D&A', 0.03),
+            'capex_percent': self._historical_ratio(self.cash_flow, 'CapitalExpenditures', 0.04),
+            'nwc_percent': nwc / latest_revenue if latest_revenue else 0.0,
+            'other_income': self._latest_value(self.income_statement, 'OtherIncomeExpenseNet'),
+            'tax_rate': float(assumptions.get('tax_rate', 0.25))
+        }
+    
+    def projected_year_labels(self) -> List[str]:
+        """Fiscal years covered by the projection, as strings"""
+        latest_year = int(self.get_latest_year())
+        return [str(latest_year + offset) for offset in range(1, self.projection_years + 1)]
+    
+    def project_income_statement(self, drivers: Dict) -> pd.DataFrame:
+        """
+        Project the Income Statement for all projection years at once
+        
+        Revenue compounds at revenue_growth from the latest year; COGS, SG&A, R&D and
+        D&A are fixed shares of revenue; other income is held at its latest value.
+        Expenses are negative, as in the historical statement.
+        """
+        years_ahead = np.arange(1, self.projection_years + 1, dtype=np.float64)
+        revenue = drivers['latest_revenue'] * (1 + drivers['revenue_growth']) ** years_ahead
+        
+        cogs = -revenue * (1 - drivers['gross_margin'])
+        gross_profit = revenue + cogs
+        sga = -revenue * drivers['sga_percent']
+        rd = -revenue * drivers['rd_percent']
+        da = -revenue * drivers['da_percent']
+        other_opex = np.zeros_like(revenue)
+        operating_income = gross_profit + sga + rd + da + other_opex
+        other_income = np.full_like(revenue, drivers['other_income'])
+        other_unusual = np.zeros_like(revenue)
+        ebt = operating_income + other_income + other_unusual
+        tax_expense = -ebt * drivers['tax_rate']
+        net_income = ebt + tax_expense
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            def pct_of_revenue(values):
+                return np.where(revenue != 0, values / revenue * 100, 0.0)
+            effective_tax_rate = np.where(ebt != 0, np.abs(tax_expense) / ebt * 100, 0.0)
+            
+            projected = pd.DataFrame({
+                'Revenue': revenue,
+                'COGS': cogs,
+                'GrossProfit': gross_profit,
+                'GrossMargin': pct_of_revenue(gross_profit),
+                'R&D': rd,
+                'R&DPctRevenue': pct_of_revenue(np.abs(rd)),
+                'SG&A': sga,
+                'SG&APctRevenue': pct_of_revenue(np.abs(sga)),
+                'OtherOperatingExpenses': other_opex,
+                'OtherOperatingExpensesPctRevenue': pct_of_revenue(other_opex),
+                'D&A': da,
+                'OperatingIncome': operating_income,
+                'OperatingMargin': pct_of_revenue(operating_income),
+                'OtherIncomeExpenseNet': other_income,
+                'OtherUnusualItems': other_unusual,
+                'OtherUnusualItemsPctRevenue': pct_of_revenue(other_unusual),
+                'EBT': ebt,
+                'TaxExpense': tax_expense,
+                'EffectiveTaxRate': effective_tax_rate,
+                'NetIncomeBeforeMinorityInterest': net_income,
+                'MinorityInterest': np.zeros_like(revenue),
+                'NetIncome': net_income
+            }, index=self.projected_year_labels())
+        return projected
+    
+    def project_cash_flow(self, projected_income: pd.DataFrame, drivers: Dict) -> pd.DataFrame:
+        """
+        Project the Cash Flow Statement from the projected Income Statement
+        
+        ChangeInWorkingCapital is the increase in net working capital (a use of cash),
+        nwc_percent of the change in revenue. CapitalExpenditures is a positive payment,
+        as reported to the SEC.
+        """
+        revenue = projected_income['Revenue'].to_numpy()
+        previous_revenue = np.concatenate(([drivers['latest_revenue']], revenue[:-1]))
+        change_in_wc = drivers['nwc_percent'] * (revenue - previous_revenue)
+        
+        net_income = projected_income['NetIncome'].to_numpy()
+        da = np.abs(projected_income['D&A'].to_numpy())
+        operating_cash_flow = net_income + da - change_in_wc
+        capex = revenue * drivers['capex_percent']
+        
+        return pd.DataFrame({
+            'NetIncome': net_income,
+            'D&A': da,
+            'ChangeInWorkingCapital': change_in_wc,
+            'OperatingCashFlow': operating_cash_flow,
+            'CapitalExpenditures': capex,
+            'InvestingCashFlow': -capex,
+            'FinancingCashFlow': np.zeros_like(capex),
+            'NetCashFlow': operating_cash_flow - capex,
+            'FreeCashFlow': operating_cash_flow - capex
+        }, index=projected_income.index)
+    
+    def project_balance_sheet(self, projected_income: pd.DataFrame, projected_cash_flow: pd.DataFrame,
+                              drivers: Dict) -> pd.DataFrame:
+        """
+        Roll the latest Balance Sheet forward
+        
+        Working capital items scale with revenue, PP&E grows by capex less D&A, cash
+        accumulates free cash flow (no dividends, buybacks or new debt) and retained
+        earnings accumulate net income; everything else is held flat. Totals move by the
+        same amounts, so the projected balance sheet still balances.
+        """
+        if self.balance_sheet is None or self.balance_sheet.empty:
+            return pd.DataFrame()
+        
+        latest = self.balance_sheet.iloc[-1].astype(np.float64)
+        n_years = len(projected_income)
+        projected = pd.DataFrame(np.tile(latest.to_numpy(), (n_years, 1)),
+                                 index=projected_income.index, columns=self.balance_sheet.columns)
+        
+        revenue_ratio = (projected_income['Revenue'].to_numpy() / drivers['latest_revenue']
+                         if drivers['latest_revenue'] else np.ones(n_years))
+        
+        def scale(items: List[str]) -> np.ndarray:
+            """Scale items with revenue and return their total change vs the latest year"""
+            change = np.zeros(n_years)
+            for item in items:
+                if item in projected.columns:
+                    projected[item] = latest[item] * revenue_ratio
+                    change += projected[item].to_numpy() - latest[item]
+            return change
+        
+        def shift(item: str, change: np.ndarray):
+            if item in projected.columns:
+                projected[item] = latest[item] + change
+            else:
+                projected[item] = change
+        
+        wc_assets_change = scale(self.WORKING_CAPITAL_ASSETS)
+        wc_liabilities_change = scale(self.WORKING_CAPITAL_LIABILITIES)
+        cash_change = np.cumsum(projected_cash_flow['FreeCashFlow'].to_numpy())
+        ppe_change = np.cumsum(projected_cash_flow['CapitalExpenditures'].to_numpy() -
+                               projected_cash_flow['D&A'].to_numpy())
+        retained_change = np.cumsum(projected_income['NetIncome'].to_numpy())
+        
+        shift('CashAndCashEquivalents', cash_change)
+        shift('PropertyPlantAndEquipmentNet', ppe_change)
+        shift('TotalCurrentAssets', cash_change + wc_assets_change)
+        shift('TotalNonCurrentAssets', ppe_change)
+        shift('TotalAssets', cash_change + wc_assets_change + ppe_change)
+        shift('TotalCurrentLiabilities', wc_liabilities_change)
+        shift('TotalLiabilities', wc_liabilities_change)
+        shift('AccumulatedDeficit', retained_change)
+        shift('TotalShareholdersEquity', retained_change)
+        return projected
+    
+    STANDARD_LINE_ITEMS = [
+        'Revenue', 'COGS', 'GrossProfit', 'GrossMargin',
+        'R&D', 'R&DPctRevenue',
+        'SG&A', 'SG&APctRevenue',
+        'OtherOperatingExpenses', 'OtherOperatingExpensesPctRevenue',
+        'D&A',
+        'OperatingIncome', 'OperatingMargin',
+        'OtherIncomeExpenseNet',
+        'OtherUnusualItems', 'OtherUnusualItemsPctRevenue',
+        'EBT',
+        'TaxExpense', 'EffectiveTaxRate',
+        'NetIncomeBeforeMinorityInterest',
+        'MinorityInterest',
+        'NetIncome'
+    ]
+    
+    def prepare_model_inputs(self) -> Optional[str]:
+        """
+        Prepare and validate the historical statements the projections start from
         
         Returns:
-            Dict with historical financial statements with calculated metrics
+            None on success, otherwise an error message
         """
         if not self.prepare_historical_data():
-            return {'error': 'Failed to prepare historical data'}
+            return 'Failed to prepare historical data'
         
         # Check if income statement has required columns
         if self.income_statement is None or self.income_statement.empty:
-            return {'error': 'Income statement is empty. Please ensure company data was fetched correctly from SEC.'}
+            return 'Income statement is empty. Please ensure company data was fetched correctly from SEC.'
         
         if 'Revenue' not in self.income_statement.columns:
             available_cols = list(self.income_statement.columns) if not self.income_statement.empty else []
-            return {
-                'error': f'Revenue column not found in income statement. Available columns: {available_cols}. Please check that the company has filed XBRL data with the SEC.'
-            }
-        
-        # COMMENTED OUT: Projection logic - focusing on historical data only
-        # Project Income Statement
-        # revenue_growth = assumptions.get('revenue_growth')
-        # gross_margin = assumptions.get('gross_margin')
-        # sga_percent = assumptions.get('sga_percent')
-        # tax_rate = assumptions.get('tax_rate', 0.25)
-        # 
-        # projected_income = self.project_income_statement(
-        #     revenue_growth=revenue_growth,
-        #     gross_margin=gross_margin,
-        #     sga_percent=sga_percent,
-        #     tax_rate=tax_rate
-        # )
-        # 
-        # # Project Balance Sheet
-        # projected_balance = self.project_balance_sheet(projected_income)
-        # 
-        # # Project Cash Flow
-        # projected_cashflow = self.project_cash_flow(projected_income, projected_balance)
-        
-        # Return only historical data (with calculated metrics already added in prepare_historical_data)
-        latest_year_str = self.get_latest_year()
-        if latest_year_str is None:
-            return {'error': 'Could not determine latest year from historical data'}
-        
-        # Use historical data only (margins and percentages already calculated)
+            return f'Revenue column not found in income statement. Available columns: {available_cols}. Please check that the company has filed XBRL data with the SEC.'
+        
+        if self.get_latest_year() is None:
+            return 'Could not determine latest year from historical data'
+        
+        # Year strings sort chronologically; projections roll forward from the last row
+        for statement in ('income_statement', 'balance_sheet', 'cash_flow'):
+            frame = getattr(self, statement)
+            if frame is not None and not frame.empty:
+                setattr(self, statement, frame.sort_index())
+        
         # Ensure all standard line items exist (even if 0) for consistent display
-        standard_line_items = [
-            'Revenue', 'COGS', 'GrossProfit', 'GrossMargin',
-            'R&D', 'R&DPctRevenue',
-            'SG&A', 'SG&APctRevenue',
-            'OtherOperatingExpenses', 'OtherOperatingExpensesPctRevenue',
-            'D&A',
-            'OperatingIncome', 'OperatingMargin',
-            'OtherIncomeExpenseNet',
-            'OtherUnusualItems', 'OtherUnusualItemsPctRevenue',
-            'EBT',
-            'TaxExpense', 'EffectiveTaxRate',
-            'NetIncomeBeforeMinorityInterest',
-            'MinorityInterest',
-            'NetIncome'
-        ]
-        
-        # Add missing columns with 0 values
-        for item in standard_line_items:
+        for item in self.STANDARD_LINE_ITEMS:
             if item not in self.income_statement.columns:
                 self.income_statement[item] = 0.0
+        return None
+    
+    def project(self, drivers: Dict) -> Dict:
+        """
+        Project all three statements from resolved drivers
         
+        Args:
+            drivers: Output of projection_drivers ({} when nothing is projected)
+        
+        Returns:
+            Dict with 'drivers' and the projected 'income_statement', 'cash_flow' and
+            'balance_sheet' frames (empty when there is nothing to project)
+        """
+        projections = {
+            'drivers': drivers,
+            'income_statement': pd.DataFrame(),
+            'cash_flow': pd.DataFrame(),
+            'balance_sheet': pd.DataFrame()
+        }
+        if self.projection_years <= 0 or not drivers:
+            return projections
+        if drivers['latest_revenue'] <= 0:
+            print("WARNING: No positive historical revenue to project from; returning historical data only")
+            return projections
+        
+        # Each line item is computed for all projected years in one array operation
+        projected_income = self.project_income_statement(drivers)
+        projected_cashflow = self.project_cash_flow(projected_income, drivers)
+        projections['income_statement'] = projected_income
+        projections['cash_flow'] = projected_cashflow
+        projections['balance_sheet'] = self.project_balance_sheet(projected_income, projected_cashflow, drivers)
+        return projections
+    
+    def assemble_model(self, projections: Dict) -> Dict:
+        """
+        Combine prepared historical statements with projections into the serialized model
+        
+        Args:
+            projections: Output of project
+        
+        Returns:
+            Dict in the shape returned by build_model
+        """
         income_combined = self.income_statement
         balance_combined = self.balance_sheet if (self.balance_sheet is not None and not self.balance_sheet.empty) else pd.DataFrame()
         cashflow_combined = self.cash_flow if (self.cash_flow is not None and not self.cash_flow.empty) else pd.DataFrame()
         
-        # Convert to dict and ensure all values are JSON-serializable (convert numpy types to native Python types)
-        def convert_to_serializable(df_dict):
-            """Convert DataFrame dict to JSON-serializable format"""
-            import math
-            result = {}
-            for key, value in df_dict.items():
-                if isinstance(value, dict):
-                    row_dict = {}
-                    for k, v in value.items():
-                        # Handle NaN, inf, and other non-serializable values
-                        if isinstance(v, (int, float, complex)):
-                            if math.isnan(v) or math.isinf(v):
-                                row_dict[str(k)] = 0.0
-                            else:
-                                row_dict[str(k)] = float(v)
-                        else:
-                            row_dict[str(k)] = v
-                    result[str(key)] = row_dict
-                else:
-                    if isinstance(value, (int, float, complex)):
-                        if math.isnan(value) or math.isinf(value):
-                            result[str(key)] = 0.0
-                        else:
-                            result[str(key)] = float(value)
-                    else:
-                        result[str(key)] = value
-            return result
-        
-        income_dict = income_combined.to_dict('index')
-        balance_dict = balance_combined.to_dict('index')
-        cashflow_dict = cashflow_combined.to_dict('index')
+        projected_income = projections['income_statement']
+        projected_cashflow = projections['cash_flow']
+        projected_balance = projections['balance_sheet']
+        projected_years = list(projected_income.index)
+        
+        if projected_years:
+            income_combined = pd.concat([income_combined, projected_income])
+            if not cashflow_combined.empty:
+                # Historical counterparts of the projected cash flow lines, so those rows are not blank
+                cashflow_combined = cashflow_combined.copy()
+                history = self.income_statement.reindex(cashflow_combined.index)
+                cashflow_combined['NetIncome'] = history['NetIncome']
+                cashflow_combined['D&A'] = history['D&A'].abs()
+                if 'OperatingCashFlow' in cashflow_combined.columns and 'CapitalExpenditures' in cashflow_combined.columns:
+                    cashflow_combined['FreeCashFlow'] = (cashflow_combined['OperatingCashFlow'] -
+                                                         cashflow_combined['CapitalExpenditures'].abs())
+            cashflow_combined = pd.concat([cashflow_combined, projected_cashflow])
+            if not projected_balance.empty:
+                balance_combined = pd.concat([balance_combined, projected_balance])
         
+        # Columnar, NaN-safe payloads written straight from each frame's float64 buffer
         return {
-            'income_statement': convert_to_serializable(income_dict),
-            'balance_sheet': convert_to_serializable(balance_dict),
-            'cash_flow': convert_to_serializable(cashflow_dict),
-            'latest_year': latest_year_str,
-            'projection_years': 0  # No projections currently
+            'income_statement': encode_statement(income_combined),
+            'balance_sheet': encode_statement(balance_combined),
+            'cash_flow': encode_statement(cashflow_combined),
+            'latest_year': self.get_latest_year(),
+            'projection_years': len(projected_years),
+            'projected_years': projected_years,
+            'projection_drivers': projections['drivers']
         }
-
+    
+    def build_model(self, assumptions: Dict) -> Dict:
+        """
+        Build operating model with historical data, calculated metrics and projections
+        
+        Args:
+            assumptions: Dict with revenue_growth, gross_margin, sga_percent (None for
+                historical averages) and tax_rate
+        
+        Returns:
+            Dict with historical and projected financial statements (columnar, see
+            statement_json.encode_statement),
+            latest_year, projection_years, projected_years and the drivers used
+        """
+        error = self.prepare_model_inputs()
+        if error:
+            return {'error': error}
+        
+        drivers = self.projection_drivers(assumptions) if self.projection_years > 0 else {}
+        return self.assemble_model(self.project(drivers))
@@ -0,0 +1,84 @@
+"""
+Rate Limiter
+Token-bucket limiter shared by every thread (or coroutine) that calls the SEC APIs
+"""
+import asyncio
+import threading
+import time
+from typing import Dict
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket
+
+    Tokens refill continuously at `rate` per second up to `capacity`. Each acquire
+    reserves a token immediately (the balance may go negative) and then waits out its
+    share of the deficit, so concurrent callers are served in arrival order and the
+    long-run request rate never exceeds `rate`.
+    """
+
+    SEC_REQUESTS_PER_SECOND = 10  # SEC fair-access limit per client
+
+    _shared: Dict[str, 'TokenBucket'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rate: float, capacity: float = 1):
+        """
+        Initialize bucket
+
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum burst; 1 spaces requests evenly at 1/rate seconds
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.total_wait = 0.0
+        self.acquired = 0
+
+    @classmethod
+    def shared(cls, name: str, rate: float, capacity: float = 1) -> 'TokenBucket':
+        """Return the process-wide bucket for a name, creating it on first use"""
+        with cls._shared_lock:
+            bucket = cls._shared.get(name)
+            if bucket is None:
+                bucket = cls(rate, capacity=capacity)
+                cls._shared[name] = bucket
+            return bucket
+
+    def _reserve(self, tokens: float) -> float:
+        """Take tokens now and return how long the caller must wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.total_wait += wait
+            self.acquired += 1
+            return wait
+
+    def acquire(self, tokens: float = 1):
+        """Block until the tokens may be spent"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1):
+        """Wait (without blocking the event loop) until the tokens may be spent"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def stats(self) -> Dict:
+        """Return acquisition count and total time callers spent waiting"""
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'capacity': self.capacity,
+                'acquired': self.acquired,
+                'total_wait': round(self.total_wait, 3)
+            }
@@ -0,0 +1,246 @@
+"""
+Scenario Scheduler
+Shards large Monte Carlo and sensitivity jobs across worker processes with shared-memory inputs
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch_dcf import BatchDCFEngine
+from monte_carlo import MonteCarloSimulator, QuantileSketch
+
+ENGINE_ARRAYS = ('free_cash_flows', 'net_debt', 'shares_outstanding')
+
+
+class SharedArrays:
+    """
+    float64 arrays packed into one shared memory block
+
+    The parent copies every array in once; workers attach by name and read views of
+    the same pages, so prepared FCF series are never pickled per task. Only the
+    block name and a {key: (offset, shape)} layout travel with each task.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        """
+        Create the block
+
+        Args:
+            arrays: Arrays to share, by key
+        """
+        self.layout: Dict[str, Tuple[int, Tuple[int, ...]]] = {}
+        total = 0
+        for key, array in arrays.items():
+            shape = np.shape(array)
+            self.layout[key] = (total, shape)
+            total += int(np.prod(shape))
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(total, 1) * 8)
+        buffer = np.ndarray((total,), dtype=np.float64, buffer=self.shm.buf)
+        for key, array in arrays.items():
+            offset, shape = self.layout[key]
+            buffer[offset:offset + int(np.prod(shape))] = np.asarray(array, dtype=np.float64).ravel()
+        del buffer  # Views must be gone before the block can be closed
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @staticmethod
+    def views(shm: shared_memory.SharedMemory, layout: Dict) -> Dict[str, np.ndarray]:
+        """Read-only array views into an attached block"""
+        views = {}
+        for key, (offset, shape) in layout.items():
+            view = np.ndarray(shape, dtype=np.float64, buffer=shm.buf, offset=offset * 8)
+            view.flags.writeable = False
+            views[key] = view
+        return views
+
+    def close(self):
+        """Release and remove the block (parent side, after all tasks finished)"""
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _engine_arrays(engine: BatchDCFEngine, prefix: str) -> Dict[str, np.ndarray]:
+    return {f"{prefix}/{name}": getattr(engine, name) for name in ENGINE_ARRAYS}
+
+
+def _attached_engine(views: Dict[str, np.ndarray], prefix: str, projection_years: int) -> BatchDCFEngine:
+    return BatchDCFEngine(views[f"{prefix}/free_cash_flows"],
+                          net_debt=views[f"{prefix}/net_debt"],
+                          shares_outstanding=views[f"{prefix}/shares_outstanding"],
+                          projection_years=projection_years)
+
+
+def _with_shared_block(shm_name: str, task: Callable):
+    """Attach to a block, run task(shm) and detach"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        return task(shm)
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            # Only when task raised: its traceback still holds views; the mapping goes with the worker
+            pass
+
+
+def _monte_carlo_task(shm_name: str, layout: Dict, prefix: str, projection_years: int, config: Dict,
+                      chunks: List[Tuple[int, int, np.random.SeedSequence]]) -> List[Tuple[int, Dict[str, QuantileSketch]]]:
+    """Worker: value a run of Monte Carlo chunks, returning (chunk index, sketches) pairs"""
+    def run(shm):
+        engine = _attached_engine(SharedArrays.views(shm, layout), prefix, projection_years)
+        simulator = MonteCarloSimulator(engine, **config)
+        return [(index, simulator.run_chunk(size, seed_sequence)) for index, size, seed_sequence in chunks]
+    return _with_shared_block(shm_name, run)
+
+
+def _sensitivity_task(shm_name: str, layout: Dict, prefix: str, projection_years: int,
+                      axes: Sequence[Tuple[str, np.ndarray]], base_assumptions: Optional[Dict],
+                      metrics: Sequence[str], start: int, stop: int) -> Tuple[int, Dict[str, np.ndarray]]:
+    """Worker: value grid cells [start, stop), returning the requested metrics"""
+    def run(shm):
+        engine = _attached_engine(SharedArrays.views(shm, layout), prefix, projection_years)
+        result = engine.evaluate_cells(axes, base_assumptions, start, stop)
+        return start, {metric: result[metric].copy() for metric in metrics}
+    return _with_shared_block(shm_name, run)
+
+
+class ScenarioScheduler:
+    """
+    Fans valuation work out to a ProcessPoolExecutor
+
+    Monte Carlo jobs are split along MonteCarloSimulator's chunk plan, whose chunks
+    and seeds depend only on (seed, draws, chunk_size); chunk sketches are merged in
+    chunk order, so results are bit-identical to MonteCarloSimulator.run() for any
+    worker count. Sensitivity grids are split into contiguous cell ranges, which are
+    independent and reassembled by offset. Jobs below the parallel thresholds (or
+    with max_workers=1) run in-process through the same code path.
+    """
+
+    TASKS_PER_WORKER = 4        # Tasks queued per worker, for load balancing
+    MIN_PARALLEL_DRAWS = 500_000
+    MIN_PARALLEL_CELLS = 250_000
+
+    def __init__(self, max_workers: Optional[int] = None, mp_context=None):
+        """
+        Initialize scheduler
+
+        Args:
+            max_workers: Worker processes (defaults to the CPU count)
+            mp_context: multiprocessing context for the pool (platform default if None). A
+                multithreaded caller such as the Flask app should pass a 'forkserver' or
+                'spawn' context: forked workers inherit locks other threads may be holding.
+        """
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.mp_context = mp_context
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        """Start the worker pool on first use (once, even under concurrent requests); it is reused across jobs"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self.mp_context)
+            return self._pool
+
+    def _map(self, function: Callable, tasks: List[Tuple], parallel: bool) -> List:
+        """Run function(*task) for every task, in worker processes when parallel"""
+        if not parallel or self.max_workers == 1 or len(tasks) == 1:
+            return [function(*task) for task in tasks]
+        futures = [self._executor().submit(function, *task) for task in tasks]
+        return [future.result() for future in futures]
+
+    def _task_size(self, items: int) -> int:
+        return max(1, -(-items // (self.max_workers * self.TASKS_PER_WORKER)))
+
+    def monte_carlo(self, simulator: MonteCarloSimulator, percentiles=None, bins: int = 50) -> Dict:
+        """Run one simulation (see MonteCarloSimulator.run), sharded when it is large"""
+        return self.monte_carlo_many({None: simulator}, percentiles=percentiles, bins=bins)[None]
+
+    def monte_carlo_many(self, simulators: Dict[Hashable, MonteCarloSimulator], percentiles=None,
+                         bins: int = 50) -> Dict[Hashable, Dict]:
+        """
+        Run many simulations (e.g. one per company in a coverage universe) on one pool
+
+        Args:
+            simulators: {key: MonteCarloSimulator}, typically keyed by CIK
+            percentiles: Percentiles to report
+            bins: Histogram bins
+
+        Returns:
+            {key: result} in the shape of MonteCarloSimulator.run
+        """
+        start = time.perf_counter()
+        keys = list(simulators)
+        arrays = {}
+        for position, key in enumerate(keys):
+            arrays.update(_engine_arrays(simulators[key].engine, str(position)))
+        shared = SharedArrays(arrays)
+        try:
+            tasks = []
+            for position, key in enumerate(keys):
+                simulator = simulators[key]
+                plan = simulator.chunk_plan()
+                step = self._task_size(len(plan) * len(keys))
+                for offset in range(0, len(plan), step):
+                    tasks.append((shared.name, shared.layout, str(position), simulator.engine.projection_years,
+                                  simulator.config(), plan[offset:offset + step]))
+
+            total_draws = sum(simulator.draws for simulator in simulators.values())
+            task_results = self._map(_monte_carlo_task, tasks, total_draws >= self.MIN_PARALLEL_DRAWS)
+        finally:
+            shared.close()
+
+        # Merge strictly in chunk order so floating-point moments never depend on scheduling
+        chunk_sketches: Dict[Tuple[int, int], Dict[str, QuantileSketch]] = {}
+        for task, results in zip(tasks, task_results):
+            position = int(task[2])
+            for index, sketches in results:
+                chunk_sketches[(position, index)] = sketches
+
+        elapsed = time.perf_counter() - start
+        output = {}
+        for position, key in enumerate(keys):
+            simulator = simulators[key]
+            merged = simulator.new_sketches()
+            for index in range(len(simulator.chunk_plan())):
+                for metric, sketch in chunk_sketches[(position, index)].items():
+                    merged[metric].merge(sketch)
+            output[key] = simulator.summarize(merged, percentiles, bins, elapsed)
+        return output
+
+    def sensitivity(self, engine: BatchDCFEngine, axes: Sequence[Tuple[str, np.ndarray]],
+                    base_assumptions: Optional[Dict] = None,
+                    metrics: Sequence[str] = ('equity_value', 'price_per_share')) -> Dict:
+        """Value a sensitivity grid (see BatchDCFEngine.sensitivity), sharded by cell range when it is large"""
+        cells = engine.grid_cells(axes)
+        axes = [(name, np.asarray(values, dtype=np.float64)) for name, values in axes]
+        shared = SharedArrays(_engine_arrays(engine, '0'))
+        try:
+            step = self._task_size(cells)
+            tasks = [(shared.name, shared.layout, '0', engine.projection_years, axes, base_assumptions,
+                      tuple(metrics), offset, min(cells, offset + step))
+                     for offset in range(0, cells, step)]
+            task_results = self._map(_sensitivity_task, tasks, cells >= self.MIN_PARALLEL_CELLS)
+        finally:
+            shared.close()
+
+        values = {metric: np.empty(cells, dtype=np.float64) for metric in metrics}
+        for offset, chunk in task_results:
+            for metric, chunk_values in chunk.items():
+                values[metric][offset:offset + len(chunk_values)] = chunk_values
+        return engine.grid_output(axes, values)
+
+    def close(self):
+        """Shut down the worker pool"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
@@ -3,14 +3,29 @@ SEC XBRL API Client
 Fetches and parses financial data from SEC EDGAR database
 """
 import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
+import re
 import time
+import zipfile
+from facts_cache import CompanyFactsCache
+from facts_stream import iter_file_chunks, load_filtered_facts
+from fact_index import FactIndex, ParseContext
+from rate_limiter import TokenBucket
+from statement_store import StatementStore
+from ticker_index import TickerIndex
 
 class SECClient:
     """Client for fetching financial data from SEC XBRL API"""
     
     BASE_URL = "https://www.sec.gov"
+    # Company facts API uses data.sec.gov, not www.sec.gov
+    COMPANY_FACTS_URL = "https://data.sec.gov/api/xbrl/companyfacts/CIK{cik}.json"
     HEADERS = {
         'User-Agent': 'DCF Tool (contact@example.com)',
         'Accept-Encoding': 'gzip, deflate',
@@ -216,6 +231,20 @@ class SECClient:
         ]
     }
     
+    # Balance sheet items that are added together (total debt and total cash for net debt,
+    # see DCFCalculator.DEBT_ITEMS / CASH_ITEMS). Their concept lists overlap, so within a
+    # group a filing fact may back only one item per year.
+    ADDITIVE_LINE_ITEMS = (
+        ('CommercialPaper', 'TermDebtCurrent', 'TermDebtNonCurrent'),
+        ('CashAndCashEquivalents', 'MarketableSecuritiesCurrent')
+    )
+    # Concepts whose amount already includes other items of the same group
+    INCLUSIVE_CONCEPTS = {
+        'CashCashEquivalentsAndShortTermInvestments': ('MarketableSecuritiesCurrent',),
+        'CashAndShortTermInvestments': ('MarketableSecuritiesCurrent',),
+        'DebtCurrent': ('CommercialPaper', 'TermDebtCurrent')
+    }
+    
     CASH_FLOW_CONCEPTS = {
         'OperatingCashFlow': [
             'NetCashProvidedByUsedInOperatingActivities', 'CashFlowFromOperatingActivities',
@@ -245,41 +274,52 @@ class SECClient:
         ]
     }
     
-    def __init__(self):
+    DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.sec_cache')
+    
+    STREAM_CHUNK_SIZE = 64 * 1024
+    DEFAULT_MAX_WORKERS = 8  # Concurrent fetches in fetch_many
+    
+    # Fiscal years parsed per statement, counted back from the filer's latest fiscal year
+    DEFAULT_LOOKBACK_YEARS = 5
+    MAX_LOOKBACK_YEARS = 20
+    # A concept is current if its latest value is at most this many years older than the filer's latest fiscal year
+    CURRENT_CONCEPT_LAG = 2
+    
+    def __init__(self, cache_dir: Optional[str] = None,
+                 cache_ttl: float = CompanyFactsCache.DEFAULT_TTL,
+                 stream_facts: bool = False,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 max_workers: int = DEFAULT_MAX_WORKERS,
+                 lookback_years: int = DEFAULT_LOOKBACK_YEARS):
+        """
+        Initialize SEC client
+        
+        Args:
+            cache_dir: Directory for the on-disk companyfacts cache (defaults to .sec_cache)
+            cache_ttl: Seconds a cached companyfacts payload is used before revalidation
+            stream_facts: Parse companyfacts incrementally and keep only mapped concepts
+            rate_limiter: Limiter for SEC requests (defaults to the process-wide 10 req/s bucket)
+            max_workers: Default concurrency for fetch_many; also sizes the connection pool
+            lookback_years: Default fiscal years of history per statement (1 to MAX_LOOKBACK_YEARS)
+        """
+        self.lookback_years = self.check_lookback(lookback_years)
+        self.stream_facts = stream_facts
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or TokenBucket.shared('sec.gov', TokenBucket.SEC_REQUESTS_PER_SECOND)
         self.session = requests.Session()
         self.session.headers.update(self.HEADERS)
+        # One pooled connection per worker so concurrent fetches reuse TLS sessions
+        self.session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=max_workers))
+        cache_dir = cache_dir or self.DEFAULT_CACHE_DIR
+        self.facts_cache = CompanyFactsCache(cache_dir, ttl=cache_ttl)
+        self.ticker_index = TickerIndex.shared(os.path.join(cache_dir, 'company_tickers.json'))
     
     def get_cik_from_ticker(self, ticker: str) -> Optional[str]:
         """Convert ticker symbol to CIK number"""
         try:
-            # SEC company tickers JSON - new format is a dict with numeric keys
-            # Use www.sec.gov for this endpoint (not data.sec.gov)
-            url = f"https://www.sec.gov/files/company_tickers.json"
-            # Create a new request with proper headers (don't use session headers for this endpoint)
-            headers = {
-                'User-Agent': 'DCF Tool contact@example.com',
-                'Accept': 'application/json',
-                'Accept-Encoding': 'gzip, deflate'
-            }
-            # Use requests directly instead of session to avoid header conflicts
-            import requests as req_lib
-            response = req_lib.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            ticker_upper = ticker.upper().strip()
-            
-            # New SEC API structure: dict with numeric keys, each value is:
-            # {'cik_str': 1234567, 'ticker': 'AAPL', 'title': 'COMPANY NAME'}
-            if isinstance(data, dict):
-                for key, company_info in data.items():
-                    if isinstance(company_info, dict):
-                        entry_ticker = str(company_info.get('ticker', '')).upper().strip()
-                        if entry_ticker == ticker_upper:
-                            cik = str(company_info.get('cik_str', ''))
-                            if cik:
-                                # Pad CIK to 10 digits
-                                return cik.zfill(10)
+            cik = self.ticker_index.lookup_cik(ticker)
+            if cik:
+                return cik
             
             print(f"Ticker {ticker} not found in SEC database")
             return None
@@ -292,126 +332,265 @@ class SECClient:
             traceback.print_exc()
             return None
     
+    def get_ticker_from_cik(self, cik: str) -> Optional[str]:
+        """Convert CIK number to its primary ticker symbol"""
+        try:
+            tickers = self.ticker_index.lookup_tickers(cik)
+            return tickers[0] if tickers else None
+        except Exception as e:
+            print(f"Error looking up ticker for CIK {cik}: {e}")
+            return None
+    
+    @classmethod
+    def mapped_concepts(cls) -> frozenset:
+        """
+        Every concept name the statement parsers can read
+        
+        The revenue aggregation and fiscal-year-end test concepts are all members of
+        INCOME_STATEMENT_CONCEPTS / BALANCE_SHEET_CONCEPTS, so the three maps suffice.
+        """
+        concepts = set()
+        for concept_map in (cls.INCOME_STATEMENT_CONCEPTS, cls.BALANCE_SHEET_CONCEPTS, cls.CASH_FLOW_CONCEPTS):
+            for concept_list in concept_map.values():
+                concepts.update(concept_list)
+        return frozenset(concepts)
+    
+    def _load_cached_facts(self, entry: Dict) -> Dict:
+        """Decode a cached payload, streaming it through the concept filter in stream mode"""
+        if self.stream_facts:
+            with self.facts_cache.open_blob(entry) as f:
+                return load_filtered_facts(iter_file_chunks(f, self.STREAM_CHUNK_SIZE), self.mapped_concepts())
+        return json.loads(self.facts_cache.read(entry))
+    
+    def _store_payload(self, cik: str, payload: bytes, etag: Optional[str] = None,
+                       last_modified: Optional[str] = None) -> Dict:
+        """Cache a fully downloaded payload and decode it"""
+        entry = self.facts_cache.store(cik, payload, etag=etag, last_modified=last_modified)
+        self.facts_cache.record_miss()
+        if self.stream_facts:
+            return self._load_cached_facts(entry)
+        return json.loads(payload)
+    
     def get_company_facts(self, cik: str) -> Optional[Dict]:
-        """Fetch company facts (XBRL data) for a given CIK"""
+        """
+        Fetch company facts (XBRL data) for a given CIK
+        
+        Payloads are served from the on-disk cache while within the TTL. Stale entries
+        are revalidated with ETag/Last-Modified so an unchanged filing costs a 304, not a
+        full multi-megabyte download.
+        
+        With stream_facts the download is streamed to the cache and parsed back from it
+        incrementally, so only the concepts in the *_CONCEPTS maps are ever materialized.
+        """
+        cik = cik.zfill(10)
         try:
-            # Company facts API uses data.sec.gov, not www.sec.gov
-            url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik.zfill(10)}.json"
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            time.sleep(0.1)  # Rate limiting
-            return response.json()
+            entry = self.facts_cache.lookup(cik)
+            if entry and self.facts_cache.is_fresh(entry):
+                self.facts_cache.record_hit()
+                return self._load_cached_facts(entry)
+            
+            url = self.COMPANY_FACTS_URL.format(cik=cik)
+            headers = CompanyFactsCache.conditional_headers(entry)
+            self.rate_limiter.acquire()  # SEC fair-access limit, shared across threads
+            response = self.session.get(url, headers=headers, timeout=10, stream=self.stream_facts)
+            
+            with response:
+                if response.status_code == 304 and entry:
+                    self.facts_cache.touch(cik, entry,
+                                           etag=response.headers.get('ETag'),
+                                           last_modified=response.headers.get('Last-Modified'))
+                    self.facts_cache.record_hit(revalidated=True)
+                    return self._load_cached_facts(entry)
+                
+                response.raise_for_status()
+                if self.stream_facts:
+                    entry = self.facts_cache.store_stream(cik, response.iter_content(self.STREAM_CHUNK_SIZE),
+                                                          etag=response.headers.get('ETag'),
+                                                          last_modified=response.headers.get('Last-Modified'))
+                    self.facts_cache.record_miss()
+                    return self._load_cached_facts(entry)
+                
+                return self._store_payload(cik, response.content,
+                                           etag=response.headers.get('ETag'),
+                                           last_modified=response.headers.get('Last-Modified'))
         except Exception as e:
             print(f"Error fetching company facts for CIK {cik}: {e}")
             return None
     
-    def extract_concept_value(self, facts: Dict, concept_list: List[str], 
+    def resolve_lookback(self, lookback_years: Optional[int] = None) -> int:
+        """Lookback to parse with: lookback_years if given (validated), else the client default"""
+        return self.lookback_years if lookback_years is None else self.check_lookback(lookback_years)
+    
+    @classmethod
+    def check_lookback(cls, lookback_years) -> int:
+        """
+        Validate a lookback in fiscal years
+        
+        Raises:
+            ValueError: If it is not a whole number of years between 1 and MAX_LOOKBACK_YEARS
+        """
+        if isinstance(lookback_years, bool) or not isinstance(lookback_years, (int, np.integer)) or \
+                not 1 <= lookback_years <= cls.MAX_LOOKBACK_YEARS:
+            raise ValueError(f"lookback_years must be a whole number from 1 to {cls.MAX_LOOKBACK_YEARS}, "
+                             f"got {lookback_years!r}")
+        return int(lookback_years)
+    
+    def resolve_max_workers(self, max_workers=None) -> int:
+        """
+        Concurrency for fetch_many: max_workers if given, capped at the client's max_workers
+        (which sizes the connection pool), else the client default
+        
+        Raises:
+            ValueError: If max_workers is not a whole number of at least 1
+        """
+        if max_workers is None:
+            return self.max_workers
+        if isinstance(max_workers, str) and max_workers.strip().isdigit():
+            max_workers = int(max_workers)
+        if isinstance(max_workers, bool) or not isinstance(max_workers, (int, np.integer)) or max_workers < 1:
+            raise ValueError(f"max_workers must be a whole number of at least 1, got {max_workers!r}")
+        return min(int(max_workers), self.max_workers)
+    
+    def _as_parse_context(self, facts) -> Optional[ParseContext]:
+        """Accept a raw companyfacts dict, a FactIndex, or an existing ParseContext"""
+        if isinstance(facts, ParseContext):
+            return facts
+        if isinstance(facts, FactIndex):
+            return ParseContext(facts)
+        if not facts or 'facts' not in facts:
+            return None
+        return ParseContext(FactIndex(facts))
+    
+    @staticmethod
+    def _fiscal_year_ends_key(fiscal_year_ends: Optional[Dict]) -> tuple:
+        """Hashable form of a fiscal-year-end map for memo keys"""
+        return tuple(sorted(fiscal_year_ends.items())) if fiscal_year_ends else ()
+    
+    def _preferred_unit(self, ctx: ParseContext, namespace: str, concept: str,
+                        preferred_units: List[str]) -> Optional[str]:
+        """Memoized unit choice for a concept"""
+        units = ctx.index.units(namespace, concept) or {}
+        return ctx.memoize('preferred_unit', (namespace, concept, tuple(preferred_units)),
+                           lambda: self._pick_unit(units, preferred_units))
+    
+    @staticmethod
+    def _pick_unit(units: Dict[str, slice], preferred_units: List[str]) -> Optional[str]:
+        """Pick the first preferred unit a concept was filed in, else its first unit"""
+        for pref_unit in preferred_units:
+            if pref_unit in units:
+                return pref_unit
+        if units:
+            return next(iter(units))
+        return None
+    
+    def extract_concept_value(self, facts, concept_list: List[str], 
                              namespace: str = 'us-gaap') -> Optional[float]:
         """Extract the most recent value for a concept from XBRL facts"""
-        if 'facts' not in facts:
+        ctx = self._as_parse_context(facts)
+        if ctx is None or not ctx.index.has_namespace(namespace):
             return None
-        
-        facts_data = facts['facts']
-        if namespace not in facts_data:
-            return None
-        
-        namespace_facts = facts_data[namespace]
+        index = ctx.index
         
         for concept_name in concept_list:
-            if concept_name in namespace_facts:
-                concept_data = namespace_facts[concept_name]
-                if 'units' in concept_data:
-                    # Get the most recent value (usually in USD)
-                    for unit, data_list in concept_data['units'].items():
-                        if data_list and len(data_list) > 0:
-                            # Sort by end date, get most recent
-                            sorted_data = sorted(data_list, 
-                                                key=lambda x: x.get('end', ''), 
-                                                reverse=True)
-                            if sorted_data:
-                                return float(sorted_data[0].get('val', 0))
+            units = index.units(namespace, concept_name)
+            if units:
+                # Get the most recent value (usually in USD)
+                for unit, rows in units.items():
+                    if rows.stop > rows.start:
+                        # First fact with the latest end date
+                        latest = max(range(rows.start, rows.stop), key=lambda i: index.end_str[i])
+                        return float(index.val[latest])
         return None
     
-    def _determine_fiscal_year_end_pattern(self, facts: Dict) -> Optional[Dict]:
+    def _latest_fiscal_year(self, ctx: ParseContext) -> Optional[int]:
+        """
+        Calendar year of the filer's latest full-year period (latest fact year if it has none)
+        
+        Recency checks are made relative to this year rather than to fixed calendar years,
+        so older filings and long lookbacks parse the same way as current ones.
+        """
+        def compute():
+            index = ctx.index
+            duration = index.duration_days
+            annual = index.valid & index.is_period & (duration >= 330) & (duration <= 400)
+            years = index.calendar_year[annual]
+            if years.size == 0:
+                years = index.calendar_year[index.valid]
+            return int(years.max()) if years.size else None
+        return ctx.memoize('latest_fiscal_year', None, compute)
+    
+    def _history_years(self, ctx: ParseContext) -> int:
+        """Fiscal years of full-year history in the filing, oldest full-year period to latest fiscal year"""
+        def compute():
+            index = ctx.index
+            duration = index.duration_days
+            annual = index.valid & index.is_period & (duration >= 330) & (duration <= 400)
+            years = index.calendar_year[annual]
+            if years.size == 0:
+                years = index.calendar_year[index.valid]
+            return int(years.max() - years.min()) + 1 if years.size else 0
+        return ctx.memoize('history_years', None, compute)
+    
+    def _earliest_year(self, ctx: ParseContext, lookback_years: int) -> int:
+        """Oldest calendar year considered for a lookback"""
+        latest_year = self._latest_fiscal_year(ctx)
+        return latest_year - lookback_years if latest_year is not None else 0
+    
+    def _determine_fiscal_year_end_pattern(self, facts, lookback_years: Optional[int] = None) -> Optional[Dict]:
         """
         Determine the company's fiscal year end pattern by looking at recent annual data.
-        Returns a dict mapping calendar year to fiscal year end date (YYYY-MM-DD).
+        Returns a dict mapping calendar year to fiscal year end date (YYYY-MM-DD), covering
+        the lookback window. Computed once per ParseContext and lookback; repeated calls
+        return the memoized map.
         """
-        if 'facts' not in facts:
+        ctx = self._as_parse_context(facts)
+        if ctx is None:
             return None
-        
-        facts_data = facts['facts']
-        us_gaap = facts_data.get('us-gaap', {})
-        
+        earliest_year = self._earliest_year(ctx, self.resolve_lookback(lookback_years))
+        return ctx.memoize('fiscal_year_ends', earliest_year,
+                           lambda: self._compute_fiscal_year_end_pattern(ctx.index, earliest_year))
+    
+    def _compute_fiscal_year_end_pattern(self, index: FactIndex, earliest_year: int) -> Optional[Dict]:
+        """Scan test concepts for annual periods and map calendar year -> fiscal year end date"""
         # Look for a common concept that should have recent annual data (e.g., Revenue, OperatingIncome)
         test_concepts = ['Revenues', 'OperatingIncomeLoss', 'NetIncomeLoss', 'Assets']
         fiscal_year_ends = {}  # Maps calendar year -> fiscal year end date
         
         for concept_name in test_concepts:
-            if concept_name not in us_gaap:
-                continue
-            
-            concept_data = us_gaap[concept_name]
-            if 'units' not in concept_data:
+            units = index.units('us-gaap', concept_name)
+            if units is None:
                 continue
             
             # Get USD units
-            units = concept_data['units']
-            unit_to_use = None
-            for pref_unit in ['USD', 'usd']:
-                if pref_unit in units:
-                    unit_to_use = pref_unit
-                    break
-            
-            if not unit_to_use and units:
-                unit_to_use = list(units.keys())[0]
+            unit_to_use = self._pick_unit(units, ['USD', 'usd'])
             
             if unit_to_use and unit_to_use in units:
-                data_list = units[unit_to_use]
+                rows = units[unit_to_use]
                 
-                # Find annual periods (spanning ~330-400 days)
-                for item in data_list:
-                    end_date = item.get('end', '')
-                    start_date = item.get('start', '')
-                    
-                    if end_date and len(end_date) >= 10:
-                        try:
-                            from datetime import datetime
-                            end_dt = datetime.strptime(end_date, '%Y-%m-%d')
-                            calendar_year = end_dt.year
-                            
-                            # Check if this is an annual period - MUST span approximately a full year
-                            is_annual = False
-                            if start_date and len(start_date) >= 10:
-                                try:
-                                    start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-                                    days_diff = (end_dt - start_dt).days
-                                    # Annual periods are typically 330-400 days (accounting for leap years)
-                                    if 330 <= days_diff <= 400:
-                                        is_annual = True
-                                except:
-                                    pass
-                            
-                            # Only use periods that actually span a full year (don't use quarterly/interim periods)
-                            if is_annual:
-                                # Only consider recent years (2020 and later) to determine pattern
-                                if calendar_year >= 2020:
-                                    # Store the fiscal year end date for this calendar year
-                                    # Prefer September/October dates (common fiscal year ends)
-                                    # If multiple annual periods exist for a year, prefer the one in Sep/Oct
-                                    if calendar_year not in fiscal_year_ends:
-                                        fiscal_year_ends[calendar_year] = end_date
-                                    else:
-                                        # Prefer Sep/Oct dates over Dec dates (Dec might be calendar year, not fiscal)
-                                        existing_month = datetime.strptime(fiscal_year_ends[calendar_year], '%Y-%m-%d').month
-                                        new_month = end_dt.month
-                                        if new_month in [9, 10] and existing_month not in [9, 10]:
-                                            fiscal_year_ends[calendar_year] = end_date
-                                        elif new_month == existing_month and end_date > fiscal_year_ends[calendar_year]:
-                                            # Same month, use more recent date
-                                            fiscal_year_ends[calendar_year] = end_date
-                        except:
-                            pass
+                # Find annual periods (spanning ~330-400 days) ending within the lookback window
+                # Only periods that actually span a full year are used (never quarterly/interim periods)
+                duration = index.duration_days[rows]
+                annual = (index.valid[rows] & index.is_period[rows] &
+                          (duration >= 330) & (duration <= 400) &
+                          (index.calendar_year[rows] >= earliest_year))
+                
+                for i in np.flatnonzero(annual) + rows.start:
+                    end_date = index.end_str[i]
+                    calendar_year = int(index.calendar_year[i])
+                    # Store the fiscal year end date for this calendar year
+                    # Prefer September/October dates (common fiscal year ends)
+                    # If multiple annual periods exist for a year, prefer the one in Sep/Oct
+                    if calendar_year not in fiscal_year_ends:
+                        fiscal_year_ends[calendar_year] = end_date
+                    else:
+                        # Prefer Sep/Oct dates over Dec dates (Dec might be calendar year, not fiscal)
+                        existing_month = int(fiscal_year_ends[calendar_year][5:7])
+                        new_month = int(index.end_month[i])
+                        if new_month in [9, 10] and existing_month not in [9, 10]:
+                            fiscal_year_ends[calendar_year] = end_date
+                        elif new_month == existing_month and end_date > fiscal_year_ends[calendar_year]:
+                            # Same month, use more recent date
+                            fiscal_year_ends[calendar_year] = end_date
                 
                 # If we found fiscal year ends, return the pattern
                 if fiscal_year_ends:
@@ -419,206 +598,351 @@ class SECClient:
         
         return None
     
-    def extract_historical_data(self, facts: Dict, concept_list: List[str],
+    def _annual_values(self, ctx: ParseContext, namespace: str, concept: str, unit_to_use: str,
+                       fiscal_year_ends: Optional[Dict], years: int) -> List[Dict]:
+        """Memoized per-concept annual selection (concepts recur across line items)"""
+        rows = ctx.index.rows(namespace, concept, unit_to_use)
+        key = (namespace, concept, unit_to_use, self._fiscal_year_ends_key(fiscal_year_ends), years)
+        return ctx.memoize('annual_values', key,
+                           lambda: self._select_annual_values(ctx.index, rows, unit_to_use,
+                                                              fiscal_year_ends, years))
+    
+    def _select_annual_values(self, index: FactIndex, rows: slice, unit_to_use: str,
+                              fiscal_year_ends: Optional[Dict], years: int) -> List[Dict]:
+        """
+        Pick one annual value per year from a concept's unit list, most recent year first.
+        Returns [{'year', 'val', 'date', 'matches_pattern'}, ...] for at most `years` years.
+        
+        Vectorized over the FactIndex columns: the annual/fiscal-year-end filter is a set
+        of boolean masks and the per-year pick is a grouped argmax over a lexsort.
+        Selects exactly what _select_annual_values_reference selects.
+        """
+        n = rows.stop - rows.start
+        if n <= 0:
+            return []
+        
+        valid = index.valid[rows]
+        is_period = index.is_period[rows]
+        duration = index.duration_days[rows]
+        calendar_years = index.calendar_year[rows]
+        end_days = index.end[rows].astype(np.int64)
+        fiscal_month = np.isin(index.end_month[rows], (9, 10, 11, 12))
+        is_10k = index.form[rows] == '10-K'
+        end_dates = index.end_str[rows]
+        
+        has_pattern = bool(fiscal_year_ends)
+        if has_pattern:
+            # Fiscal year end per row's calendar year ('' when the year is not in the pattern)
+            pattern_years = np.array([y for y in fiscal_year_ends if isinstance(y, (int, np.integer))], dtype=np.int64)
+            in_pattern = np.isin(calendar_years, pattern_years)
+            pattern_dates = np.array([fiscal_year_ends.get(int(y), '') if hit else ''
+                                      for y, hit in zip(calendar_years.tolist(), in_pattern.tolist())], dtype=object)
+            exact = in_pattern & (end_dates == pattern_dates)
+            full_year = (duration >= 330) & (duration <= 400)
+            period_ok = full_year & in_pattern & (exact | fiscal_month)
+            point_ok = in_pattern & (exact | (fiscal_month & is_10k))
+        else:
+            period_ok = (duration >= 330) & (duration <= 400)
+            point_ok = is_10k & fiscal_month
+        
+        # Full-year periods, or point-in-time (balance sheet) values at fiscal year end
+        annual = valid & np.where(is_period, period_ok, point_ok)
+        candidates = np.flatnonzero(annual)
+        if candidates.size == 0:
+            return []
+        
+        # The reference groups by the end date's 'YYYY' prefix; those keys may be strings
+        year_strs = [end_dates[i][:4] for i in candidates.tolist()]
+        if has_pattern:
+            matches = np.array([y in fiscal_year_ends and end_dates[i] == fiscal_year_ends[y]
+                                for y, i in zip(year_strs, candidates.tolist())], dtype=bool)
+        else:
+            matches = np.zeros(candidates.size, dtype=bool)
+        
+        # Grouped argmax: order by year desc, then the reference's candidate ranking
+        # (non-matching first, latest end date), ties to the earliest filed row
+        cand_years = calendar_years[candidates]
+        order = np.lexsort((candidates, -end_days[candidates], matches, -cand_years))
+        ordered_years = cand_years[order]
+        group_start = np.ones(order.size, dtype=bool)
+        group_start[1:] = ordered_years[1:] != ordered_years[:-1]
+        best = order[group_start][:years]
+        
+        scale = 1000 if 'thousand' in unit_to_use.lower() else 1
+        values = (index.val[rows][candidates[best]] * scale).tolist()
+        selected = []
+        for pos, val in zip(best.tolist(), values):
+            i = int(candidates[pos])
+            year = year_strs[pos]
+            selected.append({
+                'year': year,
+                'val': val,
+                'date': end_dates[i],
+                'matches_pattern': bool(matches[pos]) if has_pattern else fiscal_year_ends
+            })
+        return selected
+    
+    def _select_annual_values_reference(self, index: FactIndex, rows: slice, unit_to_use: str,
+                                        fiscal_year_ends: Optional[Dict], years: int) -> List[Dict]:
+        """
+        Loop implementation of _select_annual_values, kept as the reference for the parity
+        tests (tests/test_annual_values.py). Walks the unit list item by item exactly as the
+        original parser did.
+        """
+        valid = index.valid[rows].tolist()
+        is_period = index.is_period[rows].tolist()
+        duration = index.duration_days[rows].tolist()
+        calendar_years = index.calendar_year[rows].tolist()
+        months = index.end_month[rows].tolist()
+        forms = index.form[rows].tolist()
+        end_dates = index.end_str[rows].tolist()
+        values = index.val[rows].tolist()
+        
+        # Filter for annual data: ONLY use periods that span a full year (330-400 days)
+        # OR point-in-time data (balance sheets) that match fiscal year end dates
+        # This ensures we only get 10-K annual data, never quarterly data
+        annual_data = []
+        for i in range(len(end_dates)):
+            # Skip items whose dates can't be parsed
+            if not valid[i]:
+                continue
+            end_date = end_dates[i]
+            calendar_year = calendar_years[i]
+            
+            if is_period[i]:
+                # STRICT: Only include periods that span approximately a full year (330-400 days)
+                # This ensures we only get annual 10-K data, never quarterly (which would be ~90 days)
+                if 330 <= duration[i] <= 400:
+                    # If we have a fiscal year end pattern, prefer exact match but also accept annual data from same calendar year
+                    if fiscal_year_ends and calendar_year in fiscal_year_ends:
+                        if end_date == fiscal_year_ends[calendar_year]:
+                            # Exact match - highest priority
+                            annual_data.append(i)
+                        # Also accept annual data from the same calendar year if it's a full year period
+                        # ending in a common fiscal year end month
+                        elif months[i] in [9, 10, 11, 12]:
+                            annual_data.append(i)
+                    elif not fiscal_year_ends:
+                        # No pattern available, use any full-year period
+                        annual_data.append(i)
+            else:
+                # Point-in-time data (balance sheets): must match fiscal year end pattern
+                if fiscal_year_ends and calendar_year in fiscal_year_ends:
+                    if end_date == fiscal_year_ends[calendar_year]:
+                        # Exact match to fiscal year end - this is annual balance sheet data
+                        annual_data.append(i)
+                    # Also accept if it's in a common fiscal year end month (Sep/Oct/Nov/Dec)
+                    # and the form is 10-K (not 10-Q)
+                    elif months[i] in [9, 10, 11, 12] and forms[i] == '10-K':
+                        annual_data.append(i)
+                elif not fiscal_year_ends:
+                    # No pattern available, but accept point-in-time data if form is 10-K and in common fiscal year end months
+                    if forms[i] == '10-K' and months[i] in [9, 10, 11, 12]:
+                        annual_data.append(i)
+        
+        # If no annual data found, don't fall back to quarterly data
+        # Sort by end date (most recent first)
+        annual_data.sort(key=lambda i: end_dates[i], reverse=True)
+        
+        # Handle unit conversion if needed (some are in thousands)
+        scale = 1000 if 'thousand' in unit_to_use.lower() else 1
+        
+        # Group by year, prioritizing values that match the fiscal year end pattern exactly
+        year_data = {}  # Store all candidates for each year, then pick best
+        for i in annual_data:
+            end_date = end_dates[i]
+            year = end_date[:4]
+            year_data.setdefault(year, []).append({
+                'year': year,
+                'val': values[i] * scale,
+                'date': end_date,
+                'matches_pattern': (fiscal_year_ends and year in fiscal_year_ends and 
+                                  end_date == fiscal_year_ends[year])
+            })
+        
+        # For each year, pick the best candidate (prefer exact fiscal year match)
+        selected = []
+        for year, candidates in sorted(year_data.items(), key=lambda x: x[0], reverse=True):
+            # Sort candidates: exact pattern match first, then by date (most recent)
+            candidates.sort(key=lambda x: (not x['matches_pattern'], x['date']), reverse=True)
+            selected.append(candidates[0])
+            
+            # Limit to most recent N years
+            if len(selected) >= years:
+                break
+        
+        return selected
+    
+    def extract_historical_data(self, facts, concept_list: List[str],
                                namespace: str = 'us-gaap', years: int = 5,
-                               fiscal_year_ends: Optional[Dict] = None) -> Dict[str, float]:
-        """Extract historical values for a concept over multiple years"""
-        if 'facts' not in facts:
-            return {}
+                               fiscal_year_ends: Optional[Dict] = None,
+                               line_item: Optional[str] = None,
+                               lookback_years: Optional[int] = None) -> Dict[str, float]:
+        """
+        Extract historical values for a concept over multiple years
         
-        facts_data = facts['facts']
+        facts may be the raw companyfacts dict, a FactIndex or a ParseContext; callers
+        extracting many line items should pass one ParseContext so derived work is shared.
+        If line_item is given, the concepts the values came from (overall and per year) are
+        recorded on the context.
+        lookback_years (default: the client's) is the history a concept should cover
+        (capped at the filing's own history) before lower-priority concepts stop being consulted.
+        """
+        ctx = self._as_parse_context(facts)
+        if ctx is None:
+            return {}
+        lookback_years = self.resolve_lookback(lookback_years)
         
-        # Determine fiscal year end pattern for consistency (cache it to avoid recalculating)
+        # Determine fiscal year end pattern for consistency (memoized on the context)
         if fiscal_year_ends is None:
-            fiscal_year_ends = self._determine_fiscal_year_end_pattern(facts)
+            fiscal_year_ends = self._determine_fiscal_year_end_pattern(ctx, lookback_years)
             if fiscal_year_ends:
                 print(f"DEBUG: Determined fiscal year end pattern: {fiscal_year_ends}")
         
+        key = (namespace, tuple(concept_list), years, self._fiscal_year_ends_key(fiscal_year_ends), lookback_years)
+        result, concepts_used, sources = ctx.memoize(
+            'line_item', key,
+            lambda: self._extract_historical_data(ctx, concept_list, namespace, years, fiscal_year_ends,
+                                                  lookback_years)
+        )
+        if line_item:
+            ctx.chosen_concepts[line_item] = concepts_used
+            ctx.year_concepts[line_item] = sources
+        # Callers patch the returned dict (e.g. revenue aggregation), so hand out a copy
+        return dict(result)
+    
+    def _extract_historical_data(self, ctx: ParseContext, concept_list: List[str], namespace: str,
+                                 years: int, fiscal_year_ends: Optional[Dict],
+                                 lookback_years: int) -> Tuple[Dict[str, float], List[str], Dict[str, str]]:
+        """
+        Walk candidate concepts in priority order
+        
+        Returns:
+            (values by year, concepts used, concept of each year's value)
+        """
+        index = ctx.index
+        latest_year = self._latest_fiscal_year(ctx)
+        current_year = latest_year - self.CURRENT_CONCEPT_LAG if latest_year is not None else 0
+        earliest_year = self._earliest_year(ctx, lookback_years)
+        # A concept is complete once it covers the lookback or, when the filing's history is shorter,
+        # all of it; otherwise a long lookback would let lower-priority concepts overwrite every
+        # year. Never below the default lookback, so parses at or under it behave as before.
+        required_count = min(lookback_years, max(self._history_years(ctx), self.DEFAULT_LOOKBACK_YEARS))
+        
         # Try multiple namespaces if us-gaap doesn't work
         namespaces_to_try = [namespace]
         if namespace == 'us-gaap':
             namespaces_to_try.extend(['ifrs-full', 'dei'])  # Try IFRS and DEI namespaces too
         
+        # Prefer USD units, but use any available
+        preferred_units = ['USD', 'usd', 'shares', 'USD/shares']
+        
         result = {}
+        concepts_used = []
+        sources = {}
         
         for ns in namespaces_to_try:
-            if ns not in facts_data:
+            if not index.has_namespace(ns):
                 continue
             
-            namespace_facts = facts_data[ns]
-            
             for concept_name in concept_list:
-                if concept_name in namespace_facts:
-                    concept_data = namespace_facts[concept_name]
-                    if 'units' in concept_data:
-                        # Prefer USD units, but use any available
-                        preferred_units = ['USD', 'usd', 'shares', 'USD/shares']
-                        unit_to_use = None
+                units = index.units(ns, concept_name)
+                if units is None:
+                    continue
+                
+                unit_to_use = self._preferred_unit(ctx, ns, concept_name, preferred_units)
+                if unit_to_use and units[unit_to_use].stop > units[unit_to_use].start:
+                    selected = self._annual_values(ctx, ns, concept_name, unit_to_use, fiscal_year_ends, years)
+                    if selected:
+                        concepts_used.append(concept_name)
+                    for best in selected:
+                        year = best['year']
+                        # Debug: print first extraction for each concept
+                        if not result:
+                            print(f"DEBUG: Extracted {concept_name} for year {year}: {best['val']} (unit: {unit_to_use}, date: {best['date']}, matches_pattern: {best['matches_pattern']})")
                         
-                        # Find preferred unit
-                        for pref_unit in preferred_units:
-                            if pref_unit in concept_data['units']:
-                                unit_to_use = pref_unit
+                        result[year] = best['val']
+                        result[f'{year}_date'] = best['date']
+                        sources[year] = concept_name
+                
+                # Prioritize concepts that have data for the filer's most recent years
+                # Don't use concepts that only have old data or are missing recent years
+                if result:
+                    years_found = [y for y in result.keys() if not y.endswith('_date') and y.isdigit()]
+                    if years_found:
+                        sorted_years = sorted([int(y) for y in years_found], reverse=True)
+                        # We need the whole lookback (or filing history), ending within CURRENT_CONCEPT_LAG
+                        # years of the latest fiscal year
+                        if len(sorted_years) >= required_count and sorted_years[0] >= current_year:
+                            # Check the lookback's most recent years all fall inside the lookback window
+                            required_years = sorted_years[:required_count]
+                            if all(y >= earliest_year for y in required_years):
+                                # This concept has good recent data covering the years we need, use it
                                 break
-                        
-                        # If no preferred unit, use the first available
-                        if unit_to_use is None and concept_data['units']:
-                            unit_to_use = list(concept_data['units'].keys())[0]
-                        
-                        if unit_to_use and concept_data['units'][unit_to_use]:
-                            data_list = concept_data['units'][unit_to_use]
-                            
-                            # Filter for annual data: ONLY use periods that span a full year (330-400 days)
-                            # OR point-in-time data (balance sheets) that match fiscal year end dates
-                            # This ensures we only get 10-K annual data, never quarterly data
-                            annual_data = []
-                            for item in data_list:
-                                end_date = item.get('end', '')
-                                start_date = item.get('start', '')
-                                form = item.get('form', '')
-                                
-                                if end_date and len(end_date) >= 10:
-                                    try:
-                                        from datetime import datetime
-                                        end_dt = datetime.strptime(end_date, '%Y-%m-%d')
-                                        calendar_year = end_dt.year
-                                        
-                                        # Check if this is a period (has start_date) or point-in-time (no start_date)
-                                        is_period = start_date and len(start_date) >= 10
-                                        is_point_in_time = not is_period
-                                        
-                                        if is_period:
-                                            # Period data: must span approximately a full year (330-400 days)
-                                            start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-                                            days_diff = (end_dt - start_dt).days
-                                            
-                                            # STRICT: Only include periods that span approximately a full year (330-400 days)
-                                            # This ensures we only get annual 10-K data, never quarterly (which would be ~90 days)
-                                            if 330 <= days_diff <= 400:
-                                                # If we have a fiscal year end pattern, prefer exact match but also accept annual data from same calendar year
-                                                if fiscal_year_ends and calendar_year in fiscal_year_ends:
-                                                    expected_date = fiscal_year_ends[calendar_year]
-                                                    if end_date == expected_date:
-                                                        # Exact match - highest priority
-                                                        annual_data.append(item)
-                                                    # Also accept annual data from the same calendar year if it's a full year period
-                                                    # This handles cases where a concept might have slightly different fiscal year ends
-                                                    elif end_dt.month in [9, 10, 11, 12]:
-                                                        # It's a full year period ending in a common fiscal year end month
-                                                        annual_data.append(item)
-                                                elif not fiscal_year_ends:
-                                                    # No pattern available, use any full-year period
-                                                    annual_data.append(item)
-                                        elif is_point_in_time:
-                                            # Point-in-time data (balance sheets): must match fiscal year end pattern
-                                            # Only accept if it matches the fiscal year end date for that year
-                                            if fiscal_year_ends and calendar_year in fiscal_year_ends:
-                                                expected_date = fiscal_year_ends[calendar_year]
-                                                if end_date == expected_date:
-                                                    # Exact match to fiscal year end - this is annual balance sheet data
-                                                    annual_data.append(item)
-                                                # Also accept if it's in a common fiscal year end month (Sep/Oct/Nov/Dec)
-                                                # and the form is 10-K (not 10-Q)
-                                                elif end_dt.month in [9, 10, 11, 12] and form == '10-K':
-                                                    annual_data.append(item)
-                                            elif not fiscal_year_ends:
-                                                # No pattern available, but accept point-in-time data if form is 10-K and in common fiscal year end months
-                                                if form == '10-K' and end_dt.month in [9, 10, 11, 12]:
-                                                    annual_data.append(item)
-                                    except:
-                                        # Skip items that can't be parsed
-                                        pass
-                            
-                            # If no annual data found, don't fall back to quarterly data
-                            # We only want 10-K annual data, so if we can't find it, return empty
-                            
-                            # Sort by end date (most recent first)
-                            annual_data.sort(key=lambda x: x.get('end', ''), reverse=True)
-                            
-                            # Group by year, prioritizing values that match the fiscal year end pattern exactly
-                            years_seen = set()
-                            year_data = {}  # Store all candidates for each year, then pick best
-                            
-                            for item in annual_data:
-                                end_date = item.get('end', '')
-                                if end_date and len(end_date) >= 4:
-                                    year = end_date[:4]
-                                    val = float(item.get('val', 0))
-                                    
-                                    # Handle unit conversion if needed (some are in thousands)
-                                    # Check if unit indicates thousands
-                                    if 'thousand' in unit_to_use.lower() or 'thousands' in unit_to_use.lower():
-                                        val = val * 1000
-                                    
-                                    # Store candidate for this year
-                                    if year not in year_data:
-                                        year_data[year] = []
-                                    year_data[year].append({
-                                        'val': val,
-                                        'date': end_date,
-                                        'matches_pattern': (fiscal_year_ends and year in fiscal_year_ends and 
-                                                          end_date == fiscal_year_ends[year])
-                                    })
-                            
-                            # For each year, pick the best candidate (prefer exact fiscal year match)
-                            for year, candidates in sorted(year_data.items(), key=lambda x: x[0], reverse=True):
-                                if year not in years_seen:
-                                    # Sort candidates: exact pattern match first, then by date (most recent)
-                                    candidates.sort(key=lambda x: (not x['matches_pattern'], x['date']), reverse=True)
-                                    best = candidates[0]
-                                    
-                                    # Debug: print first extraction for each concept
-                                    if not result:
-                                        print(f"DEBUG: Extracted {concept_name} for year {year}: {best['val']} (unit: {unit_to_use}, date: {best['date']}, matches_pattern: {best['matches_pattern']})")
-                                    
-                                    result[year] = best['val']
-                                    result[f'{year}_date'] = best['date']
-                                    years_seen.add(year)
-                                    
-                                    # Limit to most recent N years
-                                    if len(years_seen) >= years:
-                                        break
-                    
-                    # Prioritize concepts that have data for the most recent years (2023, 2024, 2025)
-                    # Don't use concepts that only have old data or are missing recent years
-                    if result:
-                        years_found = [y for y in result.keys() if not y.endswith('_date') and y.isdigit()]
-                        if years_found:
-                            sorted_years = sorted([int(y) for y in years_found], reverse=True)
-                            # We need at least the 5 most recent years, and they should be recent (2020+)
-                            if len(sorted_years) >= 5 and sorted_years[0] >= 2023:
-                                # Check if we have the 5 most recent years (should be 2021, 2022, 2023, 2024, 2025)
-                                required_years = sorted_years[:5]
-                                if all(y >= 2020 for y in required_years):
-                                    # This concept has good recent data covering the years we need, use it
-                                    break
-                            elif len(sorted_years) >= 1 and sorted_years[0] >= 2020:
-                                # Has some recent data but not enough years - continue looking for better concept
-                                # Only use this if we've tried all concepts and this is the best we have
-                                pass
-                        # This concept doesn't have enough recent data, continue looking
-                        # Don't clear result yet - we'll use it as fallback if nothing better is found
-                        if not years_found or (years_found and sorted([int(y) for y in years_found], reverse=True)[0] < 2020):
-                            result = {}
+                    # This concept doesn't have enough recent data, continue looking
+                    # Don't clear result yet - we'll use it as fallback if nothing better is found
+                    if not years_found or (years_found and sorted([int(y) for y in years_found], reverse=True)[0] < earliest_year):
+                        result = {}
+                        concepts_used = []
+                        sources = {}
             
             # If we found data in this namespace, break
             if result:
                 break
         
-        return result
+        return result, concepts_used, sources
     
-    def parse_income_statement(self, facts: Dict) -> pd.DataFrame:
-        """Parse Income Statement data from XBRL facts"""
+    @staticmethod
+    def _selection_years(lookback_years: int) -> int:
+        """Annual values selected per concept (at least 10, so gaps in one concept can be filled by others)"""
+        return max(10, lookback_years)
+    
+    @staticmethod
+    def _statement_matrix(values_by_item: Dict[str, Dict[str, float]], line_items: Iterable[str],
+                          years: Iterable[int]) -> pd.DataFrame:
+        """
+        One float64 matrix of fiscal years x line items (0 where an item has no value), oldest year first
+        
+        Args:
+            values_by_item: {line_item: {year: value, 'year_date': date, ...}} from extract_historical_data
+            line_items: Column order
+            years: Fiscal years to keep
+        """
+        years = sorted(years)
+        line_items = list(line_items)
+        row_of = {str(year): row for row, year in enumerate(years)}
+        matrix = np.zeros((len(years), len(line_items)), dtype=np.float64)
+        for col, item in enumerate(line_items):
+            for year, value in values_by_item.get(item, {}).items():
+                row = row_of.get(year)
+                if row is not None:
+                    matrix[row, col] = value
+        return pd.DataFrame(matrix, index=[str(year) for year in years], columns=line_items)
+    
+    def parse_income_statement(self, facts, lookback_years: Optional[int] = None) -> pd.DataFrame:
+        """
+        Parse Income Statement data from XBRL facts (raw dict, FactIndex or ParseContext)
+        
+        Args:
+            facts: Company facts
+            lookback_years: Fiscal years to return (defaults to the client's lookback)
+        """
         income_data = {}
+        facts = self._as_parse_context(facts)
+        if facts is None:
+            return pd.DataFrame()
+        lookback_years = self.resolve_lookback(lookback_years)
         
         # Determine fiscal year end pattern once and reuse it for all concepts
-        fiscal_year_ends = self._determine_fiscal_year_end_pattern(facts)
+        fiscal_year_ends = self._determine_fiscal_year_end_pattern(facts, lookback_years)
         if fiscal_year_ends:
             print(f"DEBUG: Determined fiscal year end pattern: {fiscal_year_ends}")
         
-        # Extract last 10 years of data to ensure we have enough, then filter to 3 most recent
+        # Extract more years than needed to ensure we have enough, then filter to the lookback
         for key, concept_list in self.INCOME_STATEMENT_CONCEPTS.items():
-            historical = self.extract_historical_data(facts, concept_list, years=10, fiscal_year_ends=fiscal_year_ends)
+            historical = self.extract_historical_data(facts, concept_list, years=self._selection_years(lookback_years),
+                                                      fiscal_year_ends=fiscal_year_ends, line_item=key,
+                                                      lookback_years=lookback_years)
             income_data[key] = historical
             # Debug: print what we found with dates
             if historical:
@@ -636,7 +960,7 @@ class SECClient:
         
         if years:
             sorted_years = sorted([int(y) for y in years if y.isdigit()], reverse=True)
-            recent_years = sorted_years[:5]  # The 5 most recent years we'll display
+            recent_years = sorted_years[:lookback_years]  # The most recent years we'll display
             
             # Check if revenue exists for these recent years
             revenue_data = income_data.get('Revenue', {})
@@ -650,7 +974,7 @@ class SECClient:
             # If revenue is missing for recent years, try aggregation
             if revenue_missing_for_recent:
                 print(f"DEBUG: Revenue is zero or missing for recent years {recent_years}, attempting to aggregate from multiple revenue sources...")
-                revenue_aggregate = self._aggregate_revenue_from_multiple_sources(facts)
+                revenue_aggregate = self._aggregate_revenue_from_multiple_sources(facts, lookback_years)
                 if revenue_aggregate:
                     print(f"DEBUG: Successfully aggregated revenue: {list(revenue_aggregate.keys())}")
                     # Merge aggregated revenue with existing (prioritize aggregated for recent years)
@@ -669,40 +993,38 @@ class SECClient:
             print("DEBUG: No years found in income statement data")
             return pd.DataFrame()
         
-        # Sort years and take only the most recent 5 years
+        # Sort years and take only the most recent lookback_years years
         sorted_years = sorted([int(y) for y in years if y.isdigit()], reverse=True)
-        recent_years = sorted_years[:5]  # Only 5 most recent years
-        
-        df_data = {}
-        for year in recent_years:
-            year_str = str(year)
-            row = {}
-            for key in self.INCOME_STATEMENT_CONCEPTS.keys():
-                value = income_data.get(key, {}).get(year_str, 0)
-                row[key] = value
-                # Debug: warn if Revenue is zero
-                if key == 'Revenue' and value == 0:
-                    print(f"WARNING: Revenue is 0 for year {year_str}")
-                    print(f"  Income data for Revenue: {income_data.get(key, {})}")
-            df_data[year_str] = row
+        recent_years = sorted_years[:lookback_years]
+        
+        # Years in ascending order (oldest to newest)
+        statement = self._statement_matrix(income_data, self.INCOME_STATEMENT_CONCEPTS.keys(), recent_years)
+        
+        # Debug: warn if Revenue is zero
+        for year_str in statement.index[statement['Revenue'].to_numpy() == 0]:
+            print(f"WARNING: Revenue is 0 for year {year_str}")
+            print(f"  Income data for Revenue: {income_data.get('Revenue', {})}")
         
         # Debug: print sample of what we're creating
-        if df_data:
-            sample_year = list(df_data.keys())[0]
-            print(f"DEBUG: Sample row for year {sample_year}: Revenue={df_data[sample_year].get('Revenue', 'N/A')}")
+        if not statement.empty:
+            print(f"DEBUG: Sample row for year {statement.index[-1]}: Revenue={statement['Revenue'].iloc[-1]}")
         
-        # Return with years in ascending order (oldest to newest)
-        return pd.DataFrame(df_data).T.sort_index()
+        return statement
     
-    def _aggregate_revenue_from_multiple_sources(self, facts: Dict) -> Dict[str, float]:
+    def _aggregate_revenue_from_multiple_sources(self, facts, lookback_years: Optional[int] = None) -> Dict[str, float]:
         """
         Try to aggregate revenue from multiple XBRL concepts if direct revenue extraction failed.
         Prioritizes "Total" revenue concepts first, then falls back to individual components.
         """
-        if 'facts' not in facts:
+        ctx = self._as_parse_context(facts)
+        if ctx is None:
             return {}
-        
-        facts_data = facts['facts']
+        earliest_year = self._earliest_year(ctx, self.resolve_lookback(lookback_years))
+        return dict(ctx.memoize('revenue_aggregate', earliest_year,
+                                lambda: self._compute_revenue_aggregate(ctx.index, earliest_year)))
+    
+    def _compute_revenue_aggregate(self, index: FactIndex, earliest_year: int) -> Dict[str, float]:
+        """Revenue by year from total revenue concepts, else summed component concepts"""
         
         # Prioritize total/aggregate revenue concepts first
         priority_concepts = [
@@ -733,19 +1055,18 @@ class SECClient:
         
         # First, try priority concepts (these are usually total revenue)
         for ns in namespaces_to_try:
-            if ns not in facts_data:
+            if not index.has_namespace(ns):
                 continue
             
-            namespace_facts = facts_data[ns]
-            
             for concept_name in priority_concepts:
-                if concept_name not in namespace_facts:
+                units = index.units(ns, concept_name)
+                if units is None:
                     continue
                 
-                revenue_data = self._extract_revenue_from_concept(namespace_facts[concept_name])
+                revenue_data = self._extract_revenue_from_concept(index, units)
                 if revenue_data:
-                    # Check if we have recent data (2020 or later)
-                    recent_years = [y for y in revenue_data.keys() if not y.endswith('_date') and int(y) >= 2020]
+                    # Check if we have data inside the lookback window
+                    recent_years = [y for y in revenue_data.keys() if not y.endswith('_date') and int(y) >= earliest_year]
                     if recent_years:
                         aggregated_revenue = revenue_data
                         print(f"DEBUG: Found revenue using priority concept '{concept_name}' from namespace '{ns}'")
@@ -759,16 +1080,15 @@ class SECClient:
         component_revenue_by_year = {}
         
         for ns in namespaces_to_try:
-            if ns not in facts_data:
+            if not index.has_namespace(ns):
                 continue
             
-            namespace_facts = facts_data[ns]
-            
             for concept_name in fallback_concepts:
-                if concept_name not in namespace_facts:
+                units = index.units(ns, concept_name)
+                if units is None:
                     continue
                 
-                revenue_data = self._extract_revenue_from_concept(namespace_facts[concept_name])
+                revenue_data = self._extract_revenue_from_concept(index, units)
                 if revenue_data:
                     # Sum component revenues by year
                     for year, value in revenue_data.items():
@@ -785,68 +1105,57 @@ class SECClient:
         
         return {}
     
-    def _extract_revenue_from_concept(self, concept_data: Dict) -> Dict[str, float]:
+    def _extract_revenue_from_concept(self, index: FactIndex, units: Dict[str, slice]) -> Dict[str, float]:
         """Extract revenue values from a single XBRL concept"""
-        if 'units' not in concept_data:
-            return {}
-        
-        units = concept_data['units']
-        unit_to_use = None
-        
         # Prefer USD units
-        for pref_unit in ['USD', 'usd']:
-            if pref_unit in units:
-                unit_to_use = pref_unit
-                break
-        
-        if not unit_to_use and units:
-            unit_to_use = list(units.keys())[0]
+        unit_to_use = self._pick_unit(units, ['USD', 'usd'])
         
         if not unit_to_use or unit_to_use not in units:
             return {}
         
-        data_list = units[unit_to_use]
+        rows = units[unit_to_use]
         revenue_by_year = {}
         
-        # Get annual data - prioritize recent years
-        annual_items = []
-        for item in data_list:
-            end_date = item.get('end', '')
-            if end_date and len(end_date) >= 4:
-                start_date = item.get('start', '')
-                # Check if this is annual data (ends in -12-31 or spans full year)
-                is_annual = (end_date.endswith('-12-31') or 
-                           (start_date and len(start_date) >= 4 and end_date[:4] != start_date[:4]))
-                if is_annual:
-                    annual_items.append(item)
-        
-        # Sort by end date (most recent first)
-        annual_items.sort(key=lambda x: x.get('end', ''), reverse=True)
+        # Handle unit conversion (thousands to actual)
+        scale = 1000 if 'thousand' in unit_to_use.lower() else 1
         
-        # Extract values, prioritizing most recent
-        for item in annual_items:
-            end_date = item.get('end', '')
-            if end_date and len(end_date) >= 4:
+        # Get annual data (ends in -12-31 or spans full year), keeping the largest value per year
+        for end_date, start_date, val in zip(index.end_str[rows].tolist(),
+                                             index.start_str[rows].tolist(),
+                                             index.val[rows].tolist()):
+            if len(end_date) < 4:
+                continue
+            is_annual = (end_date.endswith('-12-31') or 
+                       (len(start_date) >= 4 and end_date[:4] != start_date[:4]))
+            if is_annual:
                 year = end_date[:4]
-                val = float(item.get('val', 0))
-                
-                # Handle unit conversion (thousands to actual)
-                if 'thousand' in unit_to_use.lower():
-                    val = val * 1000
-                
-                # Take the most recent value if multiple exist for same year
+                val = val * scale
                 if year not in revenue_by_year or val > revenue_by_year[year]:
                     revenue_by_year[year] = val
         
         return revenue_by_year
     
-    def parse_balance_sheet(self, facts: Dict, fiscal_year_ends: Optional[Dict] = None) -> pd.DataFrame:
-        """Parse Balance Sheet data from XBRL facts"""
+    def parse_balance_sheet(self, facts, fiscal_year_ends: Optional[Dict] = None,
+                     lookback_years: Optional[int] = None) -> pd.DataFrame:
+        """
+        Parse Balance Sheet data from XBRL facts (raw dict, FactIndex or ParseContext)
+        
+        Args:
+            facts: Company facts
+            fiscal_year_ends: Fiscal year end pattern (determined from the facts if None)
+            lookback_years: Fiscal years to return (defaults to the client's lookback)
+        """
         balance_data = {}
+        facts = self._as_parse_context(facts)
+        if facts is None:
+            return pd.DataFrame()
+        lookback_years = self.resolve_lookback(lookback_years)
         
-        # Extract last 10 years of data to ensure we have enough, then filter to 5 most recent
+        # Extract more years than needed to ensure we have enough, then filter to the lookback
         for key, concept_list in self.BALANCE_SHEET_CONCEPTS.items():
-            historical = self.extract_historical_data(facts, concept_list, years=10, fiscal_year_ends=fiscal_year_ends)
+            historical = self.extract_historical_data(facts, concept_list, years=self._selection_years(lookback_years),
+                                                      fiscal_year_ends=fiscal_year_ends, line_item=key,
+                                                      lookback_years=lookback_years)
             balance_data[key] = historical
             # Debug: print what we found
             if historical:
@@ -855,6 +1164,8 @@ class SECClient:
             else:
                 print(f"DEBUG: No data found for {key} (tried {len(concept_list)} concepts)")
         
+        self._drop_double_counted(balance_data, facts.year_concepts)
+        
         # Convert to DataFrame
         years = set()
         for key, values in balance_data.items():
@@ -863,27 +1174,66 @@ class SECClient:
         if not years:
             return pd.DataFrame()
         
-        # Sort years and take only the most recent 5 years
+        # Sort years and take only the most recent lookback_years years
         sorted_years = sorted([int(y) for y in years if y.isdigit()], reverse=True)
-        recent_years = sorted_years[:5]  # Only 5 most recent years
+        recent_years = sorted_years[:lookback_years]
         
-        df_data = {}
-        for year in recent_years:
-            year_str = str(year)
-            row = {}
-            for key in self.BALANCE_SHEET_CONCEPTS.keys():
-                row[key] = balance_data.get(key, {}).get(year_str, 0)
-            df_data[year_str] = row
+        return self._statement_matrix(balance_data, self.BALANCE_SHEET_CONCEPTS.keys(), recent_years)
+    
+    def _drop_double_counted(self, balance_data: Dict[str, Dict[str, float]],
+                             year_concepts: Dict[str, Dict[str, str]]):
+        """
+        Remove values that would count one filing fact twice within an ADDITIVE_LINE_ITEMS group
+        
+        Per year, an item resolved from the same concept as an earlier item of its group
+        is dropped, as are items already included in another item's concept (e.g.
+        short-term investments when cash came from CashCashEquivalentsAndShortTermInvestments).
         
-        return pd.DataFrame(df_data).T.sort_index()
+        Args:
+            balance_data: {line_item: {year: value, 'year_date': date}} (updated in place)
+            year_concepts: {line_item: {year: concept}} recorded by extract_historical_data
+        """
+        for group in self.ADDITIVE_LINE_ITEMS:
+            years = {year for item in group for year in year_concepts.get(item, {})}
+            for year in years:
+                sources = {item: year_concepts.get(item, {}).get(year) for item in group
+                           if year in balance_data.get(item, {})}
+                dropped = set()
+                seen = set()
+                for item, concept in sources.items():
+                    if concept in seen:
+                        dropped.add(item)
+                    seen.add(concept)
+                for item, concept in sources.items():
+                    if item not in dropped:
+                        dropped.update(included for included in self.INCLUSIVE_CONCEPTS.get(concept, ())
+                                       if included != item and included in sources)
+                for item in dropped:
+                    print(f"DEBUG: Dropped {item} for {year}: its {sources[item]} value is already counted")
+                    balance_data[item].pop(year, None)
+                    balance_data[item].pop(f'{year}_date', None)
     
-    def parse_cash_flow(self, facts: Dict, fiscal_year_ends: Optional[Dict] = None) -> pd.DataFrame:
-        """Parse Cash Flow Statement data from XBRL facts"""
+    def parse_cash_flow(self, facts, fiscal_year_ends: Optional[Dict] = None,
+                     lookback_years: Optional[int] = None) -> pd.DataFrame:
+        """
+        Parse Cash Flow Statement data from XBRL facts (raw dict, FactIndex or ParseContext)
+        
+        Args:
+            facts: Company facts
+            fiscal_year_ends: Fiscal year end pattern (determined from the facts if None)
+            lookback_years: Fiscal years to return (defaults to the client's lookback)
+        """
         cashflow_data = {}
+        facts = self._as_parse_context(facts)
+        if facts is None:
+            return pd.DataFrame()
+        lookback_years = self.resolve_lookback(lookback_years)
         
-        # Extract last 10 years of data to ensure we have enough, then filter to 3 most recent
+        # Extract more years than needed to ensure we have enough, then filter to the lookback
         for key, concept_list in self.CASH_FLOW_CONCEPTS.items():
-            historical = self.extract_historical_data(facts, concept_list, years=10, fiscal_year_ends=fiscal_year_ends)
+            historical = self.extract_historical_data(facts, concept_list, years=self._selection_years(lookback_years),
+                                                      fiscal_year_ends=fiscal_year_ends, line_item=key,
+                                                      lookback_years=lookback_years)
             cashflow_data[key] = historical
             # Debug: print what we found
             if historical:
@@ -900,49 +1250,66 @@ class SECClient:
         if not years:
             return pd.DataFrame()
         
-        # Sort years and take only the most recent 5 years
+        # Sort years and take only the most recent lookback_years years
         sorted_years = sorted([int(y) for y in years if y.isdigit()], reverse=True)
-        recent_years = sorted_years[:5]  # Only 5 most recent years
-        
-        df_data = {}
-        for year in recent_years:
-            year_str = str(year)
-            row = {}
-            for key in self.CASH_FLOW_CONCEPTS.keys():
-                row[key] = cashflow_data.get(key, {}).get(year_str, 0)
-            df_data[year_str] = row
+        recent_years = sorted_years[:lookback_years]
         
-        return pd.DataFrame(df_data).T.sort_index()
+        return self._statement_matrix(cashflow_data, self.CASH_FLOW_CONCEPTS.keys(), recent_years)
     
-    def fetch_company_data(self, identifier: str) -> Dict:
+    def fetch_company_data(self, identifier: str, lookback_years: Optional[int] = None) -> Dict:
         """
         Main method to fetch all financial data for a company
         identifier can be either a ticker symbol or CIK number
+        
+        Args:
+            identifier: Ticker or CIK
+            lookback_years: Fiscal years per statement (defaults to the client's lookback)
         """
-        # Determine if identifier is ticker or CIK
-        if identifier.isdigit():
-            cik = identifier.zfill(10)
-        else:
-            cik = self.get_cik_from_ticker(identifier)
-            if not cik:
-                return {'error': f'Could not find CIK for ticker {identifier}'}
+        cik = self.resolve_cik(identifier)
+        if not cik:
+            return {'error': f'Could not find CIK for ticker {identifier}'}
         
         facts = self.get_company_facts(cik)
         if not facts:
             return {'error': f'Could not fetch data for CIK {cik}'}
         
+        return self.build_company_data(identifier, cik, facts, lookback_years=lookback_years)
+    
+    def resolve_cik(self, identifier: str) -> Optional[str]:
+        """Return the 10-digit CIK for a ticker or CIK identifier"""
+        # Determine if identifier is ticker or CIK
+        if identifier.isdigit():
+            return identifier.zfill(10)
+        return self.get_cik_from_ticker(identifier)
+    
+    def build_company_data(self, identifier: str, cik: str, facts: Dict,
+                           ticker: Optional[str] = None, lookback_years: Optional[int] = None) -> Dict:
+        """
+        Parse a companyfacts payload into the statement dicts fetch_company_data returns
+        
+        ticker, when given, is used as-is instead of being looked up from the identifier.
+        lookback_years defaults to the client's lookback.
+        """
+        lookback_years = self.resolve_lookback(lookback_years)
         # Extract company name
         company_name = facts.get('entityName', 'Unknown Company')
         
         # Parse financial statements
+        # Flatten the payload into a columnar fact table once; every parser shares one
+        # context so derived artifacts (fiscal year ends, units, concept picks) are computed once
+        parse_context = ParseContext(FactIndex(facts))
+        
         # Determine fiscal year end pattern once and reuse for all statements
-        fiscal_year_ends = self._determine_fiscal_year_end_pattern(facts)
+        fiscal_year_ends = self._determine_fiscal_year_end_pattern(parse_context, lookback_years)
         if fiscal_year_ends:
             print(f"DEBUG: Determined fiscal year end pattern: {fiscal_year_ends}")
         
-        income_statement = self.parse_income_statement(facts)
-        balance_sheet = self.parse_balance_sheet(facts, fiscal_year_ends=fiscal_year_ends)
-        cash_flow = self.parse_cash_flow(facts, fiscal_year_ends=fiscal_year_ends)
+        income_statement = self.parse_income_statement(parse_context, lookback_years=lookback_years)
+        balance_sheet = self.parse_balance_sheet(parse_context, fiscal_year_ends=fiscal_year_ends,
+                                                 lookback_years=lookback_years)
+        cash_flow = self.parse_cash_flow(parse_context, fiscal_year_ends=fiscal_year_ends,
+                                         lookback_years=lookback_years)
+        print(f"DEBUG: Parse timings: {parse_context.timing_report()}")
         
         # Debug: Print sample data
         if not income_statement.empty:
@@ -956,8 +1323,117 @@ class SECClient:
         return {
             'company_name': company_name,
             'cik': cik,
+            'ticker': ticker if ticker is not None else (
+                identifier.upper() if not identifier.isdigit() else self.get_ticker_from_cik(cik)),
             'income_statement': income_statement.to_dict('index') if not income_statement.empty else {},
             'balance_sheet': balance_sheet.to_dict('index') if not balance_sheet.empty else {},
-            'cash_flow': cash_flow.to_dict('index') if not cash_flow.empty else {}
+            'cash_flow': cash_flow.to_dict('index') if not cash_flow.empty else {},
+            'parse_timings': parse_context.timing_report()
         }
-
+    
+    BULK_MEMBER_PATTERN = re.compile(r'CIK(\d{10})\.json$')
+    
+    def ingest_bulk_archive(self, zip_path: str, store: StatementStore,
+                            ciks: Optional[Iterable[str]] = None) -> Dict:
+        """
+        Parse SEC's bulk companyfacts.zip into a StatementStore without per-CIK HTTP calls
+        
+        Members are read one at a time straight from the archive (nothing is extracted to
+        disk) and run through the same parse_* logic as fetch_company_data at
+        MAX_LOOKBACK_YEARS. Companies without any statement data are skipped.
+        
+        Args:
+            zip_path: Local path of companyfacts.zip (https://www.sec.gov/Archives/edgar/daily-index/xbrl/companyfacts.zip)
+            store: Destination store for parsed statements
+            ciks: Optional subset of CIKs to ingest
+        
+        Returns:
+            Counts of stored, skipped and failed companies plus elapsed seconds
+        """
+        wanted = {str(c).zfill(10) for c in ciks} if ciks is not None else None
+        stats = {'stored': 0, 'skipped': 0, 'failed': 0, 'seconds': 0.0}
+        started = time.perf_counter()
+        
+        # One ticker table load up front; offline runs store companies without tickers
+        try:
+            self.ticker_index.ensure_loaded()
+            tickers_available = True
+        except Exception as e:
+            print(f"Ticker index unavailable during bulk ingest, storing without tickers: {e}")
+            tickers_available = False
+        
+        with zipfile.ZipFile(zip_path) as archive:
+            for member in archive.infolist():
+                match = self.BULK_MEMBER_PATTERN.search(member.filename)
+                if not match:
+                    continue
+                cik = match.group(1)
+                if wanted is not None and cik not in wanted:
+                    continue
+                
+                try:
+                    with archive.open(member) as f:
+                        if self.stream_facts:
+                            facts = load_filtered_facts(iter_file_chunks(f, self.STREAM_CHUNK_SIZE), self.mapped_concepts())
+                        else:
+                            facts = json.load(f)
+                    
+                    if not facts.get('facts'):
+                        stats['skipped'] += 1
+                        continue
+                    
+                    tickers = self.ticker_index.lookup_tickers(cik) if tickers_available else []
+                    # The store holds full history; readers apply their own lookback
+                    company_data = self.build_company_data(cik, cik, facts, ticker=tickers[0] if tickers else '',
+                                                           lookback_years=self.MAX_LOOKBACK_YEARS)
+                    if not (company_data['income_statement'] or company_data['balance_sheet'] or company_data['cash_flow']):
+                        stats['skipped'] += 1
+                        continue
+                    
+                    company_data.pop('parse_timings', None)
+                    store.put(cik, company_data)
+                    stats['stored'] += 1
+                except Exception as e:
+                    print(f"Error ingesting {member.filename} from bulk archive: {e}")
+                    stats['failed'] += 1
+        
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+        print(f"DEBUG: Bulk ingest finished: {stats}")
+        return stats
+    
+    def fetch_many(self, identifiers: Iterable[str], max_workers: Optional[int] = None,
+                   lookback_years: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Fetch several companies concurrently, yielding each result as it finishes
+        
+        Downloads run on a thread pool; every SEC request still passes through the
+        shared rate limiter, so throughput stays within SEC's 10 req/s regardless of
+        max_workers. Results come back in completion order, each tagged with the
+        'identifier' it was requested under.
+        
+        Args:
+            identifiers: Tickers and/or CIKs
+            max_workers: Concurrent fetches (defaults to the client's max_workers, which also caps it)
+            lookback_years: Fiscal years per statement (defaults to the client's lookback)
+        """
+        identifiers = [i.strip() for i in identifiers if i and i.strip()]
+        # Never run more workers than pooled connections
+        workers = max(1, min(self.resolve_max_workers(max_workers), len(identifiers) or 1))
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sec-fetch') as executor:
+            futures = {executor.submit(self.fetch_company_data, identifier, lookback_years): identifier
+                       for identifier in identifiers}
+            try:
+                for future in as_completed(futures):
+                    identifier = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Error fetching company data for {identifier}: {e}")
+                        result = {'error': f'Error fetching company data: {str(e)}'}
+                    result['identifier'] = identifier
+                    yield result
+            finally:
+                # Consumer went away (e.g. client disconnected): drop queued fetches
+                for future in futures:
+                    future.cancel()
@@ -0,0 +1,56 @@
+"""
+Statement JSON
+Compact columnar, NaN-safe JSON encoding of financial statement frames
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+COLUMNAR_KEYS = ('years', 'line_items', 'values')
+
+
+def encode_statement(frame: Optional[pd.DataFrame]) -> Dict:
+    """
+    Encode a statement frame (years x line items) as columnar JSON
+
+    The payload is {'years': [...], 'line_items': [...], 'values': [[...], ...]} with
+    one row of values per year. Values are taken from the frame's float64 buffer in
+    one pass; NaN and infinities become 0 so the payload is valid JSON.
+
+    Args:
+        frame: Statement with years as the index and line items as columns
+    """
+    if frame is None or frame.empty:
+        return {'years': [], 'line_items': [], 'values': []}
+    values = np.array(frame.to_numpy(dtype=np.float64, na_value=np.nan), dtype=np.float64)
+    values[~np.isfinite(values)] = 0.0
+    return {
+        'years': [str(year) for year in frame.index],
+        'line_items': [str(item) for item in frame.columns],
+        'values': values.tolist()
+    }
+
+
+def is_columnar(statement) -> bool:
+    """Whether a statement payload is in encode_statement's columnar format"""
+    return isinstance(statement, dict) and all(key in statement for key in COLUMNAR_KEYS)
+
+
+def decode_statement(statement: Optional[Dict]) -> pd.DataFrame:
+    """
+    Statement payload as a DataFrame with years as the index and line items as columns
+
+    Accepts the columnar format and the nested {year: {line_item: value}} format
+    (e.g. operating models posted back by older clients).
+
+    Args:
+        statement: Columnar or nested statement payload
+    """
+    if not statement:
+        return pd.DataFrame()
+    if is_columnar(statement):
+        values = np.asarray(statement['values'], dtype=np.float64)
+        values = values.reshape(len(statement['years']), len(statement['line_items']))
+        return pd.DataFrame(values, index=list(statement['years']), columns=list(statement['line_items']))
+    return pd.DataFrame.from_dict(statement, orient='index')
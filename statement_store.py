@@ -0,0 +1,214 @@
+"""
+Statement Store
+Columnar (Parquet) store of parsed financial statement line items keyed by CIK and fiscal year
+"""
+import math
+import os
+import shutil
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+class StatementStore:
+    """
+    Normalized line items of every stored company, one Parquet file per CIK
+
+    Rows are (fiscal_year, statement, line_item, value); the CIK is the hive partition
+    key (statements/cik=##########/part-0.parquet) and company name/ticker live in the
+    file's schema metadata. Reads are memory-mapped and push filters on CIK, statement,
+    year and line item down to partition pruning and row-group statistics, so loading
+    one company or one line item across the universe touches only the bytes it needs.
+    """
+
+    STATEMENTS = ('income_statement', 'balance_sheet', 'cash_flow')
+    SCHEMA = pa.schema([
+        ('fiscal_year', pa.int32()),
+        ('statement', pa.string()),
+        ('line_item', pa.string()),
+        ('value', pa.float64())
+    ])
+    PARTITIONING = ds.partitioning(pa.schema([('cik', pa.string())]), flavor='hive')
+
+    def __init__(self, store_dir: str):
+        """
+        Initialize store
+
+        Args:
+            store_dir: Root directory; statements are kept under store_dir/statements
+        """
+        self.store_dir = store_dir
+        self.statements_dir = os.path.join(store_dir, 'statements')
+        os.makedirs(self.statements_dir, exist_ok=True)
+
+    @staticmethod
+    def _cik(cik) -> str:
+        return str(cik).zfill(10)
+
+    def _partition_dir(self, cik: str) -> str:
+        return os.path.join(self.statements_dir, f"cik={self._cik(cik)}")
+
+    def _path(self, cik: str) -> str:
+        return os.path.join(self._partition_dir(cik), 'part-0.parquet')
+
+    @staticmethod
+    def _line_items(statement: Optional[Dict]) -> Iterator:
+        """Yield (fiscal_year, line_item, value) for a statement's numeric values"""
+        for year, row in (statement or {}).items():
+            if not str(year).isdigit() or not isinstance(row, dict):
+                continue
+            for line_item, value in row.items():
+                # Missing values are simply absent rows; get() restores them as NaN
+                if not isinstance(value, (int, float)) or math.isnan(value):
+                    continue
+                yield int(year), str(line_item), float(value)
+
+    @staticmethod
+    def _recent(rows: Dict[str, Dict[str, float]], lookback_years: Optional[int]) -> Dict[str, Dict[str, float]]:
+        """Keep the most recent lookback_years years, filling line items a year lacks with NaN"""
+        kept_years = sorted(rows)[-lookback_years:] if lookback_years else sorted(rows)
+        line_item_order = {}
+        for year in kept_years:
+            for line_item in rows[year]:
+                line_item_order.setdefault(line_item, len(line_item_order))
+        return {
+            year: {item: rows[year].get(item, float('nan')) for item in line_item_order}
+            for year in kept_years
+        }
+
+    @classmethod
+    def trim(cls, company_data: Dict, lookback_years: Optional[int]) -> Dict:
+        """
+        Apply a lookback to statements in fetch_company_data shape
+
+        Returns a copy equal to what get() reads back after put(company_data), so
+        statements parsed at full history can be served for a shorter lookback.
+        """
+        trimmed = dict(company_data)
+        for statement in cls.STATEMENTS:
+            rows = {}
+            for year, line_item, value in cls._line_items(company_data.get(statement)):
+                rows.setdefault(str(year), {})[line_item] = value
+            trimmed[statement] = cls._recent(rows, lookback_years)
+        return trimmed
+
+    def put(self, cik: str, company_data: Dict):
+        """Write a company's parsed statements (fetch_company_data shape), replacing any previous version"""
+        years, statements, line_items, values = [], [], [], []
+        for statement in self.STATEMENTS:
+            for year, line_item, value in self._line_items(company_data.get(statement)):
+                years.append(year)
+                statements.append(statement)
+                line_items.append(line_item)
+                values.append(value)
+
+        metadata = {
+            'company_name': company_data.get('company_name') or '',
+            'ticker': company_data.get('ticker') or ''
+        }
+        table = pa.table([years, statements, line_items, values],
+                         schema=self.SCHEMA.with_metadata(metadata))
+        # Sorted rows give tight per-column min/max statistics for predicate pushdown
+        table = table.sort_by([('statement', 'ascending'), ('fiscal_year', 'ascending')])
+
+        partition_dir = self._partition_dir(cik)
+        os.makedirs(partition_dir, exist_ok=True)
+        path = self._path(cik)
+        # Dot-prefixed so directory scans never pick up a half-written file
+        tmp_path = os.path.join(partition_dir, f".part-0.{os.getpid()}.{threading.get_ident()}.tmp")
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def _filter(cls, statements: Optional[Iterable[str]] = None, years: Optional[Iterable[int]] = None,
+                line_items: Optional[Iterable[str]] = None) -> Optional[List]:
+        """Build pyarrow DNF filters for the non-partition columns"""
+        filters = []
+        if statements is not None:
+            filters.append(('statement', 'in', list(statements)))
+        if years is not None:
+            filters.append(('fiscal_year', 'in', [int(y) for y in years]))
+        if line_items is not None:
+            filters.append(('line_item', 'in', list(line_items)))
+        return filters or None
+
+    def read_table(self, ciks: Optional[Iterable[str]] = None, statements: Optional[Iterable[str]] = None,
+                   years: Optional[Iterable[int]] = None, line_items: Optional[Iterable[str]] = None) -> pa.Table:
+        """
+        Read matching line items as an Arrow table with a 'cik' column
+
+        Args:
+            ciks: Companies to read (None reads the whole store)
+            statements: Subset of STATEMENTS
+            years: Fiscal years
+            line_items: Line item names (e.g. 'Revenue')
+        """
+        filters = self._filter(statements, years, line_items)
+        if ciks is None:
+            if not os.listdir(self.statements_dir):
+                return self.SCHEMA.empty_table().append_column('cik', pa.array([], pa.string()))
+            return pq.read_table(self.statements_dir, partitioning=self.PARTITIONING,
+                                 filters=filters, memory_map=True)
+
+        # Known CIKs go straight to their partition files instead of listing the store
+        tables = []
+        for cik in ciks:
+            path = self._path(cik)
+            if not os.path.exists(path):
+                continue
+            table = pq.read_table(path, filters=filters, memory_map=True)
+            tables.append(table.append_column('cik', pa.array([self._cik(cik)] * table.num_rows, pa.string())))
+        if not tables:
+            return self.SCHEMA.empty_table().append_column('cik', pa.array([], pa.string()))
+        return pa.concat_tables(tables, promote_options='default')
+
+    def get(self, cik: str, years: Optional[Iterable[int]] = None,
+            lookback_years: Optional[int] = None) -> Optional[Dict]:
+        """
+        Return a company's statements in fetch_company_data shape, or None if not stored
+
+        Each statement is {year: {line_item: value}}; line items a year lacks are NaN,
+        as they are in DataFrame.to_dict('index') output.
+
+        Args:
+            cik: Company CIK
+            years: Fiscal years to read
+            lookback_years: Keep only each statement's most recent lookback_years fiscal years
+        """
+        path = self._path(cik)
+        if not os.path.exists(path):
+            return None
+
+        table = pq.read_table(path, filters=self._filter(years=years), memory_map=True)
+        metadata = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()}
+
+        company_data = {
+            'company_name': metadata.get('company_name', ''),
+            'cik': self._cik(cik),
+            'ticker': metadata.get('ticker', '')
+        }
+        columns = table.to_pydict()
+        for statement in self.STATEMENTS:
+            rows = {}
+            for year, stmt, line_item, value in zip(columns['fiscal_year'], columns['statement'],
+                                                    columns['line_item'], columns['value']):
+                if stmt == statement:
+                    rows.setdefault(str(year), {})[line_item] = value
+            company_data[statement] = self._recent(rows, lookback_years)
+        return company_data
+
+    def delete(self, cik: str):
+        """Remove a company from the store"""
+        shutil.rmtree(self._partition_dir(cik), ignore_errors=True)
+
+    def __contains__(self, cik: str) -> bool:
+        return os.path.exists(self._path(cik))
+
+    def ciks(self) -> Iterator[str]:
+        """Yield the 10-digit CIKs present in the store"""
+        for name in sorted(os.listdir(self.statements_dir)):
+            if name.startswith('cik=') and os.path.exists(os.path.join(self.statements_dir, name, 'part-0.parquet')):
+                yield name[4:]
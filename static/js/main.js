@@ -2,6 +2,7 @@
 
 let currentData = null;
 let currentDCFResults = null;
+let currentModelHandle = null;  // Server-side handle for the fetched statements and latest results
 
 // Initialize on page load
 document.addEventListener('DOMContentLoaded', function() {
@@ -65,6 +66,7 @@ async function handleCompanyFetch(e) {
         
         if (response.ok) {
             currentData = data;
+            currentModelHandle = data.model_handle || null;
             displayCompanyInfo(data);
             document.getElementById('calculateBtn').disabled = false;
         } else {
@@ -110,15 +112,15 @@ async function handleDCFCalculation(e) {
     hideError();
     
     try {
-        const response = await fetch('/api/calculate-dcf', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                company_data: currentData,
-                assumptions: assumptions
-            })
+        // Statements live server-side (model handle, else stored by CIK); only
+        // re-upload them if the server no longer has them
+        const response = await postWithFallback('/api/calculate-dcf', {
+            model_handle: currentModelHandle,
+            cik: currentData.cik,
+            assumptions: assumptions
+        }, {
+            company_data: currentData,
+            assumptions: assumptions
         });
         
         // Check if response is ok
@@ -180,7 +182,7 @@ function displayResults(data) {
         
         // Display Income Statement
         if (data.operating_model && data.operating_model.income_statement) {
-            displayFinancialTable('incomeTable', data.operating_model.income_statement);
+            displayFinancialTable('incomeTable', data.operating_model.income_statement, data.operating_model.projected_years);
         } else {
             console.error('Income statement data not found');
         }
@@ -188,8 +190,8 @@ function displayResults(data) {
         // Display Balance Sheet
         if (data.operating_model && data.operating_model.balance_sheet) {
             const balanceSheet = data.operating_model.balance_sheet;
-            if (balanceSheet && Object.keys(balanceSheet).length > 0) {
-                displayFinancialTable('balanceTable', balanceSheet);
+            if (balanceSheet && columnarStatement(balanceSheet).years.length > 0) {
+                displayFinancialTable('balanceTable', balanceSheet, data.operating_model.projected_years);
             } else {
                 console.warn('Balance sheet data is empty');
                 const table = document.getElementById('balanceTable');
@@ -205,7 +207,7 @@ function displayResults(data) {
         
         // Display Cash Flow
         if (data.operating_model && data.operating_model.cash_flow) {
-            displayFinancialTable('cashflowTable', data.operating_model.cash_flow);
+            displayFinancialTable('cashflowTable', data.operating_model.cash_flow, data.operating_model.projected_years);
         } else {
             console.error('Cash flow data not found');
         }
@@ -221,7 +223,29 @@ function displayResults(data) {
     }
 }
 
-function displayFinancialTable(tableId, data) {
+// Statements arrive columnar ({years, line_items, values: one row per year});
+// the nested {year: {line_item: value}} format is converted to it
+function columnarStatement(data) {
+    if (data && Array.isArray(data.years) && Array.isArray(data.line_items) && Array.isArray(data.values)) {
+        return data;
+    }
+    const years = Object.keys(data || {});
+    const lineItems = [];
+    years.forEach(year => {
+        Object.keys(data[year]).forEach(item => {
+            if (!lineItems.includes(item)) {
+                lineItems.push(item);
+            }
+        });
+    });
+    return {
+        years: years,
+        line_items: lineItems,
+        values: years.map(year => lineItems.map(item => data[year][item] || 0))
+    };
+}
+
+function displayFinancialTable(tableId, data, projectedYears = []) {
     const table = document.getElementById(tableId);
     const thead = table.querySelector('thead');
     const tbody = table.querySelector('tbody');
@@ -230,14 +254,16 @@ function displayFinancialTable(tableId, data) {
     thead.innerHTML = '';
     tbody.innerHTML = '';
     
-    if (!data || Object.keys(data).length === 0) {
+    const statement = columnarStatement(data);
+    if (statement.years.length === 0) {
         tbody.innerHTML = '<tr><td colspan="2">No data available</td></tr>';
         return;
     }
     
     // Get all years
-    const years = Object.keys(data).sort();
-    if (years.length === 0) return;
+    const years = [...statement.years].sort();
+    const yearRows = new Map(statement.years.map((year, index) => [year, statement.values[index]]));
+    const itemColumns = new Map(statement.line_items.map((item, index) => [item, index]));
     
     // Define proper order for each statement type (matching Excel structure)
     const incomeStatementOrder = [
@@ -277,13 +303,12 @@ function displayFinancialTable(tableId, data) {
     const cashFlowOrder = [
         'NetIncome', 'D&A', 'ChangeInWorkingCapital', 'ChangeInCurrentAssets',
         'ChangeInCurrentLiabilities', 'OperatingCashFlow', 'CapitalExpenditures',
-        'InvestingCashFlow', 'FinancingCashFlow', 'NetCashFlow'
+        'FreeCashFlow', 'InvestingCashFlow', 'FinancingCashFlow', 'NetCashFlow'
     ];
     
     // Determine which order to use based on table ID
     let orderedLineItems;
-    const firstYear = years[0];
-    const availableItems = Object.keys(data[firstYear]);
+    const availableItems = statement.line_items;
     
     if (tableId === 'incomeTable') {
         orderedLineItems = incomeStatementOrder.filter(item => availableItems.includes(item));
@@ -316,7 +341,8 @@ function displayFinancialTable(tableId, data) {
     const headerRow = document.createElement('tr');
     headerRow.appendChild(createHeaderCell('Line Item'));
     years.forEach(year => {
-        headerRow.appendChild(createHeaderCell(year));
+        // Actuals are marked "A" and projections "E", as in the Excel export
+        headerRow.appendChild(createHeaderCell(year + (projectedYears.includes(year) ? 'E' : 'A')));
     });
     thead.appendChild(headerRow);
     
@@ -325,7 +351,7 @@ function displayFinancialTable(tableId, data) {
         const row = document.createElement('tr');
         row.appendChild(createCell(formatLineItemName(lineItem)));
         years.forEach(year => {
-            const value = data[year][lineItem] || 0;
+            const value = yearRows.get(year)[itemColumns.get(lineItem)] || 0;
             // Format as percentage for margin/percentage fields, otherwise as currency
             if (lineItem.includes('Margin') || lineItem.includes('PctRevenue') || 
                 lineItem.includes('TaxRate') || lineItem === 'GrossMargin') {
@@ -506,16 +532,14 @@ async function handleExcelExport() {
     }
     
     try {
-        const response = await fetch('/api/export-excel', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                operating_model: currentDCFResults.operating_model,
-                dcf_results: currentDCFResults.dcf_results,
-                company_name: currentData.company_name || 'Company'
-            })
+        // The server keeps the latest results on the model handle
+        const response = await postWithFallback('/api/export-excel', {
+            model_handle: currentModelHandle,
+            company_name: currentData.company_name || 'Company'
+        }, {
+            operating_model: currentDCFResults.operating_model,
+            dcf_results: currentDCFResults.dcf_results,
+            company_name: currentData.company_name || 'Company'
         });
         
         if (response.ok) {
@@ -544,16 +568,14 @@ async function handleCsvExport() {
     }
     
     try {
-        const response = await fetch('/api/export-csv', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                operating_model: currentDCFResults.operating_model,
-                dcf_results: currentDCFResults.dcf_results,
-                company_name: currentData.company_name || 'Company'
-            })
+        // The server keeps the latest results on the model handle
+        const response = await postWithFallback('/api/export-csv', {
+            model_handle: currentModelHandle,
+            company_name: currentData.company_name || 'Company'
+        }, {
+            operating_model: currentDCFResults.operating_model,
+            dcf_results: currentDCFResults.dcf_results,
+            company_name: currentData.company_name || 'Company'
         });
         
         if (response.ok) {
@@ -575,6 +597,23 @@ async function handleCsvExport() {
     }
 }
 
+async function postWithFallback(url, body, fallbackBody) {
+    // POST the compact body; if the server answers 404 (handle evicted), retry with the full payload
+    const post = (payload) => fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(payload)
+    });
+    
+    const response = await post(body);
+    if (response.status === 404 && fallbackBody) {
+        return post(fallbackBody);
+    }
+    return response;
+}
+
 function showLoading(show) {
     document.getElementById('loadingIndicator').style.display = show ? 'block' : 'none';
 }
@@ -0,0 +1,128 @@
+"""
+Streaming Export
+Write-only Excel export (xlsxwriter constant_memory) streamed to the client from a temp file
+"""
+import tempfile
+from typing import Dict, IO, Optional
+
+import xlsxwriter
+
+from export_handler import ExportHandler
+from export_styles import XlsxwriterStyles
+
+
+class StreamingExportHandler(ExportHandler):
+    """
+    Excel export through xlsxwriter's constant_memory mode
+
+    Produces the same sheets as ExportHandler.create_excel_workbook, but every sheet
+    is emitted strictly in row order and flushed to disk as it goes, and all cell
+    formats are registered once when the workbook is opened. No cell data is kept in
+    memory, so memory does not grow with the number of rows; each sheet only adds
+    xlsxwriter's per-worksheet bookkeeping (about 25 KB, mostly the column settings
+    of the gray background columns). The finished file is handed out as a temp file
+    for send_file to stream in chunks.
+    """
+
+    @staticmethod
+    def open_workbook(output: IO[bytes]) -> xlsxwriter.Workbook:
+        """Write-only workbook on output (rows go to per-sheet temp files until close)"""
+        return xlsxwriter.Workbook(output, {
+            'constant_memory': True,
+            'strings_to_formulas': False,
+            'nan_inf_to_errors': True
+        })
+
+    def register_formats(self, workbook: xlsxwriter.Workbook):
+        """Create every format the sheets use up front (see export_styles.XlsxwriterStyles)"""
+        self.styles = XlsxwriterStyles(workbook)
+
+    def create_excel_file(self) -> IO[bytes]:
+        """
+        Write the workbook to an anonymous temp file
+
+        Returns:
+            The file, positioned at the start (deleted when closed)
+        """
+        output = tempfile.TemporaryFile(prefix='dcf-export-', suffix='.xlsx')
+        try:
+            self.write_workbook(output)
+        except Exception:
+            output.close()
+            raise
+        output.seek(0)
+        return output
+
+    def write_workbook(self, output: IO[bytes]):
+        """Write all sheets (see ExportHandler.create_excel_workbook) to output"""
+        workbook = self.open_workbook(output)
+        self.register_formats(workbook)
+        self.write_sheets(workbook)
+        workbook.close()
+
+    def write_sheets(self, workbook: xlsxwriter.Workbook, prefix: str = '', sheet_names: Optional[Dict[str, str]] = None):
+        """
+        Add this company's sheets to an open workbook
+
+        Args:
+            workbook: Workbook whose formats were registered by register_formats
+            prefix: Prepended to sheet names (for several companies in one workbook)
+            sheet_names: Only write these sheets, under new names ({standard name: sheet name})
+        """
+        for name, write_sheet in self.named_sheet_writers(prefix, sheet_names):
+            ws = workbook.add_worksheet(name)
+            write_sheet(ws)
+            self.release_sheet(ws)
+    
+    @staticmethod
+    def release_sheet(ws):
+        """
+        Flush a finished sheet's row data and close its temp file
+
+        constant_memory keeps each sheet's temp file (and its text buffer) open until
+        the workbook is closed; the packager reopens it to write the last row. Closing
+        it as soon as the sheet is done keeps open files and buffers to one sheet, so
+        large comps workbooks stay under the open-file limit.
+
+        xlsxwriter has no public API for this: Worksheet._opt_close is private, so the
+        xlsxwriter version is pinned in requirements.txt. Should a later version drop
+        it, sheets simply stay open until the workbook is closed.
+        """
+        opt_close = getattr(ws, '_opt_close', None)
+        if opt_close is not None:
+            opt_close()
+
+    def _put(self, ws, row: int, col: int, value, style: Optional[str] = None, *edges: str):
+        """Write one cell; row and col are 1-based like openpyxl"""
+        cell_format = self.styles.get(style, *edges)
+        if value is None:
+            if cell_format is not None:
+                ws.write_blank(row - 1, col - 1, None, cell_format)
+        elif isinstance(value, str) and value.startswith('='):
+            ws.write_formula(row - 1, col - 1, value, cell_format)
+        else:
+            ws.write(row - 1, col - 1, value, cell_format)
+
+    def _put_formula(self, ws, row: int, col: int, formula: str, value, style: Optional[str] = None):
+        """Write a formula with the value computed in Python cached as its result"""
+        ws.write_formula(row - 1, col - 1, formula, self.styles.get(style), value)
+
+    def _merge(self, ws, row: int, first_col: int, last_col: int, value, style: Optional[str] = None):
+        ws.merge_range(row - 1, first_col - 1, row - 1, last_col - 1, value, self.styles.get(style))
+
+    def _set_widths(self, ws, widths: Dict[int, float]):
+        for col, width in widths.items():
+            ws.set_column(col - 1, col - 1, width)
+
+    def _set_heights(self, ws, heights: Dict[int, float]):
+        # Rows are flushed as soon as a later row is written, so heights must come first
+        for row, height in sorted(heights.items()):
+            ws.set_row(row - 1, height)
+
+    def _box_background(self, ws, box: Dict):
+        """Column widths and gray column defaults around a statement box (see ExportHandler._box_background)"""
+        last_col = box['bounds'][3]
+        background = self.styles.get('background')
+        for col, width in box['widths'].items():
+            ws.set_column(col - 1, col - 1, width, background)
+        ws.set_column(last_col - 1, self.background_columns(last_col) - 1, None, background)
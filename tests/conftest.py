@@ -0,0 +1,63 @@
+"""
+Test Fixtures
+Synthetic SEC companyfacts payloads shared by the test modules
+"""
+import os
+import sys
+from typing import Dict, List, Optional
+
+import pytest
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def fact(end: str, val: float, start: Optional[str] = None, form: str = '10-K',
+         fy: Optional[int] = None, filed: Optional[str] = None) -> Dict:
+    """One companyfacts fact (a period when start is given, else point-in-time)"""
+    item = {'end': end, 'val': val, 'form': form, 'fy': fy if fy is not None else int(end[:4]), 'fp': 'FY',
+            'filed': filed or f"{int(end[:4]) + 1}-02-15"}
+    if start is not None:
+        item['start'] = start
+    return item
+
+
+def annual(years: List[int], values: List[float], point_in_time: bool = False, month_day: str = '12-31') -> List[Dict]:
+    """Full-year facts (or year-end balances) ending on month_day of each year"""
+    facts = []
+    for year, value in zip(years, values):
+        start = None if point_in_time else f"{year - 1}-{month_day}" if month_day != '12-31' else f"{year}-01-01"
+        facts.append(fact(f"{year}-{month_day}", value, start=start))
+    return facts
+
+
+def companyfacts(concepts: Dict[str, Dict[str, List[Dict]]], cik: int = 1234567,
+                 entity_name: str = 'Test Co', namespace: str = 'us-gaap') -> Dict:
+    """
+    Raw companyfacts payload
+
+    Args:
+        concepts: {concept: {unit: [fact, ...]}}
+    """
+    return {
+        'cik': cik,
+        'entityName': entity_name,
+        'facts': {namespace: {name: {'units': units} for name, units in concepts.items()}}
+    }
+
+
+@pytest.fixture
+def sec_client(tmp_path):
+    """SECClient with its caches in a temp dir (no network access is needed by the tests)"""
+    from sec_client import SECClient
+    return SECClient(cache_dir=str(tmp_path / 'sec_cache'))
+
+
+@pytest.fixture(scope='session')
+def client(tmp_path_factory):
+    """Flask test client, with the app's caches and statement store in a temp dir"""
+    root = tmp_path_factory.mktemp('app')
+    os.environ['SEC_CACHE_DIR'] = str(root / 'sec_cache')
+    os.environ['SEC_STORE_DIR'] = str(root / 'store')
+    import app
+    return app.app.test_client()
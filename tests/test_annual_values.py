@@ -0,0 +1,146 @@
+"""
+Annual Value Selection Tests
+The vectorized SECClient._select_annual_values picks exactly what the loop reference picks
+"""
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import companyfacts, fact
+from fact_index import FactIndex
+
+UNITS = ('USD', 'USD thousands', 'shares')
+
+
+def select_both(sec_client, facts, concept, unit, fiscal_year_ends, years=10):
+    index = FactIndex(facts)
+    rows = index.rows('us-gaap', concept, unit)
+    vectorized = sec_client._select_annual_values(index, rows, unit, fiscal_year_ends, years)
+    reference = sec_client._select_annual_values_reference(index, rows, unit, fiscal_year_ends, years)
+    return vectorized, reference
+
+
+def patterns(sec_client, facts):
+    """Fiscal-year-end maps the selector is called with: none, empty, int keys, str keys, mixed and both"""
+    detected = sec_client._compute_fiscal_year_end_pattern(FactIndex(facts), 0) or {2022: '2022-09-24'}
+    as_str = {str(year): end for year, end in detected.items()}
+    mixed = {**{year: end for year, end in list(detected.items())[::2]},
+             **{str(year): end for year, end in list(detected.items())[1::2]}}
+    return [None, {}, detected, as_str, mixed, {**detected, **as_str}]
+
+
+def sep_filer(concepts):
+    """Filer with a late-September fiscal year end (revenue sets the pattern)"""
+    revenue = [fact(f"{year}-09-{24 + year % 3}", 1000.0 + year, start=f"{year - 1}-09-{25 + year % 3}")
+               for year in range(2017, 2024)]
+    return companyfacts({'Revenues': {'USD': revenue}, **concepts})
+
+
+def test_duplicate_filings(sec_client):
+    # Every balance is filed in its own 10-K and again as the prior year in the next one
+    balances = []
+    for year in range(2018, 2024):
+        end = f"{year}-09-{24 + year % 3}"
+        balances.append(fact(end, 100.0 * year, form='10-K', filed=f"{year}-11-01"))
+        balances.append(fact(end, 100.0 * year, form='10-K', fy=year + 1, filed=f"{year + 1}-11-01"))
+        balances.append(fact(f"{year}-06-30", 1.0, form='10-Q'))
+    facts = sep_filer({'Assets': {'USD': balances}})
+    for fiscal_year_ends in patterns(sec_client, facts):
+        vectorized, reference = select_both(sec_client, facts, 'Assets', 'USD', fiscal_year_ends)
+        assert vectorized == reference
+    vectorized, _ = select_both(sec_client, facts, 'Assets', 'USD', None)
+    assert [row['val'] for row in vectorized] == [100.0 * year for year in range(2023, 2017, -1)]
+
+
+def test_restated_years(sec_client):
+    # A later filing restates the same annual period with a different value
+    income = []
+    for year in range(2018, 2024):
+        start, end = f"{year - 1}-10-01", f"{year}-09-30"
+        income.append(fact(end, 10.0 * year, start=start, filed=f"{year}-11-01"))
+        income.append(fact(end, 10.0 * year + 7, start=start, fy=year + 1, filed=f"{year + 1}-11-01"))
+        income.append(fact(end, 1.0, start=f"{year}-07-01", form='10-Q'))
+    facts = sep_filer({'NetIncomeLoss': {'USD': income}})
+    for fiscal_year_ends in patterns(sec_client, facts):
+        for years in (1, 3, 10):
+            vectorized, reference = select_both(sec_client, facts, 'NetIncomeLoss', 'USD', fiscal_year_ends, years)
+            assert vectorized == reference
+
+
+def test_mixed_units(sec_client):
+    # The same concept filed in dollars, thousands and shares; thousands are scaled by 1000
+    concept = {
+        'USD': [fact(f"{year}-12-31", 5.0 * year, start=f"{year}-01-01") for year in range(2019, 2024)],
+        'USD thousands': [fact(f"{year}-12-31", 3.0, start=f"{year}-01-01") for year in range(2016, 2021)],
+        'shares': [fact(f"{year}-12-31", 7.0) for year in range(2020, 2024)]
+    }
+    facts = companyfacts({'Revenues': {'USD': concept['USD']}, 'Mixed': concept})
+    for unit in UNITS:
+        for fiscal_year_ends in patterns(sec_client, facts):
+            vectorized, reference = select_both(sec_client, facts, 'Mixed', unit, fiscal_year_ends)
+            assert vectorized == reference
+    thousands, _ = select_both(sec_client, facts, 'Mixed', 'USD thousands', None)
+    assert {row['val'] for row in thousands} == {3000.0}
+
+
+def test_string_and_int_year_keys(sec_client):
+    # Pattern maps are keyed by int calendar year, but candidates are grouped by the end
+    # date's 'YYYY' string, so only str-keyed maps ever report matches_pattern
+    facts = sep_filer({'Assets': {'USD': [fact(f"{year}-09-{24 + year % 3}", float(year)) for year in range(2017, 2024)]}})
+    detected, as_str = patterns(sec_client, facts)[2:4]
+
+    int_keyed, reference = select_both(sec_client, facts, 'Assets', 'USD', detected)
+    assert int_keyed == reference
+    assert not any(row['matches_pattern'] for row in int_keyed)
+
+    str_keyed, reference = select_both(sec_client, facts, 'Assets', 'USD', as_str)
+    assert str_keyed == reference
+    # Point-in-time facts are only admitted through an int key, so a str-only map selects none
+    assert str_keyed == []
+
+    both, reference = select_both(sec_client, facts, 'Assets', 'USD', {**detected, **as_str})
+    assert both == reference
+    assert all(row['matches_pattern'] for row in both) and len(both) == len(int_keyed)
+
+
+def random_facts(rng, fiscal_ends=()):
+    """
+    A concept's unit list mixing annual, quarterly, point-in-time, 10-Q and malformed facts
+    (some ending exactly on one of fiscal_ends)
+    """
+    facts = []
+    for _ in range(rng.randint(0, 40)):
+        if fiscal_ends and rng.random() < 0.4:
+            end = date.fromisoformat(rng.choice(fiscal_ends))
+        else:
+            end = date(rng.randint(2012, 2024), rng.choice([3, 6, 9, 10, 11, 12, 12]), rng.choice([24, 25, 28, 30, 31]) % 29 + 1)
+        start = None
+        kind = rng.random()
+        if kind < 0.6:
+            # Durations around the 330-400 day full-year window, plus quarters and halves
+            days = rng.choice([91, 182, 329, 330, 364, 365, 371, 400, 401])
+            start = (end - timedelta(days=days)).isoformat()
+            if rng.random() < 0.03:
+                start = '2019-02-30'
+        end_str = end.isoformat() if kind >= 0.05 else rng.choice(['', '2020-13-01', 'bad'])
+        facts.append(fact(end_str, float(rng.randint(-1000, 1000)), start=start,
+                          form=rng.choice(['10-K', '10-K', '10-Q', '10-K/A', '8-K']),
+                          fy=end.year + rng.choice([0, 0, 1]), filed=f"{end.year + rng.randint(0, 2)}-0{rng.randint(1, 9)}-15"))
+    return facts
+
+
+@pytest.mark.parametrize('seed', range(60))
+def test_random_unit_lists(sec_client, seed):
+    rng = random.Random(seed)
+    unit = rng.choice(UNITS)
+    revenue = random_facts(rng)
+    fiscal_ends = [item['end'] for item in revenue if len(item['end']) == 10 and item['end'][5:7] != '13']
+    facts = companyfacts({
+        'Revenues': {'USD': revenue},
+        'Concept': {unit: random_facts(rng, fiscal_ends)}
+    })
+    for fiscal_year_ends in patterns(sec_client, facts):
+        for years in (1, 5, 10):
+            vectorized, reference = select_both(sec_client, facts, 'Concept', unit, fiscal_year_ends, years)
+            assert vectorized == reference
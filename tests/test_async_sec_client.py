@@ -0,0 +1,157 @@
+"""
+Async SEC Client Tests
+companyfacts downloads are streamed to the cache and parsed incrementally, never buffered whole,
+and 429/5xx responses are retried with backoff
+"""
+import asyncio
+import json
+import threading
+import tracemalloc
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from async_sec_client import AsyncSECClient
+from benchmarks import synthetic_company_facts
+
+
+def padded_payload(min_bytes: int) -> bytes:
+    """companyfacts with mapped concepts plus enough unmapped ones to reach min_bytes"""
+    facts = synthetic_company_facts(years=2, line_items=0)
+    noise = json.dumps({'units': {'USD': [{'end': '2020-12-31', 'val': i, 'form': '10-K', 'fy': 2020, 'fp': 'FY'}
+                                          for i in range(200)]}})
+    count = min_bytes // len(noise) + 1
+    unmapped = ', '.join(f'"Unmapped{i}": {noise}' for i in range(count))
+    # Splice the unmapped namespace in after us-gaap, inside 'facts'
+    return (json.dumps(facts)[:-2] + ', "unmapped-ns": {' + unmapped + '}}}').encode('utf-8')
+
+
+@pytest.fixture
+def facts_server():
+    """
+    Local HTTP server streaming one companyfacts payload in small chunks
+
+    Yields (url, payload, server); statuses queued on server['errors'] as (status, headers)
+    are answered first, one per request, and every request is counted in server['requests'].
+    """
+    payload = padded_payload(16 * 1024 * 1024)
+    server = {'errors': [], 'requests': 0}
+
+    async def companyfacts(request):
+        server['requests'] += 1
+        if server['errors']:
+            status, headers = server['errors'].pop(0)
+            return web.Response(status=status, headers=headers, text='busy')
+        response = web.StreamResponse(headers={'ETag': '"v1"', 'Content-Type': 'application/json'})
+        await response.prepare(request)
+        for start in range(0, len(payload), 16 * 1024):
+            await response.write(payload[start:start + 16 * 1024])
+        await response.write_eof()
+        return response
+
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.router.add_get('/CIK{cik}.json', companyfacts)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{port}/CIK{{cik}}.json", payload, server
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+
+
+def fetch(tmp_path, url, stream_facts):
+    client = AsyncSECClient(cache_dir=str(tmp_path / f"cache-{stream_facts}"), stream_facts=stream_facts)
+    client.COMPANY_FACTS_URL = url
+    try:
+        tracemalloc.start()
+        facts = client.get_company_facts('320193')
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return client, facts, peak
+    finally:
+        client.close()
+
+
+def test_stream_facts_never_buffers_the_body(tmp_path, facts_server):
+    url, payload, _ = facts_server
+    client, facts, peak = fetch(tmp_path, url, stream_facts=True)
+
+    expected = json.loads(payload)
+    expected['facts'] = {namespace: {name: value for name, value in concepts.items()
+                                     if name in client.mapped_concepts()}
+                         for namespace, concepts in expected['facts'].items()}
+    assert facts == expected
+    assert not facts['facts'].get('unmapped-ns')
+    entry = client.facts_cache.lookup('320193')
+    assert entry['size'] == len(payload) and entry['etag'] == '"v1"'
+    assert peak < len(payload) / 4
+
+
+def test_buffered_mode_reads_the_whole_body(tmp_path, facts_server):
+    url, payload, _ = facts_server
+    _, facts, peak = fetch(tmp_path, url, stream_facts=False)
+    assert facts == json.loads(payload)
+    assert peak > len(payload)
+
+
+def retrying_client(tmp_path, url):
+    """Client whose backoffs are recorded as (attempt, Retry-After) instead of slept"""
+    client = AsyncSECClient(cache_dir=str(tmp_path / 'cache'))
+    client.COMPANY_FACTS_URL = url
+    client.backoffs = []
+
+    def backoff(attempt, retry_after=None):
+        client.backoffs.append((attempt, retry_after))
+        return 0.0
+
+    client._backoff = backoff
+    return client
+
+
+def test_rate_limit_and_server_errors_are_retried(tmp_path, facts_server):
+    url, payload, server = facts_server
+    server['errors'] = [(429, {'Retry-After': '3'}), (503, {})]
+    client = retrying_client(tmp_path, url)
+    try:
+        facts = client.get_company_facts('320193')
+    finally:
+        client.close()
+
+    assert facts['entityName'] == json.loads(payload)['entityName']
+    assert server['requests'] == 3
+    assert client.backoffs == [(0, '3'), (1, None)]
+
+
+def test_error_propagates_after_max_retries(tmp_path, facts_server):
+    url, _, server = facts_server
+    server['errors'] = [(503, {})] * (AsyncSECClient.MAX_RETRIES + 1)
+    client = retrying_client(tmp_path, url)
+    try:
+        with pytest.raises(aiohttp.ClientResponseError) as error:
+            client.run(client._get(url.format(cik='0000320193')))
+        assert error.value.status == 503
+        assert server['requests'] == AsyncSECClient.MAX_RETRIES + 1
+        assert [attempt for attempt, _ in client.backoffs] == list(range(AsyncSECClient.MAX_RETRIES))
+
+        # get_company_facts reports the failure as no data
+        server['errors'] = [(500, {})] * (AsyncSECClient.MAX_RETRIES + 1)
+        assert client.get_company_facts('320193') is None
+        assert client.facts_cache.lookup('320193') is None
+    finally:
+        client.close()
+
+
+def test_backoff_honors_retry_after_and_cap(tmp_path):
+    client = AsyncSECClient(cache_dir=str(tmp_path))
+    for attempt in range(10):
+        assert 0 <= client._backoff(attempt) <= min(client.BACKOFF_CAP, client.BACKOFF_BASE * 2 ** attempt)
+        assert client._backoff(attempt, '12') >= 12
+        # HTTP-date Retry-After values fall back to the jittered delay
+        assert client._backoff(attempt, 'Wed, 21 Oct 2026 07:28:00 GMT') <= client.BACKOFF_CAP
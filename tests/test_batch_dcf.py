@@ -0,0 +1,111 @@
+"""
+Batch DCF Tests
+Vectorized valuations match DCFCalculator; sensitivity axis specs are validated before any range is allocated
+"""
+import numpy as np
+import pytest
+
+from batch_dcf import BatchDCFEngine
+from benchmarks import synthetic_company
+from dcf_calculator import DCFCalculator
+from operating_model import OperatingModel
+
+PARITY_METRICS = ('enterprise_value', 'equity_value', 'terminal_value', 'price_per_share')
+
+
+def random_assumptions(rng, count: int):
+    """Assumption sets spanning WACC both above and below terminal growth"""
+    return [{
+        'risk_free_rate': rng.uniform(0.0, 0.06),
+        'beta': rng.uniform(0.3, 2.0),
+        'market_risk_premium': rng.uniform(0.03, 0.09),
+        'cost_of_debt': rng.uniform(0.02, 0.1),
+        'tax_rate': rng.uniform(0.0, 0.4),
+        'debt_to_equity': rng.uniform(0.0, 2.0),
+        'terminal_growth_rate': rng.uniform(-0.02, 0.12),
+        'shares_outstanding': 1e8
+    } for _ in range(count)]
+
+
+def assert_parity(operating_model_data, assumption_sets):
+    engine = BatchDCFEngine.from_calculator(DCFCalculator(operating_model_data, assumption_sets[0]))
+    batch = engine.evaluate(**{name: [a[name] for a in assumption_sets] for name in BatchDCFEngine.ASSUMPTION_DEFAULTS})
+    for i, assumptions in enumerate(assumption_sets):
+        expected = DCFCalculator(operating_model_data, assumptions).calculate_all()
+        for metric in PARITY_METRICS:
+            assert batch[metric][i] == pytest.approx(expected[metric], rel=1e-9, abs=1e-9), (i, metric)
+    return batch
+
+
+@pytest.fixture(scope='module')
+def model_data():
+    model = OperatingModel(synthetic_company(years=6, line_items=20), projection_years=5)
+    return model.build_model(OperatingModel.operating_assumptions({'revenue_growth': 0.05}))
+
+
+def test_batch_matches_calculator(model_data):
+    assumption_sets = random_assumptions(np.random.default_rng(12), 200)
+    batch = assert_parity(model_data, assumption_sets)
+    # Both terminal value branches are exercised
+    growth = np.array([a['terminal_growth_rate'] for a in assumption_sets])
+    assert (batch['wacc'] > growth).any() and (batch['wacc'] <= growth).any()
+
+
+def test_batch_matches_calculator_when_wacc_not_above_growth(model_data):
+    base = {'risk_free_rate': 0.02, 'beta': 1.0, 'market_risk_premium': 0.04, 'cost_of_debt': 0.05,
+            'tax_rate': 0.25, 'debt_to_equity': 0.0, 'shares_outstanding': 5e7}
+    # WACC is 6%: growth equal to and above it falls back to the terminal multiple
+    assert_parity(model_data, [{**base, 'terminal_growth_rate': g} for g in (0.06, 0.08, 0.03)])
+
+
+def test_batch_matches_calculator_without_projections():
+    model = OperatingModel(synthetic_company(years=6, line_items=20), projection_years=0)
+    model_data = model.build_model(OperatingModel.operating_assumptions({}))
+    assert model_data.get('projection_years', 0) == 0
+    assumption_sets = random_assumptions(np.random.default_rng(3), 5)
+    engine = BatchDCFEngine.from_calculator(DCFCalculator(model_data, assumption_sets[0]))
+    assert engine.horizon == 0
+    assert_parity(model_data, assumption_sets)
+
+
+def test_axis_range_includes_both_ends():
+    values = BatchDCFEngine.axis_values({'name': 'wacc', 'start': 0.06, 'stop': 0.12, 'steps': 7})
+    assert values.tolist() == [0.06, 0.07, 0.08, 0.09, 0.1, 0.11, 0.12]
+
+
+@pytest.mark.parametrize('steps', [0, -3, 1e9, BatchDCFEngine.MAX_SENSITIVITY_CELLS + 1, 'many', None, float('inf')])
+def test_axis_steps_out_of_range_are_rejected(steps):
+    with pytest.raises(ValueError, match='steps'):
+        BatchDCFEngine.axis_values({'name': 'wacc', 'start': 0.06, 'stop': 0.12, 'steps': steps})
+
+
+def test_explicit_values_are_capped():
+    values = np.zeros(BatchDCFEngine.MAX_SENSITIVITY_CELLS + 1)
+    with pytest.raises(ValueError, match='limit'):
+        BatchDCFEngine.axis_values({'name': 'beta', 'values': values})
+
+
+def test_sensitivity_endpoint_rejects_huge_steps(client):
+    response = client.post('/api/sensitivity', json={
+        'company_data': synthetic_company(years=5, line_items=10),
+        'assumptions': {'projection_years': 5},
+        'axes': [{'name': 'wacc', 'start': 0.06, 'stop': 0.12, 'steps': 1e9}]
+    })
+    assert response.status_code == 400
+    assert 'steps' in response.get_json()['error']
+
+
+def test_recalculation_drops_stale_sensitivity_grid(client):
+    import app
+    handle = app.model_cache.create({'company_data': synthetic_company(years=5, line_items=10)})
+    base = {'projection_years': 5, 'wacc': 0.09}
+
+    assert client.post('/api/calculate-dcf', json={'model_handle': handle, 'assumptions': base}).status_code == 200
+    response = client.post('/api/sensitivity', json={'model_handle': handle, 'assumptions': base})
+    assert response.status_code == 200
+    assert app.model_cache.get(handle)['sensitivity'] == response.get_json()
+
+    changed = {**base, 'wacc': 0.11}
+    assert client.post('/api/calculate-dcf', json={'model_handle': handle, 'assumptions': changed}).status_code == 200
+    assert app.model_cache.get(handle).get('sensitivity') is None
+    assert app.export_inputs({'model_handle': handle})[3] is None
@@ -0,0 +1,97 @@
+"""
+Bulk Ingest Tests
+companyfacts.zip members are parsed into the StatementStore one at a time; bad members are skipped
+"""
+import json
+import zipfile
+
+import pytest
+
+from conftest import annual, companyfacts
+from sec_client import SECClient
+from statement_store import StatementStore
+
+YEARS = [2020, 2021, 2022, 2023]
+TICKERS = {'0000000001': ['AAA'], '0000000002': ['BBB', 'BBB-P']}
+
+
+def company(cik: int, scale: float):
+    return companyfacts({
+        'Revenues': {'USD': annual(YEARS, [scale * y for y in (100, 110, 121, 133)])},
+        'NetIncomeLoss': {'USD': annual(YEARS, [scale * y for y in (10, 11, 12, 13)])},
+        'Assets': {'USD': annual(YEARS, [scale * y for y in (500, 520, 540, 560)], point_in_time=True)}
+    }, cik=cik, entity_name=f"Company {cik}")
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """companyfacts.zip with two good members, one malformed member and a non-CIK file"""
+    path = tmp_path / 'companyfacts.zip'
+    with zipfile.ZipFile(path, 'w') as zipf:
+        zipf.writestr('CIK0000000001.json', json.dumps(company(1, 1.0)))
+        zipf.writestr('CIK0000000002.json', json.dumps(company(2, 2.0)))
+        zipf.writestr('CIK0000000003.json', '{"cik": 3, "facts": {"us-gaap": {"Revenues": ')
+        zipf.writestr('README.txt', 'not a company')
+    return str(path)
+
+
+@pytest.mark.parametrize('stream_facts', [False, True])
+def test_ingest_stores_good_members_and_skips_bad(tmp_path, archive, monkeypatch, stream_facts):
+    client = SECClient(cache_dir=str(tmp_path / 'sec_cache'), stream_facts=stream_facts)
+    monkeypatch.setattr(client.ticker_index, 'ensure_loaded', lambda: None)
+    monkeypatch.setattr(client.ticker_index, 'lookup_tickers', lambda cik: TICKERS.get(cik, []))
+    store = StatementStore(str(tmp_path / 'store'))
+
+    stats = client.ingest_bulk_archive(archive, store)
+
+    assert (stats['stored'], stats['skipped'], stats['failed']) == (2, 0, 1)
+    assert sorted(store.ciks()) == ['0000000001', '0000000002']
+    assert '0000000003' not in store
+
+    for cik, scale in (('0000000001', 1.0), ('0000000002', 2.0)):
+        stored = store.get(cik)
+        assert stored['ticker'] == TICKERS[cik][0]
+        assert stored['company_name'] == f"Company {int(cik)}"
+        assert stored['income_statement']['2023']['Revenue'] == scale * 133
+        assert stored['income_statement']['2020']['NetIncome'] == scale * 10
+        assert stored['balance_sheet']['2022']['TotalAssets'] == scale * 540
+
+        expected = client.build_company_data(cik, cik, company(int(cik), scale), ticker=TICKERS[cik][0])
+        for statement in StatementStore.STATEMENTS:
+            assert set(stored[statement]) == set(expected[statement])
+
+
+def test_ingest_subset_of_ciks(tmp_path, archive, monkeypatch):
+    client = SECClient(cache_dir=str(tmp_path / 'sec_cache'))
+    monkeypatch.setattr(client.ticker_index, 'ensure_loaded', lambda: None)
+    monkeypatch.setattr(client.ticker_index, 'lookup_tickers', lambda cik: TICKERS.get(cik, []))
+    store = StatementStore(str(tmp_path / 'store'))
+
+    stats = client.ingest_bulk_archive(archive, store, ciks=['2'])
+
+    assert (stats['stored'], stats['failed']) == (1, 0)
+    assert list(store.ciks()) == ['0000000002']
+
+
+def test_ingest_stores_full_history(tmp_path, monkeypatch):
+    years = list(range(2008, 2024))
+    facts = companyfacts({
+        'Revenues': {'USD': annual(years, [100.0 + i for i in range(len(years))])},
+        'NetIncomeLoss': {'USD': annual(years, [10.0 + i for i in range(len(years))])}
+    }, cik=1, entity_name='Company 1')
+    path = tmp_path / 'companyfacts.zip'
+    with zipfile.ZipFile(path, 'w') as zipf:
+        zipf.writestr('CIK0000000001.json', json.dumps(facts))
+
+    # The client default lookback is shorter than the archive's history
+    client = SECClient(cache_dir=str(tmp_path / 'sec_cache'), lookback_years=5)
+    monkeypatch.setattr(client.ticker_index, 'ensure_loaded', lambda: None)
+    monkeypatch.setattr(client.ticker_index, 'lookup_tickers', lambda cik: TICKERS.get(cik, []))
+    store = StatementStore(str(tmp_path / 'store'))
+
+    assert client.ingest_bulk_archive(str(path), store)['stored'] == 1
+
+    stored = store.get('1', lookback_years=20)
+    assert sorted(stored['income_statement']) == [str(y) for y in years]
+    assert stored['income_statement']['2008']['Revenue'] == 100.0
+    assert sorted(store.get('1', lookback_years=5)['income_statement']) == [str(y) for y in years[-5:]]
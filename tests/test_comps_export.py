@@ -0,0 +1,39 @@
+"""
+Comps Export Tests
+Summary rows link to each company's sheets, whatever characters the sheet names contain
+"""
+import contextlib
+import io
+
+import openpyxl
+import pytest
+
+from benchmarks import BENCHMARK_ASSUMPTIONS, synthetic_company
+from comps_export import CompsExportHandler
+from dcf_calculator import DCFCalculator
+from operating_model import OperatingModel
+
+
+@pytest.fixture(scope='module')
+def valuation():
+    with contextlib.redirect_stdout(io.StringIO()):
+        operating_model_data = OperatingModel(synthetic_company(years=5, line_items=10)).build_model({})
+        return operating_model_data, DCFCalculator(operating_model_data, BENCHMARK_ASSUMPTIONS).calculate_all()
+
+
+@pytest.mark.parametrize('name', ["Macy's Inc", "O'Reilly's Auto", "'Quoted'", 'Plain Co'])
+def test_sheet_links_resolve(valuation, name):
+    operating_model_data, dcf_results = valuation
+    companies = [{'company_name': name, 'ticker': '', 'cik': '1',
+                  'operating_model': operating_model_data, 'dcf_results': dcf_results}]
+    with contextlib.redirect_stdout(io.StringIO()):
+        workbook = openpyxl.load_workbook(CompsExportHandler(companies).create_excel_file())
+
+    links = [cell.hyperlink.location for row in workbook[CompsExportHandler.SUMMARY_SHEET].iter_rows()
+             for cell in row if cell.hyperlink]
+    assert len(links) == 1
+    quoted, cell = links[0].rsplit('!', 1)
+    assert cell == 'A1' and quoted.startswith("'") and quoted.endswith("'")
+    # Inside the quotes every apostrophe is doubled
+    assert "'" not in quoted[1:-1].replace("''", '')
+    assert quoted[1:-1].replace("''", "'") in workbook.sheetnames
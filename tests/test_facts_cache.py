@@ -0,0 +1,103 @@
+"""
+Company Facts Cache Tests
+Fresh payloads are served from disk; stale ones are revalidated with ETag/Last-Modified
+"""
+import json
+import os
+
+import pytest
+
+from conftest import annual, companyfacts
+from sec_client import SECClient
+
+CIK = '0000320193'
+LAST_MODIFIED = 'Mon, 05 Oct 2026 10:00:00 GMT'
+
+
+def payload(revenue: float) -> bytes:
+    return json.dumps(companyfacts({'Revenues': {'USD': annual([2023], [revenue])}}, cik=int(CIK))).encode('utf-8')
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, content: bytes = b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size: int):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    """Answers GETs from a queue of responses, recording the headers of each request"""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+def age_entry(client: SECClient, seconds: float):
+    """Move a cached entry's fetch time into the past"""
+    entry = client.facts_cache.lookup(CIK)
+    entry['fetched_at'] -= seconds
+    with open(client.facts_cache._index_path(CIK), 'w') as f:
+        json.dump(entry, f)
+    return entry
+
+
+def blob_count(client: SECClient) -> int:
+    return sum(len(files) for _, _, files in os.walk(client.facts_cache.blob_dir))
+
+
+@pytest.mark.parametrize('stream_facts', [False, True])
+def test_revalidates_stale_entries(tmp_path, stream_facts):
+    client = SECClient(cache_dir=str(tmp_path), cache_ttl=60, stream_facts=stream_facts)
+    session = client.session = FakeSession()
+    first = payload(100.0)
+
+    session.responses.append(FakeResponse(200, first, {'ETag': '"v1"', 'Last-Modified': LAST_MODIFIED}))
+    assert client.get_company_facts('320193') == json.loads(first)
+    assert session.requests == [{}]
+    entry = client.facts_cache.lookup(CIK)
+    assert (entry['etag'], entry['last_modified'], entry['size']) == ('"v1"', LAST_MODIFIED, len(first))
+
+    # Within the TTL nothing is requested
+    assert client.get_company_facts(CIK) == json.loads(first)
+    assert len(session.requests) == 1
+
+    # Stale: a 304 reuses the blob and restarts the TTL
+    stale = age_entry(client, 3600)
+    session.responses.append(FakeResponse(304))
+    assert client.get_company_facts(CIK) == json.loads(first)
+    assert session.requests[-1] == {'If-None-Match': '"v1"', 'If-Modified-Since': LAST_MODIFIED}
+    revalidated = client.facts_cache.lookup(CIK)
+    assert revalidated['digest'] == stale['digest'] and blob_count(client) == 1
+    assert revalidated['fetched_at'] > stale['fetched_at'] and client.facts_cache.is_fresh(revalidated)
+    assert client.get_company_facts(CIK) == json.loads(first)
+    assert len(session.requests) == 2
+
+    # Stale again and changed upstream: the new payload replaces the entry
+    age_entry(client, 3600)
+    second = payload(250.0)
+    session.responses.append(FakeResponse(200, second, {'ETag': '"v2"'}))
+    assert client.get_company_facts(CIK) == json.loads(second)
+    assert session.requests[-1]['If-None-Match'] == '"v1"'
+    assert client.facts_cache.lookup(CIK)['etag'] == '"v2"' and blob_count(client) == 2
+
+    stats = client.facts_cache.stats()
+    assert (stats['hits'], stats['revalidated'], stats['misses']) == (3, 1, 2)
@@ -0,0 +1,78 @@
+"""
+Streaming Facts Parser Tests
+Parsing companyfacts in tiny chunks matches json.loads filtered to the mapped concepts
+"""
+import json
+
+import pytest
+
+from facts_stream import FilteredFactsParser, load_filtered_facts
+
+MAPPED = {'Revenues', 'NetIncomeLoss', 'Assets', 'CaféConcept'}
+
+PAYLOAD = r'''{
+  "entityName" : "Escapes \"Quoted\" \\ Back\\slash \u00e9\u4e2d \ud83d\ude00 é中 😀 Co",
+  "facts": {
+    "dei": {
+      "EntityCommonStockSharesOutstanding": {"label": "Shares {not} an object", "units": {"shares": [
+        {"end": "2023-10-20", "val": 15550061000, "fy": 2023}]}}
+    },
+    "us-gaap": {
+      "Revenues": {"label": "Revenue \"net\"", "description": "Tab\tand newline\n and \/ slash",
+        "units": {"USD": [
+          {"start": "2022-01-01", "end": "2022-12-31", "val": 1.5E+11, "fy": 2022, "form": "10-K"},
+          {"start": "2023-01-01", "end": "2023-12-31", "val": -12345.678e-2, "fy": 2023, "form": "10-K"},
+          {"start": "2023-01-01", "end": "2023-12-31", "val": 0, "fy": 2023, "form": "10-K/A", "frame": null}
+        ]}},
+      "UnmappedNested": {"label": "Braces { } [ ] and \"quotes\" in strings \\",
+        "units": {"USD": [{"val": -0.0, "deep": {"deeper": [[{"x": "}"}], {"y": "{["}]}, "ok": true}]}},
+      "NetIncomeLoss": {"units": {"USD": [{"val": -2.5e3, "end": "2023-12-31", "restated": false}]}},
+      "UnmappedEmpty": {},
+      "Caf\u00e9Concept": {"units": {"EUR": [{"val": 7.25, "note": "€ üñîçødé"}]}},
+      "Assets": {"units": {"USD": [{"end": "2023-12-31", "val": 352583000000}]}},
+      "UnmappedLast": {"units": {"USD": [{"val": 1e-7}]}}
+    },
+    "ifrs-full": {}
+  },
+  "cik": -320193.0e0
+}'''
+
+
+def expected(payload: str, concepts=MAPPED):
+    facts = json.loads(payload)
+    facts['facts'] = {namespace: {name: value for name, value in concepts_.items() if name in concepts}
+                      for namespace, concepts_ in facts['facts'].items()}
+    return facts
+
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 4, 5, 6, 7, 64, 10 ** 6])
+def test_tiny_chunks_match_json_loads(chunk_size):
+    data = PAYLOAD.encode('utf-8')
+    parser = FilteredFactsParser(chunked(data, chunk_size), MAPPED)
+    assert parser.parse() == expected(PAYLOAD)
+    assert (parser.kept, parser.skipped) == (4, 4)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7])
+def test_without_filter_keeps_everything(chunk_size):
+    assert load_filtered_facts(chunked(PAYLOAD.encode('utf-8'), chunk_size)) == json.loads(PAYLOAD)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 5])
+def test_compact_payload_with_empty_chunks(chunk_size):
+    compact = json.dumps(json.loads(PAYLOAD), separators=(',', ':'), ensure_ascii=False)
+    chunks = []
+    for chunk in chunked(compact.encode('utf-8'), chunk_size):
+        chunks += [b'', chunk]
+    assert load_filtered_facts(chunks, MAPPED) == expected(compact)
+
+
+@pytest.mark.parametrize('cut', [1, 40, len(PAYLOAD) // 2, len(PAYLOAD) - 1])
+@pytest.mark.parametrize('chunk_size', [1, 4])
+def test_truncated_stream_is_an_error(cut, chunk_size):
+    with pytest.raises(ValueError):
+        load_filtered_facts(chunked(PAYLOAD.encode('utf-8')[:cut], chunk_size), MAPPED)
@@ -0,0 +1,43 @@
+"""
+Batch Fetch Tests
+max_workers is validated and capped at the client's pool size
+"""
+import json
+
+import pytest
+
+
+@pytest.mark.parametrize('max_workers, expected', [(None, 4), (1, 1), (3, 3), ('2', 2), (4, 4), (10 ** 9, 4)])
+def test_resolve_max_workers_caps_at_pool_size(tmp_path, max_workers, expected):
+    from sec_client import SECClient
+    client = SECClient(cache_dir=str(tmp_path), max_workers=4)
+    assert client.resolve_max_workers(max_workers) == expected
+
+
+@pytest.mark.parametrize('max_workers', [0, -2, 1.5, 'many', '', True, [4], float('inf')])
+def test_resolve_max_workers_rejects_bad_values(sec_client, max_workers):
+    with pytest.raises(ValueError, match='max_workers'):
+        sec_client.resolve_max_workers(max_workers)
+
+
+@pytest.mark.parametrize('max_workers', [0, -1, 'lots', 2.5, float('inf')])
+def test_fetch_companies_rejects_bad_max_workers(client, max_workers):
+    response = client.post('/api/fetch-companies', json={'identifiers': ['AAPL'], 'max_workers': max_workers})
+    assert response.status_code == 400
+    assert 'max_workers' in response.get_json()['error']
+
+
+def test_fetch_companies_caps_max_workers(client, monkeypatch):
+    import app
+    seen = []
+
+    def fetch_many(identifiers, max_workers=None, lookback_years=None):
+        seen.append(max_workers)
+        for identifier in identifiers:
+            yield {'error': 'offline', 'identifier': identifier}
+
+    monkeypatch.setattr(app.sec_client, 'fetch_many', fetch_many)
+    response = client.post('/api/fetch-companies', json={'identifiers': ['AAPL', 'MSFT'], 'max_workers': 10 ** 9})
+    assert response.status_code == 200
+    assert [json.loads(line)['identifier'] for line in response.get_data(as_text=True).splitlines()] == ['AAPL', 'MSFT']
+    assert seen == [app.sec_client.max_workers]
@@ -0,0 +1,153 @@
+"""
+Lookback and Statement Store Tests
+The store keeps each company's full history; per-request lookbacks are applied when reading
+"""
+import pandas as pd
+import pytest
+
+from benchmarks import synthetic_company_facts
+from conftest import annual, companyfacts
+from sec_client import SECClient
+from statement_store import StatementStore
+
+CIK = '0000777001'
+YEARS = list(range(2012, 2024))
+
+
+def payload():
+    return companyfacts({
+        'Revenues': {'USD': annual(YEARS, [1000.0 + 10 * i for i in range(len(YEARS))])},
+        'NetIncomeLoss': {'USD': annual(YEARS, [100.0 + i for i in range(len(YEARS))])},
+        'Assets': {'USD': annual(YEARS, [5000.0 + i for i in range(len(YEARS))], point_in_time=True)}
+    }, cik=int(CIK), entity_name='Lookback Co')
+
+
+def test_get_applies_lookback(tmp_path):
+    store = StatementStore(str(tmp_path))
+    statement = {str(year): {'Revenue': float(year), 'NetIncome': 1.0} for year in YEARS}
+    store.put(CIK, {'company_name': 'Lookback Co', 'income_statement': statement})
+
+    assert list(store.get(CIK)['income_statement']) == [str(year) for year in YEARS]
+    recent = store.get(CIK, lookback_years=3)['income_statement']
+    assert recent == {str(year): statement[str(year)] for year in YEARS[-3:]}
+    assert store.get(CIK, lookback_years=50)['income_statement'] == statement
+
+
+def assert_same_statements(left, right):
+    for statement in StatementStore.STATEMENTS:
+        pd.testing.assert_frame_equal(pd.DataFrame.from_dict(left[statement], orient='index'),
+                                      pd.DataFrame.from_dict(right[statement], orient='index'))
+
+
+@pytest.mark.parametrize('history_years', [3, 6, 10, 19])
+def test_full_history_parse_trimmed_matches_default_parse(sec_client, history_years):
+    facts = synthetic_company_facts(years=history_years, line_items=0)
+    default = sec_client.build_company_data(CIK, CIK, facts, ticker='LBK', lookback_years=5)
+    full = sec_client.build_company_data(CIK, CIK, facts, ticker='LBK', lookback_years=SECClient.MAX_LOOKBACK_YEARS)
+    assert_same_statements(StatementStore.trim(full, 5), StatementStore.trim(default, 5))
+
+
+def test_full_history_parse_keeps_higher_priority_concept(sec_client):
+    years = list(range(2018, 2024))
+    facts = companyfacts({
+        'Revenues': {'USD': annual(years, [1000.0] * len(years))},
+        'SellingGeneralAndAdministrativeExpense': {'USD': annual(years, [100.0] * len(years))},
+        'OperatingExpenses': {'USD': annual(years, [700.0] * len(years))}
+    })
+    for lookback_years in (5, SECClient.MAX_LOOKBACK_YEARS):
+        income_statement = sec_client.build_company_data(CIK, CIK, facts, ticker='LBK',
+                                                         lookback_years=lookback_years)['income_statement']
+        assert {abs(row['SG&A']) for row in income_statement.values()} == {100.0}
+
+
+def test_dcf_calculator_from_store_applies_lookback(tmp_path, sec_client, monkeypatch):
+    from dcf_calculator import DCFCalculator
+    from operating_model import OperatingModel
+    store = StatementStore(str(tmp_path / 'store'))
+    store.put(CIK, sec_client.build_company_data(CIK, CIK, payload(), ticker='LBK',
+                                                 lookback_years=SECClient.MAX_LOOKBACK_YEARS))
+    seen = []
+    from_store = OperatingModel.from_store
+
+    def spy(store, cik, projection_years=5, lookback_years=None):
+        model = from_store(store, cik, projection_years=projection_years, lookback_years=lookback_years)
+        seen.append(len(model.historical_data['income_statement']))
+        return model
+
+    monkeypatch.setattr(OperatingModel, 'from_store', spy)
+    assert DCFCalculator.from_store(store, CIK, {'projection_years': 5}) is not None
+    assert DCFCalculator.from_store(store, CIK, {'projection_years': 5}, lookback_years=8) is not None
+    assert seen == [SECClient.DEFAULT_LOOKBACK_YEARS, 8]
+
+
+@pytest.fixture
+def offline_sec(client, monkeypatch):
+    """Serve the synthetic payload from the app's SEC client without network access"""
+    import app
+    monkeypatch.setattr(app.sec_client, 'resolve_cik', lambda identifier: CIK)
+    monkeypatch.setattr(app.sec_client, 'get_company_facts', lambda cik: payload())
+
+    async def get_company_facts_async(cik):
+        return payload()
+
+    monkeypatch.setattr(app.sec_client, 'get_company_facts_async', get_company_facts_async)
+    app.statement_store.delete(CIK)
+    return app
+
+
+def test_short_fetch_keeps_full_history_in_store(client, offline_sec):
+    response = client.post('/api/fetch-company', json={'identifier': 'LBK', 'lookback_years': 3})
+    assert response.status_code == 200
+    assert len(response.get_json()['income_statement']) == 3
+
+    stored = offline_sec.statement_store.get(CIK)
+    assert list(stored['income_statement']) == [str(year) for year in YEARS]
+    assert stored['ticker'] == 'LBK'
+
+    # A second short fetch must not truncate the stored history either
+    client.post('/api/fetch-company', json={'identifier': 'LBK', 'lookback_years': 2})
+    assert len(offline_sec.statement_store.get(CIK)['income_statement']) == len(YEARS)
+
+
+def test_fetch_parses_once_and_matches_store(client, offline_sec, monkeypatch):
+    calls = []
+    build_company_data = offline_sec.sec_client.build_company_data
+
+    def spy(*args, **kwargs):
+        calls.append(args[4] if len(args) > 4 else kwargs.get('lookback_years'))
+        return build_company_data(*args, **kwargs)
+
+    monkeypatch.setattr(offline_sec.sec_client, 'build_company_data', spy)
+    response = client.post('/api/fetch-company', json={'identifier': 'LBK', 'lookback_years': 4})
+    assert response.status_code == 200
+    assert calls == [offline_sec.SECClient.MAX_LOOKBACK_YEARS]
+
+    # The handle's statements are exactly what a store-based recalculation reads
+    fetched = response.get_json()
+    stored = offline_sec.statement_store.get(CIK, lookback_years=4)
+    for statement in StatementStore.STATEMENTS:
+        assert fetched[statement] == offline_sec.app.json.loads(offline_sec.app.json.dumps(stored[statement]))
+    assert StatementStore.trim(stored, 4) == stored
+
+
+def test_calculate_from_store_uses_requested_lookback(client, offline_sec, monkeypatch):
+    client.post('/api/fetch-company', json={'identifier': 'LBK', 'lookback_years': 3})
+    seen = []
+    from_store = offline_sec.OperatingModel.from_store
+
+    def spy(store, cik, projection_years=5, lookback_years=None):
+        model = from_store(store, cik, projection_years=projection_years, lookback_years=lookback_years)
+        seen.append(len(model.historical_data['income_statement']))
+        return model
+
+    monkeypatch.setattr(offline_sec.OperatingModel, 'from_store', spy)
+    for lookback_years, years in ((8, 8), (None, offline_sec.sec_client.lookback_years)):
+        request = {'cik': CIK, 'assumptions': {'projection_years': 5}}
+        if lookback_years:
+            request['lookback_years'] = lookback_years
+        assert client.post('/api/calculate-dcf', json=request).status_code == 200
+        assert seen[-1] == years
+
+    response = client.post('/api/calculate-dcf', json={'cik': CIK, 'lookback_years': 0,
+                                                       'assumptions': {'projection_years': 5}})
+    assert response.status_code == 400
@@ -0,0 +1,135 @@
+"""
+Monte Carlo Tests
+Seeded runs are reproducible, chunk sketches merge exactly, percentiles stay within the
+sketch's relative accuracy, and histogram bin counts are bounded before any scenario is valued
+"""
+import numpy as np
+import pytest
+
+from batch_dcf import BatchDCFEngine
+from benchmarks import synthetic_company
+from monte_carlo import MonteCarloSimulator, QuantileSketch
+
+DISTRIBUTIONS = {
+    'beta': {'dist': 'normal', 'mean': 1.1, 'std': 0.25, 'min': 0.1},
+    'terminal_growth_rate': {'dist': 'triangular', 'left': 0.0, 'mode': 0.02, 'right': 0.05},
+    'cost_of_debt': {'dist': 'uniform', 'low': 0.03, 'high': 0.08},
+    'tax_rate': {'dist': 'empirical', 'values': [0.15, 0.21, 0.25, 0.3]}
+}
+
+
+def simulator(**kwargs):
+    # Net debt within the range of enterprise values so equity value and price change sign
+    engine = BatchDCFEngine([80.0, 95.0, 110.0, 118.0, 125.0], net_debt=1500.0, shares_outstanding=25.0)
+    return MonteCarloSimulator(engine, DISTRIBUTIONS, base_assumptions={'risk_free_rate': 0.04}, **kwargs)
+
+
+def recorded_draws(sim):
+    """Run sim chunk by chunk, returning its merged sketches and every raw valuation"""
+    evaluate, raw = sim.engine.evaluate, []
+
+    def record(**assumptions):
+        result = evaluate(**assumptions)
+        raw.append(result)
+        return result
+
+    sim.engine.evaluate = record
+    sketches = sim.new_sketches()
+    for _, size, seed_sequence in sim.chunk_plan():
+        for metric, sketch in sim.run_chunk(size, seed_sequence).items():
+            sketches[metric].merge(sketch)
+    return sketches, np.concatenate(raw)
+
+
+def without_timing(result):
+    return {key: value for key, value in result.items() if key != 'elapsed_seconds'}
+
+
+def test_fixed_seed_reproduces_results():
+    first = simulator(draws=30_000, seed=42, chunk_size=4_096).run()
+    again = simulator(draws=30_000, seed=42, chunk_size=4_096).run()
+    other = simulator(draws=30_000, seed=43, chunk_size=4_096).run()
+    assert without_timing(first) == without_timing(again)
+    assert first['metrics']['equity_value']['percentiles'] != other['metrics']['equity_value']['percentiles']
+
+
+def test_chunk_plan_covers_every_draw():
+    plan = simulator(draws=10_001, seed=1, chunk_size=1_000).chunk_plan()
+    assert [index for index, _, _ in plan] == list(range(11))
+    assert sum(size for _, size, _ in plan) == 10_001 and plan[-1][1] == 1
+
+
+def test_chunk_sketches_merge_to_one_pass_over_all_draws():
+    sim = simulator(draws=10_001, seed=5, chunk_size=997)
+    merged, raw = recorded_draws(sim)
+    assert raw.size == 10_001
+    for metric in MonteCarloSimulator.METRICS:
+        single = QuantileSketch(sim.relative_accuracy)
+        single.add(raw[metric])
+        sketch = merged[metric]
+        assert (sketch.count, sketch.zero_count, sketch.positive, sketch.negative) == \
+            (single.count, single.zero_count, single.positive, single.negative)
+        assert (sketch.min, sketch.max) == (single.min, single.max)
+        assert sketch.mean == pytest.approx(single.mean, rel=1e-12)
+        assert sketch.summary((50,))['std'] == pytest.approx(single.summary((50,))['std'], rel=1e-9)
+        assert sketch.quantiles([0.05, 0.5, 0.95]) == single.quantiles([0.05, 0.5, 0.95])
+
+    # run() merges the same chunks
+    summary = sim.run(percentiles=(5, 50, 95))['metrics']['equity_value']['percentiles']
+    assert list(summary.values()) == merged['equity_value'].quantiles([0.05, 0.5, 0.95])
+
+
+def test_percentiles_within_relative_accuracy_of_raw_draws():
+    sim = simulator(draws=50_000, seed=9, chunk_size=8_192)
+    merged, raw = recorded_draws(sim)
+    percentiles = [0, 1, 5, 10, 25, 50, 75, 90, 95, 99, 100]
+    assert (raw['equity_value'] < 0).any() and (raw['equity_value'] > 0).any()
+    for metric in MonteCarloSimulator.METRICS:
+        values = raw[metric]
+        estimates = merged[metric].quantiles([p / 100 for p in percentiles])
+        # The sketch returns the order statistic at rank q * (n - 1), rounded down
+        exact = np.percentile(values, percentiles, method='lower')
+        for p, estimate, value in zip(percentiles, estimates, exact):
+            assert abs(estimate - value) <= sim.relative_accuracy * abs(value) + 1e-9, (metric, p)
+
+
+@pytest.mark.parametrize('relative_accuracy', [0.001, 0.01, 0.05])
+def test_sketch_quantiles_on_wide_ranges(relative_accuracy):
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.lognormal(10, 3, 20_000), -rng.lognormal(2, 2, 5_000), np.zeros(100)])
+    sketch = QuantileSketch(relative_accuracy)
+    for chunk in np.array_split(rng.permutation(values), 7):
+        sketch.add(chunk)
+    qs = np.linspace(0, 1, 101)
+    for estimate, value in zip(sketch.quantiles(qs), np.percentile(values, qs * 100, method='lower')):
+        assert abs(estimate - value) <= relative_accuracy * abs(value) + 1e-9
+
+
+def test_histogram_has_requested_bins():
+    sketch = QuantileSketch()
+    sketch.add(list(range(1, 1001)))
+    histogram = sketch.histogram(bins=20)
+    assert len(histogram['counts']) == 20 and len(histogram['edges']) == 21
+
+
+@pytest.mark.parametrize('bins', [0, -1, QuantileSketch.MAX_BINS + 1, 10 ** 9, 'wide', None, float('inf')])
+def test_bins_out_of_range_are_rejected(bins):
+    with pytest.raises(ValueError, match='bins'):
+        QuantileSketch().histogram(bins=bins)
+
+
+@pytest.mark.parametrize('bins, status', [(25, 200), (0, 400), (10 ** 9, 400), ('many', 400)])
+def test_monte_carlo_endpoint_validates_bins(client, bins, status):
+    response = client.post('/api/monte-carlo', json={
+        'company_data': synthetic_company(years=5, line_items=10),
+        'assumptions': {'projection_years': 5},
+        'distributions': {'beta': {'dist': 'normal', 'mean': 1.0, 'std': 0.1}},
+        'draws': 1000,
+        'seed': 7,
+        'bins': bins
+    })
+    assert response.status_code == status
+    if status == 200:
+        assert len(response.get_json()['metrics']['equity_value']['histogram']['counts']) == bins
+    else:
+        assert 'bins' in response.get_json()['error']
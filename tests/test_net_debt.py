@@ -0,0 +1,69 @@
+"""
+Net Debt Tests
+A filing fact that backs two overlapping balance sheet items is counted once in net debt
+"""
+import pytest
+
+from conftest import annual, companyfacts
+from dcf_calculator import DCFCalculator
+from operating_model import OperatingModel
+
+YEARS = [2021, 2022, 2023]
+
+
+def company_data(sec_client, balances):
+    """Parse a filer with revenue, total assets and the given year-end balances"""
+    concepts = {
+        'Revenues': {'USD': annual(YEARS, [1000.0, 1100.0, 1200.0])},
+        'Assets': {'USD': annual(YEARS, [5000.0, 5100.0, 5200.0], point_in_time=True)}
+    }
+    for concept, values in balances.items():
+        concepts[concept] = {'USD': annual(YEARS, values, point_in_time=True)}
+    return sec_client.build_company_data('1234567', '0001234567', companyfacts(concepts),
+                                         ticker='TEST', lookback_years=3)
+
+
+def net_debt(data):
+    operating_model_data = OperatingModel(data, projection_years=3).build_model({})
+    return DCFCalculator(operating_model_data, {}).calculate_net_debt()
+
+
+def test_shared_debt_and_cash_facts_are_counted_once(sec_client):
+    # ShortTermDebt is in both the CommercialPaper and TermDebtCurrent concept lists, and
+    # cash is only reported together with short-term investments
+    data = company_data(sec_client, {
+        'ShortTermDebt': [100.0, 110.0, 120.0],
+        'LongTermDebt': [500.0, 500.0, 500.0],
+        'CashCashEquivalentsAndShortTermInvestments': [300.0, 300.0, 300.0],
+        'ShortTermInvestments': [50.0, 50.0, 50.0]
+    })
+    latest = data['balance_sheet']['2023']
+    assert latest['CommercialPaper'] == 120.0
+    assert latest['TermDebtCurrent'] == 0.0
+    assert latest['CashAndCashEquivalents'] == 300.0
+    assert latest['MarketableSecuritiesCurrent'] == 0.0
+    assert net_debt(data) == pytest.approx(120.0 + 500.0 - 300.0)
+
+
+def test_total_current_debt_replaces_its_components(sec_client):
+    # TermDebtCurrent falls back to DebtCurrent, which already includes commercial paper
+    data = company_data(sec_client, {
+        'CommercialPaper': [30.0, 30.0, 30.0],
+        'DebtCurrent': [100.0, 100.0, 100.0],
+        'CashAndCashEquivalentsAtCarryingValue': [40.0, 40.0, 40.0]
+    })
+    latest = data['balance_sheet']['2023']
+    assert latest['TermDebtCurrent'] == 100.0
+    assert latest['CommercialPaper'] == 0.0
+    assert net_debt(data) == pytest.approx(100.0 - 40.0)
+
+
+def test_distinct_facts_are_all_counted(sec_client):
+    data = company_data(sec_client, {
+        'CommercialPaper': [30.0, 30.0, 30.0],
+        'LongTermDebtCurrent': [70.0, 70.0, 70.0],
+        'LongTermDebtExcludingCurrentMaturities': [400.0, 400.0, 400.0],
+        'CashAndCashEquivalentsAtCarryingValue': [200.0, 200.0, 200.0],
+        'MarketableSecuritiesCurrent': [40.0, 40.0, 40.0]
+    })
+    assert net_debt(data) == pytest.approx(30.0 + 70.0 + 400.0 - 200.0 - 40.0)
@@ -0,0 +1,72 @@
+"""
+Scenario Scheduler Tests
+Sharded Monte Carlo and sensitivity runs give the same results as one in-process pass
+"""
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from batch_dcf import BatchDCFEngine
+from monte_carlo import MonteCarloSimulator
+from scenario_scheduler import ScenarioScheduler
+
+FREE_CASH_FLOWS = [120.0, 131.0, 140.5, 152.0, 160.25]
+DISTRIBUTIONS = {
+    'beta': {'dist': 'normal', 'mean': 1.1, 'std': 0.2, 'min': 0.2},
+    'terminal_growth_rate': {'dist': 'triangular', 'left': 0.01, 'mode': 0.025, 'right': 0.04},
+    'tax_rate': {'dist': 'empirical', 'values': [0.18, 0.21, 0.24, 0.27]}
+}
+
+
+def engine():
+    return BatchDCFEngine(FREE_CASH_FLOWS, net_debt=250.0, shares_outstanding=40.0)
+
+
+def scheduler(max_workers: int) -> ScenarioScheduler:
+    context = multiprocessing.get_context(
+        'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+    scheduler = ScenarioScheduler(max_workers, mp_context=context)
+    # Shard even these small jobs across the pool
+    scheduler.MIN_PARALLEL_DRAWS = 0
+    scheduler.MIN_PARALLEL_CELLS = 0
+    return scheduler
+
+
+@pytest.fixture(scope='module')
+def schedulers():
+    serial, parallel = scheduler(1), scheduler(2)
+    yield serial, parallel
+    parallel.close()
+
+
+def without_timing(result):
+    return {key: value for key, value in result.items() if key != 'elapsed_seconds'}
+
+
+def test_monte_carlo_is_identical_for_any_worker_count(schedulers):
+    def simulator():
+        return MonteCarloSimulator(engine(), DISTRIBUTIONS, base_assumptions={'risk_free_rate': 0.04},
+                                   draws=20_000, seed=11, chunk_size=1_500)
+
+    expected = without_timing(simulator().run())
+    for scheduler in schedulers:
+        assert without_timing(scheduler.monte_carlo(simulator())) == expected
+    # The two-worker run really went through the process pool
+    assert schedulers[1]._pool is not None
+
+
+def test_monte_carlo_many_keeps_results_per_key(schedulers):
+    simulators = {key: MonteCarloSimulator(engine(), DISTRIBUTIONS, draws=5_000, seed=seed, chunk_size=700)
+                  for key, seed in (('A', 1), ('B', 2))}
+    results = schedulers[1].monte_carlo_many(simulators)
+    for key, simulator in simulators.items():
+        assert without_timing(results[key]) == without_timing(simulator.run())
+
+
+def test_sensitivity_is_identical_for_any_worker_count(schedulers):
+    axes = [('wacc', np.linspace(0.06, 0.12, 13)), ('terminal_growth_rate', np.linspace(0.0, 0.04, 9)),
+            ('beta', [0.8, 1.0, 1.2])]
+    expected = engine().sensitivity(axes, {'risk_free_rate': 0.04})
+    for scheduler in schedulers:
+        assert scheduler.sensitivity(engine(), axes, {'risk_free_rate': 0.04}) == expected
@@ -0,0 +1,86 @@
+"""
+Ticker Index Tests
+A failing background refresh backs off instead of starting a download on every lookup
+"""
+import json
+import os
+
+import ticker_index
+from ticker_index import TickerIndex
+
+TICKERS = {'0': {'cik_str': 320193, 'ticker': 'AAPL', 'title': 'Apple Inc.'}}
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def stale_index(tmp_path, monkeypatch):
+    path = tmp_path / 'company_tickers.json'
+    path.write_text(json.dumps(TICKERS))
+    os.utime(path, (0, 0))
+    index = TickerIndex(str(path), max_age=60)
+    clock = Clock(10_000.0)
+    monkeypatch.setattr(ticker_index.time, 'time', clock.time)
+    return index, clock
+
+
+def lookups(index, count):
+    for _ in range(count):
+        assert index.lookup_cik('AAPL') == '0000320193'
+        if index._refresh_thread is not None:
+            index._refresh_thread.join()
+
+
+def test_failed_refresh_backs_off(tmp_path, monkeypatch):
+    index, clock = stale_index(tmp_path, monkeypatch)
+    attempts = []
+
+    def failing_refresh():
+        attempts.append(clock.now)
+        raise ConnectionError('offline')
+
+    monkeypatch.setattr(index, 'refresh', failing_refresh)
+
+    lookups(index, 50)
+    assert len(attempts) == 1
+
+    clock.now += TickerIndex.RETRY_BACKOFF - 1
+    lookups(index, 10)
+    assert len(attempts) == 1
+
+    clock.now += 1
+    lookups(index, 10)
+    assert len(attempts) == 2
+
+    # The second failure doubles the wait
+    clock.now += TickerIndex.RETRY_BACKOFF
+    lookups(index, 10)
+    assert len(attempts) == 2
+    clock.now += TickerIndex.RETRY_BACKOFF
+    lookups(index, 10)
+    assert len(attempts) == 3
+
+
+def test_backoff_is_capped_and_reset_on_success(tmp_path, monkeypatch):
+    index, clock = stale_index(tmp_path, monkeypatch)
+    outcomes = iter([ConnectionError('offline')] * 20 + [None])
+
+    def refresh():
+        outcome = next(outcomes)
+        if outcome is not None:
+            raise outcome
+        index._loaded_at = clock.now
+
+    monkeypatch.setattr(index, 'refresh', refresh)
+    for _ in range(20):
+        lookups(index, 1)
+        assert index._retry_at - clock.now <= TickerIndex.MAX_RETRY_BACKOFF
+        clock.now = index._retry_at
+
+    lookups(index, 1)
+    assert index._refresh_failures == 0
@@ -0,0 +1,164 @@
+"""
+SEC Ticker Index
+Process-wide ticker/CIK/title lookup table built from SEC's company_tickers.json
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+
+class TickerIndex:
+    """
+    In-memory ticker <-> CIK index, persisted to disk and refreshed in the background
+
+    The SEC list is downloaded at most once per max_age. Lookups are plain dict reads,
+    so resolving a ticker costs microseconds instead of a ~1 s download plus a linear scan.
+    """
+
+    URL = "https://www.sec.gov/files/company_tickers.json"
+    # www.sec.gov rejects the data.sec.gov Host header the main session carries
+    HEADERS = {
+        'User-Agent': 'DCF Tool contact@example.com',
+        'Accept': 'application/json',
+        'Accept-Encoding': 'gzip, deflate'
+    }
+    DEFAULT_MAX_AGE = 24 * 60 * 60  # Seconds before the on-disk list is refreshed
+    # Failed background refreshes are retried after RETRY_BACKOFF seconds, doubling up to MAX_RETRY_BACKOFF
+    RETRY_BACKOFF = 60
+    MAX_RETRY_BACKOFF = 60 * 60
+
+    _shared: Dict[str, 'TickerIndex'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, cache_path: str, max_age: float = DEFAULT_MAX_AGE):
+        """
+        Initialize index (data is loaded lazily on first lookup)
+
+        Args:
+            cache_path: File holding the last downloaded company_tickers.json
+            max_age: Seconds before a background refresh is triggered
+        """
+        self.cache_path = cache_path
+        self.max_age = max_age
+        # (ticker -> (cik, title), cik -> [tickers]); swapped as one reference on refresh
+        self._tables: Optional[Tuple[Dict[str, Tuple[str, str]], Dict[str, List[str]]]] = None
+        self._loaded_at = 0.0
+        self._load_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        # Consecutive background refresh failures and when the next attempt is allowed
+        self._refresh_failures = 0
+        self._retry_at = 0.0
+
+    @classmethod
+    def shared(cls, cache_path: str, max_age: float = DEFAULT_MAX_AGE) -> 'TickerIndex':
+        """Return the process-wide index for a cache path, creating it on first use"""
+        with cls._shared_lock:
+            index = cls._shared.get(cache_path)
+            if index is None:
+                index = cls(cache_path, max_age=max_age)
+                cls._shared[cache_path] = index
+            return index
+
+    @staticmethod
+    def normalize_ticker(ticker: str) -> str:
+        """Upper-case a ticker and map class separators to SEC's dash form (BRK.B -> BRK-B)"""
+        return ticker.upper().strip().replace('.', '-')
+
+    @classmethod
+    def _build_tables(cls, data: Dict) -> Tuple[Dict[str, Tuple[str, str]], Dict[str, List[str]]]:
+        """Build lookup dicts from SEC's {'0': {'cik_str', 'ticker', 'title'}, ...} structure"""
+        by_ticker = {}
+        by_cik = {}
+        if isinstance(data, dict):
+            for company_info in data.values():
+                if not isinstance(company_info, dict):
+                    continue
+                ticker = cls.normalize_ticker(str(company_info.get('ticker', '')))
+                cik = str(company_info.get('cik_str', ''))
+                if not ticker or not cik:
+                    continue
+                # Pad CIK to 10 digits
+                cik = cik.zfill(10)
+                title = company_info.get('title', '')
+                # The SEC list is ordered by company size; keep the first mapping for a ticker
+                if ticker not in by_ticker:
+                    by_ticker[ticker] = (cik, title)
+                by_cik.setdefault(cik, []).append(ticker)
+        return by_ticker, by_cik
+
+    def _load_from_disk(self) -> bool:
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.load(f)
+            self._tables = self._build_tables(data)
+            self._loaded_at = os.path.getmtime(self.cache_path)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def refresh(self):
+        """Download the latest list, persist it and swap in the new tables"""
+        response = requests.get(self.URL, headers=self.HEADERS, timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        tables = self._build_tables(data)
+
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.cache_path)
+
+        self._tables = tables
+        self._loaded_at = time.time()
+        print(f"DEBUG: Ticker index refreshed with {len(tables[0])} tickers")
+
+    def _refresh_in_background(self):
+        def run():
+            try:
+                self.refresh()
+                self._refresh_failures = 0
+            except Exception as e:
+                # Back off so lookups on a stale index don't start a download each
+                self._refresh_failures += 1
+                delay = min(self.RETRY_BACKOFF * 2 ** (self._refresh_failures - 1), self.MAX_RETRY_BACKOFF)
+                self._retry_at = time.time() + delay
+                print(f"Background ticker index refresh failed: {e}; retrying in {delay:.0f}s")
+
+        with self._load_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            if time.time() < self._retry_at:
+                return
+            self._refresh_thread = threading.Thread(target=run, name='ticker-index-refresh', daemon=True)
+            self._refresh_thread.start()
+
+    def ensure_loaded(self):
+        """Load from disk or download on first use; refresh stale data in the background"""
+        if self._tables is None:
+            with self._load_lock:
+                if self._tables is None and not self._load_from_disk():
+                    self.refresh()
+        if time.time() - self._loaded_at > self.max_age:
+            self._refresh_in_background()
+
+    def lookup_cik(self, ticker: str) -> Optional[str]:
+        """Return the 10-digit CIK for a ticker, or None if unknown"""
+        self.ensure_loaded()
+        match = self._tables[0].get(self.normalize_ticker(ticker))
+        return match[0] if match else None
+
+    def lookup_title(self, ticker: str) -> Optional[str]:
+        """Return the registrant name SEC lists for a ticker"""
+        self.ensure_loaded()
+        match = self._tables[0].get(self.normalize_ticker(ticker))
+        return match[1] if match else None
+
+    def lookup_tickers(self, cik: str) -> List[str]:
+        """Return all tickers listed for a CIK (primary listing first)"""
+        self.ensure_loaded()
+        return list(self._tables[1].get(str(cik).zfill(10), []))